@@ -0,0 +1,62 @@
+import asyncio
+import re
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy.pool import NullPool
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core.config import settings
+from app.core.database import Base
+from app.models import efficiency_metrics  # noqa: F401  注册模型到 Base.metadata
+
+config = context.config
+# 由 python -m app.migrate 调用时沿用服务自己的日志配置
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+target_metadata = Base.metadata
+
+# 按月分区和兜底分区由分区任务维护，自动生成迁移时忽略
+PARTITION_PATTERN = re.compile(r"^efficiency_metrics_(y\d{4}m\d{2}|default)$")
+
+
+def include_name(name, type_, parent_names):
+    if type_ == "table":
+        return not PARTITION_PATTERN.match(name)
+    return True
+
+
+def configure(**kwargs):
+    context.configure(
+        target_metadata=target_metadata,
+        include_name=include_name,
+        compare_type=True,
+        **kwargs
+    )
+
+
+def run_migrations_offline():
+    """生成 SQL 脚本而不连接数据库：alembic upgrade head --sql"""
+    configure(url=settings.DATABASE_URL, literal_binds=True, dialect_opts={"paramstyle": "named"})
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def do_run_migrations(connection):
+    configure(connection=connection)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+async def run_migrations_online():
+    engine = create_async_engine(settings.DATABASE_URL, poolclass=NullPool)
+    async with engine.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+    await engine.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    asyncio.run(run_migrations_online())
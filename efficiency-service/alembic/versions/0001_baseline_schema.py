@@ -0,0 +1,241 @@
+"""baseline schema
+
+与 app/models 和 db/migrations/V5~V8 执行后的结构一致：
+efficiency_metrics 按月分区（只建兜底分区，按月分区由 python -m app.migrate 和分区任务补齐），
+以及看板物化视图。已按 SQL 脚本迁移到 V8 的数据库执行 alembic stamp 0001 即可。
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+DASHBOARD_VIEWS = {
+    "mv_project_daily_metrics": (
+        """
+        SELECT project_id,
+               date_trunc('day', timestamp)::date AS day,
+               metric_type,
+               COUNT(*) AS event_count,
+               COUNT(DISTINCT user_id) AS user_count,
+               COUNT(DISTINCT task_id) AS task_count,
+               SUM(metric_value) AS value_sum,
+               MIN(metric_value) AS value_min,
+               MAX(metric_value) AS value_max,
+               MAX(timestamp) AS last_activity
+          FROM efficiency_metrics
+         GROUP BY project_id, date_trunc('day', timestamp)::date, metric_type
+        """,
+        ("project_id", "day", "metric_type")
+    ),
+    "mv_user_project_daily_metrics": (
+        """
+        SELECT user_id,
+               project_id,
+               date_trunc('day', timestamp)::date AS day,
+               metric_type,
+               COUNT(*) AS event_count,
+               COUNT(DISTINCT task_id) AS task_count,
+               SUM(metric_value) AS value_sum,
+               MIN(metric_value) AS value_min,
+               MAX(metric_value) AS value_max,
+               MAX(timestamp) AS last_activity
+          FROM efficiency_metrics
+         GROUP BY user_id, project_id, date_trunc('day', timestamp)::date, metric_type
+        """,
+        ("user_id", "project_id", "day", "metric_type")
+    ),
+    "mv_tool_daily_metrics": (
+        """
+        SELECT project_id,
+               COALESCE(tool, 'unknown') AS tool,
+               date_trunc('day', timestamp)::date AS day,
+               metric_type,
+               COUNT(*) AS event_count,
+               COUNT(DISTINCT user_id) AS user_count,
+               SUM(metric_value) AS value_sum,
+               MIN(metric_value) AS value_min,
+               MAX(metric_value) AS value_max
+          FROM efficiency_metrics
+         GROUP BY project_id, COALESCE(tool, 'unknown'), date_trunc('day', timestamp)::date, metric_type
+        """,
+        ("project_id", "tool", "day", "metric_type")
+    ),
+}
+
+
+def upgrade() -> None:
+    # 效率指标表（按 timestamp 按月范围分区，主键包含分区键）
+    op.create_table(
+        "efficiency_metrics",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("user_id", sa.String(length=255), nullable=False),
+        sa.Column("project_id", sa.String(length=255), nullable=False),
+        sa.Column("task_id", sa.String(length=255), nullable=True),
+        sa.Column("tool", sa.String(length=100), nullable=True),
+        sa.Column("metric_type", sa.String(length=100), nullable=False, comment="指标类型：annotation_time, fps等"),
+        sa.Column("metric_value", sa.Float(), nullable=False, comment="指标值"),
+        sa.Column("timestamp", sa.DateTime(), nullable=False),
+        sa.Column("extra_data", sa.JSON(), nullable=True, comment="事件相关的额外数据，存储为JSON格式"),
+        sa.PrimaryKeyConstraint("id", "timestamp"),
+        postgresql_partition_by="RANGE (timestamp)",
+    )
+    op.execute("CREATE TABLE efficiency_metrics_default PARTITION OF efficiency_metrics DEFAULT")
+    op.create_index("idx_efficiency_metrics_timestamp_brin", "efficiency_metrics", ["timestamp"], postgresql_using="brin")
+    op.create_index("idx_efficiency_metrics_metric_type", "efficiency_metrics", ["metric_type"])
+    op.create_index("ix_efficiency_metrics_user_id", "efficiency_metrics", ["user_id"])
+    op.create_index("ix_efficiency_metrics_project_id", "efficiency_metrics", ["project_id"])
+    op.create_index("ix_efficiency_metrics_task_id", "efficiency_metrics", ["task_id"])
+
+    # 用户统计表
+    op.create_table(
+        "user_stats",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.String(length=255), nullable=False),
+        sa.Column("project_id", sa.String(length=255), nullable=False),
+        sa.Column("total_annotations", sa.Integer(), nullable=True),
+        sa.Column("total_time_spent", sa.Integer(), nullable=True),
+        sa.Column("avg_annotation_time", sa.Float(), nullable=True),
+        sa.Column("projects_count", sa.Integer(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.Column("last_activity", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("user_id", "project_id", name="user_stats_user_id_project_id_key"),
+    )
+    op.create_index("ix_user_stats_id", "user_stats", ["id"])
+    op.create_index("ix_user_stats_user_id", "user_stats", ["user_id"])
+
+    # 项目统计表
+    op.create_table(
+        "project_stats",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("project_id", sa.String(length=255), nullable=False),
+        sa.Column("total_events", sa.Integer(), nullable=True),
+        sa.Column("total_annotations", sa.Integer(), nullable=True),
+        sa.Column("total_tasks", sa.Integer(), nullable=True),
+        sa.Column("active_users", sa.Integer(), nullable=True),
+        sa.Column("avg_efficiency", sa.Float(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.Column("last_activity", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_project_stats_id", "project_stats", ["id"])
+    op.create_index("ix_project_stats_project_id", "project_stats", ["project_id"], unique=True)
+
+    # 任务统计表
+    op.create_table(
+        "task_stats",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("task_id", sa.String(length=255), nullable=False),
+        sa.Column("project_id", sa.String(length=255), nullable=False),
+        sa.Column("user_id", sa.String(length=255), nullable=False),
+        sa.Column("task_type", sa.String(length=100), nullable=True),
+        sa.Column("status", sa.String(length=50), nullable=True),
+        sa.Column("annotation_count", sa.Integer(), nullable=True),
+        sa.Column("total_time", sa.Integer(), nullable=True),
+        sa.Column("error_count", sa.Integer(), nullable=True),
+        sa.Column("started_at", sa.DateTime(), nullable=True),
+        sa.Column("completed_at", sa.DateTime(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_task_stats_id", "task_stats", ["id"])
+    op.create_index("ix_task_stats_task_id", "task_stats", ["task_id"], unique=True)
+    op.create_index("ix_task_stats_project_id", "task_stats", ["project_id"])
+    op.create_index("ix_task_stats_user_id", "task_stats", ["user_id"])
+
+    # 工具使用统计表
+    op.create_table(
+        "tool_usage",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("tool_name", sa.String(length=100), nullable=False),
+        sa.Column("user_id", sa.String(length=255), nullable=False),
+        sa.Column("project_id", sa.String(length=255), nullable=False),
+        sa.Column("usage_count", sa.Integer(), nullable=True),
+        sa.Column("total_time", sa.Integer(), nullable=True),
+        sa.Column("success_count", sa.Integer(), nullable=True),
+        sa.Column("error_count", sa.Integer(), nullable=True),
+        sa.Column("avg_operation_time", sa.Float(), nullable=True),
+        sa.Column("efficiency_score", sa.Float(), nullable=True),
+        sa.Column("first_used", sa.DateTime(), nullable=True),
+        sa.Column("last_used", sa.DateTime(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_tool_usage_id", "tool_usage", ["id"])
+    op.create_index("ix_tool_usage_tool_name", "tool_usage", ["tool_name"])
+    op.create_index("ix_tool_usage_user_id", "tool_usage", ["user_id"])
+    op.create_index("ix_tool_usage_project_id", "tool_usage", ["project_id"])
+
+    # 学习曲线拟合结果表
+    op.create_table(
+        "learning_curve_fits",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.String(length=255), nullable=False),
+        sa.Column("project_id", sa.String(length=255), nullable=False),
+        sa.Column("annotation_type", sa.String(length=100), nullable=False),
+        sa.Column("sample_count", sa.Integer(), nullable=True),
+        sa.Column("initial_duration", sa.Float(), nullable=False),
+        sa.Column("learning_exponent", sa.Float(), nullable=False, comment="幂律学习曲线指数b：duration = a * n^(-b)"),
+        sa.Column("learning_rate", sa.Float(), nullable=False, comment="练习次数翻倍时耗时下降的百分比"),
+        sa.Column("r_squared", sa.Float(), nullable=True),
+        sa.Column("current_duration", sa.Float(), nullable=True),
+        sa.Column("plateau_detected", sa.Boolean(), nullable=True),
+        sa.Column("window_days", sa.Integer(), nullable=False),
+        sa.Column("fitted_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("user_id", "project_id", "annotation_type", name="uq_learning_curve_fits_dim"),
+    )
+    op.create_index("ix_learning_curve_fits_id", "learning_curve_fits", ["id"])
+    op.create_index("ix_learning_curve_fits_user_id", "learning_curve_fits", ["user_id"])
+    op.create_index("ix_learning_curve_fits_project_id", "learning_curve_fits", ["project_id"])
+    op.create_index(
+        "idx_learning_curve_fits_project_rate", "learning_curve_fits",
+        ["project_id", "annotation_type", sa.text("learning_rate DESC")]
+    )
+
+    # 系统健康状态表
+    op.create_table(
+        "system_health",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("service_name", sa.String(length=100), nullable=False),
+        sa.Column("status", sa.String(length=50), nullable=False),
+        sa.Column("response_time", sa.Float(), nullable=True),
+        sa.Column("cpu_usage", sa.Float(), nullable=True),
+        sa.Column("memory_usage", sa.Float(), nullable=True),
+        sa.Column("disk_usage", sa.Float(), nullable=True),
+        sa.Column("message", sa.Text(), nullable=True),
+        sa.Column("details", sa.JSON(), nullable=True),
+        sa.Column("checked_at", sa.DateTime(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_system_health_id", "system_health", ["id"])
+    op.create_index("ix_system_health_service_name", "system_health", ["service_name"])
+
+    # 看板物化视图，唯一索引供 REFRESH ... CONCURRENTLY 使用
+    for name, (definition, unique_columns) in DASHBOARD_VIEWS.items():
+        op.execute(f"CREATE MATERIALIZED VIEW {name} AS {definition} WITH DATA")
+        op.execute(f"CREATE UNIQUE INDEX uq_{name} ON {name} ({', '.join(unique_columns)})")
+
+
+def downgrade() -> None:
+    for name in reversed(list(DASHBOARD_VIEWS)):
+        op.execute(f"DROP MATERIALIZED VIEW IF EXISTS {name}")
+    for table in ("system_health", "learning_curve_fits", "tool_usage", "task_stats", "project_stats", "user_stats"):
+        op.drop_table(table)
+    # 删除分区表会一并删除所有分区
+    op.drop_table("efficiency_metrics")
@@ -0,0 +1,24 @@
+"""system_health checked_at index
+
+服务自身的运行状况样本按 checked_at 做趋势查询和过期清理。
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 00:00:00
+
+"""
+from alembic import op
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_system_health_checked_at", "system_health", ["checked_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_system_health_checked_at", table_name="system_health")
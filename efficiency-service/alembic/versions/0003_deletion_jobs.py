@@ -0,0 +1,44 @@
+"""deletion jobs
+
+用户数据删除改为后台分块执行的任务，任务状态和进度保存在 deletion_jobs 表。
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "deletion_jobs",
+        sa.Column("id", sa.String(length=36), nullable=False),
+        sa.Column("user_id", sa.String(length=255), nullable=False),
+        sa.Column("status", sa.String(length=20), nullable=False),
+        sa.Column("phase", sa.String(length=50), nullable=False, comment="当前执行到的步骤"),
+        sa.Column("progress", sa.JSON(), nullable=True, comment="各步骤的总量和已删除量"),
+        sa.Column("cutoff", sa.DateTime(), nullable=False),
+        sa.Column("influx_floor", sa.DateTime(), nullable=True, comment="该用户在 InfluxDB 中最早的数据时间"),
+        sa.Column("influx_cursor", sa.DateTime(), nullable=True),
+        sa.Column("failures", sa.Integer(), nullable=False, comment="执行失败的次数"),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("started_at", sa.DateTime(), nullable=True),
+        sa.Column("heartbeat_at", sa.DateTime(), nullable=True),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_deletion_jobs_user_id", "deletion_jobs", ["user_id"])
+    op.create_index("ix_deletion_jobs_status", "deletion_jobs", ["status"])
+
+
+def downgrade() -> None:
+    op.drop_table("deletion_jobs")
@@ -0,0 +1,128 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+import logging
+
+from ...core.database import get_read_db
+from ...core.config import settings
+from ...services.dashboard_views import (
+    get_project_daily,
+    get_project_users,
+    get_project_tools,
+    get_user_daily,
+)
+from ...utils.timezone import utc_now
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+# 看板接口只读物化视图，数据延迟不超过 DASHBOARD_REFRESH_INTERVAL（加上副本的复制延迟）
+
+
+@router.get("/projects/{project_id}/daily")
+async def get_project_daily_dashboard(
+    project_id: str,
+    days: int = Query(30, ge=1, le=settings.DASHBOARD_MAX_DAYS, description="查询天数，默认30天"),
+    metric_type: Optional[str] = Query(None, description="指标类型，如 annotation_time"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    获取项目按天的指标汇总
+    """
+    try:
+        daily = await get_project_daily(db, project_id, days, metric_type=metric_type)
+        return {
+            "project_id": project_id,
+            "analysis_period": f"{days}天",
+            "timestamp": utc_now().isoformat(),
+            "daily": daily
+        }
+    
+    except Exception as e:
+        logger.error(f"Error getting project daily dashboard: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to get project daily dashboard: {str(e)}"
+        )
+
+
+@router.get("/projects/{project_id}/users")
+async def get_project_users_dashboard(
+    project_id: str,
+    days: int = Query(7, ge=1, le=settings.DASHBOARD_MAX_DAYS, description="查询天数，默认7天"),
+    metric_type: str = Query("annotation_time", description="指标类型"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    获取项目内各用户在时间窗口内的汇总
+    """
+    try:
+        users = await get_project_users(db, project_id, days, metric_type=metric_type)
+        return {
+            "project_id": project_id,
+            "metric_type": metric_type,
+            "analysis_period": f"{days}天",
+            "user_count": len(users),
+            "timestamp": utc_now().isoformat(),
+            "users": users
+        }
+    
+    except Exception as e:
+        logger.error(f"Error getting project users dashboard: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to get project users dashboard: {str(e)}"
+        )
+
+
+@router.get("/projects/{project_id}/tools")
+async def get_project_tools_dashboard(
+    project_id: str,
+    days: int = Query(7, ge=1, le=settings.DASHBOARD_MAX_DAYS, description="查询天数，默认7天"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    获取项目内各工具的使用汇总
+    """
+    try:
+        tools = await get_project_tools(db, project_id, days)
+        return {
+            "project_id": project_id,
+            "analysis_period": f"{days}天",
+            "timestamp": utc_now().isoformat(),
+            "tools": tools
+        }
+    
+    except Exception as e:
+        logger.error(f"Error getting project tools dashboard: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to get project tools dashboard: {str(e)}"
+        )
+
+
+@router.get("/users/{user_id}/daily")
+async def get_user_daily_dashboard(
+    user_id: str,
+    days: int = Query(30, ge=1, le=settings.DASHBOARD_MAX_DAYS, description="查询天数，默认30天"),
+    project_id: Optional[str] = Query(None, description="项目ID"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    获取用户按天、按项目的指标汇总
+    """
+    try:
+        daily = await get_user_daily(db, user_id, days, project_id=project_id)
+        return {
+            "user_id": user_id,
+            "analysis_period": f"{days}天",
+            "timestamp": utc_now().isoformat(),
+            "daily": daily
+        }
+    
+    except Exception as e:
+        logger.error(f"Error getting user daily dashboard: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to get user daily dashboard: {str(e)}"
+        )
@@ -0,0 +1,41 @@
+from fastapi import APIRouter, Query
+from typing import Optional
+from datetime import datetime, timezone
+import logging
+
+from ...core.config import settings
+from ...core.query_profiler import query_profiler
+from ...utils.timezone import utc_now
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+
+@router.get("/queries")
+async def get_query_profile(
+    source: Optional[str] = Query(None, pattern="^(sql|flux)$", description="查询来源：sql 或 flux"),
+    sort: str = Query("total_ms", pattern="^(total_ms|count|avg_ms|max_ms|p95_ms|p99_ms|slow_count|error_count)$",
+                      description="排序字段（降序）"),
+    limit: int = Query(50, ge=1, le=settings.QUERY_PROFILE_MAX_FINGERPRINTS, description="返回的指纹数")
+):
+    """
+    按查询指纹汇总的 SQL/Flux 查询次数和延迟分布
+    """
+    queries = query_profiler.snapshot(source=source, sort=sort, limit=limit)
+    return {
+        "since": datetime.fromtimestamp(query_profiler.started_at, timezone.utc).isoformat(),
+        "slow_query_threshold_ms": settings.SLOW_QUERY_THRESHOLD_MS,
+        "timestamp": utc_now().isoformat(),
+        "fingerprint_count": len(query_profiler.stats),
+        "queries": queries
+    }
+
+
+@router.delete("/queries")
+async def reset_query_profile():
+    """
+    清空查询统计
+    """
+    query_profiler.reset()
+    logger.info("Query profile reset")
+    return {"message": "Query profile reset", "timestamp": utc_now().isoformat()}
@@ -1,12 +1,42 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Iterable
 from datetime import datetime, timedelta
 import logging
+import time
 
-from ...core.database import get_db
+from ...core.database import get_db, get_read_db
+from ...core.config import settings
 from ...services.event_processor import EventProcessor
-from ...services.influxdb_service import InfluxDBService
+from ...services.influxdb_service import InfluxDBService, EVENTS_MEASUREMENT
+from ...services.flux_query import FluxQuery
+from ...services.flux_columnar import FluxColumns
+from ...services.range_executor import TimeSlice
+from ...services.aggregate_store import AggregateStore
+from ...services.sketch_store import SketchStore, summarize_sketches
+from ...services.sequence_store import SequenceStore
+from ...services.recommendations import RecommendationStore, compute_user_recommendations
+from ...services.ranking_index import RankingIndex, RANKING_METRICS
+from ...services.learning_curve import ALL_TYPES, load_user_curves, rank_project_curves, summarize_curves
+from ...services.sessionizer import ISSSessionizer
+from ...services.idle_detector import IdleDetector
+from ...services.offload import offloader
+from ...services.health_prober import health_prober
+from ...services.deletion_jobs import (
+    create_deletion_job,
+    enqueue_deletion_job,
+    get_deletion_job,
+    list_deletion_jobs,
+    job_to_dict,
+)
+from ...services.event_analysis import (
+    record_to_event,
+    UserEventsAccumulator,
+    ISSAnnotationAccumulator,
+    PolygonAnnotationAccumulator,
+    FrameAnnotationAccumulator,
+    IdleTimeAccumulator,
+)
 from ...schemas.event import EventBatch, EventData
 from ...utils.timezone import utc_now
 
@@ -15,6 +45,13 @@ router = APIRouter()
 
 event_processor = EventProcessor()
 influxdb_service = InfluxDBService()
+aggregate_store = AggregateStore()
+sketch_store = SketchStore()
+sequence_store = SequenceStore()
+ranking_index = RankingIndex()
+recommendation_store = RecommendationStore()
+iss_sessionizer = ISSSessionizer()
+idle_detector = IdleDetector()
 
 
 @router.post("/batch", response_model=Dict[str, Any])
@@ -39,7 +76,8 @@ async def submit_events(
                 detail="No valid events in batch"
             )
         
-        # 后台异步处理事件
+        # 后台异步处理事件，计入接收积压供就绪检查使用
+        health_prober.ingest.start()
         background_tasks.add_task(
             process_events_async,
             validated_events,
@@ -68,10 +106,25 @@ async def process_events_async(
     metadata: Dict[str, Any]
 ):
     """异步处理事件数据"""
+    started = time.perf_counter()
     try:
         # 存储到InfluxDB
         await influxdb_service.store_events(events, metadata)
         
+        # 更新Redis中的增量聚合
+        await aggregate_store.record_events(events, metadata)
+        
+        # 更新时长分位数草图
+        await sketch_store.record_events(events, metadata)
+        
+        # 重建ISS会话，写入已结束的会话记录
+        await iss_sessionizer.process(events, metadata, influxdb_service.store_sessions)
+        
+        # 基于事件间隔检测空闲区间
+        idle_intervals = await idle_detector.process(events, metadata)
+        if idle_intervals:
+            await influxdb_service.store_idle_intervals(idle_intervals)
+        
         # 更新统计信息到PostgreSQL
         from ...core.database import AsyncSessionLocal
         async with AsyncSessionLocal() as session:
@@ -81,18 +134,22 @@ async def process_events_async(
     
     except Exception as e:
         logger.error(f"Error in async event processing: {e}")
+    finally:
+        health_prober.ingest.finish((time.perf_counter() - started) * 1000)
 
 
 @router.get("/stats/{user_id}")
 async def get_user_stats(
     user_id: str,
-    db: AsyncSession = Depends(get_db)
+    limit: int = Query(settings.USER_STATS_PAGE_SIZE, ge=1, le=1000, description="每页项目数"),
+    after: Optional[str] = Query(None, description="分页游标：上一页返回的 next_cursor"),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
-    获取用户效率统计
+    获取用户效率统计（项目明细按 project_id 分页）
     """
     try:
-        stats = await event_processor.get_user_statistics(db, user_id)
+        stats = await event_processor.get_user_statistics(db, user_id, limit=limit, after=after)
         return stats
     
     except Exception as e:
@@ -120,33 +177,76 @@ async def get_project_performance(project_id: str):
         )
 
 
-@router.delete("/events/{user_id}")
+@router.delete("/events/{user_id}", status_code=202)
 async def clear_user_events(
     user_id: str,
+    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db)
 ):
     """
     清除用户的历史事件数据
+
+    创建后台删除任务并立即返回任务ID，用 /events/deletion-jobs/{job_id} 查询进度；
+    用户已有未结束的任务时返回该任务。
     """
     try:
-        await event_processor.clear_user_events(db, user_id)
-        await influxdb_service.clear_user_events(user_id)
+        job, created = await create_deletion_job(db, user_id)
+        # 响应返回后再提交到任务队列；提交失败的任务由定期恢复任务补上
+        background_tasks.add_task(enqueue_deletion_job, job.id)
         
-        return {"message": f"Cleared events for user {user_id}"}
+        return {
+            "message": f"{'Created' if created else 'Existing'} deletion job for user {user_id}",
+            **job_to_dict(job)
+        }
     
     except Exception as e:
         logger.error(f"Error clearing user events: {e}")
         raise HTTPException(
             status_code=500,
             detail=f"Failed to clear user events: {str(e)}"
-        ) 
+        )
+
+
+@router.get("/deletion-jobs/{job_id}")
+async def get_deletion_job_status(
+    job_id: str,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    查询删除任务的状态和进度
+    """
+    job = await get_deletion_job(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Deletion job not found: {job_id}")
+    return job_to_dict(job)
+
+
+@router.get("/deletion-jobs")
+async def list_user_deletion_jobs(
+    user_id: str = Query(..., description="用户ID"),
+    limit: int = Query(20, ge=1, le=100, description="返回的任务数"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    用户最近的删除任务
+    """
+    try:
+        jobs = await list_deletion_jobs(db, user_id, limit)
+        return {"user_id": user_id, "jobs": [job_to_dict(job) for job in jobs]}
+    
+    except Exception as e:
+        logger.error(f"Error listing deletion jobs: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to list deletion jobs: {str(e)}"
+        )
 
 
 @router.get("/analysis/user-behavior/{user_id}")
 async def analyze_user_behavior(
     user_id: str,
     days: int = Query(7, description="分析天数，默认7天"),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """分析用户行为模式"""
     try:
@@ -203,11 +303,15 @@ async def analyze_operation_patterns(
     分析用户操作模式
     """
     try:
-        # 获取操作序列分析
-        operation_sequences = await influxdb_service.get_operation_sequences(user_id, days, tool)
+        # 获取操作序列分析，优先使用后台预计算结果
+        operation_sequences = await sequence_store.load(user_id, days) if tool is None else None
+        if operation_sequences is None:
+            operation_sequences = await influxdb_service.get_operation_sequences(user_id, days, tool)
         
         # 获取常用操作组合
-        common_patterns = await influxdb_service.get_common_operation_patterns(user_id, days, tool)
+        common_patterns = await influxdb_service.get_common_operation_patterns(
+            user_id, days, tool, sequences=operation_sequences
+        )
         
         # 获取操作效率分析
         operation_efficiency = await influxdb_service.get_operation_efficiency_analysis(user_id, days, tool)
@@ -238,7 +342,8 @@ async def analyze_operation_patterns(
 async def analyze_efficiency_trends(
     user_id: str,
     days: int = Query(30, description="分析天数，默认30天"),
-    interval: str = Query("1d", description="时间间隔：1h, 6h, 1d, 1w")
+    interval: str = Query("1d", pattern=r"^\d+[smhdw]$", description="时间间隔：1h, 6h, 1d, 1w"),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     分析用户效率趋势
@@ -253,8 +358,12 @@ async def analyze_efficiency_trends(
         # 获取性能指标趋势
         performance_trend = await influxdb_service.get_performance_trend(user_id, days, interval)
         
-        # 获取学习曲线分析
-        learning_curve = await influxdb_service.get_learning_curve_analysis(user_id, days)
+        # 获取学习曲线分析，批量拟合的天数与请求一致时使用其结果，否则按请求的天数计算
+        curves = await load_user_curves(db, user_id, window_days=days)
+        if curves:
+            learning_curve = summarize_curves(curves)
+        else:
+            learning_curve = await influxdb_service.get_learning_curve_analysis(user_id, days)
         
         return {
             "user_id": user_id,
@@ -275,12 +384,108 @@ async def analyze_efficiency_trends(
         )
 
 
+@router.get("/analysis/duration-percentiles/{user_id}")
+async def get_duration_percentiles(
+    user_id: str,
+    days: int = Query(30, ge=1, le=120, description="分析天数，默认30天"),
+    project_id: Optional[str] = Query(None, description="项目ID"),
+    tool: Optional[str] = Query(None, description="工具类型"),
+    kind: Optional[str] = Query(None, description="标注类型（如 polygon / cuboid），frame 为帧级别，idle 为空闲时长"),
+    quantiles: List[float] = Query([0.5, 0.9, 0.99], description="分位数（0~1）")
+):
+    """
+    从分位数草图获取用户时长的 p50/p90/p99
+    """
+    if any(not 0 <= q <= 1 for q in quantiles):
+        raise HTTPException(status_code=400, detail="Quantiles must be between 0 and 1")
+    
+    try:
+        sketches = await sketch_store.load_user_sketches(user_id, days, project_id=project_id, tool=tool, kind=kind)
+        
+        return {
+            "user_id": user_id,
+            "analysis_period": f"{days}天",
+            "timestamp": utc_now().isoformat(),
+            "durations": summarize_sketches(sketches, quantiles)
+        }
+    
+    except Exception as e:
+        logger.error(f"Error getting duration percentiles: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to get duration percentiles: {str(e)}"
+        )
+
+
+@router.get("/analysis/team-duration-percentiles/{project_id}")
+async def get_team_duration_percentiles(
+    project_id: str,
+    days: int = Query(30, ge=1, le=120, description="分析天数，默认30天"),
+    tool: Optional[str] = Query(None, description="工具类型"),
+    kind: Optional[str] = Query(None, description="标注类型（如 polygon / cuboid），frame 为帧级别，idle 为空闲时长"),
+    quantiles: List[float] = Query([0.5, 0.9, 0.99], description="分位数（0~1）")
+):
+    """
+    合并项目内所有用户的分位数草图，获取团队时长分布
+    """
+    if any(not 0 <= q <= 1 for q in quantiles):
+        raise HTTPException(status_code=400, detail="Quantiles must be between 0 and 1")
+    
+    try:
+        sketches, user_count = await sketch_store.load_project_sketches(project_id, days, tool=tool, kind=kind)
+        
+        return {
+            "project_id": project_id,
+            "user_count": user_count,
+            "analysis_period": f"{days}天",
+            "timestamp": utc_now().isoformat(),
+            "durations": summarize_sketches(sketches, quantiles)
+        }
+    
+    except Exception as e:
+        logger.error(f"Error getting team duration percentiles: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to get team duration percentiles: {str(e)}"
+        )
+
+
+@router.get("/analysis/team-learning-curves/{project_id}")
+async def get_team_learning_curves(
+    project_id: str,
+    annotation_type: str = Query(ALL_TYPES, description="标注类型，all 为跨类型的汇总曲线"),
+    limit: int = Query(100, ge=1, le=1000, description="返回的用户数"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    按批量拟合的学习曲线对项目内用户排名
+    """
+    try:
+        rankings = await rank_project_curves(db, project_id, annotation_type, limit)
+        
+        return {
+            "project_id": project_id,
+            "annotation_type": annotation_type,
+            "timestamp": utc_now().isoformat(),
+            "user_count": len(rankings),
+            "rankings": rankings
+        }
+    
+    except Exception as e:
+        logger.error(f"Error ranking team learning curves: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to rank team learning curves: {str(e)}"
+        )
+
+
 @router.get("/analysis/comparison/{user_id}")
 async def compare_user_performance(
     user_id: str,
     comparison_users: List[str] = Query(..., description="对比用户ID列表"),
     days: int = Query(7, description="分析天数，默认7天"),
-    metrics: List[str] = Query(["efficiency", "speed", "accuracy"], description="对比指标")
+    metrics: List[str] = Query(["efficiency", "speed", "accuracy"], description="对比指标"),
+    project_id: Optional[str] = Query(None, description="项目ID，指定时同时返回在整个项目中的排名")
 ):
     """
     用户性能对比分析
@@ -299,7 +504,12 @@ async def compare_user_performance(
                 comparison_data[comp_user_id] = comp_user_data
         
         # 计算排名和百分位
-        rankings = await influxdb_service.calculate_user_rankings(comparison_data, metrics)
+        rankings = await influxdb_service.calculate_user_rankings(comparison_data, metrics, target_user_id=user_id)
+        
+        # 项目级排名直接读取预计算索引
+        project_rankings = None
+        if project_id is not None:
+            project_rankings = await ranking_index.get_standing(project_id, user_id, metrics, days)
         
         return {
             "target_user": user_id,
@@ -308,7 +518,8 @@ async def compare_user_performance(
             "metrics": metrics,
             "timestamp": utc_now().isoformat(),
             "comparison_data": comparison_data,
-            "rankings": rankings
+            "rankings": rankings,
+            "project_rankings": project_rankings
         }
     
     except Exception as e:
@@ -319,6 +530,32 @@ async def compare_user_performance(
         )
 
 
+@router.get("/analysis/project-standing/{project_id}/{user_id}")
+async def get_project_standing(
+    project_id: str,
+    user_id: str,
+    metrics: List[str] = Query(list(RANKING_METRICS), description="排名指标"),
+    days: Optional[int] = Query(None, description="统计天数，默认与排名索引一致")
+):
+    """
+    从项目排名索引获取用户在整个项目中的名次与百分位
+    """
+    days = days or settings.RANKING_DAYS
+    standing = await ranking_index.get_standing(project_id, user_id, metrics, days)
+    if standing is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Ranking index for project {project_id} ({days}d) is not available"
+        )
+    
+    return {
+        "user_id": user_id,
+        "analysis_period": f"{days}天",
+        "timestamp": utc_now().isoformat(),
+        **standing
+    }
+
+
 @router.get("/analysis/recommendations/{user_id}")
 async def get_user_recommendations(
     user_id: str,
@@ -328,32 +565,25 @@ async def get_user_recommendations(
     基于用户行为数据生成改进建议
     """
     try:
-        # 获取用户行为分析
-        behavior_analysis = await influxdb_service.get_user_interaction_analysis(user_id, days)
-        
-        # 获取效率分析
-        efficiency_analysis = await influxdb_service.get_user_efficiency(user_id, days)
-        
-        # 获取错误分析
-        error_analysis = await influxdb_service.get_error_patterns(user_id, days)
-        
-        # 生成改进建议
-        recommendations = await generate_recommendations(
-            behavior_analysis, 
-            efficiency_analysis, 
-            error_analysis
-        )
+        # 优先返回后台预计算的结果，没有时（如新用户）按需计算并保存
+        result = await recommendation_store.load(user_id, days)
+        if result is None:
+            computed = await compute_user_recommendations(
+                user_id, days, influxdb_service, aggregate_store, sequence_store
+            )
+            # 返回实际保存的内容，版本号与计算时间和之后读取到的一致；保存失败时没有版本号
+            result = await recommendation_store.save(user_id, days, computed)
+            if result is None:
+                result = dict(computed, computed_at=utc_now().isoformat())
         
         return {
             "user_id": user_id,
             "analysis_period": f"{days}天",
             "timestamp": utc_now().isoformat(),
-            "recommendations": recommendations,
-            "analysis_data": {
-                "behavior": behavior_analysis,
-                "efficiency": efficiency_analysis,
-                "errors": error_analysis
-            }
+            "computed_at": result["computed_at"],
+            "version": result.get("version"),
+            "recommendations": result["recommendations"],
+            "analysis_data": result["analysis_data"]
         }
     
     except Exception as e:
@@ -364,80 +594,6 @@ async def get_user_recommendations(
         )
 
 
-async def generate_recommendations(behavior_analysis, efficiency_analysis, error_analysis):
-    """
-    基于分析数据生成改进建议
-    """
-    recommendations = []
-    
-    # 基于效率分析的建议
-    if efficiency_analysis.get("total_time", 0) > 0:
-        avg_duration = efficiency_analysis.get("total_time", 0) / max(efficiency_analysis.get("annotation_count", 1), 1)
-        
-        if avg_duration > 10000:  # 平均标注时间超过10秒
-            recommendations.append({
-                "type": "efficiency",
-                "priority": "high",
-                "title": "标注速度优化",
-                "description": f"当前平均标注时间为{avg_duration/1000:.1f}秒，建议通过练习提高标注速度",
-                "suggestions": [
-                    "使用快捷键提高操作效率",
-                    "熟悉标注工具的各种功能",
-                    "建立标准化的标注流程"
-                ]
-            })
-    
-    # 基于错误分析的建议
-    if error_analysis.get("error_count", 0) > 0:
-        error_rate = error_analysis.get("error_count", 0) / max(efficiency_analysis.get("annotation_count", 1), 1)
-        
-        if error_rate > 0.1:  # 错误率超过10%
-            recommendations.append({
-                "type": "accuracy",
-                "priority": "high",
-                "title": "标注准确性提升",
-                "description": f"当前错误率为{error_rate*100:.1f}%，建议提高标注准确性",
-                "suggestions": [
-                    "仔细检查标注结果",
-                    "参考标注指南和标准",
-                    "遇到不确定的情况及时咨询"
-                ]
-            })
-    
-    # 基于行为分析的建议
-    if behavior_analysis.get("most_used_actions"):
-        most_used = behavior_analysis["most_used_actions"][0] if behavior_analysis["most_used_actions"] else None
-        
-        if most_used and most_used.get("action") == "click" and most_used.get("count", 0) > 100:
-            recommendations.append({
-                "type": "workflow",
-                "priority": "medium",
-                "title": "工作流程优化",
-                "description": "检测到大量点击操作，建议优化工作流程",
-                "suggestions": [
-                    "使用批量操作功能",
-                    "设置常用工具的快捷键",
-                    "考虑使用自动化标注功能"
-                ]
-            })
-    
-    # 如果没有具体问题，提供一般性建议
-    if not recommendations:
-        recommendations.append({
-            "type": "general",
-            "priority": "low",
-            "title": "持续改进",
-            "description": "您的标注工作表现良好，继续保持！",
-            "suggestions": [
-                "定期回顾和总结标注经验",
-                "关注新功能和工具的更新",
-                "与团队成员分享最佳实践"
-            ]
-        })
-    
-    return recommendations 
-
-
 @router.get("/raw-stats/{user_id}")
 async def get_user_raw_stats(
     user_id: str,
@@ -447,119 +603,76 @@ async def get_user_raw_stats(
     获取用户的原始效率统计数据
     """
     try:
+        logger.info(f"Getting raw stats for user {user_id} for last {days} days")
+        
+        # 优先使用增量聚合
+        accumulator = await aggregate_store.get_user_events_accumulator(user_id, days)
+        if accumulator is not None:
+            return build_user_events_stats(accumulator, user_id)
+        
         influx_service = InfluxDBService()
-        client = await influx_service.get_client()
-        query_api = client.query_api()
         
-        logger.info(f"Getting raw stats for user {user_id} for last {days} days")
+        # 按时间段并发查询用户的所有事件，每段解码为列式数组后向量化统计
+        async def analyze_slice(time_slice: TimeSlice) -> UserEventsAccumulator:
+            user_query, params = FluxQuery() \
+                .range(start=time_slice.start, stop=time_slice.stop) \
+                .measurement(EVENTS_MEASUREMENT) \
+                .tag("user_id", user_id) \
+                .build()
+            
+            columns = await influx_service.query_columns(user_query, params)
+            return await offloader.run("user_events", columns)
         
-        # 查询用户的所有事件
-        user_query = f'''
-        from(bucket: "efficiency_events")
-            |> range(start: -{days}d)
-            |> filter(fn: (r) => r["user_id"] == "{user_id}")
-        '''
-        
-        tables = await query_api.query(query=user_query, org="xtreme1")
-        
-        events = []
-        for table in tables:
-            for record in table.records:
-                event = {
-                    'time': record.get_time(),
-                    'field': record.get_field(),
-                    'value': record.get_value(),
-                    'event_type': record.values.get('event_type', 'unknown'),
-                    'action': record.values.get('action', 'unknown'),
-                    'tool': record.values.get('batch_tool', record.values.get('tool', 'unknown')),
-                    'all_tags': record.values
-                }
-                events.append(event)
-        
-        # 分析事件数据
-        stats = analyze_user_events(events, user_id)
-        
-        await influx_service.close()
-        return stats
+        try:
+            accumulator = await influx_service.range_executor.reduce(
+                influx_service.time_slices(days), analyze_slice
+            )
+        finally:
+            await influx_service.close()
+        
+        return build_user_events_stats(accumulator, user_id)
         
     except Exception as e:
         logger.error(f"Error getting raw stats for user {user_id}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-def analyze_user_events(events: list, user_id: str) -> Dict[str, Any]:
+def analyze_user_events(events: Iterable[Dict[str, Any]], user_id: str) -> Dict[str, Any]:
     """
     分析用户事件数据
     """
-    # 基础统计
-    total_events = len(events)
-    
-    # 事件类型分布
-    event_distribution = {}
-    interactions = {}
-    performance_values = []
-    
-    for event in events:
-        event_type = event['event_type']
-        
-        # 事件类型统计
-        if event_type not in event_distribution:
-            event_distribution[event_type] = 0
-        event_distribution[event_type] += 1
-        
-        # 用户交互统计
-        if event_type == 'EventType.USER_INTERACTION':
-            action = event['action']
-            if action not in interactions:
-                interactions[action] = 0
-            interactions[action] += 1
-        
-        # 性能数据收集
-        if event_type == 'EventType.PERFORMANCE' and event['field'] == 'fps':
-            try:
-                fps_value = float(event['value'])
-                if 0 <= fps_value <= 200:  # 合理的FPS范围
-                    performance_values.append(fps_value)
-            except (ValueError, TypeError):
-                pass
-    
-    # 计算平均性能
-    avg_fps = None
-    if performance_values:
-        avg_fps = sum(performance_values) / len(performance_values)
-    
-    # 计算操作时间统计
-    operation_times = []
-    for event in events:
-        if event['field'] == 'duration' and event['event_type'] == 'EventType.USER_INTERACTION':
-            try:
-                duration = float(event['value'])
-                if 0 <= duration <= 10000:  # 合理的操作时间范围
-                    operation_times.append(duration)
-            except (ValueError, TypeError):
-                pass
-    
-    avg_operation_time = None
-    if operation_times:
-        avg_operation_time = sum(operation_times) / len(operation_times)
+    return build_user_events_stats(UserEventsAccumulator().consume(events), user_id)
+
+def analyze_user_columns(columns: FluxColumns, user_id: str) -> Dict[str, Any]:
+    """
+    分析列式用户事件数据（向量化版本，结果与 analyze_user_events 相同）
+    """
+    return build_user_events_stats(UserEventsAccumulator().add_columns(columns), user_id)
+
+def build_user_events_stats(accumulator: UserEventsAccumulator, user_id: str) -> Dict[str, Any]:
+    """
+    根据累加器结果生成用户事件统计
+    """
+    avg_fps = accumulator.avg_fps
+    avg_operation_time = accumulator.avg_operation_time
     
     # 计算效率分数
     efficiency_score = calculate_efficiency_score(
-        total_events, interactions, avg_fps, avg_operation_time
+        accumulator.total_events, accumulator.interactions, avg_fps, avg_operation_time
     )
     
     # 用户画像
     user_profile = get_user_profile(user_id)
     
     return {
-        'total_events': total_events,
-        'event_distribution': event_distribution,
-        'interactions': interactions,
+        'total_events': accumulator.total_events,
+        'event_distribution': accumulator.event_distribution,
+        'interactions': accumulator.interactions,
         'avg_fps': avg_fps,
         'performance_data': {
             'avg_fps': avg_fps,
             'avg_operation_time': avg_operation_time,
             'efficiency_score': efficiency_score,
-            'performance_values': performance_values[-10:] if performance_values else []  # 最近10个值
+            'performance_values': list(accumulator.recent_fps)  # 最近10个值
         },
         'user_profile': user_profile,
         'last_updated': datetime.now().isoformat(),
@@ -644,72 +757,131 @@ async def get_iss_annotation_analysis(
     """
     try:
         influx_service = InfluxDBService()
-        client = await influx_service.get_client()
-        query_api = client.query_api()
         
         logger.info(f"Getting ISS annotation analysis for user {user_id} for last {days} days")
         
-        # 查询 ISS 标注相关事件
-        iss_query = f'''
-        from(bucket: "efficiency_events")
-            |> range(start: -{days}d)
-            |> filter(fn: (r) => r["user_id"] == "{user_id}")
-            |> filter(fn: (r) => r["event_type"] == "EventType.ANNOTATION" or 
-                                 r["event_type"] == "EventType.USER_INTERACTION" or 
-                                 r["event_type"] == "EventType.PERFORMANCE")
-        '''
-        
-        tables = await query_api.query(query=iss_query, org="xtreme1")
-        
-        events = []
-        for table in tables:
-            for record in table.records:
-                event = {
-                    'time': record.get_time(),
-                    'field': record.get_field(),
-                    'value': record.get_value(),
-                    'event_type': record.values.get('event_type', 'unknown'),
-                    'action': record.values.get('action', 'unknown'),
-                    'tool': record.values.get('batch_tool', record.values.get('tool', 'unknown')),
-                    'metadata': record.values
-                }
-                events.append(event)
-        
-        # 分析 ISS 标注数据
-        analysis = analyze_iss_annotation_data(events, user_id)
-        
-        await influx_service.close()
-        return analysis
+        # 会话重建开始运行之前的部分从原始 ISS 标注相关事件重建，此后的部分读取接收时重建的会话记录。
+        # 两部分都只在完成时计数：跨越分界的会话在原始事件中只有开始事件（range 的 stop 不含分界时刻），
+        # 只由结束时间在分界之后的会话记录计入一次
+        window_start = utc_now() - timedelta(days=days)
+        coverage_start = await iss_sessionizer.get_coverage_start()
+        sessions_start = max(window_start, coverage_start) if coverage_start else None
+        accumulator = ISSAnnotationAccumulator()
+        try:
+            if sessions_start is None or sessions_start > window_start:
+                iss_query, params = FluxQuery() \
+                    .range(start=window_start, stop=sessions_start or utc_now()) \
+                    .measurement(EVENTS_MEASUREMENT) \
+                    .tag("user_id", user_id) \
+                    .tag_in("event_type", [
+                        "EventType.ANNOTATION",
+                        "EventType.USER_INTERACTION",
+                        "EventType.PERFORMANCE"
+                    ]) \
+                    .build()
+                
+                async for record in influx_service.stream_records(iss_query, params):
+                    accumulator.add(record_to_event(record))
+            
+            if sessions_start is not None:
+                async for session in influx_service.stream_iss_sessions(user_id, days, start=sessions_start):
+                    accumulator.add_session(session)
+                
+                # 空闲时间优先使用服务端检测的空闲区间，没有时查询前端上报的 idle_end 事件
+                idle_periods = accumulator.idle.idle_periods.count
+                async for duration in influx_service.stream_idle_durations(user_id, days, start=sessions_start):
+                    accumulator.idle.add_interval(duration)
+                
+                if accumulator.idle.idle_periods.count == idle_periods:
+                    idle_query, params = FluxQuery() \
+                        .range(start=sessions_start) \
+                        .measurement(EVENTS_MEASUREMENT) \
+                        .tag("user_id", user_id) \
+                        .tag("event_type", "EventType.USER_INTERACTION") \
+                        .tag("action", "idle_end") \
+                        .field("duration") \
+                        .build()
+                    
+                    async for record in influx_service.stream_records(idle_query, params):
+                        accumulator.add(record_to_event(record))
+        finally:
+            await influx_service.close()
+        
+        return build_iss_annotation_analysis(accumulator, user_id)
         
     except Exception as e:
         logger.error(f"Error getting ISS analysis for user {user_id}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-def analyze_iss_annotation_data(events: list, user_id: str) -> Dict[str, Any]:
+@router.get("/analysis/idle-time/{user_id}")
+async def get_user_idle_time(
+    user_id: str,
+    days: int = Query(default=30, ge=1, le=90, description="分析天数")
+) -> Dict[str, Any]:
     """
-    分析 ISS 标注数据
+    获取基于事件间隔检测的用户空闲时间统计
     """
-    # 分类事件
-    annotation_events = []
-    interaction_events = []
-    performance_events = []
-    
-    for event in events:
-        if event['event_type'] == 'EventType.ANNOTATION':
-            annotation_events.append(event)
-        elif event['event_type'] == 'EventType.USER_INTERACTION':
-            interaction_events.append(event)
-        elif event['event_type'] == 'EventType.PERFORMANCE':
-            performance_events.append(event)
+    try:
+        influx_service = InfluxDBService()
+        accumulator = IdleTimeAccumulator()
+        # 空闲检测开始运行之前的部分直接对原始事件做间隔检测，此后的部分读取已保存的空闲区间
+        window_start = utc_now() - timedelta(days=days)
+        coverage_start = await idle_detector.get_coverage_start()
+        intervals_start = max(window_start, coverage_start) if coverage_start else None
+        sources = []
+        try:
+            if intervals_start is None or intervals_start > window_start:
+                sources.append("raw_events")
+                events_query, params = FluxQuery() \
+                    .range(start=window_start, stop=intervals_start or utc_now()) \
+                    .measurement(EVENTS_MEASUREMENT) \
+                    .tag("user_id", user_id) \
+                    .pipe('keep(columns: ["_time", "_value", "_field", "user_id", "session_id"])') \
+                    .build()
+                
+                columns = await influx_service.query_columns(events_query, params)
+                for interval in await offloader.run("idle_intervals", columns):
+                    accumulator.add_interval(interval["duration"])
+            
+            if intervals_start is not None:
+                sources.append("idle_intervals")
+                async for duration in influx_service.stream_idle_durations(user_id, days, start=intervals_start):
+                    accumulator.add_interval(duration)
+        finally:
+            await influx_service.close()
+        
+        return {
+            "user_id": user_id,
+            "analysis_period": f"{days}天",
+            "idle_threshold_ms": settings.IDLE_GAP_THRESHOLD_MS,
+            "source": "+".join(sources),
+            "coverage_start": coverage_start.isoformat() if coverage_start else None,
+            "timestamp": utc_now().isoformat(),
+            "idle_time_analysis": accumulator.result()
+        }
     
-    # 1. 分析单个 ISS 多边形标注时间
-    polygon_analysis = analyze_polygon_annotation_times(annotation_events)
+    except Exception as e:
+        logger.error(f"Error getting idle time for user {user_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def analyze_iss_annotation_data(events: Iterable[Dict[str, Any]], user_id: str) -> Dict[str, Any]:
+    """
+    分析 ISS 标注数据
+    """
+    return build_iss_annotation_analysis(ISSAnnotationAccumulator().consume(events), user_id)
+
+def build_iss_annotation_analysis(accumulator: ISSAnnotationAccumulator, user_id: str) -> Dict[str, Any]:
+    """
+    根据累加器结果生成 ISS 标注分析
+    """
+    # 1. 单个 ISS 多边形标注时间
+    polygon_analysis = accumulator.polygon.result()
     
-    # 2. 分析帧级别标注时间
-    frame_analysis = analyze_frame_annotation_times(annotation_events, interaction_events)
+    # 2. 帧级别标注时间
+    frame_analysis = accumulator.frame.result()
     
-    # 3. 分析用户空闲时间
-    idle_analysis = analyze_user_idle_times(interaction_events)
+    # 3. 用户空闲时间
+    idle_analysis = accumulator.idle.result()
     
     # 4. 计算综合效率指标
     efficiency_metrics = calculate_iss_efficiency_metrics(
@@ -724,169 +896,20 @@ def analyze_iss_annotation_data(events: list, user_id: str) -> Dict[str, Any]:
         'frame_annotation': frame_analysis,
         'idle_time_analysis': idle_analysis,
         'efficiency_metrics': efficiency_metrics,
-        'total_events_analyzed': len(events)
+        'total_events_analyzed': accumulator.total_events
     }
 
-def analyze_polygon_annotation_times(annotation_events: list) -> Dict[str, Any]:
+def analyze_polygon_annotation_times(annotation_events: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
     """分析单个多边形标注时间"""
-    polygon_durations = []
-    polygon_sessions = {}
-    completed_polygons = 0
-    incomplete_polygons = 0
-    
-    for event in annotation_events:
-        metadata = event.get('metadata', {})
-        action = event.get('action', '')
-        
-        # 检查是否是多边形级别的事件
-        if metadata.get('toolType') == 'iss' and metadata.get('level') == 'polygon':
-            session_id = metadata.get('polygonSessionId')
-            
-            if action in ['start'] and session_id:
-                polygon_sessions[session_id] = {
-                    'start_time': event['time'],
-                    'point_count': 0,
-                    'area': 0
-                }
-            elif action in ['complete'] and session_id and session_id in polygon_sessions:
-                if event['field'] == 'duration':
-                    duration = float(event['value'])
-                    polygon_durations.append(duration)
-                    completed_polygons += 1
-                    
-                    # 更新会话信息
-                    polygon_sessions[session_id].update({
-                        'duration': duration,
-                        'point_count': metadata.get('pointCount', 0),
-                        'area': metadata.get('area', 0),
-                        'points_per_second': metadata.get('pointsPerSecond', 0),
-                        'area_per_second': metadata.get('areaPerSecond', 0)
-                    })
-            elif action in ['delete'] and session_id:
-                incomplete_polygons += 1
-    
-    # 计算统计指标
-    if polygon_durations:
-        avg_duration = sum(polygon_durations) / len(polygon_durations)
-        min_duration = min(polygon_durations)
-        max_duration = max(polygon_durations)
-        median_duration = sorted(polygon_durations)[len(polygon_durations)//2]
-    else:
-        avg_duration = min_duration = max_duration = median_duration = 0
-    
-    return {
-        'total_completed_polygons': completed_polygons,
-        'total_incomplete_polygons': incomplete_polygons,
-        'completion_rate': completed_polygons / max(completed_polygons + incomplete_polygons, 1) * 100,
-        'average_duration_ms': avg_duration,
-        'min_duration_ms': min_duration,
-        'max_duration_ms': max_duration,
-        'median_duration_ms': median_duration,
-        'duration_distribution': polygon_durations[-10:] if polygon_durations else [],
-        'recent_sessions': list(polygon_sessions.values())[-5:]  # 最近5个会话
-    }
+    return PolygonAnnotationAccumulator().consume(annotation_events).result()
 
-def analyze_frame_annotation_times(annotation_events: list, interaction_events: list) -> Dict[str, Any]:
+def analyze_frame_annotation_times(annotation_events: Iterable[Dict[str, Any]], interaction_events: Iterable[Dict[str, Any]] = ()) -> Dict[str, Any]:
     """分析帧级别标注时间"""
-    frame_sessions = {}
-    frame_durations = []
-    
-    for event in annotation_events:
-        metadata = event.get('metadata', {})
-        action = event.get('action', '')
-        
-        # 检查是否是帧级别的事件
-        if metadata.get('toolType') == 'iss' and metadata.get('level') == 'frame':
-            session_id = metadata.get('frameSessionId')
-            
-            if action in ['start'] and session_id:
-                frame_sessions[session_id] = {
-                    'start_time': event['time'],
-                    'polygon_count': 0,
-                    'total_idle_time': 0,
-                    'efficiency_ratio': 0
-                }
-            elif action in ['complete'] and session_id and session_id in frame_sessions:
-                if event['field'] == 'duration':
-                    duration = float(event['value'])
-                    frame_durations.append(duration)
-                    
-                    # 更新帧会话信息
-                    frame_sessions[session_id].update({
-                        'duration': duration,
-                        'polygon_count': metadata.get('polygonCount', 0),
-                        'total_idle_time': metadata.get('totalIdleTime', 0),
-                        'active_time': metadata.get('activeTime', 0),
-                        'efficiency_ratio': metadata.get('efficiencyRatio', 0),
-                        'avg_polygon_duration': metadata.get('averagePolygonDuration', 0)
-                    })
-    
-    # 计算帧级别统计
-    if frame_durations:
-        avg_frame_duration = sum(frame_durations) / len(frame_durations)
-        min_frame_duration = min(frame_durations)
-        max_frame_duration = max(frame_durations)
-    else:
-        avg_frame_duration = min_frame_duration = max_frame_duration = 0
-    
-    # 计算帧效率指标
-    total_frames = len(frame_sessions)
-    total_polygons = sum(session.get('polygon_count', 0) for session in frame_sessions.values())
-    avg_polygons_per_frame = total_polygons / max(total_frames, 1)
-    
-    return {
-        'total_frames_analyzed': total_frames,
-        'total_polygons_in_frames': total_polygons,
-        'average_polygons_per_frame': avg_polygons_per_frame,
-        'average_frame_duration_ms': avg_frame_duration,
-        'min_frame_duration_ms': min_frame_duration,
-        'max_frame_duration_ms': max_frame_duration,
-        'frame_duration_distribution': frame_durations[-10:] if frame_durations else [],
-        'recent_frame_sessions': list(frame_sessions.values())[-3:]  # 最近3个帧会话
-    }
+    return FrameAnnotationAccumulator().consume(annotation_events).result()
 
-def analyze_user_idle_times(interaction_events: list) -> Dict[str, Any]:
+def analyze_user_idle_times(interaction_events: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
     """分析用户空闲时间"""
-    idle_periods = []
-    total_idle_time = 0
-    idle_start_events = []
-    idle_end_events = []
-    
-    for event in interaction_events:
-        action = event.get('action', '')
-        metadata = event.get('metadata', {})
-        
-        if action == 'idle_start':
-            idle_start_events.append(event)
-        elif action == 'idle_end':
-            idle_end_events.append(event)
-            if event['field'] == 'duration':
-                idle_duration = float(event['value'])
-                idle_periods.append(idle_duration)
-                total_idle_time += idle_duration
-    
-    # 计算空闲时间统计
-    if idle_periods:
-        avg_idle_duration = sum(idle_periods) / len(idle_periods)
-        min_idle_duration = min(idle_periods)
-        max_idle_duration = max(idle_periods)
-        median_idle_duration = sorted(idle_periods)[len(idle_periods)//2]
-    else:
-        avg_idle_duration = min_idle_duration = max_idle_duration = median_idle_duration = 0
-    
-    # 计算空闲频率
-    idle_frequency = len(idle_periods)  # 空闲次数
-    
-    return {
-        'total_idle_periods': idle_frequency,
-        'total_idle_time_ms': total_idle_time,
-        'average_idle_duration_ms': avg_idle_duration,
-        'min_idle_duration_ms': min_idle_duration,
-        'max_idle_duration_ms': max_idle_duration,
-        'median_idle_duration_ms': median_idle_duration,
-        'idle_frequency_per_hour': idle_frequency / max(30 * 24, 1),  # 每小时空闲次数（假设30天）
-        'recent_idle_periods': idle_periods[-10:] if idle_periods else []  # 最近10个空闲时段
-    }
+    return IdleTimeAccumulator().consume(interaction_events).result()
 
 def calculate_iss_efficiency_metrics(polygon_analysis: Dict, frame_analysis: Dict, idle_analysis: Dict) -> Dict[str, Any]:
     """计算 ISS 标注的综合效率指标"""
@@ -1,10 +1,12 @@
-from fastapi import APIRouter, HTTPException
-from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
 import logging
-import asyncio
 
-from ...core.database import engine
 from ...core.config import settings
+from ...core.database import get_read_db
+from ...services.health_prober import health_prober
+from ...services.system_sampler import TREND_METRICS, get_health_trends
 from ...utils.timezone import utc_now
 
 router = APIRouter()
@@ -12,116 +14,65 @@ logger = logging.getLogger(__name__)
 
 
 @router.get("/")
-async def health_check():
+async def health_check(history: bool = Query(False, description="是否返回每个依赖最近的探测历史")):
     """
-    系统健康检查
+    系统健康检查（返回后台探测的缓存结果，不直接访问依赖）
     """
-    try:
-        # 检查数据库连接
-        db_status = await check_database()
-        
-        # 检查Redis连接
-        redis_status = await check_redis()
-        
-        # 检查InfluxDB连接
-        influxdb_status = await check_influxdb()
-        
-        # 整体健康状态
-        overall_status = "healthy" if all([
-            db_status["status"] == "healthy",
-            redis_status["status"] == "healthy",
-            influxdb_status["status"] == "healthy"
-        ]) else "unhealthy"
-        
-        return {
-            "status": overall_status,
-            "timestamp": utc_now().isoformat(),
-            "service": "Xtreme1 Efficiency Monitor",
-            "version": "1.0.0",
-            "checks": {
-                "database": db_status,
-                "redis": redis_status,
-                "influxdb": influxdb_status
-            }
-        }
-    
-    except Exception as e:
-        logger.error(f"Health check failed: {e}")
-        raise HTTPException(
-            status_code=500,
-            detail=f"Health check failed: {str(e)}"
-        )
-
-
-async def check_database():
-    """检查PostgreSQL数据库连接"""
-    try:
-        async with engine.begin() as conn:
-            await conn.execute("SELECT 1")
-        return {"status": "healthy", "message": "Database connection OK"}
-    except Exception as e:
-        logger.error(f"Database check failed: {e}")
-        return {"status": "unhealthy", "message": f"Database error: {str(e)}"}
-
-
-async def check_redis():
-    """检查Redis连接"""
-    try:
-        import redis.asyncio as redis
-        
-        redis_client = redis.from_url(settings.REDIS_URL)
-        await redis_client.ping()
-        await redis_client.close()
-        
-        return {"status": "healthy", "message": "Redis connection OK"}
-    except Exception as e:
-        logger.error(f"Redis check failed: {e}")
-        return {"status": "unhealthy", "message": f"Redis error: {str(e)}"}
+    return {
+        "timestamp": utc_now().isoformat(),
+        "service": "Xtreme1 Efficiency Monitor",
+        "version": "1.0.0",
+        **health_prober.snapshot(history=history)
+    }
 
 
-async def check_influxdb():
-    """检查InfluxDB连接"""
-    try:
-        from influxdb_client.client.influxdb_client_async import InfluxDBClientAsync
-        
-        client = InfluxDBClientAsync(
-            url=f"http://{settings.INFLUXDB_HOST}:{settings.INFLUXDB_PORT}",
-            token=settings.INFLUXDB_TOKEN,
-            org=settings.INFLUXDB_ORG
+@router.get("/ready")
+async def readiness_check():
+    """
+    就绪状态检查：依赖全部健康且事件接收未积压
+    """
+    readiness = health_prober.readiness()
+    if not readiness["ready"]:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Service not ready: {'; '.join(readiness['reasons'])}"
         )
-        
-        # 检查连接
-        health = await client.health()
-        await client.close()
-        
-        if health.status == "pass":
-            return {"status": "healthy", "message": "InfluxDB connection OK"}
-        else:
-            return {"status": "unhealthy", "message": f"InfluxDB status: {health.status}"}
-    
-    except Exception as e:
-        logger.error(f"InfluxDB check failed: {e}")
-        return {"status": "unhealthy", "message": f"InfluxDB error: {str(e)}"}
+    return {
+        "status": "ready",
+        "timestamp": utc_now().isoformat(),
+        "message": "Service is ready to accept requests"
+    }
 
 
-@router.get("/ready")
-async def readiness_check():
+@router.get("/trends")
+async def health_trends(
+    hours: int = Query(24, ge=1, le=settings.SYSTEM_TRENDS_MAX_HOURS, description="查询最近多少小时"),
+    bucket_minutes: int = Query(5, ge=1, le=1440, description="聚合时间桶（分钟）"),
+    metrics: Optional[str] = Query(None, description=f"逗号分隔的字段，默认全部：{', '.join(TREND_METRICS)}"),
+    service_name: Optional[str] = Query(None, description="只看指定服务的样本"),
+    session: AsyncSession = Depends(get_read_db)
+):
     """
-    就绪状态检查
+    服务自身运行状况的趋势（system_health 表中的采样按时间桶聚合）
     """
+    names = [name.strip() for name in metrics.split(",") if name.strip()] if metrics else list(TREND_METRICS)
+    unknown = [name for name in names if name not in TREND_METRICS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown metrics: {', '.join(unknown)}")
+    if hours * 60 // bucket_minutes > 2000:
+        raise HTTPException(status_code=400, detail="Too many buckets, increase bucket_minutes")
+
     try:
-        # 简单的就绪检查
+        trends = await get_health_trends(session, hours, bucket_minutes, names, service_name)
         return {
-            "status": "ready",
-            "timestamp": utc_now().isoformat(),
-            "message": "Service is ready to accept requests"
+            "hours": hours,
+            "bucket_minutes": bucket_minutes,
+            "metrics": names,
+            "trends": trends
         }
     except Exception as e:
-        logger.error(f"Readiness check failed: {e}")
-        raise HTTPException(
-            status_code=503,
-            detail=f"Service not ready: {str(e)}"
-        )
+        logger.error(f"Error getting health trends: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to get health trends: {str(e)}")
 
 
 @router.get("/live")
@@ -2,9 +2,13 @@ from fastapi import APIRouter
 
 from .events import router as events_router
 from .health import router as health_router
+from .dashboards import router as dashboards_router
+from .debug import router as debug_router
 
 api_router = APIRouter()
 
 # 注册各个模块的路由
 api_router.include_router(events_router, prefix="/events", tags=["events"])
-api_router.include_router(health_router, prefix="/health", tags=["health"]) 
\ No newline at end of file
+api_router.include_router(health_router, prefix="/health", tags=["health"])
+api_router.include_router(dashboards_router, prefix="/dashboards", tags=["dashboards"])
+api_router.include_router(debug_router, prefix="/debug", tags=["debug"]) 
\ No newline at end of file
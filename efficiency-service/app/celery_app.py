@@ -6,7 +6,7 @@ celery_app = Celery(
     "efficiency_service",
     broker=settings.REDIS_URL,
     backend=settings.REDIS_URL,
-    include=["app.services.event_processor"]
+    include=["app.services.event_processor", "app.tasks.aggregates", "app.tasks.sequences", "app.tasks.learning_curves", "app.tasks.rankings", "app.tasks.recommendations", "app.tasks.partitions", "app.tasks.dashboards", "app.tasks.deletions"]
 )
 
 # 配置 Celery
@@ -26,13 +26,45 @@ celery_app.conf.update(
 # 设置定期任务
 celery_app.conf.beat_schedule = {
     "cleanup-old-metrics": {
-        "task": "app.services.event_processor.cleanup_old_metrics",
-        "schedule": 3600.0,  # 每小时执行一次
+        "task": "app.tasks.partitions.cleanup_old_metrics",
+        "schedule": float(settings.METRICS_PARTITION_INTERVAL),
+    },
+    "ensure-metric-partitions": {
+        "task": "app.tasks.partitions.ensure_metric_partitions",
+        "schedule": float(settings.METRICS_PARTITION_INTERVAL),
     },
     "calculate-efficiency-scores": {
         "task": "app.services.event_processor.calculate_efficiency_scores",
         "schedule": 1800.0,  # 每30分钟执行一次
     },
+    "reconcile-aggregates": {
+        "task": "app.tasks.aggregates.reconcile_aggregates",
+        "schedule": float(settings.AGGREGATE_RECONCILE_INTERVAL),
+    },
+    "mine-operation-sequences": {
+        "task": "app.tasks.sequences.mine_operation_sequences",
+        "schedule": float(settings.SEQUENCE_MINING_INTERVAL),
+    },
+    "fit-learning-curves": {
+        "task": "app.tasks.learning_curves.fit_learning_curves",
+        "schedule": float(settings.LEARNING_CURVE_INTERVAL),
+    },
+    "refresh-rankings": {
+        "task": "app.tasks.rankings.refresh_rankings",
+        "schedule": float(settings.RANKING_REFRESH_INTERVAL),
+    },
+    "precompute-recommendations": {
+        "task": "app.tasks.recommendations.precompute_recommendations",
+        "schedule": float(settings.RECOMMENDATION_INTERVAL),
+    },
+    "refresh-dashboard-views": {
+        "task": "app.tasks.dashboards.refresh_dashboard_views",
+        "schedule": float(settings.DASHBOARD_REFRESH_INTERVAL),
+    },
+    "resume-deletion-jobs": {
+        "task": "app.tasks.deletions.resume_deletion_jobs",
+        "schedule": float(settings.DELETION_RESUME_INTERVAL),
+    },
 }
 
 # 自动发现任务
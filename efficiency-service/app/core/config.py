@@ -29,6 +29,22 @@ class Settings(BaseSettings):
     def DATABASE_URL(self) -> str:
         return f"postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_HOST}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
     
+    # 只读副本，格式为 host 或 host:port；为空时所有读请求都走主库
+    POSTGRES_READ_HOSTS: List[str] = []
+    READ_REPLICA_MAX_LAG_SECONDS: float = 30.0  # 复制延迟超过该值的副本不接收读请求
+    READ_REPLICA_CHECK_INTERVAL: float = 10.0  # 副本延迟检查结果的缓存时间（秒）
+    SQL_ECHO: bool = False  # 逐条打印SQL，仅用于本地排查，与 DEBUG 无关
+    
+    @property
+    def READ_DATABASE_URLS(self) -> List[str]:
+        urls = []
+        for host in self.POSTGRES_READ_HOSTS:
+            host, _, port = host.partition(":")
+            urls.append(
+                f"postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{host}:{port or self.POSTGRES_PORT}/{self.POSTGRES_DB}"
+            )
+        return urls
+    
     # InfluxDB设置
     INFLUXDB_HOST: str = "localhost"
     INFLUXDB_PORT: int = 8087
@@ -68,6 +84,101 @@ class Settings(BaseSettings):
     PERFORMANCE_RETENTION_DAYS: int = 30
     ANALYTICS_CACHE_TTL: int = 300  # 5分钟
     
+    # 增量聚合设置
+    AGGREGATE_RETENTION_DAYS: int = 120  # 需覆盖分析接口的最大天数
+    AGGREGATE_RECONCILE_DAYS: int = 2  # 每次对账重算的天数（从昨天往前，当天仍在接收事件，不重算）
+    AGGREGATE_RECONCILE_GRACE_MINUTES: int = 10  # 一天结束后等待该时长再重算，留给晚到的批次写完
+    AGGREGATE_BACKFILL_DAYS: int = 14  # 每次对账为每个用户从覆盖起点向前补算的天数（补到保留期为止）
+    AGGREGATE_RECONCILE_INTERVAL: int = 3600  # 秒
+    SKETCH_COMPRESSION: int = 200  # t-digest压缩参数，越大越精确
+    
+    # ISS会话重建设置
+    ISS_SESSION_TIMEOUT: int = 1800  # 秒，超时未完成的会话视为放弃
+    ISS_SESSION_MAX_OPEN: int = 10000  # Redis 中最多保留的未完成会话数（所有用户合计）
+    
+    # 空闲检测设置
+    IDLE_GAP_THRESHOLD_MS: int = 120000  # 相邻事件间隔超过该值视为空闲
+    IDLE_LAST_SEEN_TTL: int = 86400  # 秒，Redis 中 (用户, 会话) 最后事件时间的保留时长
+    IDLE_SESSIONS_PER_USER: int = 100  # 每个用户跟踪的会话数超过该值时清理超过保留时长未活动的会话
+    
+    # 操作序列挖掘设置
+    SEQUENCE_MINING_DAYS: int = 7  # 后台预计算的天数，与接口默认天数一致
+    SEQUENCE_MINING_INTERVAL: int = 3600  # 秒
+    SEQUENCE_PATTERN_CAPACITY: int = 1000  # 每种长度保留的高频模式数
+    SEQUENCE_SKETCH_WIDTH: int = 2048  # Count-Min 每行的计数器数
+    
+    # 学习曲线拟合设置
+    LEARNING_CURVE_DAYS: int = 90  # 批量拟合使用的天数
+    LEARNING_CURVE_INTERVAL: int = 6 * 3600  # 秒
+    LEARNING_CURVE_MIN_SAMPLES: int = 10  # 每条曲线的最少标注数
+    
+    # 项目排名索引设置
+    RANKING_DAYS: int = 7  # 排名统计的天数，与对比接口默认天数一致
+    RANKING_REFRESH_INTERVAL: int = 900  # 秒
+    
+    # 改进建议预计算设置
+    RECOMMENDATION_DAYS: int = 7  # 预计算的天数，与接口默认天数一致
+    RECOMMENDATION_INTERVAL: int = 3600  # 秒
+    RECOMMENDATION_TTL: int = 3 * 3600  # 预计算结果的有效期（秒）
+    RECOMMENDATION_BATCH_SIZE: int = 20  # 每批并发计算的用户数
+    
+    # CPU密集型分析的进程池设置
+    ANALYSIS_PROCESS_WORKERS: int = 2  # 0 表示全部在事件循环中执行
+    ANALYSIS_OFFLOAD_MIN_ROWS: int = 100000  # 默认的转交进程池行数阈值
+    
+    # 效率指标表分区设置
+    METRICS_PARTITION_MONTHS_AHEAD: int = 3  # 提前创建的未来月份分区数
+    METRICS_RETENTION_DAYS: int = 365  # 整月早于保留期的分区会被卸载并删除
+    METRICS_PARTITION_INTERVAL: int = 24 * 3600  # 秒
+    
+    # 用户统计接口设置
+    USER_STATS_PAGE_SIZE: int = 100  # 每页返回的项目明细数
+    
+    # 查询耗时统计设置
+    SLOW_QUERY_THRESHOLD_MS: float = 500.0  # 超过该耗时的SQL/Flux查询写慢查询日志
+    QUERY_PROFILE_MAX_FINGERPRINTS: int = 500  # 统计的查询指纹上限
+    
+    # 健康检查设置（后台按间隔探测，接口只读缓存结果）
+    HEALTH_DATABASE_INTERVAL: float = 10.0  # 秒
+    HEALTH_REDIS_INTERVAL: float = 10.0  # 秒
+    HEALTH_INFLUXDB_INTERVAL: float = 30.0  # 秒
+    HEALTH_CHECK_TIMEOUT: float = 5.0  # 单次探测超时（秒）
+    HEALTH_HISTORY_SIZE: int = 20  # 每个依赖保留的探测历史条数
+    INGEST_MAX_PENDING_BATCHES: int = 200  # 未处理完的事件批次达到该值时就绪检查失败
+    
+    # 服务自身运行状况采样设置（写入 system_health 表）
+    SYSTEM_SAMPLE_SERVICE_NAME: str = "efficiency_service"
+    SYSTEM_SAMPLE_INTERVAL: float = 15.0  # 采样间隔（秒）
+    SYSTEM_SAMPLE_BATCH_SIZE: int = 4  # 攒够该条数后批量写入
+    SYSTEM_SAMPLE_MAX_BUFFER: int = 240  # 写入失败时内存中最多保留的样本数
+    SYSTEM_SAMPLE_DISK_PATH: str = "/"  # 统计磁盘使用率的挂载点
+    SYSTEM_HEALTH_RETENTION_DAYS: int = 30  # 样本保留天数
+    EVENT_LOOP_LAG_PROBE_INTERVAL: float = 0.5  # 事件循环延迟探测间隔（秒）
+    EVENT_LOOP_LAG_WARN_MS: float = 200.0  # 采样周期内最大延迟超过该值时记为 degraded
+    SYSTEM_TRENDS_MAX_HOURS: int = 720  # 趋势接口允许查询的最大小时数
+    
+    # examples 静态文件设置
+    EXAMPLES_DIR: str = "/app/examples"
+    STATIC_COMPRESS_MIN_SIZE: int = 512  # 小于该字节数的文件不做预压缩
+    STATIC_ASSETS_POLL_INTERVAL: float = 2.0  # 未安装 watchfiles 时检查文件变化的间隔（秒）
+    
+    # 用户数据删除任务设置
+    DELETION_CHUNK_SIZE: int = 5000  # 每个事务删除的行数
+    DELETION_CHUNK_PAUSE: float = 0.05  # 分块之间的间隔（秒），给其他事务让出锁和 IO
+    DELETION_INFLUX_SLICE_DAYS: int = 30  # InfluxDB 每次删除的时间段（天）
+    DELETION_JOB_TIME_BUDGET: int = 20 * 60  # 单次后台任务的最长执行时间（秒），超出后重新排队继续
+    DELETION_JOB_STALE_SECONDS: int = 600  # running 状态超过该时间没有心跳视为执行进程已退出
+    DELETION_JOB_MAX_FAILURES: int = 5  # 失败次数达到该值后不再自动重试
+    DELETION_RESUME_INTERVAL: int = 60  # 检查需要恢复的删除任务的间隔（秒）
+    
+    # 看板物化视图设置
+    DASHBOARD_REFRESH_INTERVAL: int = 600  # 秒，看板数据的最大延迟
+    DASHBOARD_MAX_DAYS: int = 90  # 看板接口允许查询的最大天数
+    
+    # 长时间范围查询切分设置
+    RANGE_QUERY_CONCURRENCY: int = 4  # 同时执行的分段查询数
+    RANGE_SLICE_HOURS: int = 24  # 每段的小时数
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -1,20 +1,27 @@
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import text
+from typing import List, Optional
+from pathlib import Path
 import asyncio
+import itertools
 import logging
+import time
 
 from .config import settings
+from .query_profiler import query_profiler
 
 logger = logging.getLogger(__name__)
 
 # 创建异步数据库引擎
 engine = create_async_engine(
     settings.DATABASE_URL,
-    echo=settings.DEBUG,
+    echo=settings.SQL_ECHO,
     pool_pre_ping=True,
     pool_recycle=3600,
 )
+query_profiler.instrument_engine(engine.sync_engine)
 
 # 创建异步会话工厂
 AsyncSessionLocal = sessionmaker(
@@ -26,22 +33,120 @@ AsyncSessionLocal = sessionmaker(
 # 创建基础模型类
 Base = declarative_base()
 
-async def init_db():
-    """初始化数据库连接"""
-    try:
-        async with engine.begin() as conn:
-            # 创建所有表
-            await conn.run_sync(Base.metadata.create_all)
-        logger.info("Database initialized successfully")
-    except Exception as e:
-        logger.error(f"Failed to initialize database: {e}")
-        raise
+
+# 不在恢复模式（已提升为主库）或已重放完收到的全部 WAL 时视为无延迟
+REPLICA_LAG_SQL = text(
+    "SELECT CASE "
+    "WHEN NOT pg_is_in_recovery() THEN 0 "
+    "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+class ReadReplica:
+    """单个只读副本：引擎、会话工厂和最近一次的延迟检查结果"""
+
+    def __init__(self, url: str):
+        self.engine = create_async_engine(
+            url,
+            echo=settings.SQL_ECHO,
+            pool_pre_ping=True,
+            pool_recycle=3600,
+        )
+        query_profiler.instrument_engine(self.engine.sync_engine)
+        self.session_factory = sessionmaker(
+            self.engine,
+            class_=AsyncSession,
+            expire_on_commit=False,
+        )
+        self.name = f"{self.engine.url.host}:{self.engine.url.port}"
+        self.lag: Optional[float] = None
+        self.checked_at = 0.0
+        self.lock = asyncio.Lock()
+
+    async def is_available(self, max_lag: float, check_interval: float) -> bool:
+        """副本延迟是否在允许范围内（检查结果缓存 check_interval 秒，连接失败视为不可用）"""
+        if time.monotonic() - self.checked_at >= check_interval:
+            async with self.lock:
+                if time.monotonic() - self.checked_at >= check_interval:
+                    try:
+                        async with self.engine.connect() as conn:
+                            self.lag = float((await conn.execute(REPLICA_LAG_SQL)).scalar())
+                    except Exception as e:
+                        self.lag = None
+                        logger.warning(f"Read replica {self.name} is unreachable: {e}")
+                    self.checked_at = time.monotonic()
+        return self.lag is not None and self.lag <= max_lag
+
+
+class ReadRouter:
+    """
+    读请求路由：在延迟达标的副本间轮询，没有可用副本时回退到主库
+
+    写入和需要读到自己刚写入数据的请求仍应使用 get_db。
+    """
+
+    def __init__(self, urls: List[str]):
+        self.replicas = [ReadReplica(url) for url in urls]
+        self._cycle = itertools.cycle(self.replicas) if self.replicas else None
+
+    async def session_factory(self) -> sessionmaker:
+        for _ in range(len(self.replicas)):
+            replica = next(self._cycle)
+            if await replica.is_available(settings.READ_REPLICA_MAX_LAG_SECONDS, settings.READ_REPLICA_CHECK_INTERVAL):
+                return replica.session_factory
+        if self.replicas:
+            logger.warning("No read replica within lag threshold, falling back to primary")
+        return AsyncSessionLocal
+
+    def status(self) -> List[dict]:
+        return [{"replica": replica.name, "lag_seconds": replica.lag} for replica in self.replicas]
+
+    async def dispose(self):
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+
+read_router = ReadRouter(settings.READ_DATABASE_URLS)
+
+# 数据库结构由 Alembic 迁移管理（python -m app.migrate），服务启动时只核对版本
+ALEMBIC_INI = Path(__file__).resolve().parents[2] / "alembic.ini"
+
+
+def expected_schema_revision() -> str:
+    """迁移脚本中的最新版本号"""
+    from alembic.config import Config
+    from alembic.script import ScriptDirectory
+
+    return ScriptDirectory.from_config(Config(str(ALEMBIC_INI))).get_current_head()
+
+
+async def current_schema_revision() -> Optional[str]:
+    """数据库当前的结构版本，未由 Alembic 管理时返回 None"""
+    async with engine.connect() as conn:
+        exists = (await conn.execute(text("SELECT to_regclass('alembic_version') IS NOT NULL"))).scalar()
+        if not exists:
+            return None
+        return (await conn.execute(text("SELECT version_num FROM alembic_version"))).scalar()
+
+
+async def check_schema_version():
+    """核对数据库结构版本，未迁移到最新版本时拒绝启动"""
+    expected = expected_schema_revision()
+    current = await current_schema_revision()
+    if current != expected:
+        raise RuntimeError(
+            f"Database schema revision is {current or 'missing'}, expected {expected}; "
+            f"run `python -m app.migrate` before starting the service"
+        )
+    logger.info(f"Database schema is at revision {current}")
 
 
 async def close_db():
     """关闭数据库连接"""
     try:
         await engine.dispose()
+        await read_router.dispose()
         logger.info("Database connections closed")
     except Exception as e:
         logger.error(f"Failed to close database: {e}")
@@ -63,4 +168,14 @@ async def get_db():
         try:
             yield session
         finally:
-            await session.close() 
\ No newline at end of file
+            await session.close()
+
+
+async def get_read_db():
+    """FastAPI依赖注入用的只读会话，优先路由到只读副本"""
+    session_factory = await read_router.session_factory()
+    async with session_factory() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
@@ -0,0 +1,194 @@
+from typing import Dict, Any, List, Optional
+from contextlib import contextmanager
+from bisect import bisect_left
+import hashlib
+import logging
+import re
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# 延迟直方图的桶上界（毫秒），最后一个桶收集超过 10 秒的查询
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, float("inf"))
+# 指纹数超过上限后，新出现的查询统一计入该指纹
+OVERFLOW_FINGERPRINT = "<other>"
+
+_SQL_COMMENT = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_SQL_STRING = re.compile(r"'(?:[^']|'')*'")
+_SQL_PARAM = re.compile(r"\$\d+|%\(\w+\)s|(?<!:):\w+|\?")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?:e[+-]?\d+)?(?![\w.])", re.I)
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+_FLUX_COMMENT = re.compile(r"//[^\n]*")
+_FLUX_STRING = re.compile(r'"(?:[^"\\]|\\.)*"')
+_FLUX_TIME = re.compile(r"\d{4}-\d{2}-\d{2}T[\d:.]+(?:Z|[+-]\d{2}:\d{2})?")
+_FLUX_DURATION = re.compile(r"(?<![\w.])-?(?:\d+(?:ns|us|µs|ms|mo|[smhdwy]))+(?![\w.])")
+
+
+def fingerprint_sql(statement: str) -> str:
+    """SQL 归一化：去掉注释，字面量和绑定参数替换为 ?，IN 列表折叠，空白合并"""
+    statement = _SQL_COMMENT.sub(" ", statement)
+    statement = _SQL_STRING.sub("?", statement)
+    statement = _SQL_PARAM.sub("?", statement)
+    statement = _NUMBER.sub("?", statement)
+    statement = _IN_LIST.sub("(?+)", statement)
+    return _WHITESPACE.sub(" ", statement).strip()
+
+
+def fingerprint_flux(query: str) -> str:
+    """Flux 归一化：去掉注释，字符串、时间、时长和数字替换为 ?，空白合并"""
+    query = _FLUX_COMMENT.sub(" ", query)
+    query = _FLUX_STRING.sub("?", query)
+    query = _FLUX_TIME.sub("?", query)
+    query = _FLUX_DURATION.sub("?", query)
+    query = _NUMBER.sub("?", query)
+    return _WHITESPACE.sub(" ", query).strip()
+
+
+class QueryStats:
+    """单个查询指纹的调用次数、耗时和延迟直方图"""
+
+    def __init__(self, source: str, fingerprint: str):
+        self.source = source
+        self.fingerprint = fingerprint
+        self.id = hashlib.sha1(f"{source}:{fingerprint}".encode()).hexdigest()[:12]
+        self.count = 0
+        self.slow_count = 0
+        self.error_count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS_MS)
+
+    def add(self, duration_ms: float, slow: bool, failed: bool):
+        self.count += 1
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+        self.buckets[bisect_left(LATENCY_BUCKETS_MS, duration_ms)] += 1
+        if slow:
+            self.slow_count += 1
+        if failed:
+            self.error_count += 1
+
+    def quantile(self, q: float) -> float:
+        """按直方图估计分位数（取所在桶的上界，不超过观测到的最大值）"""
+        rank = q * self.count
+        seen = 0
+        for bound, bucket_count in zip(LATENCY_BUCKETS_MS, self.buckets):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "source": self.source,
+            "fingerprint": self.fingerprint,
+            "count": self.count,
+            "slow_count": self.slow_count,
+            "error_count": self.error_count,
+            "total_ms": round(self.total_ms, 3),
+            "avg_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "p50_ms": round(self.quantile(0.5), 3),
+            "p95_ms": round(self.quantile(0.95), 3),
+            "p99_ms": round(self.quantile(0.99), 3),
+            "histogram": {
+                ("+inf" if bound == float("inf") else f"le_{bound:g}ms"): bucket_count
+                for bound, bucket_count in zip(LATENCY_BUCKETS_MS, self.buckets)
+            }
+        }
+
+
+class QueryProfiler:
+    """
+    按查询指纹统计 PostgreSQL 和 Flux 查询的耗时
+
+    只有超过 SLOW_QUERY_THRESHOLD_MS 的查询写日志，其余只计入统计；
+    SQLAlchemy 事件回调是同步的，统计用线程锁保护。
+    """
+
+    def __init__(self):
+        self.stats: Dict[str, QueryStats] = {}
+        self.started_at = time.time()
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def record(self, source: str, fingerprint: str, duration_ms: float,
+               statement: Optional[str] = None, failed: bool = False):
+        slow = duration_ms >= settings.SLOW_QUERY_THRESHOLD_MS
+        with self.lock:
+            key = f"{source}:{fingerprint}"
+            stats = self.stats.get(key)
+            if stats is None:
+                if len(self.stats) >= settings.QUERY_PROFILE_MAX_FINGERPRINTS:
+                    key = f"{source}:{OVERFLOW_FINGERPRINT}"
+                    stats = self.stats.get(key)
+                if stats is None:
+                    stats = self.stats[key] = QueryStats(source, key.split(":", 1)[1])
+            stats.add(duration_ms, slow, failed)
+
+        if slow:
+            self.logger.warning(
+                f"slow_query source={source} duration_ms={duration_ms:.1f} fingerprint={stats.id} "
+                f"failed={failed} statement={_WHITESPACE.sub(' ', statement or fingerprint)[:1000]}"
+            )
+
+    @contextmanager
+    def track_flux(self, query: str):
+        """记录一次 Flux 查询的耗时（流式查询需把整个消费过程包在内）"""
+        started = time.perf_counter()
+        failed = False
+        try:
+            yield
+        except GeneratorExit:
+            # 调用方提前结束流式消费，不算失败
+            raise
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            self.record("flux", fingerprint_flux(query), (time.perf_counter() - started) * 1000, query, failed)
+
+    def instrument_engine(self, engine: Engine):
+        """在同步引擎上挂载执行前后的事件回调（异步引擎传入 engine.sync_engine）"""
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("query_start_times", []).append(time.perf_counter())
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            started = conn.info["query_start_times"].pop()
+            self.record("sql", fingerprint_sql(statement), (time.perf_counter() - started) * 1000, statement)
+
+        @event.listens_for(engine, "handle_error")
+        def handle_error(exception_context):
+            conn = exception_context.connection
+            statement = exception_context.statement
+            if conn is None or statement is None or not conn.info.get("query_start_times"):
+                return
+            started = conn.info["query_start_times"].pop()
+            self.record("sql", fingerprint_sql(statement), (time.perf_counter() - started) * 1000, statement, True)
+
+    def snapshot(self, source: Optional[str] = None, sort: str = "total_ms", limit: int = 50) -> List[Dict[str, Any]]:
+        """按指定字段降序返回各指纹的统计"""
+        with self.lock:
+            items = [stats.to_dict() for stats in self.stats.values() if source is None or stats.source == source]
+        items.sort(key=lambda item: item[sort], reverse=True)
+        return items[:limit]
+
+    def reset(self):
+        with self.lock:
+            self.stats.clear()
+            self.started_at = time.time()
+
+
+query_profiler = QueryProfiler()
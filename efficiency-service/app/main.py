@@ -1,17 +1,18 @@
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse, HTMLResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse, Response
 from contextlib import asynccontextmanager
 import uvicorn
 from typing import List
 import logging
-from datetime import datetime
-import os
 
 from .api.v1.router import api_router
-from .core.database import init_db, close_db
+from .core.database import check_schema_version, close_db
 from .core.config import settings
+from .services.offload import offloader
+from .services.health_prober import health_prober
+from .services.static_assets import examples_assets
+from .services.system_sampler import system_sampler
 from .utils.timezone import utc_now
 
 # 配置日志
@@ -23,13 +24,20 @@ logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # 启动时初始化数据库
-    logger.info("Initializing database connections...")
-    await init_db()
+    # 启动时只核对数据库结构版本，建表和分区由 python -m app.migrate 完成
+    logger.info("Checking database schema version...")
+    await check_schema_version()
+    health_prober.start()
+    system_sampler.start()
+    examples_assets.start()
     yield
     # 关闭时清理资源
+    await examples_assets.stop()
+    await system_sampler.stop()
+    await health_prober.stop()
     logger.info("Closing database connections...")
     await close_db()
+    offloader.shutdown()
 
 app = FastAPI(
     title="Xtreme1 Efficiency Monitor",
@@ -41,52 +49,32 @@ app = FastAPI(
 # 注册API路由
 app.include_router(api_router, prefix="/api/v1")
 
-# 自定义静态文件服务，禁用缓存
-examples_dir = "/app/examples"  # 直接使用绝对路径
-
+# examples 目录的静态文件从内存提供，带内容哈希 ETag 和预压缩版本
 @app.get("/examples/")
-async def serve_examples_index():
+async def serve_examples_index(request: Request):
     """提供 examples 目录的默认 index.html"""
-    return await serve_examples("index.html")
+    return await serve_examples("index.html", request)
 
 @app.get("/examples/{file_path:path}")
-async def serve_examples(file_path: str):
-    """无缓存的静态文件服务，特别适合开发环境"""
-    # 如果请求的是空路径或根目录，默认返回 index.html
-    if not file_path or file_path == "/":
-        file_path = "index.html"
-    
-    file_full_path = os.path.join(examples_dir, file_path)
-    
-    if not os.path.exists(file_full_path) or not os.path.isfile(file_full_path):
+async def serve_examples(file_path: str, request: Request):
+    """静态文件服务：浏览器每次都会重新校验（no-cache），文件未变化时返回 304"""
+    asset = examples_assets.get(file_path)
+    if asset is None:
         raise HTTPException(status_code=404, detail=f"File not found: {file_path}")
     
-    # 读取文件内容
-    with open(file_full_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
-    # 确定内容类型
-    if file_path.endswith('.html'):
-        media_type = "text/html"
-    elif file_path.endswith('.js'):
-        media_type = "application/javascript"
-    elif file_path.endswith('.css'):
-        media_type = "text/css"
-    else:
-        media_type = "text/plain"
+    headers = {
+        "Cache-Control": "no-cache",
+        "ETag": asset.etag,
+        "Last-Modified": asset.last_modified,
+        "Vary": "Accept-Encoding"
+    }
+    if asset.matches(request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
     
-    # 返回带有无缓存头的响应
-    return HTMLResponse(
-        content=content,
-        media_type=media_type,
-        headers={
-            "Cache-Control": "no-cache, no-store, must-revalidate",
-            "Pragma": "no-cache",
-            "Expires": "0",
-            "Last-Modified": datetime.utcnow().strftime("%a, %d %b %Y %H:%M:%S GMT"),
-            "ETag": f'"{hash(content + str(datetime.utcnow()))}"'
-        }
-    )
+    content, encoding = asset.encode(request.headers.get("accept-encoding"))
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=content, media_type=asset.media_type, headers=headers)
 
 @app.get("/health")
 async def health_check():
@@ -99,16 +87,10 @@ async def health_check():
 
 @app.get("/")
 async def root():
-    # 动态扫描examples目录
-    examples_dict = {}
-    examples_dir_root = "/app/examples"  # 直接使用绝对路径
-    
-    if os.path.exists(examples_dir_root):
-        for file in os.listdir(examples_dir_root):
-            if file.endswith('.html'):
-                # 将文件名转换为友好的键名
-                key = file.replace('.html', '').replace('_', ' ').title()
-                examples_dict[file.replace('.html', '')] = f"/examples/{file}"
+    # examples 目录的文件列表来自内存中的静态文件
+    examples_dict = {
+        file[:-len('.html')]: f"/examples/{file}" for file in examples_assets.list(".html")
+    }
     
     return {
         "service": "Xtreme1 Efficiency Monitor",
@@ -0,0 +1,62 @@
+"""
+数据库迁移命令，部署时执行一次（不在每个服务进程启动时执行）
+
+    python -m app.migrate            # 升级到最新版本并补齐效率指标分区
+    python -m app.migrate --stamp    # 已按 db/migrations 的 SQL 脚本迁移到 V8 的数据库，只标记为基线版本
+"""
+import argparse
+import asyncio
+import logging
+
+from alembic import command
+from alembic.config import Config
+
+from .core.database import ALEMBIC_INI, close_db, current_schema_revision
+from .services.partitions import ensure_metric_partitions
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+BASELINE_REVISION = "0001"
+
+
+async def read_revision():
+    try:
+        return await current_schema_revision()
+    finally:
+        # 连接池绑定在当前事件循环上，后续 asyncio.run 前先释放
+        await close_db()
+
+
+async def prepare_partitions():
+    try:
+        created = await ensure_metric_partitions()
+        if created:
+            logger.info(f"Created efficiency metric partitions: {', '.join(created)}")
+    finally:
+        await close_db()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="效率监控服务数据库迁移")
+    parser.add_argument("--stamp", action="store_true", help="只把现有数据库标记为基线版本，不执行迁移")
+    args = parser.parse_args()
+
+    config = Config(str(ALEMBIC_INI))
+    config.attributes["configure_logger"] = False
+    if args.stamp:
+        current = asyncio.run(read_revision())
+        if current is not None:
+            parser.error(f"database is already at revision {current}, refusing to stamp")
+        command.stamp(config, BASELINE_REVISION)
+    command.upgrade(config, "head")
+
+    # 分区表没有当月分区时写入会落到兜底分区，迁移后先补齐
+    asyncio.run(prepare_partitions())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, String, Integer, Float, DateTime, Text, Boolean, JSON
-from sqlalchemy.sql import func
+from sqlalchemy import Column, String, Integer, Float, DateTime, Text, Boolean, JSON, UniqueConstraint, Index
+from sqlalchemy.sql import func, text
 from datetime import datetime
 from typing import Dict, Any
 
@@ -7,18 +7,25 @@ from ..core.database import Base
 
 
 class EfficiencyMetrics(Base):
-    """效率指标表"""
+    """效率指标表（按 timestamp 按月范围分区，分区由后台任务维护）"""
     __tablename__ = "efficiency_metrics"
-    
-    id = Column(Integer, primary_key=True, index=True)
+    __table_args__ = (
+        # BRIN 索引在父表上定义，每个分区自动创建对应的索引
+        Index("idx_efficiency_metrics_timestamp_brin", "timestamp", postgresql_using="brin"),
+        Index("idx_efficiency_metrics_metric_type", "metric_type"),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
+    
+    # 分区表的主键必须包含分区键
+    id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(String(255), nullable=False, index=True)
     project_id = Column(String(255), nullable=False, index=True)
     task_id = Column(String(255), nullable=True, index=True)
     tool = Column(String(100), nullable=True)
-    metric_type = Column(String(100), nullable=False)
-    metric_value = Column(Float, nullable=False)
-    timestamp = Column(DateTime, nullable=False, default=func.now())
-    extra_data = Column(JSON, nullable=True)  # 使用 extra_data 替代 metadata
+    metric_type = Column(String(100), nullable=False, comment="指标类型：annotation_time, fps等")
+    metric_value = Column(Float, nullable=False, comment="指标值")
+    timestamp = Column(DateTime, primary_key=True, nullable=False, default=func.now())
+    extra_data = Column(JSON, nullable=True, comment="事件相关的额外数据，存储为JSON格式")  # 使用 extra_data 替代 metadata
     
     def __repr__(self):
         return f"<EfficiencyMetrics(user_id='{self.user_id}', metric_type='{self.metric_type}', value={self.metric_value})>"
@@ -27,6 +34,10 @@ class EfficiencyMetrics(Base):
 class UserStats(Base):
     """用户统计表"""
     __tablename__ = "user_stats"
+    __table_args__ = (
+        # 与初始化脚本一致；同时作为按 project_id 键集分页的索引
+        UniqueConstraint("user_id", "project_id", name="user_stats_user_id_project_id_key"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(String(255), nullable=False, index=True)
@@ -127,6 +138,37 @@ class ToolUsage(Base):
         return f"<ToolUsage(tool='{self.tool_name}', user_id='{self.user_id}', usage={self.usage_count})>"
 
 
+class LearningCurveFit(Base):
+    """学习曲线拟合结果表（幂律模型 duration = a * n^(-b)）"""
+    __tablename__ = "learning_curve_fits"
+    __table_args__ = (
+        UniqueConstraint("user_id", "project_id", "annotation_type", name="uq_learning_curve_fits_dim"),
+        # 项目内按学习速度排名
+        Index("idx_learning_curve_fits_project_rate", "project_id", "annotation_type", text("learning_rate DESC")),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(String(255), nullable=False, index=True)
+    project_id = Column(String(255), nullable=False, index=True)
+    annotation_type = Column(String(100), nullable=False)  # all 表示跨所有类型的汇总曲线
+    
+    # 模型参数
+    sample_count = Column(Integer, default=0)
+    initial_duration = Column(Float, nullable=False)  # a，首次标注的拟合耗时（毫秒）
+    learning_exponent = Column(Float, nullable=False, comment="幂律学习曲线指数b：duration = a * n^(-b)")  # b，越大学得越快
+    learning_rate = Column(Float, nullable=False, comment="练习次数翻倍时耗时下降的百分比")
+    r_squared = Column(Float, nullable=True)
+    current_duration = Column(Float, nullable=True)  # 按当前练习次数预测的耗时
+    plateau_detected = Column(Boolean, default=False)
+    
+    # 时间戳
+    window_days = Column(Integer, nullable=False)
+    fitted_at = Column(DateTime, default=func.now())
+    
+    def __repr__(self):
+        return f"<LearningCurveFit(user_id='{self.user_id}', type='{self.annotation_type}', rate={self.learning_rate})>"
+
+
 class SystemHealth(Base):
     """系统健康状态表"""
     __tablename__ = "system_health"
@@ -146,8 +188,36 @@ class SystemHealth(Base):
     details = Column(JSON, nullable=True)
     
     # 时间戳
-    checked_at = Column(DateTime, default=func.now())
+    checked_at = Column(DateTime, default=func.now(), index=True)
     created_at = Column(DateTime, default=func.now())
     
     def __repr__(self):
-        return f"<SystemHealth(service='{self.service_name}', status='{self.status}')>" 
\ No newline at end of file
+        return f"<SystemHealth(service='{self.service_name}', status='{self.status}')>"
+
+
+class DeletionJob(Base):
+    """用户数据删除任务（按表分块、按时间段删除，进度与每个分块一起提交，中断后从断点继续）"""
+    __tablename__ = "deletion_jobs"
+    
+    id = Column(String(36), primary_key=True)
+    user_id = Column(String(255), nullable=False, index=True)
+    status = Column(String(20), nullable=False, default="pending", index=True)  # pending, running, completed, failed
+    phase = Column(String(50), nullable=False, comment="当前执行到的步骤")
+    progress = Column(JSON, nullable=True, comment="各步骤的总量和已删除量")
+    
+    # 只删除任务创建之前的数据；InfluxDB 从 cutoff 向前按时间段删除，influx_cursor 为已删除到的位置
+    cutoff = Column(DateTime, nullable=False)
+    influx_floor = Column(DateTime, nullable=True, comment="该用户在 InfluxDB 中最早的数据时间")
+    influx_cursor = Column(DateTime, nullable=True)
+    
+    failures = Column(Integer, nullable=False, default=0, comment="执行失败的次数")
+    error = Column(Text, nullable=True)
+    
+    # 时间戳
+    created_at = Column(DateTime, default=func.now())
+    started_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f"<DeletionJob(id='{self.id}', user_id='{self.user_id}', status='{self.status}', phase='{self.phase}')>"
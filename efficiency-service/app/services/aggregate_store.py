@@ -0,0 +1,486 @@
+from typing import List, Dict, Any, Optional, Tuple
+from datetime import datetime, date, timedelta, timezone
+import logging
+
+import numpy as np
+import redis.asyncio as redis
+
+from ..schemas.event import EventData, EventType
+from ..core.config import settings
+from ..utils.timezone import utc_now
+from .event_analysis import UserEventsAccumulator
+from .flux_query import FluxQuery
+from .influxdb_service import EVENTS_MEASUREMENT
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "effm:agg"
+ACTIVE_USERS_KEY = f"{KEY_PREFIX}:active-users"
+DIM_SEPARATOR = "|"
+
+INTERACTION_TYPE = str(EventType.USER_INTERACTION)
+PERFORMANCE_TYPE = str(EventType.PERFORMANCE)
+ANNOTATION_TYPE = str(EventType.ANNOTATION)
+ERROR_TYPE = str(EventType.ERROR)
+
+# 对单个哈希原子地执行一组自增/最小值/最大值更新
+# ARGV[1] 为过期秒数，其后每三个参数为 (操作, 字段, 值)
+_UPDATE_SCRIPT = """
+for i = 2, #ARGV, 3 do
+    local op, field, value = ARGV[i], ARGV[i + 1], ARGV[i + 2]
+    if op == 'i' then
+        redis.call('HINCRBY', KEYS[1], field, value)
+    elseif op == 'f' then
+        redis.call('HINCRBYFLOAT', KEYS[1], field, value)
+    else
+        local current = redis.call('HGET', KEYS[1], field)
+        if (not current) or (op == 'min' and tonumber(value) < tonumber(current))
+                or (op == 'max' and tonumber(value) > tonumber(current)) then
+            redis.call('HSET', KEYS[1], field, value)
+        end
+    end
+end
+if tonumber(ARGV[1]) > 0 then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+return 1
+"""
+
+# 覆盖起点正好是重算那天的后一天时下移到重算的那天（覆盖范围保持连续）
+# ARGV[1] 为重算那天的后一天，ARGV[2] 为重算的那天
+_LOWER_COVERAGE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+
+def _day_key(day: date) -> str:
+    return day.strftime("%Y%m%d")
+
+
+def aggregate_key(user_id: str, project_id: str, tool: str, day: date) -> str:
+    return f"{KEY_PREFIX}:{user_id}:{project_id}:{tool}:{_day_key(day)}"
+
+
+def dims_key(user_id: str) -> str:
+    return f"{KEY_PREFIX}:dims:{user_id}"
+
+
+def project_users_key(project_id: str) -> str:
+    return f"{KEY_PREFIX}:project-users:{project_id}"
+
+
+def recent_fps_key(user_id: str) -> str:
+    return f"{KEY_PREFIX}:recent-fps:{user_id}"
+
+
+def coverage_key(user_id: str) -> str:
+    return f"{KEY_PREFIX}:coverage:{user_id}"
+
+
+def last_closed_day() -> date:
+    """
+    可以重算的最后一天（UTC）：当天结束已超过 AGGREGATE_RECONCILE_GRACE_MINUTES
+
+    接收路径先写 InfluxDB 再自增 Redis 中的聚合，重算仍在写入的日期时，两步之间的事件会被重算结果和自增各计一次。
+    """
+    return (utc_now() - timedelta(minutes=settings.AGGREGATE_RECONCILE_GRACE_MINUTES)).date() - timedelta(days=1)
+
+
+def _parse_day(value: str) -> date:
+    return datetime.strptime(value, "%Y%m%d").date()
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def event_tool(event: EventData, metadata: Optional[Dict[str, Any]] = None) -> str:
+    """与InfluxDB中 batch_tool / tool 标签一致的工具维度"""
+    if metadata and isinstance(metadata.get("tool"), str):
+        return metadata["tool"]
+    tool = event.data.get("tool")
+    return tool if isinstance(tool, str) else "unknown"
+
+
+class _Delta:
+    """单个聚合哈希在一个批次内的增量"""
+
+    __slots__ = ("incr", "incr_float", "mins", "maxs")
+
+    def __init__(self):
+        self.incr: Dict[str, int] = {}
+        self.incr_float: Dict[str, float] = {}
+        self.mins: Dict[str, float] = {}
+        self.maxs: Dict[str, float] = {}
+
+    def add(self, field: str, amount: int = 1):
+        self.incr[field] = self.incr.get(field, 0) + amount
+
+    def add_duration(self, prefix: str, value: float):
+        self.incr_float[f"{prefix}:sum"] = self.incr_float.get(f"{prefix}:sum", 0.0) + value
+        self.add(f"{prefix}:count")
+        self.mins[f"{prefix}:min"] = min(value, self.mins.get(f"{prefix}:min", value))
+        self.maxs[f"{prefix}:max"] = max(value, self.maxs.get(f"{prefix}:max", value))
+
+    def script_args(self, ttl: int) -> List[Any]:
+        args: List[Any] = [ttl]
+        for field, value in self.incr.items():
+            args.extend(("i", field, value))
+        for field, value in self.incr_float.items():
+            args.extend(("f", field, repr(value)))
+        for field, value in self.mins.items():
+            args.extend(("min", field, repr(value)))
+        for field, value in self.maxs.items():
+            args.extend(("max", field, repr(value)))
+        return args
+
+
+def _merge_totals(totals: Dict[str, float], row: Dict[str, str]):
+    for field, raw in row.items():
+        value = float(raw)
+        if field.endswith(":min"):
+            totals[field] = min(value, totals.get(field, value))
+        elif field.endswith(":max"):
+            totals[field] = max(value, totals.get(field, value))
+        else:
+            totals[field] = totals.get(field, 0.0) + value
+
+
+class AggregateStore:
+    """
+    用户/项目/工具/天维度的增量聚合，保存在Redis哈希中
+
+    计数口径与InfluxDB记录一致：每个数值字段算一条记录（与 /raw-stats 的 total_events 相同）。
+
+    聚合只包含接收路径上记录的事件，每个用户记录覆盖起点（从这一天起聚合完整）：
+    首次记录时为次日（当天可能有上线前只写入了 InfluxDB 的事件），对账和补算从 InfluxDB
+    重算更早的天后逐天下移。查询窗口早于覆盖起点时读取方法返回 None，由调用方查询 InfluxDB。
+    """
+
+    def __init__(self):
+        self.client = None
+        self._update_script = None
+        self._lower_coverage_script = None
+        self.logger = logging.getLogger(__name__)
+
+    async def get_client(self) -> redis.Redis:
+        """获取Redis客户端"""
+        if self.client is None:
+            self.client = redis.from_url(settings.REDIS_URL, decode_responses=True)
+            self._update_script = self.client.register_script(_UPDATE_SCRIPT)
+            self._lower_coverage_script = self.client.register_script(_LOWER_COVERAGE_SCRIPT)
+        return self.client
+
+    async def close(self):
+        """关闭Redis连接"""
+        if self.client:
+            await self.client.close()
+            self.client = None
+
+    @property
+    def ttl_seconds(self) -> int:
+        return settings.AGGREGATE_RETENTION_DAYS * 86400
+
+    def _build_deltas(self, events: List[EventData], metadata: Optional[Dict[str, Any]]):
+        deltas: Dict[Tuple[str, str, str, date], _Delta] = {}
+        recent_fps: Dict[str, List[float]] = {}
+
+        for event in events:
+            timestamp = event.timestamp
+            if timestamp.tzinfo is not None:
+                timestamp = timestamp.astimezone(timezone.utc)
+            records = sum(1 for value in event.data.values() if isinstance(value, (bool, int, float)))
+            if records == 0:
+                continue
+
+            dim = (event.user_id, event.project_id, event_tool(event, metadata), timestamp.date())
+            delta = deltas.get(dim)
+            if delta is None:
+                delta = deltas[dim] = _Delta()
+
+            event_type = str(event.event_type)
+            delta.add(f"events:{event_type}", records)
+
+            duration = event.data.get("duration")
+            if _is_number(duration):
+                delta.add_duration(f"duration:{event_type}", float(duration))
+
+            if event_type == INTERACTION_TYPE:
+                action = event.data.get("action")
+                delta.add(f"interactions:{action if isinstance(action, str) else 'unknown'}", records)
+                if _is_number(duration) and 0 <= duration <= 10000:
+                    delta.incr_float["op_time:sum"] = delta.incr_float.get("op_time:sum", 0.0) + float(duration)
+                    delta.add("op_time:count")
+            elif event_type == PERFORMANCE_TYPE:
+                fps = event.data.get("fps")
+                if isinstance(fps, (bool, int, float)) and 0 <= fps <= 200:
+                    delta.incr_float["fps:sum"] = delta.incr_float.get("fps:sum", 0.0) + float(fps)
+                    delta.add("fps:count")
+                    recent_fps.setdefault(event.user_id, []).append(float(fps))
+
+        return deltas, recent_fps
+
+    async def record_events(self, events: List[EventData], metadata: Optional[Dict[str, Any]] = None):
+        """在接收路径上按批次原子地更新聚合"""
+        try:
+            client = await self.get_client()
+            deltas, recent_fps = self._build_deltas(events, metadata)
+            if not deltas:
+                return
+
+            ttl = self.ttl_seconds
+            now = utc_now()
+            first_covered_day = _day_key(now.date() + timedelta(days=1))
+            async with client.pipeline(transaction=True) as pipe:
+                last_seen: Dict[str, float] = {}
+                for (user_id, project_id, tool, day), delta in deltas.items():
+                    key = aggregate_key(user_id, project_id, tool, day)
+                    await self._update_script(keys=[key], args=delta.script_args(ttl), client=pipe)
+                    pipe.sadd(dims_key(user_id), f"{project_id}{DIM_SEPARATOR}{tool}")
+                    pipe.sadd(project_users_key(project_id), user_id)
+                    last_seen[user_id] = now.timestamp()
+                for user_id in last_seen:
+                    pipe.set(coverage_key(user_id), first_covered_day, nx=True)
+                for user_id, values in recent_fps.items():
+                    pipe.lpush(recent_fps_key(user_id), *values)
+                    pipe.ltrim(recent_fps_key(user_id), 0, 9)
+                pipe.zadd(ACTIVE_USERS_KEY, last_seen)
+                await pipe.execute()
+
+        except Exception as e:
+            self.logger.error(f"Failed to update aggregates: {e}")
+
+    async def get_user_totals(self, user_id: str, days: int, project_id: Optional[str] = None) -> Dict[str, float]:
+        """合并最近days天的聚合，结果为 字段 -> 数值；Redis不可用时返回空字典"""
+        try:
+            client = await self.get_client()
+            dims = await client.smembers(dims_key(user_id))
+            today = utc_now().date()
+            day_list = [today - timedelta(days=offset) for offset in range(days)]
+
+            async with client.pipeline(transaction=False) as pipe:
+                for dim in dims:
+                    dim_project, _, tool = dim.partition(DIM_SEPARATOR)
+                    if project_id is not None and dim_project != project_id:
+                        continue
+                    for day in day_list:
+                        pipe.hgetall(aggregate_key(user_id, dim_project, tool, day))
+                rows = await pipe.execute()
+
+        except Exception as e:
+            self.logger.error(f"Failed to read aggregates for user {user_id}: {e}")
+            return {}
+
+        totals: Dict[str, float] = {}
+        for row in rows:
+            if row:
+                _merge_totals(totals, row)
+        return totals
+
+    async def get_coverage_start(self, user_id: str) -> Optional[date]:
+        """用户聚合的覆盖起点，从未记录过时返回None"""
+        client = await self.get_client()
+        value = await client.get(coverage_key(user_id))
+        return _parse_day(value) if value else None
+
+    async def covers(self, user_id: str, days: int) -> bool:
+        """最近days天（含今天）是否都在聚合的覆盖范围和保留期内；Redis不可用时返回False"""
+        if days > settings.AGGREGATE_RETENTION_DAYS:
+            return False
+        try:
+            start = await self.get_coverage_start(user_id)
+        except Exception as e:
+            self.logger.error(f"Failed to read aggregate coverage for user {user_id}: {e}")
+            return False
+        return start is not None and start <= utc_now().date() - timedelta(days=days - 1)
+
+    async def get_user_projects(self, user_id: str) -> List[str]:
+        """用户有聚合数据的项目列表"""
+        client = await self.get_client()
+        dims = await client.smembers(dims_key(user_id))
+        return sorted({dim.partition(DIM_SEPARATOR)[0] for dim in dims})
+
+    async def get_recent_fps(self, user_id: str) -> List[float]:
+        client = await self.get_client()
+        values = await client.lrange(recent_fps_key(user_id), 0, 9)
+        return [float(value) for value in reversed(values)]
+
+    async def get_active_users(self, since: datetime) -> List[str]:
+        client = await self.get_client()
+        return await client.zrangebyscore(ACTIVE_USERS_KEY, since.timestamp(), "+inf")
+
+    async def get_user_events_accumulator(self, user_id: str, days: int) -> Optional[UserEventsAccumulator]:
+        """用聚合结果构造与 /raw-stats 相同口径的累加器，无数据或窗口超出覆盖范围时返回None"""
+        if not await self.covers(user_id, days):
+            return None
+        totals = await self.get_user_totals(user_id, days)
+        if not totals:
+            return None
+
+        accumulator = UserEventsAccumulator()
+        for field, value in totals.items():
+            kind, _, name = field.partition(":")
+            if kind == "events":
+                accumulator.event_distribution[name] = int(value)
+                accumulator.total_events += int(value)
+            elif kind == "interactions":
+                accumulator.interactions[name] = int(value)
+        accumulator.fps_sum = totals.get("fps:sum", 0.0)
+        accumulator.fps_count = int(totals.get("fps:count", 0))
+        accumulator.operation_time_sum = totals.get("op_time:sum", 0.0)
+        accumulator.operation_time_count = int(totals.get("op_time:count", 0))
+        accumulator.recent_fps.extend(await self.get_recent_fps(user_id))
+        return accumulator
+
+    async def get_recommendation_inputs(self, user_id: str, days: int) -> Optional[Tuple[Dict, Dict, Dict]]:
+        """返回 generate_recommendations 所需的 (行为, 效率, 错误) 分析，无数据或窗口超出覆盖范围时返回None"""
+        if not await self.covers(user_id, days):
+            return None
+        totals = await self.get_user_totals(user_id, days)
+        if not totals:
+            return None
+
+        interactions = sorted(
+            ((field.partition(":")[2], int(value)) for field, value in totals.items() if field.startswith("interactions:")),
+            key=lambda item: item[1],
+            reverse=True
+        )
+        behavior_analysis = {
+            "total_interactions": sum(count for _, count in interactions),
+            "most_used_actions": [{"action": action, "count": count} for action, count in interactions],
+            "interaction_distribution": dict(interactions)
+        }
+
+        annotation_count = int(totals.get(f"duration:{ANNOTATION_TYPE}:count", 0))
+        efficiency_analysis = {
+            "user_id": user_id,
+            "time_range": f"{days}d",
+            "annotation_count": annotation_count,
+            "total_time": totals.get(f"duration:{ANNOTATION_TYPE}:sum", 0.0),
+            "min_duration": totals.get(f"duration:{ANNOTATION_TYPE}:min"),
+            "max_duration": totals.get(f"duration:{ANNOTATION_TYPE}:max")
+        }
+
+        error_analysis = {
+            "error_count": int(totals.get(f"events:{ERROR_TYPE}", 0))
+        }
+        return behavior_analysis, efficiency_analysis, error_analysis
+
+    async def reconcile_user_day(self, influxdb_service, user_id: str, day: date):
+        """从InfluxDB重新计算某用户某天的聚合，覆盖Redis中可能漂移的值，并在相邻时下移覆盖起点；只能重算已结束的日期"""
+        if day > last_closed_day():
+            raise ValueError(f"Cannot reconcile {day}: the day is still receiving events")
+        start = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+        query, params = FluxQuery() \
+            .range(start=start, stop=start + timedelta(days=1)) \
+            .measurement(EVENTS_MEASUREMENT) \
+            .tag("user_id", user_id) \
+            .build()
+        columns = await influxdb_service.query_columns(query, params)
+
+        client = await self.get_client()
+        existing = await client.smembers(dims_key(user_id))
+        rows = _aggregate_columns(columns)
+
+        async with client.pipeline(transaction=True) as pipe:
+            for dim in existing:
+                dim_project, _, tool = dim.partition(DIM_SEPARATOR)
+                pipe.delete(aggregate_key(user_id, dim_project, tool, day))
+            for (project_id, tool), mapping in rows.items():
+                key = aggregate_key(user_id, project_id, tool, day)
+                pipe.hset(key, mapping=mapping)
+                pipe.expire(key, self.ttl_seconds)
+                pipe.sadd(dims_key(user_id), f"{project_id}{DIM_SEPARATOR}{tool}")
+                pipe.sadd(project_users_key(project_id), user_id)
+            await pipe.execute()
+
+        await self._lower_coverage_script(
+            keys=[coverage_key(user_id)], args=[_day_key(day + timedelta(days=1)), _day_key(day)]
+        )
+        return len(rows)
+
+
+    async def clear_user(self, user_id: str) -> int:
+        """
+        删除用户的全部增量聚合、最近帧率、覆盖起点以及在活跃用户和项目用户集合中的成员，返回删除的键数
+
+        按维度集合逐个删除各天的哈希，维度集合最后删除，中断后可以重新执行。
+        """
+        client = await self.get_client()
+        dims = await client.smembers(dims_key(user_id))
+        last_day = utc_now().date() + timedelta(days=1)
+        projects = set()
+        deleted = 0
+        for dim in sorted(dims):
+            project_id, _, tool = dim.partition(DIM_SEPARATOR)
+            projects.add(project_id)
+            async with client.pipeline(transaction=False) as pipe:
+                for offset in range(settings.AGGREGATE_RETENTION_DAYS + 2):
+                    pipe.delete(aggregate_key(user_id, project_id, tool, last_day - timedelta(days=offset)))
+                deleted += sum(await pipe.execute())
+
+        async with client.pipeline(transaction=True) as pipe:
+            for project_id in projects:
+                pipe.srem(project_users_key(project_id), user_id)
+            pipe.zrem(ACTIVE_USERS_KEY, user_id)
+            pipe.delete(recent_fps_key(user_id), coverage_key(user_id), dims_key(user_id))
+            replies = await pipe.execute()
+        return deleted + replies[-1]
+
+def _aggregate_columns(columns) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    """按 (project_id, tool) 从列式记录计算聚合字段"""
+    if len(columns) == 0:
+        return {}
+
+    project = columns.column("project_id").decode("unknown")
+    tool = columns.column("batch_tool").decode("")
+    tool = np.where(tool == "", columns.column("tool").decode("unknown"), tool)
+    event_type = columns.column("event_type").decode("unknown")
+    action = columns.column("action").decode("unknown")
+    field = columns.field.decode("")
+    value = columns.value
+
+    rows: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    group_keys = np.char.add(np.char.add(project.astype(str), DIM_SEPARATOR), tool.astype(str))
+    for group in np.unique(group_keys):
+        mask = group_keys == group
+        project_id, _, tool_name = str(group).partition(DIM_SEPARATOR)
+        mapping: Dict[str, Any] = {}
+
+        types, counts = np.unique(event_type[mask], return_counts=True)
+        for name, count in zip(types.tolist(), counts.tolist()):
+            mapping[f"events:{name}"] = count
+
+        interaction_mask = mask & (event_type == INTERACTION_TYPE)
+        actions, counts = np.unique(action[interaction_mask], return_counts=True)
+        for name, count in zip(actions.tolist(), counts.tolist()):
+            mapping[f"interactions:{name}"] = count
+
+        duration_mask = mask & (field == "duration")
+        for name in np.unique(event_type[duration_mask]).tolist():
+            durations = value[duration_mask & (event_type == name)]
+            durations = durations[~np.isnan(durations)]
+            if len(durations):
+                mapping[f"duration:{name}:sum"] = repr(float(durations.sum()))
+                mapping[f"duration:{name}:count"] = len(durations)
+                mapping[f"duration:{name}:min"] = repr(float(durations.min()))
+                mapping[f"duration:{name}:max"] = repr(float(durations.max()))
+
+        op_times = value[duration_mask & (event_type == INTERACTION_TYPE)]
+        op_times = op_times[(op_times >= 0) & (op_times <= 10000)]
+        if len(op_times):
+            mapping["op_time:sum"] = repr(float(op_times.sum()))
+            mapping["op_time:count"] = len(op_times)
+
+        fps = value[mask & (field == "fps") & (event_type == PERFORMANCE_TYPE)]
+        fps = fps[(fps >= 0) & (fps <= 200)]
+        if len(fps):
+            mapping["fps:sum"] = repr(float(fps.sum()))
+            mapping["fps:count"] = len(fps)
+
+        rows[(project_id, tool_name)] = mapping
+    return rows
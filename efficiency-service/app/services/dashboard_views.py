@@ -0,0 +1,195 @@
+from typing import List, Dict, Any, Optional
+from datetime import timedelta
+import logging
+
+from sqlalchemy import select, text, table, column, func, Date, Integer, Float, String, DateTime
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.database import AsyncSessionLocal
+from ..utils.timezone import utc_now
+
+logger = logging.getLogger(__name__)
+
+# 视图及其唯一索引由迁移创建（alembic/versions/0001_baseline_schema.py）
+DASHBOARD_VIEWS = ("mv_project_daily_metrics", "mv_user_project_daily_metrics", "mv_tool_daily_metrics")
+
+# 查询用的轻量表结构（不注册到 Base.metadata，避免自动生成迁移时把视图当成普通表）
+project_daily = table(
+    "mv_project_daily_metrics",
+    column("project_id", String), column("day", Date), column("metric_type", String),
+    column("event_count", Integer), column("user_count", Integer), column("task_count", Integer),
+    column("value_sum", Float), column("value_min", Float), column("value_max", Float),
+    column("last_activity", DateTime)
+)
+
+user_project_daily = table(
+    "mv_user_project_daily_metrics",
+    column("user_id", String), column("project_id", String), column("day", Date), column("metric_type", String),
+    column("event_count", Integer), column("task_count", Integer),
+    column("value_sum", Float), column("value_min", Float), column("value_max", Float),
+    column("last_activity", DateTime)
+)
+
+tool_daily = table(
+    "mv_tool_daily_metrics",
+    column("project_id", String), column("tool", String), column("day", Date), column("metric_type", String),
+    column("event_count", Integer), column("user_count", Integer),
+    column("value_sum", Float), column("value_min", Float), column("value_max", Float)
+)
+
+
+def _since(days: int):
+    return (utc_now() - timedelta(days=days - 1)).date()
+
+
+def _average(value_sum: Optional[float], count: Optional[int]) -> float:
+    return float(value_sum) / int(count) if count else 0.0
+
+
+async def refresh_dashboard_views(session: AsyncSession) -> List[str]:
+    """
+    刷新所有看板物化视图，返回刷新的视图名
+
+    已填充的视图使用 REFRESH ... CONCURRENTLY，刷新期间读请求不被阻塞；
+    尚未填充的视图只能先做一次普通刷新。
+    """
+    result = await session.execute(
+        text("SELECT matviewname, ispopulated FROM pg_matviews WHERE matviewname = ANY(:names)"),
+        {"names": list(DASHBOARD_VIEWS)}
+    )
+    populated = dict(result.all())
+
+    refreshed = []
+    for name in DASHBOARD_VIEWS:
+        if name not in populated:
+            logger.warning(f"Dashboard view {name} does not exist, skipping refresh")
+            continue
+        concurrently = "CONCURRENTLY " if populated[name] else ""
+        try:
+            await session.execute(text(f"REFRESH MATERIALIZED VIEW {concurrently}{name}"))
+            await session.commit()
+            refreshed.append(name)
+        except Exception as e:
+            await session.rollback()
+            logger.error(f"Failed to refresh dashboard view {name}: {e}")
+            raise
+    return refreshed
+
+
+async def get_project_daily(session: AsyncSession, project_id: str, days: int,
+                            metric_type: Optional[str] = None) -> List[Dict[str, Any]]:
+    """项目按天的指标汇总"""
+    query = select(project_daily)\
+        .where(project_daily.c.project_id == project_id, project_daily.c.day >= _since(days))\
+        .order_by(project_daily.c.day, project_daily.c.metric_type)
+    if metric_type:
+        query = query.where(project_daily.c.metric_type == metric_type)
+
+    result = await session.execute(query)
+    return [
+        {
+            "day": row.day.isoformat(),
+            "metric_type": row.metric_type,
+            "event_count": row.event_count,
+            "user_count": row.user_count,
+            "task_count": row.task_count,
+            "avg_value": _average(row.value_sum, row.event_count),
+            "min_value": row.value_min,
+            "max_value": row.value_max,
+            "last_activity": row.last_activity.isoformat() if row.last_activity else None
+        }
+        for row in result.all()
+    ]
+
+
+async def get_project_users(session: AsyncSession, project_id: str, days: int,
+                            metric_type: str = "annotation_time") -> List[Dict[str, Any]]:
+    """项目内每个用户在时间窗口内的汇总（按事件数降序）"""
+    event_count = func.sum(user_project_daily.c.event_count).label("event_count")
+    query = select(
+        user_project_daily.c.user_id,
+        event_count,
+        func.sum(user_project_daily.c.value_sum).label("value_sum"),
+        func.min(user_project_daily.c.value_min).label("value_min"),
+        func.max(user_project_daily.c.value_max).label("value_max"),
+        func.count().label("active_days"),
+        func.max(user_project_daily.c.last_activity).label("last_activity")
+    ).where(
+        user_project_daily.c.project_id == project_id,
+        user_project_daily.c.metric_type == metric_type,
+        user_project_daily.c.day >= _since(days)
+    ).group_by(user_project_daily.c.user_id)\
+        .order_by(event_count.desc(), user_project_daily.c.user_id)
+
+    result = await session.execute(query)
+    return [
+        {
+            "user_id": row.user_id,
+            "event_count": int(row.event_count),
+            "active_days": row.active_days,
+            "avg_value": _average(row.value_sum, row.event_count),
+            "min_value": row.value_min,
+            "max_value": row.value_max,
+            "last_activity": row.last_activity.isoformat() if row.last_activity else None
+        }
+        for row in result.all()
+    ]
+
+
+async def get_user_daily(session: AsyncSession, user_id: str, days: int,
+                         project_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """用户按天、按项目的指标汇总"""
+    query = select(user_project_daily)\
+        .where(user_project_daily.c.user_id == user_id, user_project_daily.c.day >= _since(days))\
+        .order_by(user_project_daily.c.day, user_project_daily.c.project_id, user_project_daily.c.metric_type)
+    if project_id:
+        query = query.where(user_project_daily.c.project_id == project_id)
+
+    result = await session.execute(query)
+    return [
+        {
+            "day": row.day.isoformat(),
+            "project_id": row.project_id,
+            "metric_type": row.metric_type,
+            "event_count": row.event_count,
+            "task_count": row.task_count,
+            "avg_value": _average(row.value_sum, row.event_count),
+            "min_value": row.value_min,
+            "max_value": row.value_max
+        }
+        for row in result.all()
+    ]
+
+
+async def get_project_tools(session: AsyncSession, project_id: str, days: int) -> List[Dict[str, Any]]:
+    """项目内各工具在时间窗口内的使用汇总"""
+    event_count = func.sum(tool_daily.c.event_count).label("event_count")
+    query = select(
+        tool_daily.c.tool,
+        tool_daily.c.metric_type,
+        event_count,
+        func.max(tool_daily.c.user_count).label("peak_daily_users"),
+        func.sum(tool_daily.c.value_sum).label("value_sum")
+    ).where(
+        tool_daily.c.project_id == project_id,
+        tool_daily.c.day >= _since(days)
+    ).group_by(tool_daily.c.tool, tool_daily.c.metric_type)\
+        .order_by(event_count.desc(), tool_daily.c.tool)
+
+    result = await session.execute(query)
+    return [
+        {
+            "tool": row.tool,
+            "metric_type": row.metric_type,
+            "event_count": int(row.event_count),
+            "peak_daily_users": row.peak_daily_users,
+            "avg_value": _average(row.value_sum, row.event_count)
+        }
+        for row in result.all()
+    ]
+
+
+async def refresh_all_dashboard_views() -> List[str]:
+    """刷新看板物化视图（供后台任务调用）"""
+    async with AsyncSessionLocal() as session:
+        return await refresh_dashboard_views(session)
@@ -0,0 +1,346 @@
+from typing import List, Dict, Any, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+import asyncio
+import logging
+import time
+
+from sqlalchemy import select, update, delete, func, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.config import settings
+from ..core.database import AsyncSessionLocal
+from ..models.efficiency_metrics import DeletionJob, UserStats, LearningCurveFit, EfficiencyMetrics
+from ..utils.timezone import utc_now
+from .influxdb_service import InfluxDBService
+from .aggregate_store import AggregateStore
+from .sketch_store import SketchStore
+from .sequence_store import SequenceStore
+from .recommendations import RecommendationStore
+from .ranking_index import RankingIndex
+from .sessionizer import ISSSessionizer
+from .idle_detector import IdleDetector
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+# 按顺序执行的步骤：先删派生的统计，再删明细，然后按时间段删 InfluxDB 中的原始数据，
+# 最后删 Redis 中按用户保存的状态（原始数据删完后再删，对账任务不会再从原始数据重建聚合）
+TABLE_STEPS = (
+    ("user_stats", UserStats),
+    ("learning_curve_fits", LearningCurveFit),
+    ("efficiency_metrics", EfficiencyMetrics),
+)
+INFLUXDB_STEP = "influxdb"
+REDIS_STEP = "redis"
+STEPS = tuple(name for name, _ in TABLE_STEPS) + (INFLUXDB_STEP, REDIS_STEP)
+DONE = "done"
+
+RUN_TASK_NAME = "app.tasks.deletions.run_deletion_job"
+
+
+def _now() -> datetime:
+    return utc_now().replace(tzinfo=None)
+
+
+def _aware(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc)
+
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def job_to_dict(job: DeletionJob) -> Dict[str, Any]:
+    """任务状态和进度；percent 按步骤平均，每个步骤按已删除量占开始时总量的比例计"""
+    progress = job.progress or {}
+    current = len(STEPS) if job.phase == DONE else STEPS.index(job.phase)
+    fractions = []
+    for index, step in enumerate(STEPS):
+        if index < current:
+            fractions.append(1.0)
+        elif index == current and progress.get(step, {}).get("total"):
+            fractions.append(min(1.0, progress[step]["done"] / progress[step]["total"]))
+        else:
+            fractions.append(0.0)
+
+    return {
+        "job_id": job.id,
+        "user_id": job.user_id,
+        "status": job.status,
+        "phase": job.phase,
+        "percent": round(sum(fractions) / len(STEPS) * 100, 1),
+        "steps": {step: progress.get(step) for step in STEPS},
+        "cutoff": _isoformat(job.cutoff),
+        "failures": job.failures,
+        "error": job.error,
+        "created_at": _isoformat(job.created_at),
+        "started_at": _isoformat(job.started_at),
+        "heartbeat_at": _isoformat(job.heartbeat_at),
+        "finished_at": _isoformat(job.finished_at)
+    }
+
+
+async def create_deletion_job(session: AsyncSession, user_id: str) -> Tuple[DeletionJob, bool]:
+    """
+    为用户创建删除任务，返回 (任务, 是否新建)
+
+    用户已有未结束（包括失败但还会重试）的任务时直接返回该任务；只删除任务创建之前写入的数据。
+    """
+    result = await session.execute(
+        select(DeletionJob)
+        .where(
+            DeletionJob.user_id == user_id,
+            or_(
+                DeletionJob.status.in_((PENDING, RUNNING)),
+                and_(DeletionJob.status == FAILED, DeletionJob.failures < settings.DELETION_JOB_MAX_FAILURES)
+            )
+        )
+        .order_by(DeletionJob.created_at)
+        .limit(1)
+    )
+    existing = result.scalar_one_or_none()
+    if existing is not None:
+        return existing, False
+
+    now = _now()
+    job = DeletionJob(
+        id=str(uuid4()),
+        user_id=user_id,
+        status=PENDING,
+        phase=STEPS[0],
+        progress={},
+        cutoff=now,
+        failures=0,
+        created_at=now
+    )
+    session.add(job)
+    await session.commit()
+    return job, True
+
+
+async def get_deletion_job(session: AsyncSession, job_id: str) -> Optional[DeletionJob]:
+    return await session.get(DeletionJob, job_id)
+
+
+async def list_deletion_jobs(session: AsyncSession, user_id: str, limit: int = 20) -> List[DeletionJob]:
+    result = await session.execute(
+        select(DeletionJob)
+        .where(DeletionJob.user_id == user_id)
+        .order_by(DeletionJob.created_at.desc())
+        .limit(limit)
+    )
+    return list(result.scalars().all())
+
+
+def _claimable():
+    """可以领取执行的任务：等待中、执行进程已失去心跳、失败但未用完重试次数"""
+    stale = _now() - timedelta(seconds=settings.DELETION_JOB_STALE_SECONDS)
+    return or_(
+        DeletionJob.status == PENDING,
+        and_(DeletionJob.status == RUNNING, DeletionJob.heartbeat_at < stale),
+        and_(DeletionJob.status == FAILED, DeletionJob.failures < settings.DELETION_JOB_MAX_FAILURES)
+    )
+
+
+async def find_resumable_jobs(session: AsyncSession) -> List[str]:
+    result = await session.execute(
+        select(DeletionJob.id).where(_claimable()).order_by(DeletionJob.created_at)
+    )
+    return list(result.scalars().all())
+
+
+async def enqueue_deletion_job(job_id: str) -> bool:
+    """提交后台执行；失败时任务保持 pending，由定期恢复任务重新提交"""
+    from ..celery_app import celery_app
+    try:
+        # 发布消息是同步网络调用，放到线程中执行；不重试、不订阅结果（进度从任务表读取），避免阻塞请求
+        await asyncio.to_thread(
+            celery_app.send_task, RUN_TASK_NAME, args=[job_id], retry=False, ignore_result=True
+        )
+        return True
+    except Exception as e:
+        logger.warning(f"Failed to enqueue deletion job {job_id}, it will be resumed later: {e}")
+        return False
+
+
+class DeletionJobRunner:
+    """
+    分块执行删除任务
+
+    PostgreSQL 每个事务最多删除 DELETION_CHUNK_SIZE 行，InfluxDB 每次删除 DELETION_INFLUX_SLICE_DAYS 天，
+    Redis 每次删除一类状态，删除和任务进度在同一事务中提交。进程中断后重新领取任务，从记录的步骤和时间位置继续，
+    重复执行某个分块不会产生副作用。
+    """
+
+    def __init__(self):
+        self.influxdb_service = InfluxDBService()
+        self.aggregate_store = AggregateStore()
+        self.sketch_store = SketchStore()
+        self.sequence_store = SequenceStore()
+        self.recommendation_store = RecommendationStore()
+        self.ranking_index = RankingIndex()
+        self.iss_sessionizer = ISSSessionizer()
+        self.idle_detector = IdleDetector()
+        # Redis 步骤按顺序逐类删除；排名需要从聚合的维度中取得项目，放在聚合之前
+        self.redis_targets = (
+            ("rankings", self._clear_rankings),
+            ("recommendations", self.recommendation_store.clear_user),
+            ("sequences", self.sequence_store.clear_user),
+            ("sketches", self.sketch_store.clear_user),
+            ("iss_sessions", self.iss_sessionizer.clear_user),
+            ("idle_last_seen", self.idle_detector.clear_user),
+            ("aggregates", self.aggregate_store.clear_user),
+        )
+        self.logger = logging.getLogger(__name__)
+
+    async def claim(self, session: AsyncSession, job_id: str) -> Optional[DeletionJob]:
+        """原子地把任务标记为 running，任务不可领取时返回 None"""
+        now = _now()
+        result = await session.execute(
+            update(DeletionJob)
+            .where(DeletionJob.id == job_id, _claimable())
+            .values(
+                status=RUNNING,
+                error=None,
+                heartbeat_at=now,
+                started_at=func.coalesce(DeletionJob.started_at, now)
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+        if result.rowcount == 0:
+            return None
+        return await session.get(DeletionJob, job_id, populate_existing=True)
+
+    def _update_progress(self, job: DeletionJob, step: str, **values):
+        progress = dict(job.progress or {})
+        progress[step] = {**progress.get(step, {}), **values}
+        job.progress = progress
+        job.heartbeat_at = _now()
+
+    async def _delete_table_chunk(self, session: AsyncSession, job: DeletionJob, step: str, model) -> bool:
+        """删除一个分块，返回该表是否已删完"""
+        conditions = [model.user_id == job.user_id]
+        if model is EfficiencyMetrics:
+            conditions.append(model.timestamp <= job.cutoff)
+
+        progress = (job.progress or {}).get(step, {})
+        if "total" not in progress:
+            total = await session.scalar(select(func.count()).select_from(model).where(*conditions))
+            progress = {"unit": "rows", "total": total, "done": 0}
+
+        chunk = select(model.id).where(*conditions).limit(settings.DELETION_CHUNK_SIZE).scalar_subquery()
+        result = await session.execute(
+            delete(model)
+            .where(model.id.in_(chunk), *conditions)
+            .execution_options(synchronize_session=False)
+        )
+        self._update_progress(job, step, **{**progress, "done": progress["done"] + result.rowcount})
+        await session.commit()
+        return result.rowcount < settings.DELETION_CHUNK_SIZE
+
+    async def _delete_influx_slice(self, session: AsyncSession, job: DeletionJob) -> bool:
+        """从 cutoff 向前删除一个时间段，返回是否已删到该用户最早的数据"""
+        if job.influx_cursor is None:
+            # 第一次执行时确定该用户最早的数据时间，据此切分时间段（不再受固定的一年范围限制）
+            earliest = await self.influxdb_service.earliest_user_time(job.user_id, _aware(job.cutoff))
+            floor = earliest.astimezone(timezone.utc).replace(tzinfo=None) if earliest else job.cutoff
+            step = timedelta(days=settings.DELETION_INFLUX_SLICE_DAYS)
+            job.influx_floor = floor
+            job.influx_cursor = job.cutoff
+            self._update_progress(job, INFLUXDB_STEP, unit="slices", total=-((floor - job.cutoff) // step), done=0)
+            await session.commit()
+
+        if job.influx_cursor <= job.influx_floor:
+            return True
+
+        start = max(job.influx_floor, job.influx_cursor - timedelta(days=settings.DELETION_INFLUX_SLICE_DAYS))
+        await self.influxdb_service.delete_user_range(job.user_id, _aware(start), _aware(job.influx_cursor))
+        job.influx_cursor = start
+        self._update_progress(job, INFLUXDB_STEP, done=job.progress[INFLUXDB_STEP]["done"] + 1)
+        await session.commit()
+        return start <= job.influx_floor
+
+    async def _clear_rankings(self, user_id: str) -> int:
+        return await self.ranking_index.clear_user(user_id, await self.aggregate_store.get_user_projects(user_id))
+
+    async def _delete_redis_target(self, session: AsyncSession, job: DeletionJob) -> bool:
+        """删除一类 Redis 状态，返回是否已全部删完"""
+        progress = (job.progress or {}).get(REDIS_STEP) \
+            or {"unit": "stores", "total": len(self.redis_targets), "done": 0, "keys": 0}
+        name, clear_user = self.redis_targets[progress["done"]]
+        deleted = await clear_user(job.user_id)
+        self.logger.info(f"Deletion job {job.id} removed {deleted} Redis keys/members of {name}")
+        self._update_progress(
+            job, REDIS_STEP, **{**progress, "done": progress["done"] + 1, "keys": progress["keys"] + deleted}
+        )
+        await session.commit()
+        return progress["done"] + 1 >= len(self.redis_targets)
+
+    async def _run_chunk(self, session: AsyncSession, job: DeletionJob) -> bool:
+        if job.phase == INFLUXDB_STEP:
+            return await self._delete_influx_slice(session, job)
+        if job.phase == REDIS_STEP:
+            return await self._delete_redis_target(session, job)
+        model = dict(TABLE_STEPS)[job.phase]
+        return await self._delete_table_chunk(session, job, job.phase, model)
+
+    async def run(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        执行任务直到完成或用完 DELETION_JOB_TIME_BUDGET，返回任务状态
+
+        用完时间预算时任务回到 pending，由调用方重新排队；任务已完成或正由其他进程执行时返回 None。
+        """
+        deadline = time.monotonic() + settings.DELETION_JOB_TIME_BUDGET
+        try:
+            async with AsyncSessionLocal() as session:
+                job = await self.claim(session, job_id)
+                if job is None:
+                    return None
+                self.logger.info(f"Running deletion job {job.id} for user {job.user_id} from step {job.phase}")
+
+                try:
+                    while job.phase != DONE:
+                        if await self._run_chunk(session, job):
+                            index = STEPS.index(job.phase) + 1
+                            job.phase = STEPS[index] if index < len(STEPS) else DONE
+                            job.heartbeat_at = _now()
+                            await session.commit()
+                        elif settings.DELETION_CHUNK_PAUSE > 0:
+                            await asyncio.sleep(settings.DELETION_CHUNK_PAUSE)
+
+                        # 每次至少执行一个分块，保证重新排队后总有进展
+                        if job.phase != DONE and time.monotonic() >= deadline:
+                            job.status = PENDING
+                            await session.commit()
+                            self.logger.info(f"Deletion job {job.id} paused at step {job.phase}, time budget used up")
+                            return job_to_dict(job)
+
+                    job.status = COMPLETED
+                    job.finished_at = _now()
+                    await session.commit()
+                    self.logger.info(f"Deletion job {job.id} for user {job.user_id} completed: {job.progress}")
+                    return job_to_dict(job)
+
+                except Exception as e:
+                    # 回滚会使 job 对象过期，用 UPDATE 记录失败状态；已提交的分块保留，重试时从断点继续
+                    await session.rollback()
+                    await session.execute(
+                        update(DeletionJob)
+                        .where(DeletionJob.id == job_id)
+                        .values(status=FAILED, failures=DeletionJob.failures + 1, error=str(e)[:2000], heartbeat_at=_now())
+                        .execution_options(synchronize_session=False)
+                    )
+                    await session.commit()
+                    self.logger.error(f"Deletion job {job_id} failed: {e}")
+                    raise
+        finally:
+            await self.influxdb_service.close()
+            for store in (self.aggregate_store, self.sketch_store, self.sequence_store, self.recommendation_store,
+                          self.ranking_index, self.iss_sessionizer, self.idle_detector):
+                await store.close()
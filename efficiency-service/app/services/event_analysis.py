@@ -0,0 +1,491 @@
+from typing import Dict, Any, Iterable, Optional
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+
+import numpy as np
+
+from .flux_columnar import Categorical, FluxColumns
+from .quantile_sketch import TDigest
+from .offload import cpu_bound
+
+
+def record_to_event(record, metadata_key: str = 'metadata') -> Dict[str, Any]:
+    """将FluxRecord转换为分析函数使用的事件字典"""
+    values = record.values
+    return {
+        'time': record.get_time(),
+        'field': record.get_field(),
+        'value': record.get_value(),
+        'event_type': values.get('event_type', 'unknown'),
+        'action': values.get('action', 'unknown'),
+        'tool': values.get('batch_tool', values.get('tool', 'unknown')),
+        metadata_key: values
+    }
+
+
+# 跟踪的未完成会话数上限，超出时丢弃最早开始的（一直没有完成的会话不会无限累积）
+_MAX_OPEN_SESSIONS = 10000
+
+
+class _RecentSessions:
+    """按开始顺序保留最近N个会话，同时跟踪仍未完成的会话（数量有上限）"""
+
+    def __init__(self, keep: int, max_open: int = _MAX_OPEN_SESSIONS):
+        self.keep = keep
+        self.max_open = max_open
+        self.open = OrderedDict()
+        self.recent = OrderedDict()
+
+    def start(self, session_id: str, session: Dict[str, Any]):
+        """登记会话开始，重新开始时覆盖之前的会话"""
+        self.open[session_id] = session
+        self.open.move_to_end(session_id)
+        while len(self.open) > self.max_open:
+            self.open.popitem(last=False)
+        self.recent[session_id] = session
+        while len(self.recent) > self.keep:
+            self.recent.popitem(last=False)
+
+    def complete(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """完成会话后不再占用活跃会话内存"""
+        return self.open.pop(session_id, None)
+
+    def values(self) -> list:
+        return list(self.recent.values())
+
+
+def _session_start(session: Dict[str, Any]) -> Optional[datetime]:
+    start_ms = session.get('start_time')
+    if start_ms is None:
+        return None
+    return datetime.fromtimestamp(start_ms / 1000, tz=timezone.utc)
+
+
+class UserEventsAccumulator:
+    """单次遍历的用户事件统计，内存与记录总数无关"""
+
+    def __init__(self):
+        self.total_events = 0
+        self.event_distribution = {}
+        self.interactions = {}
+        self.fps_sum = 0.0
+        self.fps_count = 0
+        self.recent_fps = deque(maxlen=10)
+        self.operation_time_sum = 0.0
+        self.operation_time_count = 0
+
+    def add(self, event: Dict[str, Any]):
+        self.total_events += 1
+        event_type = event['event_type']
+        self.event_distribution[event_type] = self.event_distribution.get(event_type, 0) + 1
+
+        if event_type == 'EventType.USER_INTERACTION':
+            action = event['action']
+            self.interactions[action] = self.interactions.get(action, 0) + 1
+
+            # 操作时间统计
+            if event['field'] == 'duration':
+                try:
+                    duration = float(event['value'])
+                    if 0 <= duration <= 10000:  # 合理的操作时间范围
+                        self.operation_time_sum += duration
+                        self.operation_time_count += 1
+                except (ValueError, TypeError):
+                    pass
+
+        # 性能数据收集
+        elif event_type == 'EventType.PERFORMANCE' and event['field'] == 'fps':
+            try:
+                fps_value = float(event['value'])
+                if 0 <= fps_value <= 200:  # 合理的FPS范围
+                    self.fps_sum += fps_value
+                    self.fps_count += 1
+                    self.recent_fps.append(fps_value)
+            except (ValueError, TypeError):
+                pass
+
+    def consume(self, events: Iterable[Dict[str, Any]]) -> 'UserEventsAccumulator':
+        for event in events:
+            self.add(event)
+        return self
+
+    def add_columns(self, columns: FluxColumns) -> 'UserEventsAccumulator':
+        """向量化地累加列式记录，结果与逐条调用 add 完全一致"""
+        if len(columns) == 0:
+            return self
+
+        event_type = columns.column('event_type')
+        field = columns.field
+        values = columns.value
+        self.total_events += len(columns)
+        _add_counts(self.event_distribution, event_type, 'unknown')
+
+        interaction_mask = event_type.eq('EventType.USER_INTERACTION')
+        _add_counts(self.interactions, columns.column('action').take(interaction_mask), 'unknown')
+
+        # 操作时间统计：合理的操作时间范围
+        durations = values[interaction_mask & field.eq('duration')]
+        durations = durations[(durations >= 0) & (durations <= 10000)]
+        self.operation_time_sum = _sequential_sum(self.operation_time_sum, durations)
+        self.operation_time_count += len(durations)
+
+        # 性能数据收集：合理的FPS范围
+        fps_values = values[event_type.eq('EventType.PERFORMANCE') & field.eq('fps')]
+        fps_values = fps_values[(fps_values >= 0) & (fps_values <= 200)]
+        self.fps_sum = _sequential_sum(self.fps_sum, fps_values)
+        self.fps_count += len(fps_values)
+        self.recent_fps.extend(fps_values[-self.recent_fps.maxlen:].tolist())
+        return self
+
+    def merge(self, other: 'UserEventsAccumulator') -> 'UserEventsAccumulator':
+        """合并时间上在后的另一段统计"""
+        self.total_events += other.total_events
+        for event_type, count in other.event_distribution.items():
+            self.event_distribution[event_type] = self.event_distribution.get(event_type, 0) + count
+        for action, count in other.interactions.items():
+            self.interactions[action] = self.interactions.get(action, 0) + count
+        self.fps_sum += other.fps_sum
+        self.fps_count += other.fps_count
+        self.recent_fps.extend(other.recent_fps)
+        self.operation_time_sum += other.operation_time_sum
+        self.operation_time_count += other.operation_time_count
+        return self
+
+    @property
+    def avg_fps(self) -> Optional[float]:
+        return self.fps_sum / self.fps_count if self.fps_count else None
+
+    @property
+    def avg_operation_time(self) -> Optional[float]:
+        return self.operation_time_sum / self.operation_time_count if self.operation_time_count else None
+
+
+@cpu_bound("user_events", min_rows=1000000, columns=("event_type", "_field", "action"))
+def accumulate_user_columns(columns: FluxColumns) -> UserEventsAccumulator:
+    """对一段列式记录做用户事件统计（可在子进程中执行）"""
+    return UserEventsAccumulator().add_columns(columns)
+
+
+def _add_counts(counts: Dict[str, int], column: Categorical, default: str):
+    """按首次出现顺序累加各取值的出现次数，与逐条累加的字典顺序一致"""
+    codes = column.codes
+    if len(codes) == 0:
+        return
+    # 缺失值(-1)移到最后一个编码
+    shifted = np.where(codes < 0, len(column.categories), codes)
+    occurrences = np.bincount(shifted, minlength=len(column.categories) + 1)
+    present = np.flatnonzero(occurrences)
+    # 重复下标赋值时最后一次生效，倒序赋值即得到首次出现位置
+    first_seen = np.full(len(occurrences), len(codes))
+    first_seen[shifted[::-1]] = np.arange(len(codes))[::-1]
+    labels = column.categories + [default]
+    for code in present[np.argsort(first_seen[present], kind='stable')].tolist():
+        label = labels[code]
+        counts[label] = counts.get(label, 0) + int(occurrences[code])
+
+
+def _sequential_sum(start: float, values: np.ndarray) -> float:
+    """按顺序累加（与Python逐个相加的舍入一致），np.sum的成对求和结果可能不同"""
+    if len(values) == 0:
+        return start
+    return float(np.cumsum(np.concatenate(([start], values)))[-1])
+
+
+class DurationStats:
+    """时长的增量统计：均值/极值/最近10个值，中位数由t-digest估计，内存与数量无关"""
+
+    def __init__(self, recent: int = 10):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.recent = deque(maxlen=recent)
+        self.sketch = TDigest()
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.recent.append(value)
+        self.sketch.add(value)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0
+
+    def median(self) -> float:
+        return self.sketch.quantile(0.5) if self.count else 0
+
+
+class PolygonAnnotationAccumulator:
+    """多边形标注时间的增量分析，只保存活跃会话"""
+
+    def __init__(self, recent_sessions: int = 5):
+        self.sessions = _RecentSessions(recent_sessions)
+        self.durations = DurationStats()
+        self.completed_polygons = 0
+        self.incomplete_polygons = 0
+
+    def add(self, event: Dict[str, Any]):
+        metadata = event.get('metadata', {})
+        action = event.get('action', '')
+
+        # 检查是否是多边形级别的事件
+        if metadata.get('toolType') != 'iss' or metadata.get('level') != 'polygon':
+            return
+
+        session_id = metadata.get('polygonSessionId')
+        if not session_id:
+            return
+
+        if action == 'start':
+            self.sessions.start(session_id, {
+                'start_time': event['time'],
+                'point_count': 0,
+                'area': 0
+            })
+        elif action == 'complete' and event['field'] == 'duration':
+            session = self.sessions.complete(session_id)
+            if session is None:
+                return
+            duration = float(event['value'])
+            self.durations.add(duration)
+            self.completed_polygons += 1
+
+            # 更新会话信息
+            session.update({
+                'duration': duration,
+                'point_count': metadata.get('pointCount', 0),
+                'area': metadata.get('area', 0),
+                'points_per_second': metadata.get('pointsPerSecond', 0),
+                'area_per_second': metadata.get('areaPerSecond', 0)
+            })
+        elif action == 'delete':
+            self.incomplete_polygons += 1
+
+    def add_session(self, session: Dict[str, Any]):
+        """累加接收时重建的多边形会话记录"""
+        status = session.get('status')
+        if status == 'cancelled':
+            self.incomplete_polygons += 1
+            return
+        if status != 'completed' or session.get('duration') is None:
+            return
+
+        duration = float(session['duration'])
+        self.durations.add(duration)
+        self.completed_polygons += 1
+        self.sessions.start(session['session_id'], {
+            'start_time': _session_start(session),
+            'duration': duration,
+            'point_count': int(session.get('point_count', 0)),
+            'area': session.get('area', 0),
+            'points_per_second': session.get('points_per_second', 0),
+            'area_per_second': session.get('area_per_second', 0)
+        })
+        self.sessions.complete(session['session_id'])
+
+    def consume(self, events: Iterable[Dict[str, Any]]) -> 'PolygonAnnotationAccumulator':
+        for event in events:
+            self.add(event)
+        return self
+
+    def result(self) -> Dict[str, Any]:
+        durations = self.durations
+        if durations.count:
+            avg_duration = durations.mean
+            min_duration = durations.min
+            max_duration = durations.max
+            median_duration = durations.median()
+        else:
+            avg_duration = min_duration = max_duration = median_duration = 0
+
+        completed = self.completed_polygons
+        return {
+            'total_completed_polygons': completed,
+            'total_incomplete_polygons': self.incomplete_polygons,
+            'completion_rate': completed / max(completed + self.incomplete_polygons, 1) * 100,
+            'average_duration_ms': avg_duration,
+            'min_duration_ms': min_duration,
+            'max_duration_ms': max_duration,
+            'median_duration_ms': median_duration,
+            'duration_distribution': list(durations.recent),
+            'recent_sessions': self.sessions.values()
+        }
+
+
+class FrameAnnotationAccumulator:
+    """帧级别标注时间的增量分析，只保存活跃会话"""
+
+    def __init__(self, recent_sessions: int = 3):
+        self.sessions = _RecentSessions(recent_sessions)
+        self.durations = DurationStats()
+        self.total_frames = 0
+        self.total_polygons = 0
+
+    def add(self, event: Dict[str, Any]):
+        metadata = event.get('metadata', {})
+        action = event.get('action', '')
+
+        # 检查是否是帧级别的事件
+        if metadata.get('toolType') != 'iss' or metadata.get('level') != 'frame':
+            return
+
+        session_id = metadata.get('frameSessionId')
+        if not session_id:
+            return
+
+        if action == 'start':
+            self.sessions.start(session_id, {
+                'start_time': event['time'],
+                'polygon_count': 0,
+                'total_idle_time': 0,
+                'efficiency_ratio': 0
+            })
+        elif action == 'complete' and event['field'] == 'duration':
+            # 只在会话从进行中变为完成时计数，重新开始的帧不会因开始事件被重复计入
+            session = self.sessions.complete(session_id)
+            if session is None:
+                return
+            duration = float(event['value'])
+            self.durations.add(duration)
+            self.total_frames += 1
+
+            # 更新帧会话信息
+            session.update({
+                'duration': duration,
+                'polygon_count': metadata.get('polygonCount', 0),
+                'total_idle_time': metadata.get('totalIdleTime', 0),
+                'active_time': metadata.get('activeTime', 0),
+                'efficiency_ratio': metadata.get('efficiencyRatio', 0),
+                'avg_polygon_duration': metadata.get('averagePolygonDuration', 0)
+            })
+            self.total_polygons += session['polygon_count']
+
+    def add_session(self, session: Dict[str, Any]):
+        """累加接收时重建的帧会话记录，与逐条事件一致只计入已完成的帧"""
+        if session.get('status') != 'completed' or session.get('duration') is None:
+            return
+
+        duration = float(session['duration'])
+        self.durations.add(duration)
+        self.total_frames += 1
+        polygon_count = int(session.get('polygon_count', 0))
+        self.total_polygons += polygon_count
+        self.sessions.start(session['session_id'], {
+            'start_time': _session_start(session),
+            'duration': duration,
+            'polygon_count': polygon_count,
+            'total_idle_time': session.get('total_idle_time', 0),
+            'active_time': session.get('active_time', 0),
+            'efficiency_ratio': session.get('efficiency_ratio', 0),
+            'avg_polygon_duration': session.get('avg_polygon_duration', 0)
+        })
+        self.sessions.complete(session['session_id'])
+
+    def consume(self, events: Iterable[Dict[str, Any]]) -> 'FrameAnnotationAccumulator':
+        for event in events:
+            self.add(event)
+        return self
+
+    def result(self) -> Dict[str, Any]:
+        durations = self.durations
+        if durations.count:
+            avg_frame_duration = durations.mean
+            min_frame_duration = durations.min
+            max_frame_duration = durations.max
+        else:
+            avg_frame_duration = min_frame_duration = max_frame_duration = 0
+
+        return {
+            'total_frames_analyzed': self.total_frames,
+            'total_polygons_in_frames': self.total_polygons,
+            'average_polygons_per_frame': self.total_polygons / max(self.total_frames, 1),
+            'average_frame_duration_ms': avg_frame_duration,
+            'min_frame_duration_ms': min_frame_duration,
+            'max_frame_duration_ms': max_frame_duration,
+            'frame_duration_distribution': list(durations.recent),
+            'recent_frame_sessions': self.sessions.values()
+        }
+
+
+class IdleTimeAccumulator:
+    """用户空闲时间的增量分析"""
+
+    def __init__(self):
+        self.idle_periods = DurationStats()
+        self.total_idle_time = 0
+
+    def add(self, event: Dict[str, Any]):
+        if event.get('action', '') == 'idle_end' and event['field'] == 'duration':
+            idle_duration = float(event['value'])
+            self.idle_periods.add(idle_duration)
+            self.total_idle_time += idle_duration
+
+    def add_interval(self, duration: float):
+        """累加服务端检测到的空闲区间"""
+        self.idle_periods.add(float(duration))
+        self.total_idle_time += duration
+
+    def consume(self, events: Iterable[Dict[str, Any]]) -> 'IdleTimeAccumulator':
+        for event in events:
+            self.add(event)
+        return self
+
+    def result(self) -> Dict[str, Any]:
+        idle_periods = self.idle_periods
+        if idle_periods.count:
+            avg_idle_duration = idle_periods.mean
+            min_idle_duration = idle_periods.min
+            max_idle_duration = idle_periods.max
+            median_idle_duration = idle_periods.median()
+        else:
+            avg_idle_duration = min_idle_duration = max_idle_duration = median_idle_duration = 0
+
+        # 计算空闲频率
+        idle_frequency = idle_periods.count  # 空闲次数
+
+        return {
+            'total_idle_periods': idle_frequency,
+            'total_idle_time_ms': self.total_idle_time,
+            'average_idle_duration_ms': avg_idle_duration,
+            'min_idle_duration_ms': min_idle_duration,
+            'max_idle_duration_ms': max_idle_duration,
+            'median_idle_duration_ms': median_idle_duration,
+            'idle_frequency_per_hour': idle_frequency / max(30 * 24, 1),  # 每小时空闲次数（假设30天）
+            'recent_idle_periods': list(idle_periods.recent)
+        }
+
+
+class ISSAnnotationAccumulator:
+    """按事件类型分发到各ISS分析器，支持逐条流式输入"""
+
+    def __init__(self):
+        self.total_events = 0
+        self.polygon = PolygonAnnotationAccumulator()
+        self.frame = FrameAnnotationAccumulator()
+        self.idle = IdleTimeAccumulator()
+
+    def add(self, event: Dict[str, Any]):
+        self.total_events += 1
+        event_type = event['event_type']
+        if event_type == 'EventType.ANNOTATION':
+            self.polygon.add(event)
+            self.frame.add(event)
+        elif event_type == 'EventType.USER_INTERACTION':
+            self.idle.add(event)
+
+    def add_session(self, session: Dict[str, Any]):
+        """按级别分发会话记录"""
+        self.total_events += 1
+        level = session.get('level')
+        if level == 'polygon':
+            self.polygon.add_session(session)
+        elif level == 'frame':
+            self.frame.add_session(session)
+
+    def consume(self, events: Iterable[Dict[str, Any]]) -> 'ISSAnnotationAccumulator':
+        for event in events:
+            self.add(event)
+        return self
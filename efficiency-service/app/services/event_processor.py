@@ -1,11 +1,13 @@
 from typing import List, Dict, Any, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, delete
+from sqlalchemy import select, update, func, literal_column
+from sqlalchemy.dialects.postgresql import aggregate_order_by
 import logging
 from datetime import datetime, timedelta
 from datetime import timezone
 
 from ..schemas.event import EventData, EventType
+from ..core.config import settings
 from ..models.efficiency_metrics import EfficiencyMetrics, UserStats, ProjectStats
 from ..utils.timezone import utc_now
 
@@ -187,70 +189,77 @@ class EventProcessor:
             self.logger.error(f"Failed to update efficiency metrics: {e}")
             raise
     
-    async def get_user_statistics(self, session: AsyncSession, user_id: str) -> Dict[str, Any]:
-        """获取用户统计信息"""
+    async def get_user_statistics(self, session: AsyncSession, user_id: str,
+                                  limit: Optional[int] = None, after: Optional[str] = None) -> Dict[str, Any]:
+        """
+        获取用户统计信息
+
+        汇总和项目明细在一条 SQL 中完成：汇总覆盖用户的全部项目，平均标注时间按标注数加权；
+        项目明细按 project_id 做键集分页（after 为上一页最后一个 project_id），以 json_agg 返回。
+        """
+        limit = limit or settings.USER_STATS_PAGE_SIZE
         try:
-            # 使用正确的字段名称进行查询
+            conditions = [UserStats.user_id == user_id]
+            if after is not None:
+                conditions.append(UserStats.project_id > after)
+
+            # 多取一条用于判断是否还有下一页
+            page = select(
+                UserStats.project_id,
+                UserStats.total_annotations,
+                UserStats.total_time_spent,
+                UserStats.avg_annotation_time,
+                UserStats.last_activity
+            ).where(*conditions).order_by(UserStats.project_id).limit(limit + 1).cte("page")
+
+            projects = select(
+                func.coalesce(
+                    func.json_agg(aggregate_order_by(
+                        func.json_build_object(
+                            "project_id", page.c.project_id,
+                            "total_annotations", page.c.total_annotations,
+                            "total_time", page.c.total_time_spent,
+                            "avg_annotation_time", page.c.avg_annotation_time,
+                            "last_activity", page.c.last_activity
+                        ),
+                        page.c.project_id
+                    )),
+                    literal_column("'[]'::json")
+                )
+            ).scalar_subquery()
+
+            total_annotations = func.coalesce(func.sum(UserStats.total_annotations), 0)
             result = await session.execute(
                 select(
-                    UserStats.id,
-                    UserStats.user_id,
-                    UserStats.project_id,
-                    UserStats.total_annotations,
-                    UserStats.total_time_spent,
-                    UserStats.avg_annotation_time,
-                    UserStats.projects_count,
-                    UserStats.created_at,
-                    UserStats.updated_at,
-                    UserStats.last_activity
+                    func.count(UserStats.id).label("project_rows"),
+                    total_annotations.label("total_annotations"),
+                    func.coalesce(func.sum(UserStats.total_time_spent), 0).label("total_time"),
+                    (
+                        func.sum(UserStats.avg_annotation_time * UserStats.total_annotations)
+                        / func.nullif(total_annotations, 0)
+                    ).label("avg_annotation_time"),
+                    func.coalesce(func.sum(UserStats.projects_count), 0).label("projects_count"),
+                    projects.label("projects")
                 ).where(UserStats.user_id == user_id)
             )
-            user_stats = result.all()
+            row = result.one()
             
-            if not user_stats:
+            if not row.project_rows:
                 return {"message": "No statistics found for user"}
             
-            total_stats = {
+            project_page = row.projects[:limit]
+            has_more = len(row.projects) > limit
+            return {
                 "user_id": user_id,
-                "total_annotations": sum(s.total_annotations for s in user_stats),
-                "total_time": sum(s.total_time_spent for s in user_stats),
-                "avg_annotation_time": sum(s.avg_annotation_time for s in user_stats) / len(user_stats),
-                "projects_count": sum(s.projects_count for s in user_stats),
-                "projects": []
+                "total_annotations": row.total_annotations,
+                "total_time": row.total_time,
+                "avg_annotation_time": row.avg_annotation_time or 0.0,
+                "projects_count": row.projects_count,
+                "projects": project_page,
+                "has_more": has_more,
+                "next_cursor": project_page[-1]["project_id"] if has_more else None
             }
-            
-            for stats in user_stats:
-                total_stats["projects"].append({
-                    "project_id": stats.project_id,
-                    "total_annotations": stats.total_annotations,
-                    "total_time": stats.total_time_spent,
-                    "avg_annotation_time": stats.avg_annotation_time,
-                    "last_activity": stats.last_activity.isoformat() if stats.last_activity else None
-                })
-            
-            return total_stats
         
         except Exception as e:
             self.logger.error(f"Failed to get user statistics: {e}")
             raise
-    
-    async def clear_user_events(self, session: AsyncSession, user_id: str):
-        """清除用户事件数据"""
-        try:
-            # 删除用户统计
-            await session.execute(
-                delete(UserStats).where(UserStats.user_id == user_id)
-            )
-            
-            # 删除用户的效率指标
-            await session.execute(
-                delete(EfficiencyMetrics).where(EfficiencyMetrics.user_id == user_id)
-            )
-            
-            await session.commit()
-            self.logger.info(f"Cleared events for user {user_id}")
-        
-        except Exception as e:
-            await session.rollback()
-            self.logger.error(f"Failed to clear user events: {e}")
-            raise 
\ No newline at end of file
@@ -0,0 +1,241 @@
+from typing import List, Dict, Optional, Iterable
+from datetime import datetime, timezone
+import csv
+import io
+
+import numpy as np
+
+# Flux结果中的非标签列
+SYSTEM_COLUMNS = {"", "result", "table", "_start", "_stop", "_time", "_value", "_field", "_measurement"}
+
+NULL_CODE = -1
+
+
+class Categorical:
+    """字典编码的字符串列：codes为int32，-1表示缺失"""
+
+    __slots__ = ("codes", "categories", "_lookup")
+
+    def __init__(self, codes: np.ndarray, categories: List[str]):
+        self.codes = codes
+        self.categories = categories
+        self._lookup = {value: code for code, value in enumerate(categories)}
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __reduce__(self):
+        # 序列化时只传编码数组与字典，查找表在接收端重建
+        return Categorical, (self.codes, self.categories)
+
+    def code_of(self, value: str) -> int:
+        return self._lookup.get(value, NULL_CODE - 1)
+
+    def eq(self, value: str) -> np.ndarray:
+        """返回等于value的布尔掩码"""
+        return self.codes == self.code_of(value)
+
+    def isin(self, values: Iterable[str]) -> np.ndarray:
+        codes = [self._lookup[v] for v in values if v in self._lookup]
+        return np.isin(self.codes, codes)
+
+    def take(self, index) -> 'Categorical':
+        return Categorical(self.codes[index], self.categories)
+
+    def decode(self, default: Optional[str] = None) -> np.ndarray:
+        """还原为object数组，缺失值用default填充"""
+        lookup = np.array(self.categories + [default], dtype=object)
+        return lookup[self.codes]
+
+
+class _DictEncoder:
+    """解析时逐值做字典编码"""
+
+    __slots__ = ("codes", "lookup")
+
+    def __init__(self, prefill: int = 0):
+        self.codes = [NULL_CODE] * prefill
+        self.lookup = {}
+
+    def append(self, value: str):
+        if value == "":
+            self.codes.append(NULL_CODE)
+            return
+        code = self.lookup.get(value)
+        if code is None:
+            code = self.lookup[value] = len(self.lookup)
+        self.codes.append(code)
+
+    def finish(self) -> Categorical:
+        return Categorical(np.array(self.codes, dtype=np.int32), list(self.lookup))
+
+
+class FluxColumns:
+    """列式Flux查询结果：time为int64纳秒，value为float64，字符串列为字典编码"""
+
+    def __init__(self, time: np.ndarray, value: np.ndarray, columns: Dict[str, Categorical]):
+        self.time = time
+        self.value = value
+        self.columns = columns
+
+    def __len__(self) -> int:
+        return len(self.value)
+
+    @property
+    def field(self) -> Categorical:
+        return self.column("_field")
+
+    @property
+    def measurement(self) -> Categorical:
+        return self.column("_measurement")
+
+    @property
+    def tags(self) -> Dict[str, Categorical]:
+        return {name: col for name, col in self.columns.items() if name not in SYSTEM_COLUMNS}
+
+    def column(self, name: str) -> Categorical:
+        """获取字符串列，不存在时返回全缺失列"""
+        col = self.columns.get(name)
+        if col is None:
+            col = Categorical(np.full(len(self), NULL_CODE, dtype=np.int32), [])
+        return col
+
+    def select(self, names: Iterable[str]) -> 'FluxColumns':
+        """只保留指定的字符串列（_field / _measurement 等系统列同样按名称选择）"""
+        return FluxColumns(self.time, self.value, {name: self.columns[name] for name in names if name in self.columns})
+
+    def take(self, index) -> 'FluxColumns':
+        """按掩码或下标选取行"""
+        return FluxColumns(
+            self.time[index],
+            self.value[index],
+            {name: col.take(index) for name, col in self.columns.items()}
+        )
+
+    @classmethod
+    def empty(cls) -> 'FluxColumns':
+        return cls(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64), {})
+
+
+def concat_columns(parts: List[FluxColumns]) -> FluxColumns:
+    """按顺序拼接多个查询结果，字符串列重新合并字典"""
+    parts = [part for part in parts if part is not None and len(part)]
+    if not parts:
+        return FluxColumns.empty()
+    if len(parts) == 1:
+        return parts[0]
+
+    names: Dict[str, None] = {}
+    for part in parts:
+        names.update(dict.fromkeys(part.columns))
+
+    columns = {}
+    for name in names:
+        lookup: Dict[str, int] = {}
+        codes = []
+        for part in parts:
+            col = part.column(name)
+            # 末尾追加NULL_CODE，使缺失值(-1)映射后仍为缺失
+            remap = np.array([lookup.setdefault(value, len(lookup)) for value in col.categories] + [NULL_CODE],
+                             dtype=np.int32)
+            codes.append(remap[col.codes])
+        columns[name] = Categorical(np.concatenate(codes), list(lookup))
+
+    return FluxColumns(
+        np.concatenate([part.time for part in parts]),
+        np.concatenate([part.value for part in parts]),
+        columns
+    )
+
+
+def ns_to_datetime(ns: int) -> datetime:
+    """int64纳秒时间戳转UTC datetime（精度到微秒）"""
+    seconds, remainder = divmod(int(ns), 1_000_000_000)
+    return datetime.fromtimestamp(seconds, tz=timezone.utc).replace(microsecond=remainder // 1000)
+
+
+def _parse_times(raw: List[str]) -> np.ndarray:
+    # numpy不接受带时区后缀的字符串，Flux始终返回UTC
+    stripped = [value[:-1] if value.endswith("Z") else value for value in raw]
+    return np.array(stripped, dtype="datetime64[ns]").view(np.int64)
+
+
+def _parse_values(raw: List[str]) -> np.ndarray:
+    try:
+        return np.array(raw, dtype=np.float64)
+    except ValueError:
+        pass
+
+    values = np.empty(len(raw), dtype=np.float64)
+    for i, value in enumerate(raw):
+        if value == "true":
+            values[i] = 1.0
+        elif value == "false":
+            values[i] = 0.0
+        else:
+            try:
+                values[i] = float(value)
+            except ValueError:
+                values[i] = np.nan
+    return values
+
+
+def decode_annotated_csv(text: str) -> FluxColumns:
+    """将Flux注解CSV直接解码为列式数组，不创建FluxRecord"""
+    times: List[str] = []
+    values: List[str] = []
+    encoders: Dict[str, _DictEncoder] = {}
+    row_count = 0
+
+    header = None
+    error_table = False
+    time_index = value_index = None
+    positions: List[tuple] = []
+    absent: List[_DictEncoder] = []
+
+    for row in csv.reader(io.StringIO(text)):
+        # 空行或注解行表示新表开始
+        if not row or (len(row) == 1 and not row[0]):
+            header = None
+            continue
+        if row[0].startswith("#"):
+            header = None
+            continue
+
+        if header is None:
+            header = row
+            error_table = "error" in header and "reference" in header
+            if error_table:
+                continue
+            time_index = header.index("_time") if "_time" in header else None
+            value_index = header.index("_value") if "_value" in header else None
+            positions = []
+            for index, name in enumerate(header):
+                if name in ("", "result", "table", "_start", "_stop", "_time", "_value"):
+                    continue
+                if name not in encoders:
+                    encoders[name] = _DictEncoder(prefill=row_count)
+                positions.append((encoders[name], index))
+            present = set(header)
+            absent = [encoder for name, encoder in encoders.items() if name not in present]
+            continue
+
+        if error_table:
+            raise RuntimeError(f"Flux query error: {row[header.index('error')]}")
+
+        times.append(row[time_index] if time_index is not None else "")
+        values.append(row[value_index] if value_index is not None else "")
+        for encoder, index in positions:
+            encoder.append(row[index])
+        for encoder in absent:
+            encoder.codes.append(NULL_CODE)
+        row_count += 1
+
+    if row_count == 0:
+        return FluxColumns.empty()
+
+    return FluxColumns(
+        _parse_times(times),
+        _parse_values(values),
+        {name: encoder.finish() for name, encoder in encoders.items()}
+    )
@@ -0,0 +1,143 @@
+from typing import List, Dict, Any, Optional, Tuple, Union, Iterable
+from datetime import datetime, timedelta
+from functools import lru_cache
+import re
+
+from ..core.config import settings
+
+_DURATION_UNITS = {
+    "s": timedelta(seconds=1),
+    "m": timedelta(minutes=1),
+    "h": timedelta(hours=1),
+    "d": timedelta(days=1),
+    "w": timedelta(weeks=1),
+}
+_DURATION_PATTERN = re.compile(r"^(\d+)([smhdw])$")
+_IDENTIFIER_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def parse_duration(value: str) -> timedelta:
+    """解析 1h / 6h / 1d / 1w 形式的时间间隔"""
+    match = _DURATION_PATTERN.match(value.strip()) if isinstance(value, str) else None
+    if not match:
+        raise ValueError(f"Invalid duration: {value!r}")
+    return int(match.group(1)) * _DURATION_UNITS[match.group(2)]
+
+
+def flux_string(value: str) -> str:
+    """生成Flux字符串字面量，仅用于代码内的常量"""
+    escaped = value.replace("\\", "\\\\").replace('"', '\\"').replace("${", "\\${")
+    return f'"{escaped}"'
+
+
+def _column(name: str) -> str:
+    return f"r[{flux_string(name)}]"
+
+
+class FluxQuery:
+    """
+    Flux查询构建器
+
+    过滤条件固定按 range → _measurement → 标签 → _field 的顺序输出，便于存储层下推；
+    用户输入全部通过客户端 params 绑定（以 extern option 形式传入，查询中按 p_ 前缀标识符引用），
+    查询文本只取决于查询结构，可按结构缓存。
+    """
+
+    def __init__(self, bucket: Optional[str] = None):
+        self._params: Dict[str, Any] = {"p_bucket": bucket or settings.INFLUXDB_BUCKET}
+        self._bound = 0
+        self._has_stop = False
+        self._measurement: Optional[str] = None
+        self._tags: List[Tuple[str, int, int]] = []
+        self._fields: Tuple[str, ...] = ()
+        self._pipes: List[Tuple[str, Tuple[Tuple[str, str], ...]]] = []
+
+    def _bind(self, value: Any) -> str:
+        name = f"p_{self._bound}"
+        self._params[name] = value
+        self._bound += 1
+        return name
+
+    def range(self, days: Optional[int] = None, hours: Optional[int] = None,
+              start: Union[datetime, timedelta, None] = None,
+              stop: Optional[datetime] = None) -> 'FluxQuery':
+        """设置时间范围：相对天数/小时数，或绝对起止时间"""
+        if days is not None or hours is not None:
+            start = -timedelta(days=int(days or 0), hours=int(hours or 0))
+        if start is None:
+            raise ValueError("range() requires days, hours or start")
+        self._params["p_start"] = start
+        if stop is not None:
+            self._params["p_stop"] = stop
+            self._has_stop = True
+        return self
+
+    def measurement(self, name: str) -> 'FluxQuery':
+        self._measurement = name
+        return self
+
+    def tag(self, key: str, value: Optional[str]) -> 'FluxQuery':
+        """标签等值过滤，value为None时忽略"""
+        if value is not None:
+            self.tag_in(key, [value])
+        return self
+
+    def tag_in(self, key: str, values: Iterable[str]) -> 'FluxQuery':
+        """标签多值过滤，展开为 or 链以保持可下推"""
+        values = list(values)
+        if not values:
+            raise ValueError(f"tag_in({key!r}) requires at least one value")
+        first = self._bound
+        for value in values:
+            self._bind(str(value))
+        self._tags.append((key, first, len(values)))
+        return self
+
+    def field(self, *names: str) -> 'FluxQuery':
+        self._fields = self._fields + names
+        return self
+
+    def pipe(self, template: str, **values: Any) -> 'FluxQuery':
+        """追加后续处理阶段，模板中的 {name} 会绑定为参数；Flux 记录字面量的花括号需写成 {{ }}"""
+        bindings = tuple((name, self._bind(value)) for name, value in sorted(values.items()))
+        self._pipes.append((template, bindings))
+        return self
+
+    def shape(self) -> Tuple:
+        """查询结构（不含参数值），用作模板缓存键"""
+        return (
+            self._has_stop,
+            self._measurement,
+            tuple(self._tags),
+            self._fields,
+            tuple(self._pipes),
+        )
+
+    def build(self) -> Tuple[str, Dict[str, Any]]:
+        """返回 (查询文本, params)"""
+        return _render(self.shape()), dict(self._params)
+
+
+@lru_cache(maxsize=256)
+def _render(shape: Tuple) -> str:
+    has_stop, measurement, tags, fields, pipes = shape
+
+    range_args = "start: p_start, stop: p_stop" if has_stop else "start: p_start"
+    lines = [
+        "from(bucket: p_bucket)",
+        f"    |> range({range_args})",
+    ]
+    if measurement:
+        lines.append(f'    |> filter(fn: (r) => r["_measurement"] == {flux_string(measurement)})')
+    for key, first, count in tags:
+        if not _IDENTIFIER_PATTERN.match(key):
+            raise ValueError(f"Invalid tag key: {key!r}")
+        predicate = " or ".join(f"{_column(key)} == p_{first + i}" for i in range(count))
+        lines.append(f"    |> filter(fn: (r) => {predicate})")
+    if fields:
+        predicate = " or ".join(f'r["_field"] == {flux_string(name)}' for name in fields)
+        lines.append(f"    |> filter(fn: (r) => {predicate})")
+    for template, bindings in pipes:
+        refs = dict(bindings)
+        lines.append(f"    |> {template.format_map(refs)}")
+    return "\n".join(lines)
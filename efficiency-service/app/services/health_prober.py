@@ -0,0 +1,178 @@
+from typing import Dict, Any, List, Optional, Callable, Awaitable
+from collections import deque
+import asyncio
+import logging
+import time
+
+from sqlalchemy import text
+
+from ..core.config import settings
+from ..core.database import engine, read_router
+from ..utils.timezone import utc_now
+from .influxdb_service import InfluxDBService
+
+logger = logging.getLogger(__name__)
+
+HEALTHY = "healthy"
+UNHEALTHY = "unhealthy"
+UNKNOWN = "unknown"
+
+
+class DependencyCheck:
+    """单个依赖的检查状态：最近一次结果、连续失败次数和最近若干次的历史"""
+
+    def __init__(self, name: str, probe: Callable[[], Awaitable[str]], interval: float):
+        self.name = name
+        self.probe = probe
+        self.interval = interval
+        self.status = UNKNOWN
+        self.message = "Not checked yet"
+        self.latency_ms: Optional[float] = None
+        self.checked_at: Optional[str] = None
+        self.consecutive_failures = 0
+        self.history = deque(maxlen=settings.HEALTH_HISTORY_SIZE)
+
+    async def run(self):
+        started = time.perf_counter()
+        try:
+            self.message = await asyncio.wait_for(self.probe(), timeout=settings.HEALTH_CHECK_TIMEOUT)
+            if self.status == UNHEALTHY:
+                logger.info(f"{self.name} recovered after {self.consecutive_failures} failed checks")
+            self.status = HEALTHY
+            self.consecutive_failures = 0
+        except Exception as e:
+            if self.status != UNHEALTHY:
+                logger.error(f"{self.name} health check failed: {e!r}")
+            self.status = UNHEALTHY
+            self.message = f"{self.name} error: {e!r}"
+            self.consecutive_failures += 1
+        self.latency_ms = round((time.perf_counter() - started) * 1000, 3)
+        self.checked_at = utc_now().isoformat()
+        self.history.append({"checked_at": self.checked_at, "status": self.status, "latency_ms": self.latency_ms})
+
+    def to_dict(self, history: bool = False) -> Dict[str, Any]:
+        result = {
+            "status": self.status,
+            "message": self.message,
+            "latency_ms": self.latency_ms,
+            "checked_at": self.checked_at,
+            "consecutive_failures": self.consecutive_failures
+        }
+        if history:
+            result["history"] = list(self.history)
+        return result
+
+
+class IngestBacklog:
+    """已接收但尚未处理完的事件批次数（/events/batch 的后台任务），以及处理完的批次的写入耗时"""
+
+    def __init__(self):
+        self.pending = 0
+        self.write_latencies = deque(maxlen=10000)
+
+    def start(self):
+        self.pending += 1
+
+    def finish(self, duration_ms: Optional[float] = None):
+        self.pending -= 1
+        if duration_ms is not None:
+            self.write_latencies.append(duration_ms)
+
+    def drain_latencies(self) -> List[float]:
+        """取出上次调用以来记录的写入耗时（毫秒）"""
+        latencies = list(self.write_latencies)
+        self.write_latencies.clear()
+        return latencies
+
+    @property
+    def saturated(self) -> bool:
+        return self.pending >= settings.INGEST_MAX_PENDING_BATCHES
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "status": UNHEALTHY if self.saturated else HEALTHY,
+            "pending_batches": self.pending,
+            "max_pending_batches": settings.INGEST_MAX_PENDING_BATCHES
+        }
+
+
+class HealthProber:
+    """
+    后台依赖探测：每个依赖按各自的间隔检查，健康检查接口只读缓存的结果
+
+    连接复用服务自身的连接池和客户端，探测频率不随健康检查请求的频率变化。
+    """
+
+    def __init__(self):
+        self.influxdb_service = InfluxDBService()
+        self.redis_client = None
+        self.ingest = IngestBacklog()
+        self.checks: Dict[str, DependencyCheck] = {
+            "database": DependencyCheck("database", self.check_database, settings.HEALTH_DATABASE_INTERVAL),
+            "redis": DependencyCheck("redis", self.check_redis, settings.HEALTH_REDIS_INTERVAL),
+            "influxdb": DependencyCheck("influxdb", self.check_influxdb, settings.HEALTH_INFLUXDB_INTERVAL),
+        }
+        self.tasks: List[asyncio.Task] = []
+        self.logger = logging.getLogger(__name__)
+
+    async def check_database(self) -> str:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+        return "Database connection OK"
+
+    async def check_redis(self) -> str:
+        if self.redis_client is None:
+            import redis.asyncio as redis
+            self.redis_client = redis.from_url(settings.REDIS_URL)
+        await self.redis_client.ping()
+        return "Redis connection OK"
+
+    async def check_influxdb(self) -> str:
+        client = await self.influxdb_service.get_client()
+        # 异步客户端没有 health()，ping 失败时返回 False
+        if not await client.ping():
+            raise RuntimeError("InfluxDB ping failed")
+        return "InfluxDB connection OK"
+
+    async def _loop(self, check: DependencyCheck):
+        while True:
+            await check.run()
+            await asyncio.sleep(check.interval)
+
+    def start(self):
+        if not self.tasks:
+            self.tasks = [asyncio.create_task(self._loop(check)) for check in self.checks.values()]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        await self.influxdb_service.close()
+        if self.redis_client is not None:
+            await self.redis_client.close()
+            self.redis_client = None
+
+    @property
+    def healthy(self) -> bool:
+        return all(check.status == HEALTHY for check in self.checks.values())
+
+    def snapshot(self, history: bool = False) -> Dict[str, Any]:
+        return {
+            "status": HEALTHY if self.healthy else UNHEALTHY,
+            "checks": {name: check.to_dict(history) for name, check in self.checks.items()},
+            "ingest": self.ingest.to_dict(),
+            "read_replicas": read_router.status()
+        }
+
+    def readiness(self) -> Dict[str, Any]:
+        """就绪状态及未就绪的原因"""
+        reasons = [
+            f"{name} is {check.status}" for name, check in self.checks.items() if check.status != HEALTHY
+        ]
+        if self.ingest.saturated:
+            reasons.append(f"ingest backlog {self.ingest.pending} >= {settings.INGEST_MAX_PENDING_BATCHES}")
+        return {"ready": not reasons, "reasons": reasons}
+
+
+health_prober = HealthProber()
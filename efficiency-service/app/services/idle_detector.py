@@ -0,0 +1,227 @@
+from typing import List, Dict, Any, Optional, Tuple
+from datetime import datetime, timezone
+import logging
+
+import numpy as np
+import redis.asyncio as redis
+
+from ..schemas.event import EventData
+from ..core.config import settings
+from ..utils.timezone import utc_now
+from .aggregate_store import event_tool
+from .flux_columnar import FluxColumns, ns_to_datetime
+from .offload import cpu_bound
+
+logger = logging.getLogger(__name__)
+
+_NS_PER_MS = 1_000_000
+_NS_PER_US = 1_000
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+KEY_PREFIX = "effm:idle"
+# 空闲检测开始运行的时间，此前结束的空闲区间没有保存
+COVERAGE_KEY = f"{KEY_PREFIX}:coverage"
+
+# 原子地读取并更新一组 (用户, 会话) 的最后事件时间（微秒，在 Lua 的浮点数中可精确表示），返回更新前的值
+# ARGV[1] 为过期秒数，ARGV[2] 为清理阈值，ARGV[3] 为每个用户的会话数上限，其后每两个参数为 (会话, 时间)
+# 用户的会话数超过上限时删除最后事件早于清理阈值的会话
+_UPDATE_SCRIPT = """
+local previous = {}
+for i, key in ipairs(KEYS) do
+    local field, value = ARGV[2 + i * 2], ARGV[3 + i * 2]
+    local current = redis.call('HGET', key, field)
+    previous[i] = current or ''
+    if (not current) or tonumber(value) > tonumber(current) then
+        redis.call('HSET', key, field, value)
+    end
+    redis.call('EXPIRE', key, ARGV[1])
+    if redis.call('HLEN', key) > tonumber(ARGV[3]) then
+        local entries = redis.call('HGETALL', key)
+        for j = 1, #entries, 2 do
+            if tonumber(entries[j + 1]) < tonumber(ARGV[2]) then
+                redis.call('HDEL', key, entries[j])
+            end
+        end
+    end
+end
+return previous
+"""
+
+
+def last_seen_key(user_id: str) -> str:
+    return f"{KEY_PREFIX}:last-seen:{user_id}"
+
+
+def detect_gaps(group_codes: np.ndarray, times_ns: np.ndarray,
+                threshold_ns: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    按分组检测相邻事件的时间间隔
+
+    返回超过阈值的间隔 (行下标, 开始时间, 结束时间)，行下标指向间隔结束的那一行。
+    """
+    order = np.lexsort((times_ns, group_codes))
+    groups = group_codes[order]
+    times = times_ns[order]
+    gaps = np.diff(times)
+    mask = (groups[1:] == groups[:-1]) & (gaps > threshold_ns)
+    index = np.flatnonzero(mask)
+    return order[index + 1], times[index], times[index + 1]
+
+
+def _datetime_ns(timestamp: datetime) -> int:
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    # 用整数运算换算，避免浮点时间戳的精度损失
+    delta = timestamp - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000_000 + delta.microseconds * 1000
+
+
+def _event_ns(event: EventData) -> int:
+    return _datetime_ns(event.timestamp)
+
+
+class IdleDetector:
+    """
+    接收路径上基于事件间隔的空闲检测
+
+    按 (用户, 会话) 在Redis哈希中记住最后一次事件时间（有过期时间，每个用户的会话数有上限），
+    多个进程接收同一会话的事件时共享，跨批次的间隔同样能被检测到；
+    晚到的、早于最后事件时间的事件不参与检测。Redis不可用时只检测批次内的间隔。
+    """
+
+    def __init__(self, threshold_ms: Optional[int] = None, sessions_per_user: Optional[int] = None):
+        self.threshold_ms = threshold_ms or settings.IDLE_GAP_THRESHOLD_MS
+        self.sessions_per_user = sessions_per_user or settings.IDLE_SESSIONS_PER_USER
+        self.client = None
+        self.logger = logging.getLogger(__name__)
+
+    async def get_client(self) -> redis.Redis:
+        """获取Redis客户端"""
+        if self.client is None:
+            self.client = redis.from_url(settings.REDIS_URL, decode_responses=True)
+            self._update_script = self.client.register_script(_UPDATE_SCRIPT)
+        return self.client
+
+    async def close(self):
+        """关闭Redis连接"""
+        if self.client:
+            await self.client.close()
+            self.client = None
+
+    async def get_coverage_start(self) -> Optional[datetime]:
+        """空闲检测开始运行的时间，此后结束的空闲区间都已保存；未知或Redis不可用时返回None"""
+        try:
+            client = await self.get_client()
+            value = await client.get(COVERAGE_KEY)
+            return datetime.fromisoformat(value) if value else None
+        except Exception as e:
+            self.logger.error(f"Failed to read idle detection coverage: {e}")
+            return None
+
+    async def clear_user(self, user_id: str) -> int:
+        """删除用户各会话的最后事件时间，返回删除的键数"""
+        client = await self.get_client()
+        return await client.delete(last_seen_key(user_id))
+
+    async def _exchange_last_seen(self, latest: Dict[Tuple[str, str], int]) -> Dict[Tuple[str, str], int]:
+        """写入本批次各组的最后事件时间（取较大值），返回写入前的值"""
+        try:
+            client = await self.get_client()
+            keys = list(latest)
+            args = [
+                settings.IDLE_LAST_SEEN_TTL,
+                (_datetime_ns(utc_now()) - settings.IDLE_LAST_SEEN_TTL * 1_000_000_000) // _NS_PER_US,
+                self.sessions_per_user
+            ]
+            for key in keys:
+                args.extend((key[1], latest[key] // _NS_PER_US))
+            async with client.pipeline(transaction=False) as pipe:
+                pipe.set(COVERAGE_KEY, utc_now().isoformat(), nx=True)
+                await self._update_script(keys=[last_seen_key(user_id) for user_id, _ in keys], args=args, client=pipe)
+                _, values = await pipe.execute()
+            return {key: int(value) * _NS_PER_US for key, value in zip(keys, values) if value}
+        except Exception as e:
+            self.logger.error(f"Failed to update idle detection state: {e}")
+            return {}
+
+    async def process(self, events: List[EventData], metadata: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """处理一个批次，返回检测到的空闲区间"""
+        event_times = [_event_ns(event) for event in events]
+        latest: Dict[Tuple[str, str], int] = {}
+        for event, timestamp in zip(events, event_times):
+            key = (event.user_id, event.session_id or "")
+            if key not in latest or timestamp > latest[key]:
+                latest[key] = timestamp
+        last_seen = await self._exchange_last_seen(latest) if latest else {}
+
+        key_codes: Dict[Tuple[str, str], int] = {}
+        rows: List[int] = []
+        groups: List[int] = []
+        times: List[int] = []
+
+        for position, (event, timestamp) in enumerate(zip(events, event_times)):
+            key = (event.user_id, event.session_id or "")
+            previous = last_seen.get(key)
+            if previous is not None and timestamp < previous:
+                continue
+            code = key_codes.get(key)
+            if code is None:
+                code = key_codes[key] = len(key_codes)
+                # 上一批次的最后事件作为本组的起点
+                if previous is not None:
+                    rows.append(-1)
+                    groups.append(code)
+                    times.append(previous)
+            rows.append(position)
+            groups.append(code)
+            times.append(timestamp)
+
+        if not rows:
+            return []
+
+        rows_array = np.array(rows, dtype=np.int64)
+        groups_array = np.array(groups, dtype=np.int64)
+        times_array = np.array(times, dtype=np.int64)
+        end_rows, starts, ends = detect_gaps(groups_array, times_array, self.threshold_ms * _NS_PER_MS)
+
+        intervals = []
+        for row, start_ns, end_ns in zip(end_rows.tolist(), starts.tolist(), ends.tolist()):
+            event = events[rows_array[row]]
+            intervals.append({
+                "user_id": event.user_id,
+                "project_id": event.project_id,
+                "tool": event_tool(event, metadata),
+                "session_id": event.session_id,
+                "start_time": ns_to_datetime(start_ns),
+                "end_time": ns_to_datetime(end_ns),
+                "duration": (end_ns - start_ns) / _NS_PER_MS
+            })
+
+        return intervals
+
+
+@cpu_bound("idle_intervals", min_rows=500000, columns=("user_id", "session_id"))
+def idle_intervals_from_columns(columns: FluxColumns, threshold_ms: Optional[int] = None) -> List[Dict[str, Any]]:
+    """对任意列式事件流按 (用户, 会话) 检测空闲区间"""
+    if len(columns) == 0:
+        return []
+    threshold_ms = threshold_ms or settings.IDLE_GAP_THRESHOLD_MS
+
+    users = columns.column("user_id")
+    sessions = columns.column("session_id")
+    # 用户与会话编码组合为单个分组编码
+    group_codes = users.codes.astype(np.int64) * (len(sessions.categories) + 1) + (sessions.codes + 1)
+    end_rows, starts, ends = detect_gaps(group_codes, columns.time, threshold_ms * _NS_PER_MS)
+
+    user_values = users.decode("unknown")
+    session_values = sessions.decode(None)
+    return [
+        {
+            "user_id": user_values[row],
+            "session_id": session_values[row],
+            "start_time": ns_to_datetime(start_ns),
+            "end_time": ns_to_datetime(end_ns),
+            "duration": (end_ns - start_ns) / _NS_PER_MS
+        }
+        for row, start_ns, end_ns in zip(end_rows.tolist(), starts.tolist(), ends.tolist())
+    ]
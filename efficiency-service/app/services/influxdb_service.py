@@ -1,17 +1,42 @@
-from typing import List, Dict, Any, Optional
-from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional, AsyncGenerator, Callable, Hashable, Tuple, TYPE_CHECKING
+from datetime import datetime, timedelta, timezone
 import logging
 import asyncio
 
-from influxdb_client.client.influxdb_client_async import InfluxDBClientAsync
-from influxdb_client.domain.write_precision import WritePrecision
-from influxdb_client import Point
+# influxdb_client 导入较慢，只在首次连接或写入时加载，缩短 API 进程的冷启动
+if TYPE_CHECKING:
+    from influxdb_client.client.influxdb_client_async import InfluxDBClientAsync
+    from influxdb_client.client.flux_table import FluxRecord
 
 from ..schemas.event import EventData, EventType
+from .flux_query import FluxQuery, parse_duration
+from .flux_columnar import FluxColumns, SYSTEM_COLUMNS, decode_annotated_csv, concat_columns, ns_to_datetime
+from .range_executor import RangeExecutor, TimeSlice, GroupedStats, split_range
+from .sequence_miner import PATTERN_SEPARATOR
+from .learning_curve import summarize_curves
+from .offload import offloader
+from .ranking_index import RANKING_METRICS, metric_value
 from ..core.config import settings
+from ..core.query_profiler import query_profiler
+from ..utils.timezone import utc_now
 
 logger = logging.getLogger(__name__)
 
+# 前端事件统一写入的measurement
+EVENTS_MEASUREMENT = "efficiency_events"
+# 接收时重建的ISS会话记录
+ISS_SESSIONS_MEASUREMENT = "iss_sessions"
+# 服务端基于事件间隔检测的空闲区间
+IDLE_INTERVALS_MEASUREMENT = "idle_intervals"
+
+
+def series_key(record: "FluxRecord") -> Tuple:
+    """记录所属序列（全部标签值），用于跨分段合并时保持各序列独立"""
+    return tuple(sorted(
+        (name, value) for name, value in record.values.items()
+        if name not in SYSTEM_COLUMNS and isinstance(value, str)
+    ))
+
 
 class InfluxDBService:
     """InfluxDB服务"""
@@ -20,11 +45,14 @@ class InfluxDBService:
         self.client = None
         self.write_api = None
         self.query_api = None
+        self.range_executor = RangeExecutor()
         self.logger = logging.getLogger(__name__)
     
-    async def get_client(self) -> InfluxDBClientAsync:
+    async def get_client(self) -> "InfluxDBClientAsync":
         """获取InfluxDB客户端"""
         if self.client is None:
+            from influxdb_client.client.influxdb_client_async import InfluxDBClientAsync
+            
             self.client = InfluxDBClientAsync(
                 url=f"http://{settings.INFLUXDB_HOST}:{settings.INFLUXDB_PORT}",
                 token=settings.INFLUXDB_TOKEN,
@@ -40,19 +68,83 @@ class InfluxDBService:
         if self.client:
             await self.client.close()
     
+    async def stream_records(self, query: str, params: Dict[str, Any] = None) -> AsyncGenerator["FluxRecord", None]:
+        """流式查询，逐条产出FluxRecord而不物化全部FluxTable"""
+        await self.get_client()
+        with query_profiler.track_flux(query):
+            records = await self.query_api.query_stream(query=query, org=settings.INFLUXDB_ORG, params=params)
+            async for record in records:
+                yield record
+    
+    async def query_columns(self, query: str, params: Dict[str, Any] = None) -> FluxColumns:
+        """查询并直接解码为列式数组，跳过FluxTable/FluxRecord的逐条构建"""
+        await self.get_client()
+        with query_profiler.track_flux(query):
+            text = await self.query_api.query_raw(query=query, org=settings.INFLUXDB_ORG, params=params)
+        return decode_annotated_csv(text)
+    
+    def time_slices(self, days: int, window: Optional[timedelta] = None) -> List[TimeSlice]:
+        """切分最近days天的查询范围；聚合窗口无法与分段边界对齐时不切分"""
+        step = timedelta(hours=settings.RANGE_SLICE_HOURS)
+        if window is not None and (window > step or step % window):
+            stop = utc_now()
+            return [TimeSlice(0, stop - timedelta(days=days), stop)]
+        return split_range(days=days, step=step)
+    
+    async def query_columns_sliced(self, slices: List[TimeSlice],
+                                   build_query: Callable[[TimeSlice], Tuple[str, Dict[str, Any]]]) -> FluxColumns:
+        """分段并发查询，按时间顺序拼接列式结果"""
+        await self.get_client()
+        
+        async def fetch(time_slice: TimeSlice) -> FluxColumns:
+            query, params = build_query(time_slice)
+            return await self.query_columns(query, params)
+        
+        parts: List[Optional[FluxColumns]] = [None] * len(slices)
+        async for time_slice, columns in self.range_executor.iter_slices(slices, fetch):
+            parts[time_slice.index] = columns
+        return concat_columns(parts)
+    
+    async def query_grouped(self, slices: List[TimeSlice],
+                            build_query: Callable[[TimeSlice], Tuple[str, Dict[str, Any]]],
+                            key: Callable[["FluxRecord"], Hashable],
+                            value_column: str = "_value",
+                            count_column: Optional[str] = None) -> GroupedStats:
+        """分段并发执行分组聚合查询，按分组键合并 sum/count"""
+        await self.get_client()
+        
+        async def fetch(time_slice: TimeSlice) -> GroupedStats:
+            query, params = build_query(time_slice)
+            with query_profiler.track_flux(query):
+                tables = await self.query_api.query(query=query, org=settings.INFLUXDB_ORG, params=params)
+            partial = GroupedStats()
+            for table in tables:
+                for record in table.records:
+                    value = record[value_column]
+                    if value is None:
+                        continue
+                    partial.add(key(record), value, record[count_column] if count_column else 1)
+            return partial
+        
+        return await self.range_executor.reduce(slices, fetch) or GroupedStats()
+    
     async def store_events(self, events: List[EventData], metadata: Dict[str, Any] = None):
         """批量存储事件到InfluxDB"""
         try:
             client = await self.get_client()
+            from influxdb_client import Point
             points = []
             
             for event in events:
                 # 基础事件数据
-                point = Point("efficiency_events") \
+                point = Point(EVENTS_MEASUREMENT) \
                     .tag("user_id", event.user_id) \
                     .tag("project_id", event.project_id) \
                     .tag("event_type", event.event_type)
                 
+                if event.session_id:
+                    point = point.tag("session_id", event.session_id)
+                
                 # 添加事件数据字段
                 for key, value in event.data.items():
                     if isinstance(value, (bool, int, float)):
@@ -91,6 +183,110 @@ class InfluxDBService:
             self.logger.error(f"Failed to store events: {e}")
             return False
 
+    async def store_sessions(self, sessions: List[Dict[str, Any]]):
+        """写入重建完成的ISS会话记录"""
+        try:
+            client = await self.get_client()
+            from influxdb_client import Point
+            points = []
+            
+            for session in sessions:
+                point = Point(ISS_SESSIONS_MEASUREMENT) \
+                    .tag("user_id", session["user_id"]) \
+                    .tag("project_id", session["project_id"]) \
+                    .tag("tool", session["tool"]) \
+                    .tag("level", session["level"]) \
+                    .tag("status", session["status"]) \
+                    .field("session_id", session["session_id"])
+                
+                if session.get("frame_session_id"):
+                    point = point.field("frame_session_id", str(session["frame_session_id"]))
+                if session.get("start_time") is not None:
+                    point = point.field("start_time", int(session["start_time"].timestamp() * 1000))
+                for key, value in session.items():
+                    if isinstance(value, float):
+                        point = point.field(key, value)
+                
+                points.append(point.time(session["end_time"]))
+            
+            write_api = client.write_api()
+            await write_api.write(
+                bucket=settings.INFLUXDB_BUCKET,
+                org=settings.INFLUXDB_ORG,
+                record=points
+            )
+            
+            self.logger.info(f"Stored {len(sessions)} ISS sessions to InfluxDB")
+            return True
+        
+        except Exception as e:
+            self.logger.error(f"Failed to store ISS sessions: {e}")
+            return False
+    
+    async def store_idle_intervals(self, intervals: List[Dict[str, Any]]):
+        """写入检测到的空闲区间"""
+        try:
+            client = await self.get_client()
+            from influxdb_client import Point
+            points = []
+            
+            for interval in intervals:
+                point = Point(IDLE_INTERVALS_MEASUREMENT) \
+                    .tag("user_id", interval["user_id"]) \
+                    .tag("project_id", interval["project_id"]) \
+                    .tag("tool", interval["tool"]) \
+                    .field("duration", float(interval["duration"])) \
+                    .field("start_time", int(interval["start_time"].timestamp() * 1000))
+                
+                if interval.get("session_id"):
+                    point = point.tag("session_id", interval["session_id"])
+                
+                points.append(point.time(interval["end_time"]))
+            
+            write_api = client.write_api()
+            await write_api.write(
+                bucket=settings.INFLUXDB_BUCKET,
+                org=settings.INFLUXDB_ORG,
+                record=points
+            )
+            
+            self.logger.info(f"Stored {len(intervals)} idle intervals to InfluxDB")
+            return True
+        
+        except Exception as e:
+            self.logger.error(f"Failed to store idle intervals: {e}")
+            return False
+    
+    async def stream_idle_durations(self, user_id: str, days: int,
+                                    start: Optional[datetime] = None) -> AsyncGenerator[float, None]:
+        """按时间顺序流式读取用户空闲区间的时长（毫秒），给定 start 时只读取此后结束的区间"""
+        query, params = FluxQuery() \
+            .range(days=None if start else days, start=start) \
+            .measurement(IDLE_INTERVALS_MEASUREMENT) \
+            .tag("user_id", user_id) \
+            .field("duration") \
+            .pipe("group()") \
+            .pipe('sort(columns: ["_time"])') \
+            .build()
+        
+        async for record in self.stream_records(query, params):
+            yield record.get_value()
+    
+    async def stream_iss_sessions(self, user_id: str, days: int,
+                                  start: Optional[datetime] = None) -> AsyncGenerator[Dict[str, Any], None]:
+        """按结束时间顺序流式读取用户的ISS会话记录，给定 start 时只读取此后结束的会话"""
+        query, params = FluxQuery() \
+            .range(days=None if start else days, start=start) \
+            .measurement(ISS_SESSIONS_MEASUREMENT) \
+            .tag("user_id", user_id) \
+            .pipe('pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")') \
+            .pipe("group()") \
+            .pipe('sort(columns: ["_time"])') \
+            .build()
+        
+        async for record in self.stream_records(query, params):
+            yield record.values
+    
     async def store_event(self, event: EventData):
         """存储单个事件到InfluxDB（向后兼容）"""
         return await self.store_events([event])
@@ -101,15 +297,14 @@ class InfluxDBService:
             client = await self.get_client()
             
             # 查询最近24小时的性能数据
-            query = f'''
-            from(bucket: "{settings.INFLUXDB_BUCKET}")
-                |> range(start: -{hours}h)
-                |> filter(fn: (r) => r["_measurement"] == "efficiency_performance")
-                |> filter(fn: (r) => r["project_id"] == "{project_id}")
-                |> aggregateWindow(every: 1h, fn: mean, createEmpty: false)
-            '''
+            query, params = FluxQuery() \
+                .range(hours=hours) \
+                .measurement("efficiency_performance") \
+                .tag("project_id", project_id) \
+                .pipe("aggregateWindow(every: 1h, fn: mean, createEmpty: false)") \
+                .build()
             
-            tables = await self.query_api.query(query=query, org=settings.INFLUXDB_ORG)
+            columns = await self.query_columns(query, params)
             
             performance_data = {
                 "project_id": project_id,
@@ -123,14 +318,13 @@ class InfluxDBService:
                 }
             }
             
-            for table in tables:
-                for record in table.records:
-                    metric_name = record["_field"]
-                    if metric_name in performance_data["metrics"]:
-                        performance_data["metrics"][metric_name].append({
-                            "time": record["_time"].isoformat(),
-                            "value": record["_value"]
-                        })
+            for metric_name, points in performance_data["metrics"].items():
+                mask = columns.field.eq(metric_name)
+                for time_ns, value in zip(columns.time[mask].tolist(), columns.value[mask].tolist()):
+                    points.append({
+                        "time": ns_to_datetime(time_ns).isoformat(),
+                        "value": value
+                    })
             
             return performance_data
         
@@ -144,16 +338,16 @@ class InfluxDBService:
             client = await self.get_client()
             
             # 查询用户标注效率
-            query = f'''
-            from(bucket: "{settings.INFLUXDB_BUCKET}")
-                |> range(start: -{days}d)
-                |> filter(fn: (r) => r["_measurement"] == "efficiency_events")
-                |> filter(fn: (r) => r["user_id"] == "{user_id}")
-                |> filter(fn: (r) => contains(value: r["_field"], set: ["duration", "success"]))
-                |> aggregateWindow(every: 1d, fn: mean, createEmpty: false)
-            '''
+            def build_query(time_slice: TimeSlice):
+                return FluxQuery() \
+                    .range(start=time_slice.start, stop=time_slice.stop) \
+                    .measurement(EVENTS_MEASUREMENT) \
+                    .tag("user_id", user_id) \
+                    .field("duration", "success") \
+                    .pipe("aggregateWindow(every: 1d, fn: mean, createEmpty: false)") \
+                    .build()
             
-            tables = await self.query_api.query(query=query, org=settings.INFLUXDB_ORG)
+            columns = await self.query_columns_sliced(self.time_slices(days, timedelta(days=1)), build_query)
             
             efficiency_data = {
                 "user_id": user_id,
@@ -163,16 +357,15 @@ class InfluxDBService:
                 "total_time_spent": 0
             }
             
-            for table in tables:
-                for record in table.records:
-                    if record["_field"] == "duration":
-                        efficiency_data["daily_avg_duration"].append({
-                            "date": record["_time"].strftime("%Y-%m-%d"),
-                            "avg_duration": record["_value"]
-                        })
-                        efficiency_data["total_time_spent"] += record["_value"]
-                    elif record["_field"] == "success":
-                        efficiency_data["total_annotations"] += record["_value"]
+            duration_mask = columns.field.eq("duration")
+            durations = columns.value[duration_mask].tolist()
+            for time_ns, duration in zip(columns.time[duration_mask].tolist(), durations):
+                efficiency_data["daily_avg_duration"].append({
+                    "date": ns_to_datetime(time_ns).strftime("%Y-%m-%d"),
+                    "avg_duration": duration
+                })
+            efficiency_data["total_time_spent"] += sum(durations)
+            efficiency_data["total_annotations"] += sum(columns.value[columns.field.eq("success")].tolist())
             
             return efficiency_data
         
@@ -180,31 +373,39 @@ class InfluxDBService:
             self.logger.error(f"Failed to get user efficiency: {e}")
             raise
     
-    async def clear_user_events(self, user_id: str):
-        """清除用户事件数据"""
+    async def earliest_user_time(self, user_id: str, stop: datetime) -> Optional[datetime]:
+        """用户在 stop 之前最早的数据时间（所有 measurement），没有数据时返回 None"""
+        query, params = FluxQuery() \
+            .range(start=datetime(1970, 1, 1, tzinfo=timezone.utc), stop=stop) \
+            .tag("user_id", user_id) \
+            .pipe("first()") \
+            .pipe("group()") \
+            .pipe('min(column: "_time")') \
+            .build()
+        records = self.stream_records(query, params)
+        try:
+            async for record in records:
+                return record.get_time()
+            return None
+        finally:
+            await records.aclose()
+    
+    async def delete_user_range(self, user_id: str, start: datetime, stop: datetime):
+        """删除用户在 [start, stop] 内的全部数据（所有 measurement）"""
         try:
             client = await self.get_client()
-            
-            # 删除用户的所有事件数据
-            delete_api = client.delete_api()
-            
-            start = datetime.now() - timedelta(days=365)  # 删除一年内的数据
-            stop = datetime.now()
-            
-            await delete_api.delete(
+            escaped = user_id.replace("\\", "\\\\").replace('"', '\\"')
+            await client.delete_api().delete(
                 start,
                 stop,
-                f'user_id="{user_id}"',
+                f'user_id="{escaped}"',
                 bucket=settings.INFLUXDB_BUCKET,
                 org=settings.INFLUXDB_ORG
             )
-            
-            self.logger.info(f"Cleared InfluxDB events for user {user_id}")
-        
         except Exception as e:
-            self.logger.error(f"Failed to clear user events from InfluxDB: {e}")
+            self.logger.error(f"Failed to delete InfluxDB data for user {user_id} in [{start}, {stop}]: {e}")
             raise
-
+    
     # ==================== 用户操作数据分析方法 ====================
 
     async def get_user_interaction_analysis(self, user_id: str, days: int = 7) -> Dict[str, Any]:
@@ -213,18 +414,20 @@ class InfluxDBService:
             client = await self.get_client()
             
             # 查询用户交互事件
-            query = f'''
-            from(bucket: "{settings.INFLUXDB_BUCKET}")
-                |> range(start: -{days}d)
-                |> filter(fn: (r) => r["_measurement"] == "efficiency_user_interaction")
-                |> filter(fn: (r) => r["user_id"] == "{user_id}")
-                |> filter(fn: (r) => r["_field"] == "count")
-                |> group(columns: ["action", "element"])
-                |> sum()
-                |> sort(columns: ["_value"], desc: true)
-            '''
-            
-            tables = await self.query_api.query(query=query, org=settings.INFLUXDB_ORG)
+            def build_query(time_slice: TimeSlice):
+                return FluxQuery() \
+                    .range(start=time_slice.start, stop=time_slice.stop) \
+                    .measurement("efficiency_user_interaction") \
+                    .tag("user_id", user_id) \
+                    .field("count") \
+                    .pipe('group(columns: ["action", "element"])') \
+                    .pipe("sum()") \
+                    .build()
+            
+            slices = self.time_slices(days)
+            grouped = await self.query_grouped(
+                slices, build_query, key=lambda record: (record.get("action", "unknown"), record.get("element", "unknown"))
+            )
             
             analysis = {
                 "total_interactions": 0,
@@ -234,51 +437,38 @@ class InfluxDBService:
                 "hourly_activity": {}
             }
             
-            for table in tables:
-                for record in table.records:
-                    action = record.get("action", "unknown")
-                    element = record.get("element", "unknown")
-                    count = record["_value"]
-                    
-                    analysis["total_interactions"] += count
-                    
-                    # 统计最常用操作
-                    analysis["most_used_actions"].append({
-                        "action": action,
-                        "count": count
-                    })
-                    
-                    # 统计最常用元素
-                    analysis["most_used_elements"].append({
-                        "element": element,
-                        "count": count
-                    })
-                    
-                    # 操作分布
-                    if action not in analysis["interaction_distribution"]:
-                        analysis["interaction_distribution"][action] = 0
-                    analysis["interaction_distribution"][action] += count
+            for (action, element), count in sorted(grouped.sums().items(), key=lambda item: item[1], reverse=True):
+                analysis["total_interactions"] += count
+                
+                # 统计最常用操作
+                analysis["most_used_actions"].append({
+                    "action": action,
+                    "count": count
+                })
+                
+                # 统计最常用元素
+                analysis["most_used_elements"].append({
+                    "element": element,
+                    "count": count
+                })
+                
+                # 操作分布
+                if action not in analysis["interaction_distribution"]:
+                    analysis["interaction_distribution"][action] = 0
+                analysis["interaction_distribution"][action] += count
             
             # 获取小时活动分布
-            hourly_query = f'''
-            from(bucket: "{settings.INFLUXDB_BUCKET}")
-                |> range(start: -{days}d)
-                |> filter(fn: (r) => r["_measurement"] == "efficiency_user_interaction")
-                |> filter(fn: (r) => r["user_id"] == "{user_id}")
-                |> filter(fn: (r) => r["_field"] == "count")
-                |> aggregateWindow(every: 1h, fn: sum, createEmpty: false)
-            '''
-            
-            hourly_tables = await self.query_api.query(query=hourly_query, org=settings.INFLUXDB_ORG)
-            
-            for table in hourly_tables:
-                for record in table.records:
-                    hour = record["_time"].hour
-                    count = record["_value"]
-                    
-                    if hour not in analysis["hourly_activity"]:
-                        analysis["hourly_activity"][hour] = 0
-                    analysis["hourly_activity"][hour] += count
+            def build_hourly_query(time_slice: TimeSlice):
+                return FluxQuery() \
+                    .range(start=time_slice.start, stop=time_slice.stop) \
+                    .measurement("efficiency_user_interaction") \
+                    .tag("user_id", user_id) \
+                    .field("count") \
+                    .pipe("aggregateWindow(every: 1h, fn: sum, createEmpty: false)") \
+                    .build()
+            
+            hourly = await self.query_grouped(slices, build_hourly_query, key=lambda record: record["_time"].hour)
+            analysis["hourly_activity"] = hourly.sums()
             
             return analysis
         
@@ -292,15 +482,19 @@ class InfluxDBService:
             client = await self.get_client()
             
             # 查询用户活动时间分布
-            query = f'''
-            from(bucket: "{settings.INFLUXDB_BUCKET}")
-                |> range(start: -{days}d)
-                |> filter(fn: (r) => r["user_id"] == "{user_id}")
-                |> filter(fn: (r) => r["_field"] == "count")
-                |> aggregateWindow(every: 1d, fn: sum, createEmpty: false)
-            '''
-            
-            tables = await self.query_api.query(query=query, org=settings.INFLUXDB_ORG)
+            def build_query(time_slice: TimeSlice):
+                return FluxQuery() \
+                    .range(start=time_slice.start, stop=time_slice.stop) \
+                    .measurement(EVENTS_MEASUREMENT) \
+                    .tag("user_id", user_id) \
+                    .field("count") \
+                    .pipe("aggregateWindow(every: 1d, fn: sum, createEmpty: false)") \
+                    .build()
+            
+            daily = await self.query_grouped(
+                self.time_slices(days, timedelta(days=1)), build_query,
+                key=lambda record: (series_key(record), record["_time"])
+            )
             
             time_distribution = {
                 "daily_activity": [],
@@ -309,15 +503,11 @@ class InfluxDBService:
                 "break_patterns": []
             }
             
-            for table in tables:
-                for record in table.records:
-                    date = record["_time"].strftime("%Y-%m-%d")
-                    count = record["_value"]
-                    
-                    time_distribution["daily_activity"].append({
-                        "date": date,
-                        "activity_count": count
-                    })
+            for (_, time), count in sorted(daily.sums().items()):
+                time_distribution["daily_activity"].append({
+                    "date": time.strftime("%Y-%m-%d"),
+                    "activity_count": count
+                })
             
             return time_distribution
         
@@ -331,17 +521,19 @@ class InfluxDBService:
             client = await self.get_client()
             
             # 查询用户在不同工具中的活动
-            query = f'''
-            from(bucket: "{settings.INFLUXDB_BUCKET}")
-                |> range(start: -{days}d)
-                |> filter(fn: (r) => r["user_id"] == "{user_id}")
-                |> filter(fn: (r) => r["_field"] == "count")
-                |> group(columns: ["tool"])
-                |> sum()
-                |> sort(columns: ["_value"], desc: true)
-            '''
-            
-            tables = await self.query_api.query(query=query, org=settings.INFLUXDB_ORG)
+            def build_query(time_slice: TimeSlice):
+                return FluxQuery() \
+                    .range(start=time_slice.start, stop=time_slice.stop) \
+                    .measurement(EVENTS_MEASUREMENT) \
+                    .tag("user_id", user_id) \
+                    .field("count") \
+                    .pipe('group(columns: ["tool"])') \
+                    .pipe("sum()") \
+                    .build()
+            
+            grouped = await self.query_grouped(
+                self.time_slices(days), build_query, key=lambda record: record.get("tool", "unknown")
+            )
             
             tool_preference = {
                 "preferred_tools": [],
@@ -349,15 +541,11 @@ class InfluxDBService:
                 "tool_efficiency": {}
             }
             
-            for table in tables:
-                for record in table.records:
-                    tool = record.get("tool", "unknown")
-                    count = record["_value"]
-                    
-                    tool_preference["preferred_tools"].append({
-                        "tool": tool,
-                        "usage_count": count
-                    })
+            for tool, count in sorted(grouped.sums().items(), key=lambda item: item[1], reverse=True):
+                tool_preference["preferred_tools"].append({
+                    "tool": tool,
+                    "usage_count": count
+                })
             
             return tool_preference
         
@@ -371,16 +559,15 @@ class InfluxDBService:
             client = await self.get_client()
             
             # 查询用户效率趋势
-            query = f'''
-            from(bucket: "{settings.INFLUXDB_BUCKET}")
-                |> range(start: -{days}d)
-                |> filter(fn: (r) => r["_measurement"] == "efficiency_annotation")
-                |> filter(fn: (r) => r["user_id"] == "{user_id}")
-                |> filter(fn: (r) => r["_field"] == "duration")
-                |> aggregateWindow(every: 1d, fn: mean, createEmpty: false)
-            '''
+            query, params = FluxQuery() \
+                .range(days=days) \
+                .measurement("efficiency_annotation") \
+                .tag("user_id", user_id) \
+                .field("duration") \
+                .pipe("aggregateWindow(every: 1d, fn: mean, createEmpty: false)") \
+                .build()
             
-            tables = await self.query_api.query(query=query, org=settings.INFLUXDB_ORG)
+            columns = await self.query_columns(query, params)
             
             efficiency_trend = {
                 "daily_efficiency": [],
@@ -388,17 +575,12 @@ class InfluxDBService:
                 "consistency_score": 0.0
             }
             
-            durations = []
-            for table in tables:
-                for record in table.records:
-                    date = record["_time"].strftime("%Y-%m-%d")
-                    duration = record["_value"]
-                    durations.append(duration)
-                    
-                    efficiency_trend["daily_efficiency"].append({
-                        "date": date,
-                        "avg_duration": duration
-                    })
+            durations = columns.value.tolist()
+            for time_ns, duration in zip(columns.time.tolist(), durations):
+                efficiency_trend["daily_efficiency"].append({
+                    "date": ns_to_datetime(time_ns).strftime("%Y-%m-%d"),
+                    "avg_duration": duration
+                })
             
             # 计算改进率
             if len(durations) >= 2:
@@ -415,59 +597,37 @@ class InfluxDBService:
             raise
 
     async def get_operation_sequences(self, user_id: str, days: int = 7, tool: Optional[str] = None) -> Dict[str, Any]:
-        """获取操作序列分析"""
+        """获取操作序列分析（按会话排序后挖掘 n-gram 与转移矩阵）"""
         try:
-            client = await self.get_client()
-            
-            # 构建查询条件
-            tool_filter = f' and r["tool"] == "{tool}"' if tool else ""
-            
-            # 查询操作序列
-            query = f'''
-            from(bucket: "{settings.INFLUXDB_BUCKET}")
-                |> range(start: -{days}d)
-                |> filter(fn: (r) => r["user_id"] == "{user_id}"{tool_filter})
-                |> filter(fn: (r) => r["_field"] == "count")
-                |> sort(columns: ["_time"])
-            '''
-            
-            tables = await self.query_api.query(query=query, org=settings.INFLUXDB_ORG)
-            
-            sequences = {
-                "common_sequences": [],
-                "sequence_patterns": {},
-                "transition_matrix": {}
-            }
-            
-            # 分析操作序列
-            current_sequence = []
-            for table in tables:
-                for record in table.records:
-                    action = record.get("action", "unknown")
-                    current_sequence.append(action)
-                    
-                    # 限制序列长度
-                    if len(current_sequence) > 10:
-                        current_sequence = current_sequence[-10:]
-                    
-                    # 记录序列模式
-                    if len(current_sequence) >= 2:
-                        pattern = " -> ".join(current_sequence[-2:])
-                        if pattern not in sequences["sequence_patterns"]:
-                            sequences["sequence_patterns"][pattern] = 0
-                        sequences["sequence_patterns"][pattern] += 1
-            
-            return sequences
+            # 查询交互操作，按会话与时间排序在本地完成，不依赖Flux表的输出顺序
+            def build_query(time_slice: TimeSlice):
+                return FluxQuery() \
+                    .range(start=time_slice.start, stop=time_slice.stop) \
+                    .measurement(EVENTS_MEASUREMENT) \
+                    .tag("user_id", user_id) \
+                    .tag("tool", tool) \
+                    .tag("event_type", "EventType.USER_INTERACTION") \
+                    .pipe('keep(columns: ["_time", "_value", "_field", "action", "session_id"])') \
+                    .build()
+            
+            columns = await self.query_columns_sliced(self.time_slices(days), build_query)
+            
+            # n-gram 统计是纯Python循环，数据量大时转交进程池
+            return await offloader.run(
+                "sequence_mining", columns,
+                settings.SEQUENCE_PATTERN_CAPACITY, settings.SEQUENCE_SKETCH_WIDTH
+            )
         
         except Exception as e:
             self.logger.error(f"Failed to get operation sequences: {e}")
             raise
 
-    async def get_common_operation_patterns(self, user_id: str, days: int = 7, tool: Optional[str] = None) -> Dict[str, Any]:
-        """获取常用操作组合"""
+    async def get_common_operation_patterns(self, user_id: str, days: int = 7, tool: Optional[str] = None,
+                                            sequences: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """获取常用操作组合，可直接使用预计算的序列挖掘结果"""
         try:
-            # 这里可以基于操作序列分析结果，提取常用的操作组合
-            sequences = await self.get_operation_sequences(user_id, days, tool)
+            if sequences is None:
+                sequences = await self.get_operation_sequences(user_id, days, tool)
             
             patterns = {
                 "frequent_patterns": [],
@@ -475,14 +635,23 @@ class InfluxDBService:
                 "inefficient_patterns": []
             }
             
-            # 分析序列模式
-            for pattern, count in sequences["sequence_patterns"].items():
-                if count >= 5:  # 出现5次以上的模式
-                    patterns["frequent_patterns"].append({
-                        "pattern": pattern,
-                        "frequency": count
-                    })
+            # 分析序列模式（2~5步）
+            for n, entries in sequences.get("ngram_patterns", {}).items():
+                for entry in entries:
+                    if entry["count"] >= 5:  # 出现5次以上的模式
+                        patterns["frequent_patterns"].append({
+                            "pattern": entry["pattern"],
+                            "length": int(n),
+                            "frequency": entry["count"]
+                        })
+            
+            # 连续重复同一操作的模式视为低效
+            for entry in patterns["frequent_patterns"]:
+                steps = entry["pattern"].split(PATTERN_SEPARATOR)
+                if entry["length"] >= 3 and len(set(steps)) == 1:
+                    patterns["inefficient_patterns"].append(entry)
             
+            patterns["frequent_patterns"].sort(key=lambda x: x["frequency"], reverse=True)
             return patterns
         
         except Exception as e:
@@ -494,19 +663,23 @@ class InfluxDBService:
         try:
             client = await self.get_client()
             
-            # 查询操作效率数据
-            tool_filter = f' and r["tool"] == "{tool}"' if tool else ""
-            
-            query = f'''
-            from(bucket: "{settings.INFLUXDB_BUCKET}")
-                |> range(start: -{days}d)
-                |> filter(fn: (r) => r["user_id"] == "{user_id}"{tool_filter})
-                |> filter(fn: (r) => r["_field"] == "duration")
-                |> group(columns: ["action"])
-                |> mean()
-            '''
-            
-            tables = await self.query_api.query(query=query, org=settings.INFLUXDB_ORG)
+            # 查询操作效率数据，按段返回 sum/count 以便跨段求均值
+            def build_query(time_slice: TimeSlice):
+                return FluxQuery() \
+                    .range(start=time_slice.start, stop=time_slice.stop) \
+                    .measurement(EVENTS_MEASUREMENT) \
+                    .tag("user_id", user_id) \
+                    .tag("tool", tool) \
+                    .field("duration") \
+                    .pipe('group(columns: ["action"])') \
+                    .pipe("reduce(identity: {{total: 0.0, count: 0.0}}, "
+                          "fn: (r, accumulator) => ({{total: accumulator.total + float(v: r._value), count: accumulator.count + 1.0}}))") \
+                    .build()
+            
+            grouped = await self.query_grouped(
+                self.time_slices(days), build_query, key=lambda record: record.get("action", "unknown"),
+                value_column="total", count_column="count"
+            )
             
             efficiency_analysis = {
                 "action_efficiency": [],
@@ -518,30 +691,26 @@ class InfluxDBService:
             total_duration = 0
             total_actions = 0
             
-            for table in tables:
-                for record in table.records:
-                    action = record.get("action", "unknown")
-                    avg_duration = record["_value"]
-                    
-                    efficiency_analysis["action_efficiency"].append({
+            for action, avg_duration in grouped.means().items():
+                efficiency_analysis["action_efficiency"].append({
+                    "action": action,
+                    "avg_duration": avg_duration
+                })
+                
+                total_duration += avg_duration
+                total_actions += 1
+                
+                # 分类操作
+                if avg_duration > 5000:  # 超过5秒的操作
+                    efficiency_analysis["slow_operations"].append({
+                        "action": action,
+                        "avg_duration": avg_duration
+                    })
+                elif avg_duration < 1000:  # 少于1秒的操作
+                    efficiency_analysis["fast_operations"].append({
                         "action": action,
                         "avg_duration": avg_duration
                     })
-                    
-                    total_duration += avg_duration
-                    total_actions += 1
-                    
-                    # 分类操作
-                    if avg_duration > 5000:  # 超过5秒的操作
-                        efficiency_analysis["slow_operations"].append({
-                            "action": action,
-                            "avg_duration": avg_duration
-                        })
-                    elif avg_duration < 1000:  # 少于1秒的操作
-                        efficiency_analysis["fast_operations"].append({
-                            "action": action,
-                            "avg_duration": avg_duration
-                        })
             
             # 计算效率分数
             if total_actions > 0:
@@ -559,19 +728,21 @@ class InfluxDBService:
             client = await self.get_client()
             
             # 查询错误事件
-            tool_filter = f' and r["tool"] == "{tool}"' if tool else ""
-            
-            query = f'''
-            from(bucket: "{settings.INFLUXDB_BUCKET}")
-                |> range(start: -{days}d)
-                |> filter(fn: (r) => r["_measurement"] == "efficiency_error")
-                |> filter(fn: (r) => r["user_id"] == "{user_id}"{tool_filter})
-                |> filter(fn: (r) => r["_field"] == "count")
-                |> group(columns: ["error_type", "severity"])
-                |> sum()
-            '''
-            
-            tables = await self.query_api.query(query=query, org=settings.INFLUXDB_ORG)
+            def build_query(time_slice: TimeSlice):
+                return FluxQuery() \
+                    .range(start=time_slice.start, stop=time_slice.stop) \
+                    .measurement("efficiency_error") \
+                    .tag("user_id", user_id) \
+                    .tag("tool", tool) \
+                    .field("count") \
+                    .pipe('group(columns: ["error_type", "severity"])') \
+                    .pipe("sum()") \
+                    .build()
+            
+            grouped = await self.query_grouped(
+                self.time_slices(days), build_query,
+                key=lambda record: (record.get("error_type", "unknown"), record.get("severity", "unknown"))
+            )
             
             error_patterns = {
                 "error_count": 0,
@@ -581,23 +752,18 @@ class InfluxDBService:
                 "common_errors": []
             }
             
-            for table in tables:
-                for record in table.records:
-                    error_type = record.get("error_type", "unknown")
-                    severity = record.get("severity", "unknown")
-                    count = record["_value"]
-                    
-                    error_patterns["error_count"] += count
-                    
-                    error_patterns["error_types"].append({
-                        "type": error_type,
-                        "count": count,
-                        "severity": severity
-                    })
-                    
-                    if severity not in error_patterns["error_severity"]:
-                        error_patterns["error_severity"][severity] = 0
-                    error_patterns["error_severity"][severity] += count
+            for (error_type, severity), count in grouped.sums().items():
+                error_patterns["error_count"] += count
+                
+                error_patterns["error_types"].append({
+                    "type": error_type,
+                    "count": count,
+                    "severity": severity
+                })
+                
+                if severity not in error_patterns["error_severity"]:
+                    error_patterns["error_severity"][severity] = 0
+                error_patterns["error_severity"][severity] += count
             
             return error_patterns
         
@@ -611,17 +777,21 @@ class InfluxDBService:
             client = await self.get_client()
             
             # 查询错误事件
-            query = f'''
-            from(bucket: "{settings.INFLUXDB_BUCKET}")
-                |> range(start: -{days}d)
-                |> filter(fn: (r) => r["_measurement"] == "efficiency_error")
-                |> filter(fn: (r) => r["user_id"] == "{user_id}")
-                |> filter(fn: (r) => r["_field"] == "count")
-                |> group(columns: ["error_type", "severity"])
-                |> sum()
-            '''
-            
-            tables = await self.query_api.query(query=query, org=settings.INFLUXDB_ORG)
+            def build_query(time_slice: TimeSlice):
+                return FluxQuery() \
+                    .range(start=time_slice.start, stop=time_slice.stop) \
+                    .measurement("efficiency_error") \
+                    .tag("user_id", user_id) \
+                    .field("count") \
+                    .pipe('group(columns: ["error_type", "severity"])') \
+                    .pipe("sum()") \
+                    .build()
+            
+            slices = self.time_slices(days)
+            grouped = await self.query_grouped(
+                slices, build_query,
+                key=lambda record: (record.get("error_type", "unknown"), record.get("severity", "unknown"))
+            )
             
             error_analysis = {
                 "error_count": 0,
@@ -630,42 +800,37 @@ class InfluxDBService:
                 "error_trend": []
             }
             
-            for table in tables:
-                for record in table.records:
-                    error_type = record.get("error_type", "unknown")
-                    severity = record.get("severity", "unknown")
-                    count = record["_value"]
-                    
-                    error_analysis["error_count"] += count
-                    
-                    error_analysis["error_types"].append({
-                        "type": error_type,
-                        "count": count,
-                        "severity": severity
-                    })
-                    
-                    if severity not in error_analysis["error_severity"]:
-                        error_analysis["error_severity"][severity] = 0
-                    error_analysis["error_severity"][severity] += count
+            for (error_type, severity), count in grouped.sums().items():
+                error_analysis["error_count"] += count
+                
+                error_analysis["error_types"].append({
+                    "type": error_type,
+                    "count": count,
+                    "severity": severity
+                })
+                
+                if severity not in error_analysis["error_severity"]:
+                    error_analysis["error_severity"][severity] = 0
+                error_analysis["error_severity"][severity] += count
             
             # 获取错误趋势
-            trend_query = f'''
-            from(bucket: "{settings.INFLUXDB_BUCKET}")
-                |> range(start: -{days}d)
-                |> filter(fn: (r) => r["_measurement"] == "efficiency_error")
-                |> filter(fn: (r) => r["user_id"] == "{user_id}")
-                |> filter(fn: (r) => r["_field"] == "count")
-                |> aggregateWindow(every: 1d, fn: sum, createEmpty: false)
-            '''
-            
-            trend_tables = await self.query_api.query(query=trend_query, org=settings.INFLUXDB_ORG)
-            
-            for table in trend_tables:
-                for record in table.records:
-                    error_analysis["error_trend"].append({
-                        "time": record["_time"].isoformat(),
-                        "count": record["_value"]
-                    })
+            def build_trend_query(time_slice: TimeSlice):
+                return FluxQuery() \
+                    .range(start=time_slice.start, stop=time_slice.stop) \
+                    .measurement("efficiency_error") \
+                    .tag("user_id", user_id) \
+                    .field("count") \
+                    .pipe("aggregateWindow(every: 1d, fn: sum, createEmpty: false)") \
+                    .build()
+            
+            trend = await self.query_grouped(
+                slices, build_trend_query, key=lambda record: (series_key(record), record["_time"])
+            )
+            for (_, time), count in sorted(trend.sums().items()):
+                error_analysis["error_trend"].append({
+                    "time": time.isoformat(),
+                    "count": count
+                })
             
             return error_analysis
         
@@ -679,16 +844,18 @@ class InfluxDBService:
             client = await self.get_client()
             
             # 查询标注效率趋势
-            query = f'''
-            from(bucket: "{settings.INFLUXDB_BUCKET}")
-                |> range(start: -{days}d)
-                |> filter(fn: (r) => r["_measurement"] == "efficiency_annotation")
-                |> filter(fn: (r) => r["user_id"] == "{user_id}")
-                |> filter(fn: (r) => r["_field"] == "duration")
-                |> aggregateWindow(every: {interval}, fn: mean, createEmpty: false)
-            '''
+            every = parse_duration(interval)
             
-            tables = await self.query_api.query(query=query, org=settings.INFLUXDB_ORG)
+            def build_query(time_slice: TimeSlice):
+                return FluxQuery() \
+                    .range(start=time_slice.start, stop=time_slice.stop) \
+                    .measurement("efficiency_annotation") \
+                    .tag("user_id", user_id) \
+                    .field("duration") \
+                    .pipe("aggregateWindow(every: {every}, fn: mean, createEmpty: false)", every=every) \
+                    .build()
+            
+            columns = await self.query_columns_sliced(self.time_slices(days, every), build_query)
             
             trend = {
                 "timeline": [],
@@ -696,17 +863,12 @@ class InfluxDBService:
                 "consistency": 0.0
             }
             
-            durations = []
-            for table in tables:
-                for record in table.records:
-                    time = record["_time"].isoformat()
-                    duration = record["_value"]
-                    durations.append(duration)
-                    
-                    trend["timeline"].append({
-                        "time": time,
-                        "avg_duration": duration
-                    })
+            durations = columns.value.tolist()
+            for time_ns, duration in zip(columns.time.tolist(), durations):
+                trend["timeline"].append({
+                    "time": ns_to_datetime(time_ns).isoformat(),
+                    "avg_duration": duration
+                })
             
             # 计算改进率
             if len(durations) >= 2:
@@ -732,16 +894,20 @@ class InfluxDBService:
             client = await self.get_client()
             
             # 查询任务完成趋势
-            query = f'''
-            from(bucket: "{settings.INFLUXDB_BUCKET}")
-                |> range(start: -{days}d)
-                |> filter(fn: (r) => r["_measurement"] == "efficiency_task_status")
-                |> filter(fn: (r) => r["user_id"] == "{user_id}")
-                |> filter(fn: (r) => r["_field"] == "count")
-                |> aggregateWindow(every: {interval}, fn: sum, createEmpty: false)
-            '''
-            
-            tables = await self.query_api.query(query=query, org=settings.INFLUXDB_ORG)
+            every = parse_duration(interval)
+            
+            def build_query(time_slice: TimeSlice):
+                return FluxQuery() \
+                    .range(start=time_slice.start, stop=time_slice.stop) \
+                    .measurement("efficiency_task_status") \
+                    .tag("user_id", user_id) \
+                    .field("count") \
+                    .pipe("aggregateWindow(every: {every}, fn: sum, createEmpty: false)", every=every) \
+                    .build()
+            
+            completed = await self.query_grouped(
+                self.time_slices(days, every), build_query, key=lambda record: (series_key(record), record["_time"])
+            )
             
             trend = {
                 "completed_tasks": [],
@@ -749,15 +915,11 @@ class InfluxDBService:
                 "avg_completion_time": 0.0
             }
             
-            for table in tables:
-                for record in table.records:
-                    time = record["_time"].isoformat()
-                    count = record["_value"]
-                    
-                    trend["completed_tasks"].append({
-                        "time": time,
-                        "count": count
-                    })
+            for (_, time), count in sorted(completed.sums().items()):
+                trend["completed_tasks"].append({
+                    "time": time.isoformat(),
+                    "count": count
+                })
             
             return trend
         
@@ -771,15 +933,17 @@ class InfluxDBService:
             client = await self.get_client()
             
             # 查询性能指标趋势
-            query = f'''
-            from(bucket: "{settings.INFLUXDB_BUCKET}")
-                |> range(start: -{days}d)
-                |> filter(fn: (r) => r["_measurement"] == "efficiency_performance")
-                |> filter(fn: (r) => r["user_id"] == "{user_id}")
-                |> aggregateWindow(every: {interval}, fn: mean, createEmpty: false)
-            '''
+            every = parse_duration(interval)
             
-            tables = await self.query_api.query(query=query, org=settings.INFLUXDB_ORG)
+            def build_query(time_slice: TimeSlice):
+                return FluxQuery() \
+                    .range(start=time_slice.start, stop=time_slice.stop) \
+                    .measurement("efficiency_performance") \
+                    .tag("user_id", user_id) \
+                    .pipe("aggregateWindow(every: {every}, fn: mean, createEmpty: false)", every=every) \
+                    .build()
+            
+            columns = await self.query_columns_sliced(self.time_slices(days, every), build_query)
             
             trend = {
                 "fps_trend": [],
@@ -788,20 +952,16 @@ class InfluxDBService:
                 "render_time_trend": []
             }
             
-            for table in tables:
-                for record in table.records:
-                    time = record["_time"].isoformat()
-                    field = record["_field"]
-                    value = record["_value"]
-                    
-                    if field == "fps":
-                        trend["fps_trend"].append({"time": time, "value": value})
-                    elif field == "memory_usage":
-                        trend["memory_trend"].append({"time": time, "value": value})
-                    elif field == "cpu_usage":
-                        trend["cpu_trend"].append({"time": time, "value": value})
-                    elif field == "render_time":
-                        trend["render_time_trend"].append({"time": time, "value": value})
+            field_trends = {
+                "fps": trend["fps_trend"],
+                "memory_usage": trend["memory_trend"],
+                "cpu_usage": trend["cpu_trend"],
+                "render_time": trend["render_time_trend"]
+            }
+            for field, points in field_trends.items():
+                mask = columns.field.eq(field)
+                for time_ns, value in zip(columns.time[mask].tolist(), columns.value[mask].tolist()):
+                    points.append({"time": ns_to_datetime(time_ns).isoformat(), "value": value})
             
             return trend
         
@@ -809,37 +969,26 @@ class InfluxDBService:
             self.logger.error(f"Failed to get performance trend: {e}")
             raise
 
+    async def get_annotation_durations(self, days: int = 30, user_id: Optional[str] = None) -> FluxColumns:
+        """按列式获取标注时长记录（不指定用户时返回所有用户），供学习曲线拟合使用"""
+        def build_query(time_slice: TimeSlice):
+            return FluxQuery() \
+                .range(start=time_slice.start, stop=time_slice.stop) \
+                .measurement(EVENTS_MEASUREMENT) \
+                .tag("user_id", user_id) \
+                .tag("event_type", "EventType.ANNOTATION") \
+                .field("duration") \
+                .pipe('keep(columns: ["_time", "_value", "_field", "user_id", "project_id", "annotationType"])') \
+                .build()
+        
+        return await self.query_columns_sliced(self.time_slices(days), build_query)
+
     async def get_learning_curve_analysis(self, user_id: str, days: int = 30) -> Dict[str, Any]:
-        """获取学习曲线分析"""
+        """获取学习曲线分析（按需拟合单个用户的幂律学习曲线）"""
         try:
-            # 基于效率趋势数据计算学习曲线
-            efficiency_trend = await self.get_annotation_efficiency_trend(user_id, days, "1d")
-            
-            learning_curve = {
-                "learning_rate": 0.0,
-                "plateau_detected": False,
-                "skill_level": "beginner",
-                "improvement_potential": 0.0
-            }
-            
-            if efficiency_trend["timeline"]:
-                # 计算学习率
-                learning_curve["learning_rate"] = efficiency_trend["improvement_rate"]
-                
-                # 判断技能水平
-                if learning_curve["learning_rate"] > 20:
-                    learning_curve["skill_level"] = "rapid_learner"
-                elif learning_curve["learning_rate"] > 10:
-                    learning_curve["skill_level"] = "intermediate"
-                elif learning_curve["learning_rate"] > 0:
-                    learning_curve["skill_level"] = "beginner"
-                else:
-                    learning_curve["skill_level"] = "experienced"
-                
-                # 计算改进潜力
-                learning_curve["improvement_potential"] = max(0, 50 - learning_curve["learning_rate"])
-            
-            return learning_curve
+            columns = await self.get_annotation_durations(days, user_id)
+            curves = await offloader.run("learning_curves", columns, settings.LEARNING_CURVE_MIN_SAMPLES)
+            return summarize_curves(curves)
         
         except Exception as e:
             self.logger.error(f"Failed to get learning curve analysis: {e}")
@@ -889,8 +1038,9 @@ class InfluxDBService:
             self.logger.error(f"Failed to get user comparison data: {e}")
             raise
 
-    async def calculate_user_rankings(self, comparison_data: Dict[str, Any], metrics: List[str]) -> Dict[str, Any]:
-        """计算用户排名和百分位"""
+    async def calculate_user_rankings(self, comparison_data: Dict[str, Any], metrics: List[str],
+                                      target_user_id: Optional[str] = None) -> Dict[str, Any]:
+        """计算目标用户在对比用户中的排名和百分位（项目级排名见 RankingIndex）"""
         try:
             rankings = {
                 "overall_rank": 0,
@@ -898,28 +1048,35 @@ class InfluxDBService:
                 "percentiles": {}
             }
             
+            if target_user_id is None:
+                target_user_id = next(iter(comparison_data), None)
+            
             # 计算每个指标的排名
             for metric in metrics:
                 metric_values = []
                 for user_id, user_data in comparison_data.items():
-                    if metric in user_data.get("metrics", {}):
+                    value = metric_value(metric, user_data.get("metrics", {}).get(metric))
+                    if value is not None:
                         metric_values.append({
                             "user_id": user_id,
-                            "value": user_data["metrics"][metric]
+                            "value": value
                         })
                 
-                # 排序
+                # 排序（耗时类指标越小越好）
                 if metric_values:
-                    metric_values.sort(key=lambda x: x["value"], reverse=True)
+                    higher_is_better = RANKING_METRICS.get(metric, (None, True))[1]
+                    metric_values.sort(key=lambda x: x["value"], reverse=higher_is_better)
                     
                     # 找到目标用户的排名
                     for i, item in enumerate(metric_values):
-                        if item["user_id"] == list(comparison_data.keys())[0]:  # 假设第一个是目标用户
+                        if item["user_id"] == target_user_id:
+                            percentile = (len(metric_values) - i) / len(metric_values) * 100
                             rankings["metric_rankings"][metric] = {
                                 "rank": i + 1,
                                 "total": len(metric_values),
-                                "percentile": (len(metric_values) - i) / len(metric_values) * 100
+                                "percentile": percentile
                             }
+                            rankings["percentiles"][metric] = percentile
                             break
             
             return rankings
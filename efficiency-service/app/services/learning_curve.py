@@ -0,0 +1,254 @@
+from typing import List, Dict, Any, Optional
+import logging
+
+import numpy as np
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models.efficiency_metrics import LearningCurveFit
+from ..utils.timezone import utc_now
+from .flux_columnar import FluxColumns
+from .offload import cpu_bound
+
+logger = logging.getLogger(__name__)
+
+# 跨所有标注类型的汇总曲线
+ALL_TYPES = "all"
+
+
+def skill_level(learning_rate: float) -> str:
+    """按学习率划分技能水平（与原有阈值一致）"""
+    if learning_rate > 20:
+        return "rapid_learner"
+    if learning_rate > 10:
+        return "intermediate"
+    if learning_rate > 0:
+        return "beginner"
+    return "experienced"
+
+
+def fit_power_law(group_codes: np.ndarray, practice: np.ndarray, durations: np.ndarray,
+                  n_groups: int) -> Dict[str, np.ndarray]:
+    """
+    按分组批量拟合幂律学习曲线 duration = a * practice^(-b)
+
+    在对数空间做最小二乘，所有分组的充分统计量用 np.bincount 一次求出。
+    样本不足或练习次数无变化的分组，系数为NaN。
+    """
+    x = np.log(practice)
+    y = np.log(durations)
+    n = np.bincount(group_codes, minlength=n_groups).astype(np.float64)
+    sx = np.bincount(group_codes, weights=x, minlength=n_groups)
+    sy = np.bincount(group_codes, weights=y, minlength=n_groups)
+    sxx = np.bincount(group_codes, weights=x * x, minlength=n_groups)
+    sxy = np.bincount(group_codes, weights=x * y, minlength=n_groups)
+    syy = np.bincount(group_codes, weights=y * y, minlength=n_groups)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        var_x = n * sxx - sx * sx
+        var_y = n * syy - sy * sy
+        cov = n * sxy - sx * sy
+        slope = np.where(var_x > 0, cov / var_x, np.nan)
+        intercept = (sy - slope * sx) / n
+        r_squared = np.where(var_y > 0, cov * cov / (var_x * var_y), 1.0)
+
+    return {
+        "count": n.astype(np.int64),
+        "a": np.exp(intercept),
+        "b": -slope,
+        "r_squared": np.where(np.isnan(slope), np.nan, r_squared)
+    }
+
+
+@cpu_bound("learning_curves", min_rows=500000, columns=("user_id", "project_id", "annotationType"))
+def fit_learning_curves(columns: FluxColumns, min_samples: int = 10) -> List[Dict[str, Any]]:
+    """
+    对列式标注时长记录按 (用户, 项目, 标注类型) 批量拟合学习曲线
+
+    练习次数为该分组在查询范围内按时间排序的累计标注数；每个 (用户, 项目) 另拟合一条
+    跨所有类型的汇总曲线（标注类型为 all）。
+    """
+    if len(columns) == 0:
+        return []
+
+    valid = np.isfinite(columns.value) & (columns.value > 0)
+    users = columns.column("user_id")
+    projects = columns.column("project_id")
+    types = columns.column("annotationType")
+
+    # (用户, 项目) 编码，类型编码中最后一个值代表汇总曲线
+    pair_codes = users.codes.astype(np.int64) * (len(projects.categories) + 1) + (projects.codes + 1)
+    type_labels = types.categories + ["unknown", ALL_TYPES]
+    type_codes = np.where(types.codes < 0, len(types.categories), types.codes).astype(np.int64)
+    all_code = len(type_labels) - 1
+
+    pair_codes = np.concatenate((pair_codes[valid], pair_codes[valid]))
+    type_codes = np.concatenate((type_codes[valid], np.full(int(valid.sum()), all_code, dtype=np.int64)))
+    times = np.concatenate((columns.time[valid], columns.time[valid]))
+    durations = np.concatenate((columns.value[valid], columns.value[valid]))
+    rows = np.concatenate((np.flatnonzero(valid), np.flatnonzero(valid)))
+    if len(durations) == 0:
+        return []
+
+    # 分组后按时间排序，组内位置即累计练习次数
+    groups, group_codes = np.unique(pair_codes * len(type_labels) + type_codes, return_inverse=True)
+    order = np.lexsort((times, group_codes))
+    group_codes = group_codes[order]
+    starts = np.flatnonzero(np.r_[True, group_codes[1:] != group_codes[:-1]])
+    practice = np.arange(len(order)) - np.repeat(starts, np.diff(np.r_[starts, len(order)])) + 1
+
+    fit = fit_power_law(group_codes, practice.astype(np.float64), durations[order], len(groups))
+
+    # 每个分组取首行还原用户与项目
+    first_rows = rows[order][starts]
+    user_values = users.decode("unknown")[first_rows]
+    project_values = projects.decode("unknown")[first_rows]
+    type_values = np.array(type_labels, dtype=object)[(groups % len(type_labels)).astype(np.int64)]
+
+    curves = []
+    for index in range(len(groups)):
+        count = int(fit["count"][index])
+        b = float(fit["b"][index])
+        if count < min_samples or np.isnan(b):
+            continue
+        a = float(fit["a"][index])
+        # 练习次数每翻一倍，耗时下降的百分比
+        learning_rate = (1 - 2 ** -b) * 100
+        curves.append({
+            "user_id": user_values[index],
+            "project_id": project_values[index],
+            "annotation_type": type_values[index],
+            "sample_count": count,
+            "initial_duration": a,
+            "learning_exponent": b,
+            "learning_rate": learning_rate,
+            "r_squared": float(fit["r_squared"][index]),
+            "current_duration": a * count ** -b,
+            "plateau_detected": learning_rate < 5
+        })
+    return curves
+
+
+def summarize_curves(curves: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """把某个用户的拟合结果转换为学习曲线分析（以样本最多的汇总曲线为主）"""
+    learning_curve = {
+        "learning_rate": 0.0,
+        "plateau_detected": False,
+        "skill_level": "beginner",
+        "improvement_potential": 0.0,
+        "by_annotation_type": []
+    }
+
+    overall = [curve for curve in curves if curve["annotation_type"] == ALL_TYPES]
+    if not overall:
+        return learning_curve
+    main = max(overall, key=lambda curve: curve["sample_count"])
+
+    learning_curve.update({
+        "project_id": main["project_id"],
+        "learning_rate": main["learning_rate"],
+        "plateau_detected": main["plateau_detected"],
+        "skill_level": skill_level(main["learning_rate"]),
+        "improvement_potential": max(0, 50 - main["learning_rate"]),
+        "model": {
+            "initial_duration": main["initial_duration"],
+            "learning_exponent": main["learning_exponent"],
+            "r_squared": main["r_squared"],
+            "sample_count": main["sample_count"],
+            "current_duration": main["current_duration"]
+        },
+        "by_annotation_type": [
+            {
+                "annotation_type": curve["annotation_type"],
+                "learning_rate": curve["learning_rate"],
+                "learning_exponent": curve["learning_exponent"],
+                "r_squared": curve["r_squared"],
+                "sample_count": curve["sample_count"]
+            }
+            for curve in curves
+            if curve["project_id"] == main["project_id"] and curve["annotation_type"] != ALL_TYPES
+        ]
+    })
+    if "fitted_at" in main:
+        learning_curve["fitted_at"] = main["fitted_at"]
+        learning_curve["window_days"] = main["window_days"]
+    return learning_curve
+
+
+def _curve_row(fit) -> Dict[str, Any]:
+    return {
+        "user_id": fit.user_id,
+        "project_id": fit.project_id,
+        "annotation_type": fit.annotation_type,
+        "sample_count": fit.sample_count,
+        "initial_duration": fit.initial_duration,
+        "learning_exponent": fit.learning_exponent,
+        "learning_rate": fit.learning_rate,
+        "r_squared": fit.r_squared,
+        "current_duration": fit.current_duration,
+        "plateau_detected": fit.plateau_detected,
+        "window_days": fit.window_days,
+        "fitted_at": fit.fitted_at.isoformat() if fit.fitted_at else None
+    }
+
+
+async def save_curves(session: AsyncSession, curves: List[Dict[str, Any]], window_days: int,
+                      batch_size: int = 500) -> int:
+    """
+    按 (用户, 项目, 标注类型) 批量写入拟合结果，已存在则覆盖
+
+    同一事务中删除本次没有拟合出结果的旧记录（如最近窗口内已没有数据的用户），只保留本批次的结果。
+    """
+    fitted_at = utc_now().replace(tzinfo=None)
+    try:
+        for start in range(0, len(curves), batch_size):
+            rows = [
+                dict(curve, window_days=window_days, fitted_at=fitted_at)
+                for curve in curves[start:start + batch_size]
+            ]
+            statement = insert(LearningCurveFit).values(rows)
+            statement = statement.on_conflict_do_update(
+                constraint="uq_learning_curve_fits_dim",
+                set_={
+                    column: statement.excluded[column]
+                    for column in ("sample_count", "initial_duration", "learning_exponent", "learning_rate",
+                                   "r_squared", "current_duration", "plateau_detected", "window_days", "fitted_at")
+                }
+            )
+            await session.execute(statement)
+        await session.execute(delete(LearningCurveFit).where(LearningCurveFit.fitted_at < fitted_at))
+        await session.commit()
+        return len(curves)
+    except Exception as e:
+        await session.rollback()
+        logger.error(f"Failed to save learning curves: {e}")
+        raise
+
+
+async def load_user_curves(session: AsyncSession, user_id: str,
+                           window_days: Optional[int] = None) -> List[Dict[str, Any]]:
+    """读取用户已保存的拟合结果，给定 window_days 时只返回使用该天数拟合的结果"""
+    query = select(LearningCurveFit).where(LearningCurveFit.user_id == user_id)
+    if window_days is not None:
+        query = query.where(LearningCurveFit.window_days == window_days)
+    result = await session.execute(query)
+    return [_curve_row(fit) for fit in result.scalars().all()]
+
+
+async def rank_project_curves(session: AsyncSession, project_id: str,
+                              annotation_type: str = ALL_TYPES, limit: int = 100) -> List[Dict[str, Any]]:
+    """按学习率对项目内所有用户的学习曲线排名"""
+    result = await session.execute(
+        select(LearningCurveFit)
+        .where(LearningCurveFit.project_id == project_id, LearningCurveFit.annotation_type == annotation_type)
+        .order_by(LearningCurveFit.learning_rate.desc())
+        .limit(limit)
+    )
+    rankings = []
+    for rank, fit in enumerate(result.scalars().all(), start=1):
+        row = _curve_row(fit)
+        row["rank"] = rank
+        row["skill_level"] = skill_level(fit.learning_rate)
+        rankings.append(row)
+    return rankings
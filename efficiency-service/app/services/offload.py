@@ -0,0 +1,79 @@
+from typing import Dict, Any, Optional, Callable, Tuple, Iterable
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import asyncio
+import logging
+import multiprocessing
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisOffloader:
+    """
+    CPU密集型分析函数的执行层
+
+    按名称注册分析函数及其行数阈值：输入较小时直接在事件循环中执行，
+    超过阈值时提交到进程池，避免阻塞同一进程中的接收请求。
+    输入应为列式数组（FluxColumns），序列化开销只与数组字节数相关。
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, min_rows: Optional[int] = None):
+        self.max_workers = max_workers or settings.ANALYSIS_PROCESS_WORKERS
+        self.min_rows = min_rows or settings.ANALYSIS_OFFLOAD_MIN_ROWS
+        self.registry: Dict[str, Tuple[Callable[..., Any], int, Optional[Tuple[str, ...]]]] = {}
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.logger = logging.getLogger(__name__)
+
+    def register(self, name: str, func: Callable[..., Any], min_rows: Optional[int] = None,
+                 columns: Optional[Iterable[str]] = None):
+        """
+        注册分析函数（必须是模块级函数，才能在子进程中按引用序列化）
+
+        columns 为函数用到的字符串列，提交到进程池前会裁剪掉其余列。
+        """
+        self.registry[name] = (func, min_rows or self.min_rows, tuple(columns) if columns else None)
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self.pool is None:
+            # 使用spawn启动子进程，避免fork复制事件循环与连接池状态
+            self.pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self.pool
+
+    async def run(self, name: str, data: Any, *args: Any) -> Any:
+        """执行已注册的分析函数，data为主要输入（按len判断规模）"""
+        func, min_rows, columns = self.registry[name]
+        if self.max_workers <= 0 or len(data) < min_rows:
+            return func(data, *args)
+
+        if columns is not None:
+            data = data.select(columns)
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._get_pool(), func, data, *args)
+        except BrokenProcessPool as e:
+            # 子进程异常退出时重建进程池，本次在当前进程内执行
+            self.logger.error(f"Analysis process pool broken while running {name}: {e}")
+            self.shutdown()
+            return func(data, *args)
+
+    def shutdown(self):
+        """关闭进程池"""
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+
+offloader = AnalysisOffloader()
+
+
+def cpu_bound(name: str, min_rows: Optional[int] = None, columns: Optional[Iterable[str]] = None):
+    """把模块级分析函数注册到默认执行层的装饰器"""
+    def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+        offloader.register(name, func, min_rows, columns)
+        return func
+    return decorator
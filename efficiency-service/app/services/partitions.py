@@ -0,0 +1,167 @@
+from typing import List, Tuple
+from datetime import datetime, timedelta
+import logging
+import re
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.config import settings
+from ..core.database import AsyncSessionLocal
+from ..utils.timezone import utc_now
+
+logger = logging.getLogger(__name__)
+
+
+def month_start(value: datetime) -> datetime:
+    """所在月份的第一天零点（不带时区，与表中的 timestamp 列一致）"""
+    return datetime(value.year, value.month, 1)
+
+
+def add_months(value: datetime, months: int) -> datetime:
+    index = value.year * 12 + value.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+class MonthlyPartitionManager:
+    """
+    按月范围分区的维护：提前创建未来月份的分区，按保留期整块卸载并删除过期分区
+
+    分区命名为 {table}_yYYYYmMM，另有 {table}_default 兜底分区接收超出已建范围的记录；
+    新建分区时先把兜底分区中落在该月的记录搬过去再挂载，避免挂载时约束冲突。
+    """
+
+    def __init__(self, table: str, column: str = "timestamp"):
+        self.table = table
+        self.column = column
+        self.default_partition = f"{table}_default"
+        self.name_pattern = re.compile(rf"^{re.escape(table)}_y(\d{{4}})m(\d{{2}})$")
+        self.logger = logging.getLogger(__name__)
+
+    def partition_name(self, start: datetime) -> str:
+        return f"{self.table}_y{start.year:04d}m{start.month:02d}"
+
+    async def is_partitioned(self, session: AsyncSession) -> bool:
+        """表是否为分区表（尚未迁移的普通表不做分区维护）"""
+        result = await session.execute(
+            text("SELECT relkind::text FROM pg_class WHERE oid = to_regclass(:table)"),
+            {"table": self.table}
+        )
+        return result.scalar() == "p"
+
+    async def list_partitions(self, session: AsyncSession) -> List[Tuple[str, datetime]]:
+        """列出按月分区及其起始时间（按时间排序，不含兜底分区）"""
+        result = await session.execute(
+            text(
+                "SELECT child.relname FROM pg_inherits "
+                "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+                "WHERE pg_inherits.inhparent = to_regclass(:table)"
+            ),
+            {"table": self.table}
+        )
+        partitions = []
+        for (name,) in result.all():
+            match = self.name_pattern.match(name)
+            if match:
+                partitions.append((name, datetime(int(match.group(1)), int(match.group(2)), 1)))
+        return sorted(partitions, key=lambda partition: partition[1])
+
+    async def ensure_default_partition(self, session: AsyncSession):
+        await session.execute(text(
+            f'CREATE TABLE IF NOT EXISTS "{self.default_partition}" PARTITION OF "{self.table}" DEFAULT'
+        ))
+        await session.commit()
+
+    async def create_partition(self, session: AsyncSession, start: datetime):
+        """创建单个月份分区，每个分区一个事务"""
+        end = add_months(start, 1)
+        name = self.partition_name(start)
+        bounds = {"start": start, "end": end}
+        try:
+            await session.execute(text(
+                f'CREATE TABLE "{name}" (LIKE "{self.table}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+            ))
+            # 兜底分区中已有的该月记录先搬到新分区
+            await session.execute(text(
+                f'WITH moved AS (DELETE FROM "{self.default_partition}" '
+                f'WHERE "{self.column}" >= :start AND "{self.column}" < :end RETURNING *) '
+                f'INSERT INTO "{name}" SELECT * FROM moved'
+            ), bounds)
+            await session.execute(text(
+                f'ALTER TABLE "{self.table}" ATTACH PARTITION "{name}" '
+                f"FOR VALUES FROM ('{start.isoformat(sep=' ')}') TO ('{end.isoformat(sep=' ')}')"
+            ))
+            await session.commit()
+        except Exception as e:
+            await session.rollback()
+            self.logger.error(f"Failed to create partition {name}: {e}")
+            raise
+
+    async def ensure_partitions(self, session: AsyncSession, now: datetime, months_ahead: int) -> List[str]:
+        """确保从当前月到未来 months_ahead 个月的分区都已存在，返回新建的分区名"""
+        if not await self.is_partitioned(session):
+            self.logger.warning(f"Table {self.table} is not partitioned, skipping partition maintenance")
+            return []
+
+        await self.ensure_default_partition(session)
+        existing = {start for _, start in await self.list_partitions(session)}
+        created = []
+        current = month_start(now)
+        for offset in range(months_ahead + 1):
+            start = add_months(current, offset)
+            if start not in existing:
+                await self.create_partition(session, start)
+                created.append(self.partition_name(start))
+        return created
+
+    async def drop_partitions_before(self, session: AsyncSession, cutoff: datetime) -> List[str]:
+        """
+        卸载并删除整月早于 cutoff 的分区，返回删除的分区名
+
+        兜底分区中早于 cutoff 的零星记录按行删除。
+        """
+        if not await self.is_partitioned(session):
+            return []
+
+        await self.ensure_default_partition(session)
+        dropped = []
+        for name, start in await self.list_partitions(session):
+            if add_months(start, 1) > cutoff:
+                break
+            try:
+                # 先卸载再删除，删除时不再持有父表上的锁
+                await session.execute(text(f'ALTER TABLE "{self.table}" DETACH PARTITION "{name}"'))
+                await session.commit()
+                await session.execute(text(f'DROP TABLE IF EXISTS "{name}"'))
+                await session.commit()
+                dropped.append(name)
+            except Exception as e:
+                await session.rollback()
+                self.logger.error(f"Failed to drop partition {name}: {e}")
+                raise
+
+        await session.execute(
+            text(f'DELETE FROM "{self.default_partition}" WHERE "{self.column}" < :cutoff'),
+            {"cutoff": cutoff}
+        )
+        await session.commit()
+        return dropped
+
+
+metrics_partitions = MonthlyPartitionManager("efficiency_metrics")
+
+
+
+async def ensure_metric_partitions(months_ahead: int = None) -> List[str]:
+    """为效率指标表建好当前及未来月份的分区"""
+    months_ahead = months_ahead or settings.METRICS_PARTITION_MONTHS_AHEAD
+    async with AsyncSessionLocal() as session:
+        return await metrics_partitions.ensure_partitions(session, utc_now().replace(tzinfo=None), months_ahead)
+
+
+async def drop_expired_metric_partitions(retention_days: int = None) -> List[str]:
+    """按保留期删除效率指标表的过期分区"""
+    retention_days = retention_days or settings.METRICS_RETENTION_DAYS
+    cutoff = utc_now().replace(tzinfo=None) - timedelta(days=retention_days)
+    async with AsyncSessionLocal() as session:
+        return await metrics_partitions.drop_partitions_before(session, cutoff)
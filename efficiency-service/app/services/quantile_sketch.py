@@ -0,0 +1,140 @@
+from typing import List, Dict, Optional, Iterable
+import math
+import struct
+
+import numpy as np
+
+_HEADER = struct.Struct("<dddI")
+
+
+class TDigest:
+    """
+    可合并的t-digest分位数草图（merging digest，k1尺度函数）
+
+    内存与数据量无关：质心数约为 compression 的量级，两端分位数精度更高。
+    """
+
+    def __init__(self, compression: float = 200.0, buffer_size: int = 500):
+        self.compression = float(compression)
+        self.buffer_size = buffer_size
+        self.means = np.empty(0, dtype=np.float64)
+        self.weights = np.empty(0, dtype=np.float64)
+        self.min = math.inf
+        self.max = -math.inf
+        self._buffer: List[float] = []
+        self._buffer_weights: List[float] = []
+
+    def __len__(self) -> int:
+        return int(round(self.count))
+
+    @property
+    def count(self) -> float:
+        return float(self.weights.sum()) + sum(self._buffer_weights)
+
+    def add(self, value: float, weight: float = 1.0):
+        value = float(value)
+        if math.isnan(value):
+            return
+        self._buffer.append(value)
+        self._buffer_weights.append(float(weight))
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if len(self._buffer) >= self.buffer_size:
+            self._compress()
+
+    def update(self, values: Iterable[float]) -> 'TDigest':
+        for value in values:
+            self.add(value)
+        return self
+
+    def merge(self, other: 'TDigest') -> 'TDigest':
+        """合并另一个草图（如其他天或其他用户）"""
+        other._compress()
+        self._buffer.extend(other.means.tolist())
+        self._buffer_weights.extend(other.weights.tolist())
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def _k(self, q: float) -> float:
+        return self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+    def _k_inverse(self, k: float) -> float:
+        if k >= self.compression / 4:
+            return 1.0
+        return (math.sin(k * 2 * math.pi / self.compression) + 1) / 2
+
+    def _compress(self):
+        if not self._buffer:
+            return
+
+        means = np.concatenate((self.means, np.array(self._buffer, dtype=np.float64)))
+        weights = np.concatenate((self.weights, np.array(self._buffer_weights, dtype=np.float64)))
+        self._buffer = []
+        self._buffer_weights = []
+
+        order = np.argsort(means, kind="mergesort")
+        means = means[order].tolist()
+        weights = weights[order].tolist()
+        total = sum(weights)
+
+        merged_means: List[float] = []
+        merged_weights: List[float] = []
+        current_mean, current_weight = means[0], weights[0]
+        weight_so_far = current_weight
+        limit = total * self._k_inverse(self._k(0.0) + 1)
+
+        for mean, weight in zip(means[1:], weights[1:]):
+            proposed = weight_so_far + weight
+            if proposed <= limit:
+                current_weight += weight
+                current_mean += (mean - current_mean) * weight / current_weight
+            else:
+                merged_means.append(current_mean)
+                merged_weights.append(current_weight)
+                limit = total * self._k_inverse(self._k(weight_so_far / total) + 1)
+                current_mean, current_weight = mean, weight
+            weight_so_far = proposed
+
+        merged_means.append(current_mean)
+        merged_weights.append(current_weight)
+        self.means = np.array(merged_means, dtype=np.float64)
+        self.weights = np.array(merged_weights, dtype=np.float64)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """返回分位数q（0~1）的估计值，无数据时返回None"""
+        if not 0 <= q <= 1:
+            raise ValueError(f"Quantile must be in [0, 1]: {q}")
+        self._compress()
+        if len(self.means) == 0:
+            return None
+        if len(self.means) == 1:
+            return float(self.means[0])
+
+        total = float(self.weights.sum())
+        centers = np.cumsum(self.weights) - self.weights / 2
+        positions = np.concatenate(([0.0], centers, [total]))
+        values = np.concatenate(([self.min], self.means, [self.max]))
+        return float(np.interp(q * total, positions, values))
+
+    def quantiles(self, qs: Iterable[float]) -> Dict[str, Optional[float]]:
+        """批量计算分位数，键为 p50 / p90 / p99 形式"""
+        return {f"p{q * 100:g}": self.quantile(q) for q in qs}
+
+    def to_bytes(self) -> bytes:
+        """序列化为紧凑的二进制格式"""
+        self._compress()
+        header = _HEADER.pack(self.compression, self.min, self.max, len(self.means))
+        return header + np.stack((self.means, self.weights)).astype("<f8").tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'TDigest':
+        compression, minimum, maximum, size = _HEADER.unpack_from(data)
+        digest = cls(compression)
+        payload = np.frombuffer(data, dtype="<f8", offset=_HEADER.size).reshape(2, size)
+        digest.means = payload[0].astype(np.float64)
+        digest.weights = payload[1].astype(np.float64)
+        digest.min = minimum
+        digest.max = maximum
+        return digest
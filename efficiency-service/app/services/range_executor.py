@@ -0,0 +1,136 @@
+from typing import List, Dict, Any, Optional, Tuple, Callable, Awaitable, AsyncIterator, NamedTuple, Hashable
+from datetime import datetime, timedelta, timezone
+import asyncio
+import logging
+
+from ..core.config import settings
+from ..utils.timezone import utc_now
+
+logger = logging.getLogger(__name__)
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class TimeSlice(NamedTuple):
+    """查询时间范围中的一段，index为按时间先后的序号"""
+    index: int
+    start: datetime
+    stop: datetime
+
+
+def split_range(days: Optional[int] = None, hours: Optional[int] = None,
+                start: Optional[datetime] = None, stop: Optional[datetime] = None,
+                step: Optional[timedelta] = None) -> List[TimeSlice]:
+    """
+    将 [start, stop) 切分为若干段
+
+    内部切点对齐到step的整数倍（相对Unix纪元），与 aggregateWindow 的窗口边界一致，
+    因此按段聚合再合并的结果与整段查询相同。
+    """
+    stop = stop or utc_now()
+    if start is None:
+        start = stop - timedelta(days=days or 0, hours=hours or 0)
+    step = step or timedelta(hours=settings.RANGE_SLICE_HOURS)
+    if start >= stop:
+        raise ValueError("split_range() requires start < stop")
+
+    slices = []
+    cursor = start
+    boundary = _EPOCH + ((start - _EPOCH) // step + 1) * step
+    while cursor < stop:
+        end = min(boundary, stop)
+        slices.append(TimeSlice(len(slices), cursor, end))
+        cursor = end
+        boundary += step
+    return slices
+
+
+class GroupedStats:
+    """按分组键累计 sum/count/min/max，可跨时间段合并"""
+
+    __slots__ = ("groups",)
+
+    def __init__(self):
+        self.groups: Dict[Hashable, List[float]] = {}
+
+    def add(self, key: Hashable, total: float, count: float = 1,
+            minimum: Optional[float] = None, maximum: Optional[float] = None):
+        minimum = total if minimum is None else minimum
+        maximum = total if maximum is None else maximum
+        stats = self.groups.get(key)
+        if stats is None:
+            self.groups[key] = [total, count, minimum, maximum]
+        else:
+            stats[0] += total
+            stats[1] += count
+            stats[2] = min(stats[2], minimum)
+            stats[3] = max(stats[3], maximum)
+
+    def merge(self, other: 'GroupedStats') -> 'GroupedStats':
+        for key, (total, count, minimum, maximum) in other.groups.items():
+            self.add(key, total, count, minimum, maximum)
+        return self
+
+    def sums(self) -> Dict[Hashable, float]:
+        return {key: stats[0] for key, stats in self.groups.items()}
+
+    def means(self) -> Dict[Hashable, float]:
+        return {key: stats[0] / stats[1] for key, stats in self.groups.items() if stats[1]}
+
+
+def merge_partials(left: Any, right: Any) -> Any:
+    """合并两个部分结果：支持 merge() 方法、数值以及按键合并的字典"""
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if hasattr(left, "merge"):
+        return left.merge(right)
+    if isinstance(left, dict):
+        merged = dict(left)
+        for key, value in right.items():
+            merged[key] = merge_partials(merged.get(key), value)
+        return merged
+    return left + right
+
+
+class RangeExecutor:
+    """在信号量限制下并发执行各时间段查询"""
+
+    def __init__(self, concurrency: Optional[int] = None):
+        self.concurrency = concurrency or settings.RANGE_QUERY_CONCURRENCY
+
+    async def iter_slices(self, slices: List[TimeSlice],
+                          fetch: Callable[[TimeSlice], Awaitable[Any]]) -> AsyncIterator[Tuple[TimeSlice, Any]]:
+        """按完成顺序逐段产出 (时间段, 部分结果)"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run(time_slice: TimeSlice):
+            async with semaphore:
+                return time_slice, await fetch(time_slice)
+
+        tasks = [asyncio.ensure_future(run(time_slice)) for time_slice in slices]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def reduce(self, slices: List[TimeSlice], fetch: Callable[[TimeSlice], Awaitable[Any]],
+                     merge: Callable[[Any, Any], Any] = merge_partials) -> Any:
+        """
+        执行全部时间段并合并结果
+
+        合并按时间先后进行：先完成的后续段会暂存，直到前面的段到达，
+        因此依赖顺序的部分结果（如最近N个值）也能正确合并。
+        """
+        result = None
+        pending: Dict[int, Any] = {}
+        next_index = 0
+        async for time_slice, partial in self.iter_slices(slices, fetch):
+            pending[time_slice.index] = partial
+            while next_index in pending:
+                result = merge(result, pending.pop(next_index))
+                next_index += 1
+        return result
@@ -0,0 +1,183 @@
+from typing import List, Dict, Any, Optional, Tuple
+from datetime import timedelta
+import logging
+import re
+
+import redis.asyncio as redis
+
+from ..schemas.event import EventType
+from ..core.config import settings
+from ..utils.timezone import utc_now
+from .redis_keys import scan_keys
+
+logger = logging.getLogger(__name__)
+
+RANKING_PREFIX = "effm:rank"
+
+ANNOTATION_TYPE = str(EventType.ANNOTATION)
+ERROR_TYPE = str(EventType.ERROR)
+
+# 指标 -> (对比数据中的取值字段, 是否越大越好)
+RANKING_METRICS: Dict[str, Tuple[str, bool]] = {
+    "efficiency": ("avg_duration", False),
+    "speed": ("annotations_per_hour", True),
+    "accuracy": ("accuracy_rate", True),
+}
+
+
+def ranking_key(project_id: str, metric: str, days: int) -> str:
+    return f"{RANKING_PREFIX}:{project_id}:{metric}:{days}d"
+
+
+def ranking_meta_key(project_id: str, days: int) -> str:
+    return f"{RANKING_PREFIX}:meta:{project_id}:{days}d"
+
+
+def metric_scores(totals: Dict[str, float], days: int) -> Dict[str, float]:
+    """从聚合结果计算各排名指标，口径与 get_user_comparison_data 一致"""
+    count = int(totals.get(f"duration:{ANNOTATION_TYPE}:count", 0))
+    if count == 0:
+        return {}
+    errors = int(totals.get(f"events:{ERROR_TYPE}", 0))
+    return {
+        "efficiency": totals.get(f"duration:{ANNOTATION_TYPE}:sum", 0.0) / count,
+        "speed": count / (days * 24),
+        "accuracy": 1.0 - errors / count
+    }
+
+
+def metric_value(metric: str, metric_data: Any) -> Optional[float]:
+    """从对比数据中取出可排序的数值"""
+    field, _ = RANKING_METRICS.get(metric, (None, True))
+    if isinstance(metric_data, dict):
+        metric_data = metric_data.get(field)
+    if isinstance(metric_data, bool) or not isinstance(metric_data, (int, float)):
+        return None
+    return float(metric_data)
+
+
+class RankingIndex:
+    """
+    项目级排名索引：每个 (项目, 指标, 天数) 一个Redis有序集合，由后台任务定期全量刷新
+
+    任意用户的名次与百分位通过 ZSCORE/ZCOUNT 在 O(log n) 内得到，无需查询其他用户的数据。
+    """
+
+    def __init__(self):
+        self.client = None
+        self.logger = logging.getLogger(__name__)
+
+    async def get_client(self) -> redis.Redis:
+        """获取Redis客户端"""
+        if self.client is None:
+            self.client = redis.from_url(settings.REDIS_URL, decode_responses=True)
+        return self.client
+
+    async def close(self):
+        """关闭Redis连接"""
+        if self.client:
+            await self.client.close()
+            self.client = None
+
+    async def refresh(self, aggregate_store, days: int) -> int:
+        """用增量聚合重建所有活跃项目的排名，返回写入的项目数"""
+        scores: Dict[str, Dict[str, Dict[str, float]]] = {}
+        users = await aggregate_store.get_active_users(utc_now() - timedelta(days=days))
+        for user_id in users:
+            for project_id in await aggregate_store.get_user_projects(user_id):
+                totals = await aggregate_store.get_user_totals(user_id, days, project_id)
+                for metric, score in metric_scores(totals, days).items():
+                    scores.setdefault(project_id, {}).setdefault(metric, {})[user_id] = score
+
+        client = await self.get_client()
+        ttl = settings.RANKING_REFRESH_INTERVAL * 3
+        refreshed_at = utc_now().isoformat()
+        for project_id, project_scores in scores.items():
+            async with client.pipeline(transaction=True) as pipe:
+                for metric, members in project_scores.items():
+                    # 先写临时键再改名，读者不会看到写了一半的排名
+                    key = ranking_key(project_id, metric, days)
+                    staging = f"{key}:staging"
+                    pipe.delete(staging)
+                    pipe.zadd(staging, members)
+                    pipe.rename(staging, key)
+                    pipe.expire(key, ttl)
+                pipe.hset(ranking_meta_key(project_id, days), mapping={
+                    "refreshed_at": refreshed_at,
+                    "user_count": max(len(members) for members in project_scores.values())
+                })
+                pipe.expire(ranking_meta_key(project_id, days), ttl)
+                await pipe.execute()
+        return len(scores)
+
+    async def get_standing(self, project_id: str, user_id: str, metrics: List[str],
+                           days: int) -> Optional[Dict[str, Any]]:
+        """查询用户在整个项目中的名次与百分位，索引不存在时返回None"""
+        try:
+            client = await self.get_client()
+            meta = await client.hgetall(ranking_meta_key(project_id, days))
+            if not meta:
+                return None
+
+            metrics = [metric for metric in metrics if metric in RANKING_METRICS]
+            async with client.pipeline(transaction=False) as pipe:
+                for metric in metrics:
+                    pipe.zscore(ranking_key(project_id, metric, days), user_id)
+                    pipe.zcard(ranking_key(project_id, metric, days))
+                replies = await pipe.execute()
+
+            standing = {
+                "project_id": project_id,
+                "refreshed_at": meta.get("refreshed_at"),
+                "metric_rankings": {},
+                "percentiles": {}
+            }
+            ranked: List[Tuple[str, float, int, bool]] = []
+            for index, metric in enumerate(metrics):
+                score, total = replies[2 * index], replies[2 * index + 1]
+                if score is not None and total:
+                    ranked.append((metric, float(score), int(total), RANKING_METRICS[metric][1]))
+
+            async with client.pipeline(transaction=False) as pipe:
+                for metric, score, _, higher_is_better in ranked:
+                    key = ranking_key(project_id, metric, days)
+                    if higher_is_better:
+                        pipe.zcount(key, f"({score}", "+inf")
+                        pipe.zcount(key, "-inf", score)
+                    else:
+                        pipe.zcount(key, "-inf", f"({score}")
+                        pipe.zcount(key, score, "+inf")
+                counts = await pipe.execute()
+
+            for index, (metric, score, total, _) in enumerate(ranked):
+                better, not_better = counts[2 * index], counts[2 * index + 1]
+                percentile = not_better / total * 100
+                standing["metric_rankings"][metric] = {
+                    "value": score,
+                    "rank": better + 1,
+                    "total": total,
+                    "percentile": percentile
+                }
+                standing["percentiles"][metric] = percentile
+
+            if standing["percentiles"]:
+                standing["overall_percentile"] = sum(standing["percentiles"].values()) / len(standing["percentiles"])
+            return standing
+
+        except Exception as e:
+            self.logger.error(f"Failed to read ranking index for project {project_id}: {e}")
+            return None
+
+    async def clear_user(self, user_id: str, project_ids: List[str]) -> int:
+        """从这些项目各天数的排名中移除用户，返回移除的成员数（下次重建前项目总人数暂不变）"""
+        client = await self.get_client()
+        metrics = "|".join(re.escape(metric) for metric in RANKING_METRICS)
+        removed = 0
+        for project_id in project_ids:
+            keys = await scan_keys(client, f"{RANKING_PREFIX}:{project_id}:", rf"({metrics}):\d+d")
+            if keys:
+                async with client.pipeline(transaction=True) as pipe:
+                    for key in keys:
+                        pipe.zrem(key, user_id)
+                    removed += sum(await pipe.execute())
+        return removed
@@ -0,0 +1,241 @@
+from typing import List, Dict, Any, Optional
+import asyncio
+import json
+import logging
+
+import redis.asyncio as redis
+
+from ..core.config import settings
+from ..utils.timezone import utc_now
+from .redis_keys import scan_keys
+
+logger = logging.getLogger(__name__)
+
+RECOMMENDATION_PREFIX = "effm:recs"
+
+# 建议规则或输入口径变化时递增，旧版本的预计算结果不再使用
+RECOMMENDATION_ALGORITHM_VERSION = 1
+
+
+def recommendation_key(user_id: str, days: int) -> str:
+    return f"{RECOMMENDATION_PREFIX}:{user_id}:{days}d"
+
+
+def recommendation_version_key(user_id: str) -> str:
+    return f"{RECOMMENDATION_PREFIX}:version:{user_id}"
+
+
+async def generate_recommendations(behavior_analysis, efficiency_analysis, error_analysis, sequence_analysis=None):
+    """
+    基于分析数据生成改进建议
+    """
+    recommendations = []
+    
+    # 基于效率分析的建议
+    if efficiency_analysis.get("total_time", 0) > 0:
+        avg_duration = efficiency_analysis.get("total_time", 0) / max(efficiency_analysis.get("annotation_count", 1), 1)
+        
+        if avg_duration > 10000:  # 平均标注时间超过10秒
+            recommendations.append({
+                "type": "efficiency",
+                "priority": "high",
+                "title": "标注速度优化",
+                "description": f"当前平均标注时间为{avg_duration/1000:.1f}秒，建议通过练习提高标注速度",
+                "suggestions": [
+                    "使用快捷键提高操作效率",
+                    "熟悉标注工具的各种功能",
+                    "建立标准化的标注流程"
+                ]
+            })
+    
+    # 基于错误分析的建议
+    if error_analysis.get("error_count", 0) > 0:
+        error_rate = error_analysis.get("error_count", 0) / max(efficiency_analysis.get("annotation_count", 1), 1)
+        
+        if error_rate > 0.1:  # 错误率超过10%
+            recommendations.append({
+                "type": "accuracy",
+                "priority": "high",
+                "title": "标注准确性提升",
+                "description": f"当前错误率为{error_rate*100:.1f}%，建议提高标注准确性",
+                "suggestions": [
+                    "仔细检查标注结果",
+                    "参考标注指南和标准",
+                    "遇到不确定的情况及时咨询"
+                ]
+            })
+    
+    # 基于行为分析的建议
+    if behavior_analysis.get("most_used_actions"):
+        most_used = behavior_analysis["most_used_actions"][0] if behavior_analysis["most_used_actions"] else None
+        
+        if most_used and most_used.get("action") == "click" and most_used.get("count", 0) > 100:
+            recommendations.append({
+                "type": "workflow",
+                "priority": "medium",
+                "title": "工作流程优化",
+                "description": "检测到大量点击操作，建议优化工作流程",
+                "suggestions": [
+                    "使用批量操作功能",
+                    "设置常用工具的快捷键",
+                    "考虑使用自动化标注功能"
+                ]
+            })
+    
+    # 基于操作序列的建议：高频的多步重复操作
+    if sequence_analysis:
+        repeated = [
+            entry for n in ("3", "4", "5")
+            for entry in sequence_analysis.get("ngram_patterns", {}).get(n, [])
+            if entry["count"] >= 20 and len(set(entry["pattern"].split(" -> "))) == 1
+        ]
+        if repeated:
+            top_pattern = max(repeated, key=lambda entry: entry["count"])
+            recommendations.append({
+                "type": "workflow",
+                "priority": "medium",
+                "title": "重复操作优化",
+                "description": f"操作序列“{top_pattern['pattern']}”出现了{top_pattern['count']}次，建议减少重复操作",
+                "suggestions": [
+                    "使用批量操作功能",
+                    "为重复步骤设置快捷键",
+                    "检查是否存在反复撤销/重做的情况"
+                ]
+            })
+    
+    # 如果没有具体问题，提供一般性建议
+    if not recommendations:
+        recommendations.append({
+            "type": "general",
+            "priority": "low",
+            "title": "持续改进",
+            "description": "您的标注工作表现良好，继续保持！",
+            "suggestions": [
+                "定期回顾和总结标注经验",
+                "关注新功能和工具的更新",
+                "与团队成员分享最佳实践"
+            ]
+        })
+    
+    return recommendations
+
+
+async def compute_user_recommendations(user_id: str, days: int, influxdb_service, aggregate_store,
+                                       sequence_store) -> Dict[str, Any]:
+    """计算单个用户的改进建议及其输入数据"""
+    # 优先使用增量聚合，无聚合数据时回退到InfluxDB查询
+    aggregated = await aggregate_store.get_recommendation_inputs(user_id, days)
+    if aggregated is not None:
+        behavior_analysis, efficiency_analysis, error_analysis = aggregated
+    else:
+        # 获取用户行为分析
+        behavior_analysis = await influxdb_service.get_user_interaction_analysis(user_id, days)
+        
+        # 获取效率分析
+        efficiency_analysis = await influxdb_service.get_user_efficiency(user_id, days)
+        
+        # 获取错误分析
+        error_analysis = await influxdb_service.get_error_patterns(user_id, days)
+    
+    # 预计算的操作序列（不存在时不做按需挖掘）
+    sequence_analysis = await sequence_store.load(user_id, days)
+    
+    # 生成改进建议
+    recommendations = await generate_recommendations(
+        behavior_analysis, 
+        efficiency_analysis, 
+        error_analysis,
+        sequence_analysis
+    )
+    
+    return {
+        "recommendations": recommendations,
+        "analysis_data": {
+            "behavior": behavior_analysis,
+            "efficiency": efficiency_analysis,
+            "errors": error_analysis
+        }
+    }
+
+
+class RecommendationStore:
+    """
+    后台任务预计算的改进建议，按 (用户, 天数) 以JSON保存在Redis中
+
+    每次写入递增用户的结果版本号并记录计算时间与算法版本。
+    """
+
+    def __init__(self):
+        self.client = None
+        self.logger = logging.getLogger(__name__)
+
+    async def get_client(self) -> redis.Redis:
+        """获取Redis客户端"""
+        if self.client is None:
+            self.client = redis.from_url(settings.REDIS_URL, decode_responses=True)
+        return self.client
+
+    async def close(self):
+        """关闭Redis连接"""
+        if self.client:
+            await self.client.close()
+            self.client = None
+
+    async def save(self, user_id: str, days: int, result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """保存一次计算结果，返回写入的内容（含版本号和计算时间），Redis不可用时返回None"""
+        try:
+            client = await self.get_client()
+            version = await client.incr(recommendation_version_key(user_id))
+            payload = dict(
+                result,
+                version=version,
+                algorithm_version=RECOMMENDATION_ALGORITHM_VERSION,
+                computed_at=utc_now().isoformat()
+            )
+            await client.set(recommendation_key(user_id, days), json.dumps(payload),
+                             ex=settings.RECOMMENDATION_TTL)
+            return payload
+        except Exception as e:
+            self.logger.error(f"Failed to save recommendations for user {user_id}: {e}")
+            return None
+
+    async def load(self, user_id: str, days: int) -> Optional[Dict[str, Any]]:
+        """读取当前算法版本的预计算结果，不存在或Redis不可用时返回None"""
+        try:
+            client = await self.get_client()
+            value = await client.get(recommendation_key(user_id, days))
+            if not value:
+                return None
+            result = json.loads(value)
+            if result.get("algorithm_version") != RECOMMENDATION_ALGORITHM_VERSION:
+                return None
+            return result
+        except Exception as e:
+            self.logger.error(f"Failed to load recommendations for user {user_id}: {e}")
+            return None
+
+    async def clear_user(self, user_id: str) -> int:
+        """删除用户所有天数的预计算结果和版本号，返回删除的键数"""
+        client = await self.get_client()
+        keys = await scan_keys(client, f"{RECOMMENDATION_PREFIX}:{user_id}:", r"\d+d")
+        return await client.delete(*keys, recommendation_version_key(user_id))
+
+    async def refresh_users(self, user_ids: List[str], days: int, influxdb_service, aggregate_store,
+                            sequence_store) -> int:
+        """分批并发计算并保存多个用户的建议，返回成功的用户数"""
+        async def refresh(user_id: str) -> bool:
+            try:
+                result = await compute_user_recommendations(
+                    user_id, days, influxdb_service, aggregate_store, sequence_store
+                )
+                return await self.save(user_id, days, result) is not None
+            except Exception as e:
+                self.logger.error(f"Failed to compute recommendations for user {user_id}: {e}")
+                return False
+
+        refreshed = 0
+        batch_size = settings.RECOMMENDATION_BATCH_SIZE
+        for start in range(0, len(user_ids), batch_size):
+            results = await asyncio.gather(*(refresh(user_id) for user_id in user_ids[start:start + batch_size]))
+            refreshed += sum(results)
+        return refreshed
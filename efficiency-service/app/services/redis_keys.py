@@ -0,0 +1,27 @@
+from typing import List
+import re
+
+import redis.asyncio as redis
+
+_GLOB_SPECIAL = re.compile(r"([*?\[\]\\])")
+
+
+def glob_escape(value: str) -> str:
+    """转义 SCAN MATCH 模式中的通配符"""
+    return _GLOB_SPECIAL.sub(r"\\\1", value)
+
+
+async def scan_keys(client: redis.Redis, prefix: str, suffix_pattern: str) -> List[str]:
+    """
+    用 SCAN 查找以 prefix 开头、其余部分完整匹配正则 suffix_pattern 的键
+
+    前缀中含用户ID等任意字符串时，仅靠 MATCH 会把 "u1:*" 匹配到用户 "u1:x" 的键，因此再按正则过滤。
+    """
+    suffix = re.compile(suffix_pattern)
+    keys = []
+    async for key in client.scan_iter(match=f"{glob_escape(prefix)}*", count=1000):
+        if isinstance(key, bytes):
+            key = key.decode()
+        if suffix.fullmatch(key[len(prefix):]):
+            keys.append(key)
+    return keys
@@ -0,0 +1,229 @@
+from typing import List, Dict, Any, Tuple, Iterable, Hashable
+import heapq
+import zlib
+
+import numpy as np
+
+from .flux_columnar import FluxColumns
+from .offload import cpu_bound
+
+PATTERN_SEPARATOR = " -> "
+
+
+class SpaceSaving:
+    """
+    Space-Saving频繁项统计：最多保留capacity个计数器
+
+    被淘汰的最小计数会作为新项的误差上界，count - error 为真实频次的下界。
+    """
+
+    def __init__(self, capacity: int = 1000):
+        self.capacity = capacity
+        self.counts: Dict[Hashable, int] = {}
+        self.errors: Dict[Hashable, int] = {}
+        self._heap: List[Tuple[int, int, Hashable]] = []
+        self._sequence = 0
+
+    def _push(self, item: Hashable):
+        self._sequence += 1
+        heapq.heappush(self._heap, (self.counts[item], self._sequence, item))
+        # 堆中的过期条目过多时重建
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(count, i, key) for i, (key, count) in enumerate(self.counts.items())]
+            heapq.heapify(self._heap)
+
+    def _pop_min(self) -> Tuple[Hashable, int]:
+        while True:
+            count, _, item = heapq.heappop(self._heap)
+            if self.counts.get(item) == count:
+                return item, count
+
+    def add(self, item: Hashable, count: int = 1):
+        if item in self.counts:
+            self.counts[item] += count
+        elif len(self.counts) < self.capacity:
+            self.counts[item] = count
+            self.errors[item] = 0
+        else:
+            evicted, minimum = self._pop_min()
+            del self.counts[evicted]
+            del self.errors[evicted]
+            self.counts[item] = minimum + count
+            self.errors[item] = minimum
+        self._push(item)
+
+    def top(self, k: int) -> List[Tuple[Hashable, int, int]]:
+        """返回 (项, 计数, 误差)，按计数降序"""
+        items = sorted(self.counts.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(item, count, self.errors[item]) for item, count in items]
+
+
+class CountMinSketch:
+    """Count-Min频次估计，用于任意模式的频次查询（只会高估）"""
+
+    def __init__(self, width: int = 2048, depth: int = 4):
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self._seeds = [f"{row}:".encode() for row in range(depth)]
+
+    def _columns(self, item: str) -> List[int]:
+        encoded = item.encode()
+        return [zlib.crc32(seed + encoded) % self.width for seed in self._seeds]
+
+    def add(self, item: str, count: int = 1):
+        for row, column in enumerate(self._columns(item)):
+            self.table[row, column] += count
+
+    def estimate(self, item: str) -> int:
+        return int(min(self.table[row, column] for row, column in enumerate(self._columns(item))))
+
+    def merge(self, other: 'CountMinSketch') -> 'CountMinSketch':
+        if other.table.shape != self.table.shape:
+            raise ValueError("Count-Min sketches must have the same shape to merge")
+        self.table += other.table
+        return self
+
+
+def ordered_sessions(columns: FluxColumns, action_column: str = "action",
+                     session_column: str = "session_id") -> Iterable[List[str]]:
+    """
+    按会话拆分并按时间排序操作序列
+
+    同一事件的多个字段会产生时间与操作都相同的多条记录，这里合并为一次操作。
+    没有会话标签的记录视为同一个序列。
+    """
+    if len(columns) == 0:
+        return
+
+    sessions = columns.column(session_column).codes.astype(np.int64)
+    action = columns.column(action_column)
+    order = np.lexsort((action.codes, columns.time, sessions))
+    sessions = sessions[order]
+    times = columns.time[order]
+    actions = action.codes[order]
+
+    keep = np.ones(len(order), dtype=bool)
+    keep[1:] = (sessions[1:] != sessions[:-1]) | (times[1:] != times[:-1]) | (actions[1:] != actions[:-1])
+    sessions = sessions[keep]
+    labels = np.array(action.categories + ["unknown"], dtype=object)[actions[keep]]
+
+    boundaries = np.flatnonzero(sessions[1:] != sessions[:-1]) + 1
+    for sequence in np.split(labels, boundaries):
+        yield sequence.tolist()
+
+
+class SequenceMiner:
+    """
+    操作序列挖掘：按会话统计 n-gram（n = 2..5）与操作转移矩阵
+
+    n-gram 使用 Space-Saving 保留高频模式、Count-Min 估计任意模式频次，内存有上限；
+    转移矩阵以稀疏形式保存（操作种类有限）。
+    """
+
+    def __init__(self, min_n: int = 2, max_n: int = 5, capacity: int = 1000,
+                 sketch_width: int = 2048, sketch_depth: int = 4):
+        self.min_n = min_n
+        self.max_n = max_n
+        self.frequent = {n: SpaceSaving(capacity) for n in range(min_n, max_n + 1)}
+        self.sketch = CountMinSketch(sketch_width, sketch_depth)
+        # 先在小批量内预聚合，再按 (模式, 次数) 写入计数器，减少堆与哈希操作
+        self._pending: Dict[int, Dict[str, int]] = {n: {} for n in range(min_n, max_n + 1)}
+        self._flush_size = 4 * capacity
+        self.transitions: Dict[str, Dict[str, int]] = {}
+        self.total_sessions = 0
+        self.total_actions = 0
+
+    def add_sequence(self, actions: List[str]):
+        """累加一个会话内按时间排序的操作序列"""
+        if not actions:
+            return
+        self.total_sessions += 1
+        self.total_actions += len(actions)
+
+        for previous, current in zip(actions, actions[1:]):
+            row = self.transitions.setdefault(previous, {})
+            row[current] = row.get(current, 0) + 1
+
+        for n in range(self.min_n, min(self.max_n, len(actions)) + 1):
+            pending = self._pending[n]
+            for start in range(len(actions) - n + 1):
+                pattern = PATTERN_SEPARATOR.join(actions[start:start + n])
+                pending[pattern] = pending.get(pattern, 0) + 1
+            if len(pending) >= self._flush_size:
+                self._flush(n)
+
+    def _flush(self, n: int):
+        counter = self.frequent[n]
+        for pattern, count in self._pending[n].items():
+            counter.add(pattern, count)
+            self.sketch.add(pattern, count)
+        self._pending[n] = {}
+
+    def consume_columns(self, columns: FluxColumns) -> 'SequenceMiner':
+        for sequence in ordered_sessions(columns):
+            self.add_sequence(sequence)
+        return self
+
+    def estimate(self, pattern: str) -> int:
+        """估计任意模式的出现次数"""
+        for n in self._pending:
+            self._flush(n)
+        return self.sketch.estimate(pattern)
+
+    def transition_matrix(self) -> Dict[str, Any]:
+        """稀疏转移矩阵（COO格式）及按行归一化的转移概率"""
+        actions = sorted(set(self.transitions) | {b for row in self.transitions.values() for b in row})
+        index = {action: i for i, action in enumerate(actions)}
+        rows, cols, counts = [], [], []
+        probabilities: Dict[str, Dict[str, float]] = {}
+        for previous, row in self.transitions.items():
+            total = sum(row.values())
+            probabilities[previous] = {}
+            for current, count in sorted(row.items(), key=lambda item: item[1], reverse=True):
+                rows.append(index[previous])
+                cols.append(index[current])
+                counts.append(count)
+                probabilities[previous][current] = count / total
+        return {
+            "actions": actions,
+            "rows": rows,
+            "cols": cols,
+            "counts": counts,
+            "probabilities": probabilities
+        }
+
+    def result(self, top_k: int = 20) -> Dict[str, Any]:
+        """生成与 get_operation_sequences 兼容的结果"""
+        for n in self._pending:
+            self._flush(n)
+        ngram_patterns = {
+            str(n): [
+                {"pattern": pattern, "count": count, "error": error}
+                for pattern, count, error in counter.top(top_k)
+            ]
+            for n, counter in self.frequent.items()
+        }
+        bigrams = self.frequent.get(2)
+        sequence_patterns = {pattern: count for pattern, count, _ in bigrams.top(bigrams.capacity)} if bigrams else {}
+        common_sequences = sorted(
+            (entry for entries in ngram_patterns.values() for entry in entries),
+            key=lambda entry: (entry["count"], entry["pattern"].count(PATTERN_SEPARATOR)),
+            reverse=True
+        )[:top_k]
+        return {
+            "common_sequences": common_sequences,
+            "sequence_patterns": sequence_patterns,
+            "ngram_patterns": ngram_patterns,
+            "transition_matrix": self.transition_matrix(),
+            "total_sessions": self.total_sessions,
+            "total_actions": self.total_actions
+        }
+
+
+@cpu_bound("sequence_mining", min_rows=20000, columns=("action", "session_id"))
+def mine_sequences(columns: FluxColumns, capacity: int = 1000, sketch_width: int = 2048,
+                   top_k: int = 20) -> Dict[str, Any]:
+    """对列式交互记录做完整的序列挖掘（可在子进程中执行）"""
+    miner = SequenceMiner(capacity=capacity, sketch_width=sketch_width)
+    return miner.consume_columns(columns).result(top_k)
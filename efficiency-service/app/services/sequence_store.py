@@ -0,0 +1,69 @@
+from typing import Dict, Any, Optional
+import json
+import logging
+
+import redis.asyncio as redis
+
+from ..core.config import settings
+from ..utils.timezone import utc_now
+from .redis_keys import scan_keys
+
+logger = logging.getLogger(__name__)
+
+SEQUENCE_PREFIX = "effm:sequences"
+
+
+def sequence_key(user_id: str, days: int) -> str:
+    return f"{SEQUENCE_PREFIX}:{user_id}:{days}d"
+
+
+class SequenceStore:
+    """
+    后台任务预计算的操作序列挖掘结果，按 (用户, 天数) 以JSON保存在Redis中
+
+    结果覆盖所有工具；带工具过滤的查询仍按需计算。
+    """
+
+    def __init__(self):
+        self.client = None
+        self.logger = logging.getLogger(__name__)
+
+    async def get_client(self) -> redis.Redis:
+        """获取Redis客户端"""
+        if self.client is None:
+            self.client = redis.from_url(settings.REDIS_URL, decode_responses=True)
+        return self.client
+
+    async def close(self):
+        """关闭Redis连接"""
+        if self.client:
+            await self.client.close()
+            self.client = None
+
+    async def save(self, user_id: str, days: int, sequences: Dict[str, Any]) -> bool:
+        """保存挖掘结果，过期时间为两个计算周期"""
+        try:
+            client = await self.get_client()
+            payload = dict(sequences, computed_at=utc_now().isoformat(), days=days)
+            await client.set(sequence_key(user_id, days), json.dumps(payload),
+                             ex=settings.SEQUENCE_MINING_INTERVAL * 2)
+            return True
+        except Exception as e:
+            self.logger.error(f"Failed to save operation sequences: {e}")
+            return False
+
+    async def load(self, user_id: str, days: int) -> Optional[Dict[str, Any]]:
+        """读取预计算结果，不存在或Redis不可用时返回None"""
+        try:
+            client = await self.get_client()
+            value = await client.get(sequence_key(user_id, days))
+            return json.loads(value) if value else None
+        except Exception as e:
+            self.logger.error(f"Failed to load operation sequences: {e}")
+            return None
+
+    async def clear_user(self, user_id: str) -> int:
+        """删除用户所有天数的挖掘结果，返回删除的键数"""
+        client = await self.get_client()
+        keys = await scan_keys(client, f"{SEQUENCE_PREFIX}:{user_id}:", r"\d+d")
+        return await client.delete(*keys) if keys else 0
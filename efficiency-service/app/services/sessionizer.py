@@ -0,0 +1,357 @@
+from typing import List, Dict, Any, Optional, Tuple, Callable, Awaitable
+from datetime import datetime, timedelta, timezone
+import json
+import logging
+
+import redis.asyncio as redis
+
+from ..schemas.event import EventData, EventType
+from ..core.config import settings
+from ..utils.timezone import utc_now
+from .aggregate_store import event_tool
+
+logger = logging.getLogger(__name__)
+
+POLYGON_LEVEL = "polygon"
+FRAME_LEVEL = "frame"
+
+STATUS_COMPLETED = "completed"
+STATUS_CANCELLED = "cancelled"
+STATUS_ABANDONED = "abandoned"
+
+KEY_PREFIX = "effm:iss"
+# 所有未完成会话按最后活动时间排序的索引，成员为 [user_id, level, session_id] 的 JSON
+OPEN_INDEX_KEY = f"{KEY_PREFIX}:open-index"
+# 会话重建开始运行的时间，此前结束的会话没有会话记录
+COVERAGE_KEY = f"{KEY_PREFIX}:coverage"
+
+# 每次最多处理的超时会话数，其余留到下一批次
+_EXPIRE_LIMIT = 1000
+
+# 原子地取出并删除一个未完成会话；ARGV[3] 非空时只取出最后活动时间不晚于该值的会话
+# 返回会话JSON，会话已被其他进程取出（或尚未超时）时返回 false
+_POP_SCRIPT = """
+local score = redis.call('ZSCORE', KEYS[2], ARGV[2])
+if ARGV[3] ~= '' and ((not score) or tonumber(score) > tonumber(ARGV[3])) then
+    return false
+end
+redis.call('ZREM', KEYS[2], ARGV[2])
+local session = redis.call('HGET', KEYS[1], ARGV[1])
+redis.call('HDEL', KEYS[1], ARGV[1])
+return session
+"""
+
+# 会话未被改动（仍为读取时的内容）时删除，避免删掉其他进程刚重新开始的同名会话
+# ARGV[1] 为会话字段，ARGV[2] 为读取时的会话JSON，ARGV[3] 为索引成员
+_DELETE_IF_UNCHANGED_SCRIPT = """
+if redis.call('HGET', KEYS[1], ARGV[1]) == ARGV[2] then
+    redis.call('HDEL', KEYS[1], ARGV[1])
+    redis.call('ZREM', KEYS[2], ARGV[3])
+    return 1
+end
+return 0
+"""
+
+# 完成事件元数据 -> 会话记录字段
+_POLYGON_FIELDS = {
+    "pointCount": "point_count",
+    "area": "area",
+    "pointsPerSecond": "points_per_second",
+    "areaPerSecond": "area_per_second",
+}
+_FRAME_FIELDS = {
+    "polygonCount": "polygon_count",
+    "totalIdleTime": "total_idle_time",
+    "activeTime": "active_time",
+    "efficiencyRatio": "efficiency_ratio",
+    "averagePolygonDuration": "avg_polygon_duration",
+}
+
+
+def event_value(event: EventData, name: str) -> Any:
+    """依次从事件元数据、事件数据及其嵌套metadata中取值"""
+    for source in (event.metadata, event.data, event.data.get("metadata")):
+        if isinstance(source, dict) and source.get(name) is not None:
+            return source[name]
+    return None
+
+
+def _as_utc(timestamp: datetime) -> datetime:
+    if timestamp.tzinfo is None:
+        return timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.astimezone(timezone.utc)
+
+
+def open_sessions_key(user_id: str) -> str:
+    return f"{KEY_PREFIX}:open:{user_id}"
+
+
+def _session_field(level: str, session_id: str) -> str:
+    return f"{level}:{session_id}"
+
+
+def _index_member(user_id: str, level: str, session_id: str) -> str:
+    return json.dumps([user_id, level, session_id])
+
+
+def _dump_session(session: Dict[str, Any]) -> str:
+    return json.dumps(dict(
+        session,
+        start_time=session["start_time"].isoformat(),
+        last_seen=session["last_seen"].isoformat()
+    ))
+
+
+def _load_session(value: str) -> Dict[str, Any]:
+    session = json.loads(value)
+    session["start_time"] = datetime.fromisoformat(session["start_time"])
+    session["last_seen"] = datetime.fromisoformat(session["last_seen"])
+    return session
+
+
+def _abandoned_record(session: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "user_id": session["user_id"],
+        "project_id": session["project_id"],
+        "tool": session["tool"],
+        "level": session["level"],
+        "status": STATUS_ABANDONED,
+        "session_id": session["session_id"],
+        "frame_session_id": session["frame_session_id"],
+        "start_time": session["start_time"],
+        "end_time": session["last_seen"],
+        "duration": None
+    }
+
+
+def _number(value: Any) -> Optional[float]:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return float(value)
+
+
+class ISSSessionizer:
+    """
+    接收路径上的ISS多边形/帧会话重建
+
+    未完成的会话按用户保存在Redis哈希中，并在全局索引中按最后活动时间排序（数量与超时均有上限），
+    多个进程接收同一会话的事件时共享状态；会话完成、取消或超时后输出一条紧凑的会话记录。
+    记录写入成功后才删除未完成状态；超时会话原子地取出，只由一个进程输出。
+    """
+
+    def __init__(self, max_open: Optional[int] = None, timeout_seconds: Optional[int] = None):
+        self.max_open = max_open or settings.ISS_SESSION_MAX_OPEN
+        self.timeout = timedelta(seconds=timeout_seconds or settings.ISS_SESSION_TIMEOUT)
+        self.client = None
+        self.logger = logging.getLogger(__name__)
+
+    async def get_client(self) -> redis.Redis:
+        """获取Redis客户端"""
+        if self.client is None:
+            self.client = redis.from_url(settings.REDIS_URL, decode_responses=True)
+            self._pop_script = self.client.register_script(_POP_SCRIPT)
+            self._delete_if_unchanged_script = self.client.register_script(_DELETE_IF_UNCHANGED_SCRIPT)
+        return self.client
+
+    async def close(self):
+        """关闭Redis连接"""
+        if self.client:
+            await self.client.close()
+            self.client = None
+
+    async def process(self, events: List[EventData], metadata: Optional[Dict[str, Any]],
+                      store: Callable[[List[Dict[str, Any]]], Awaitable[bool]]) -> List[Dict[str, Any]]:
+        """
+        处理一个批次，用 store 写入本批次结束的会话记录（含超时会话），返回已写入的记录
+
+        先写入记录，成功后再删除对应的未完成会话；写入失败时已结束的会话仍保留在Redis中，
+        超时取出的会话放回，不会因写入失败而丢失。Redis不可用时返回空列表。
+        """
+        actions: List[Tuple[Tuple[str, str, str], str, EventData]] = []
+        for event in events:
+            if event.event_type != EventType.ANNOTATION or event_value(event, "toolType") != "iss":
+                continue
+            level = event_value(event, "level")
+            if level == POLYGON_LEVEL:
+                session_id = event_value(event, "polygonSessionId")
+            elif level == FRAME_LEVEL:
+                session_id = event_value(event, "frameSessionId")
+            else:
+                continue
+            if not session_id:
+                continue
+
+            action = event.data.get("action") or event.data.get("type")
+            if action in ("start", "complete") or (action == "delete" and level == POLYGON_LEVEL):
+                actions.append(((event.user_id, level, str(session_id)), action, event))
+
+        try:
+            client = await self.get_client()
+
+            # 在本批次中先结束、后（或没有）开始的会话，开始事件在之前的批次中，从Redis读取（写入记录后再删除）
+            first_actions: Dict[Tuple[str, str, str], str] = {}
+            for key, action, _ in actions:
+                first_actions.setdefault(key, action)
+            stored = [key for key, action in first_actions.items() if action != "start"]
+            consumed: Dict[Tuple[str, str, str], str] = {}
+            open_sessions: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+            if stored:
+                async with client.pipeline(transaction=False) as pipe:
+                    for user_id, level, session_id in stored:
+                        pipe.hget(open_sessions_key(user_id), _session_field(level, session_id))
+                    values = await pipe.execute()
+                for key, value in zip(stored, values):
+                    if value:
+                        consumed[key] = value
+                        open_sessions[key] = _load_session(value)
+
+            finished: List[Dict[str, Any]] = []
+            for key, action, event in actions:
+                user_id, level, session_id = key
+                timestamp = _as_utc(event.timestamp)
+                if action == "start":
+                    open_sessions[key] = {
+                        "user_id": event.user_id,
+                        "project_id": event.project_id,
+                        "tool": event_tool(event, metadata),
+                        "level": level,
+                        "session_id": session_id,
+                        "frame_session_id": event_value(event, "frameSessionId"),
+                        "start_time": timestamp,
+                        "last_seen": timestamp
+                    }
+                else:
+                    status = STATUS_COMPLETED if action == "complete" else STATUS_CANCELLED
+                    finished.append(self._finish(open_sessions.pop(key, None), event, metadata, status, level, session_id))
+
+            # 超时会话原子地取出，只由一个进程输出
+            claimed = await self._claim_expired()
+            records = finished + [_abandoned_record(session) for _, _, session in claimed]
+            written = True
+            if records:
+                try:
+                    written = bool(await store(records))
+                except Exception as e:
+                    self.logger.error(f"Failed to store {len(records)} ISS session records: {e}")
+                    written = False
+
+            # 记录已写入时删除已结束的会话，否则放回取出的超时会话；保存本批次结束时仍未完成的会话，记录会话重建的起始时间
+            ttl = int(self.timeout.total_seconds()) * 2
+            async with client.pipeline(transaction=True) as pipe:
+                pipe.set(COVERAGE_KEY, utc_now().isoformat(), nx=True)
+                if written:
+                    for (user_id, level, session_id), value in consumed.items():
+                        await self._delete_if_unchanged_script(
+                            keys=[open_sessions_key(user_id), OPEN_INDEX_KEY],
+                            args=[_session_field(level, session_id), value, _index_member(user_id, level, session_id)],
+                            client=pipe
+                        )
+                else:
+                    for member, value, session in claimed:
+                        pipe.hset(open_sessions_key(session["user_id"]),
+                                  _session_field(session["level"], session["session_id"]), value)
+                        pipe.expire(open_sessions_key(session["user_id"]), ttl)
+                        pipe.zadd(OPEN_INDEX_KEY, {member: session["last_seen"].timestamp()})
+                for (user_id, level, session_id), session in open_sessions.items():
+                    pipe.hset(open_sessions_key(user_id), _session_field(level, session_id), _dump_session(session))
+                    pipe.expire(open_sessions_key(user_id), ttl)
+                    pipe.zadd(OPEN_INDEX_KEY, {
+                        _index_member(user_id, level, session_id): session["last_seen"].timestamp()
+                    })
+                await pipe.execute()
+
+            if claimed and written:
+                self.logger.info(f"Expired {len(claimed)} abandoned ISS sessions")
+            return records if written else []
+        except Exception as e:
+            self.logger.error(f"Failed to sessionize ISS events: {e}")
+            return []
+
+    def _finish(self, session: Optional[Dict[str, Any]], event: EventData, metadata: Optional[Dict[str, Any]],
+                status: str, level: str, session_id: str) -> Dict[str, Any]:
+        end_time = _as_utc(event.timestamp)
+        duration = _number(event.data.get("duration"))
+
+        record = {
+            "user_id": event.user_id,
+            "project_id": event.project_id,
+            "tool": event_tool(event, metadata),
+            "level": level,
+            "status": status,
+            "session_id": session_id,
+            "frame_session_id": event_value(event, "frameSessionId"),
+            "end_time": end_time,
+        }
+        if session is not None:
+            record["start_time"] = session["start_time"]
+            if duration is None:
+                duration = (end_time - session["start_time"]).total_seconds() * 1000
+        elif duration is not None:
+            record["start_time"] = end_time - timedelta(milliseconds=duration)
+        record["duration"] = duration
+
+        if status == STATUS_COMPLETED:
+            fields = _POLYGON_FIELDS if level == POLYGON_LEVEL else _FRAME_FIELDS
+            for source, target in fields.items():
+                value = _number(event_value(event, source))
+                if value is not None:
+                    record[target] = value
+        return record
+
+    async def _claim_expired(self, now: Optional[datetime] = None) -> List[Tuple[str, str, Dict[str, Any]]]:
+        """原子地取出超时或超出数量上限的未完成会话，返回 (索引成员, 会话JSON, 会话)"""
+        now = now or utc_now()
+        client = await self.get_client()
+        cutoff = (now - self.timeout).timestamp()
+
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.zcard(OPEN_INDEX_KEY)
+            pipe.zrangebyscore(OPEN_INDEX_KEY, "-inf", cutoff, start=0, num=_EXPIRE_LIMIT)
+            count, timed_out = await pipe.execute()
+        # 超出上限时从最早活动的会话开始淘汰
+        overflow = max(0, count - len(timed_out) - self.max_open)
+        evicted = await client.zrange(OPEN_INDEX_KEY, len(timed_out), len(timed_out) + min(overflow, _EXPIRE_LIMIT) - 1) \
+            if overflow else []
+
+        candidates = [(member, str(cutoff)) for member in timed_out] + [(member, "") for member in evicted]
+        if not candidates:
+            return []
+        async with client.pipeline(transaction=False) as pipe:
+            for member, max_score in candidates:
+                user_id, level, session_id = json.loads(member)
+                await self._pop_script(
+                    keys=[open_sessions_key(user_id), OPEN_INDEX_KEY],
+                    args=[_session_field(level, session_id), member, max_score],
+                    client=pipe
+                )
+            values = await pipe.execute()
+
+        return [
+            (member, value, _load_session(value))
+            for (member, _), value in zip(candidates, values) if value
+        ]
+
+    async def get_coverage_start(self) -> Optional[datetime]:
+        """会话重建开始运行的时间，此后结束的会话都有会话记录；未知或Redis不可用时返回None"""
+        try:
+            client = await self.get_client()
+            value = await client.get(COVERAGE_KEY)
+            return datetime.fromisoformat(value) if value else None
+        except Exception as e:
+            self.logger.error(f"Failed to read ISS session coverage: {e}")
+            return None
+
+    async def clear_user(self, user_id: str) -> int:
+        """删除用户的未完成会话及其索引成员，返回删除的键数"""
+        client = await self.get_client()
+        fields = await client.hkeys(open_sessions_key(user_id))
+        members = []
+        for field in fields:
+            level, _, session_id = field.partition(":")
+            members.append(_index_member(user_id, level, session_id))
+        async with client.pipeline(transaction=True) as pipe:
+            if members:
+                pipe.zrem(OPEN_INDEX_KEY, *members)
+            pipe.delete(open_sessions_key(user_id))
+            replies = await pipe.execute()
+        return replies[-1]
@@ -0,0 +1,193 @@
+from typing import List, Dict, Any, Optional, Tuple
+from datetime import date, timedelta, timezone
+import logging
+
+import redis.asyncio as redis
+
+from ..schemas.event import EventData, EventType
+from ..core.config import settings
+from ..utils.timezone import utc_now
+from .aggregate_store import DIM_SEPARATOR, event_tool, project_users_key
+from .quantile_sketch import TDigest
+
+logger = logging.getLogger(__name__)
+
+SKETCH_PREFIX = "effm:sketch"
+
+# 空闲时长使用的草图类型
+IDLE_KIND = "idle"
+# ISS帧级别标注时长使用的草图类型
+FRAME_KIND = "frame"
+
+
+def sketch_key(user_id: str, project_id: str, tool: str, kind: str, day: date) -> str:
+    return f"{SKETCH_PREFIX}:{user_id}:{project_id}:{tool}:{kind}:{day.strftime('%Y%m%d')}"
+
+
+def sketch_dims_key(user_id: str) -> str:
+    return f"{SKETCH_PREFIX}:dims:{user_id}"
+
+
+def _event_value(event: EventData, name: str) -> Any:
+    value = event.data.get(name)
+    return value if value is not None else event.metadata.get(name)
+
+
+def sketch_sample(event: EventData) -> Optional[Tuple[str, float]]:
+    """返回事件对应的 (草图类型, 时长)，不需要记录时返回None"""
+    duration = event.data.get("duration")
+    if not isinstance(duration, (int, float)) or isinstance(duration, bool) or duration <= 0:
+        return None
+
+    if event.event_type == EventType.ANNOTATION:
+        if _event_value(event, "level") == "frame":
+            return FRAME_KIND, float(duration)
+        annotation_type = _event_value(event, "annotationType")
+        return (annotation_type if isinstance(annotation_type, str) else "unknown"), float(duration)
+
+    if event.event_type == EventType.USER_INTERACTION and event.data.get("action") == "idle_end":
+        return IDLE_KIND, float(duration)
+
+    return None
+
+
+class SketchStore:
+    """
+    用户/项目/工具/标注类型/天维度的时长分位数草图，序列化后保存在Redis中
+
+    草图可跨天、跨用户合并，用于个人与团队的 p50/p90/p99 查询。
+    """
+
+    def __init__(self):
+        self.client = None
+        self.logger = logging.getLogger(__name__)
+
+    async def get_client(self) -> redis.Redis:
+        """获取Redis客户端（草图为二进制数据，不解码响应）"""
+        if self.client is None:
+            self.client = redis.from_url(settings.REDIS_URL)
+        return self.client
+
+    async def close(self):
+        """关闭Redis连接"""
+        if self.client:
+            await self.client.close()
+            self.client = None
+
+    def _build_sketches(self, events: List[EventData], metadata: Optional[Dict[str, Any]]):
+        sketches: Dict[Tuple[str, str, str, str, date], TDigest] = {}
+        for event in events:
+            sample = sketch_sample(event)
+            if sample is None:
+                continue
+            kind, duration = sample
+            timestamp = event.timestamp
+            if timestamp.tzinfo is not None:
+                timestamp = timestamp.astimezone(timezone.utc)
+            dim = (event.user_id, event.project_id, event_tool(event, metadata), kind, timestamp.date())
+            sketch = sketches.get(dim)
+            if sketch is None:
+                sketch = sketches[dim] = TDigest(settings.SKETCH_COMPRESSION)
+            sketch.add(duration)
+        return sketches
+
+    async def record_events(self, events: List[EventData], metadata: Optional[Dict[str, Any]] = None):
+        """在接收路径上把批次内的时长合并进已保存的草图"""
+        try:
+            sketches = self._build_sketches(events, metadata)
+            if not sketches:
+                return
+
+            client = await self.get_client()
+            ttl = settings.AGGREGATE_RETENTION_DAYS * 86400
+            for (user_id, project_id, tool, kind, day), delta in sketches.items():
+                key = sketch_key(user_id, project_id, tool, kind, day)
+                dim = DIM_SEPARATOR.join((project_id, tool, kind))
+
+                # WATCH乐观锁：并发写入同一草图时重试，避免丢失更新
+                async def apply(pipe, key=key, delta=delta, user_id=user_id, dim=dim):
+                    current = await pipe.get(key)
+                    sketch = TDigest.from_bytes(current).merge(delta) if current else delta
+                    pipe.multi()
+                    pipe.set(key, sketch.to_bytes(), ex=ttl)
+                    pipe.sadd(sketch_dims_key(user_id), dim)
+
+                await client.transaction(apply, key)
+
+        except Exception as e:
+            self.logger.error(f"Failed to update duration sketches: {e}")
+
+    async def load_user_sketches(self, user_id: str, days: int, project_id: Optional[str] = None,
+                                 tool: Optional[str] = None, kind: Optional[str] = None) -> Dict[str, TDigest]:
+        """合并最近days天的草图，按草图类型返回"""
+        client = await self.get_client()
+        dims = [dim.decode() for dim in await client.smembers(sketch_dims_key(user_id))]
+        today = utc_now().date()
+
+        keys: List[Tuple[str, str]] = []
+        for dim in dims:
+            dim_project, dim_tool, dim_kind = dim.split(DIM_SEPARATOR, 2)
+            if (project_id is not None and dim_project != project_id) \
+                    or (tool is not None and dim_tool != tool) \
+                    or (kind is not None and dim_kind != kind):
+                continue
+            for offset in range(days):
+                keys.append((dim_kind, sketch_key(user_id, dim_project, dim_tool, dim_kind, today - timedelta(days=offset))))
+
+        merged: Dict[str, TDigest] = {}
+        if not keys:
+            return merged
+
+        values = await client.mget([key for _, key in keys])
+        for (dim_kind, _), value in zip(keys, values):
+            if value is None:
+                continue
+            sketch = TDigest.from_bytes(value)
+            if dim_kind in merged:
+                merged[dim_kind].merge(sketch)
+            else:
+                merged[dim_kind] = sketch
+        return merged
+
+    async def load_project_sketches(self, project_id: str, days: int, tool: Optional[str] = None,
+                                    kind: Optional[str] = None) -> Tuple[Dict[str, TDigest], int]:
+        """合并项目内所有用户的草图，返回 (按类型的草图, 用户数)"""
+        client = await self.get_client()
+        users = [user.decode() for user in await client.smembers(project_users_key(project_id))]
+
+        merged: Dict[str, TDigest] = {}
+        for user_id in users:
+            sketches = await self.load_user_sketches(user_id, days, project_id=project_id, tool=tool, kind=kind)
+            for dim_kind, sketch in sketches.items():
+                if dim_kind in merged:
+                    merged[dim_kind].merge(sketch)
+                else:
+                    merged[dim_kind] = sketch
+        return merged, len(users)
+
+
+    async def clear_user(self, user_id: str) -> int:
+        """删除用户的全部草图，返回删除的键数；维度集合最后删除，中断后可以重新执行"""
+        client = await self.get_client()
+        dims = [dim.decode() for dim in await client.smembers(sketch_dims_key(user_id))]
+        last_day = utc_now().date() + timedelta(days=1)
+        deleted = 0
+        for dim in sorted(dims):
+            dim_project, dim_tool, dim_kind = dim.split(DIM_SEPARATOR, 2)
+            async with client.pipeline(transaction=False) as pipe:
+                for offset in range(settings.AGGREGATE_RETENTION_DAYS + 2):
+                    pipe.delete(sketch_key(user_id, dim_project, dim_tool, dim_kind, last_day - timedelta(days=offset)))
+                deleted += sum(await pipe.execute())
+        return deleted + await client.delete(sketch_dims_key(user_id))
+
+def summarize_sketches(sketches: Dict[str, TDigest], quantiles: List[float]) -> Dict[str, Any]:
+    """把草图转换为接口返回的分位数摘要"""
+    return {
+        kind: {
+            "count": len(sketch),
+            "min": sketch.min,
+            "max": sketch.max,
+            "percentiles": sketch.quantiles(quantiles)
+        }
+        for kind, sketch in sorted(sketches.items())
+    }
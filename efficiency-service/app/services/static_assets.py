@@ -0,0 +1,160 @@
+from typing import Dict, List, Optional
+from email.utils import formatdate
+from pathlib import Path
+import asyncio
+import gzip
+import hashlib
+import logging
+import mimetypes
+
+from ..core.config import settings
+
+# brotli 为可选依赖，未安装时只提供 gzip 压缩版本
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+
+class StaticAsset:
+    """内存中的静态文件：原始内容、预压缩版本和基于内容哈希的 ETag"""
+
+    def __init__(self, path: Path, content: bytes, mtime: float):
+        self.path = path
+        self.content = content
+        self.mtime = mtime
+        self.etag = f'"{hashlib.sha256(content).hexdigest()[:32]}"'
+        self.last_modified = formatdate(mtime, usegmt=True)
+        self.media_type = mimetypes.guess_type(path.name)[0] or "text/plain"
+        if path.suffix == ".md":
+            self.media_type = "text/markdown"
+
+        # 只保留比原文件小的压缩版本
+        self.variants: Dict[str, bytes] = {}
+        if len(content) >= settings.STATIC_COMPRESS_MIN_SIZE:
+            compressed = gzip.compress(content, compresslevel=9, mtime=0)
+            if len(compressed) < len(content):
+                self.variants["gzip"] = compressed
+            if brotli is not None:
+                compressed = brotli.compress(content)
+                if len(compressed) < len(content):
+                    self.variants["br"] = compressed
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """If-None-Match 是否命中当前版本（弱比较，支持多个 ETag 和 *）"""
+        if not if_none_match:
+            return False
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or any(tag.removeprefix("W/") == self.etag for tag in tags)
+
+    def encode(self, accept_encoding: Optional[str]):
+        """按 Accept-Encoding 选择内容，返回 (内容, Content-Encoding)，优先 br"""
+        accepted = set()
+        for item in (accept_encoding or "").split(","):
+            coding, _, params = item.strip().partition(";")
+            if params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+                accepted.add(coding.strip().lower())
+        for coding in ("br", "gzip"):
+            if coding in self.variants and (coding in accepted or "*" in accepted):
+                return self.variants[coding], coding
+        return self.content, None
+
+
+class StaticAssetStore:
+    """
+    把目录下的静态文件整体加载到内存，按相对路径提供
+
+    文件变化由后台监视任务重新加载（安装了 watchfiles 时使用文件事件，否则按间隔比对修改时间），
+    挂载目录热更新的开发流程保持不变。
+    """
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self.assets: Dict[str, StaticAsset] = {}
+        self.watch_task: Optional[asyncio.Task] = None
+        self.logger = logging.getLogger(__name__)
+
+    def _relative(self, path: Path) -> str:
+        return path.relative_to(self.directory).as_posix()
+
+    def _load(self, path: Path):
+        try:
+            stat = path.stat()
+            self.assets[self._relative(path)] = StaticAsset(path, path.read_bytes(), stat.st_mtime)
+        except FileNotFoundError:
+            self.assets.pop(self._relative(path), None)
+        except Exception as e:
+            self.logger.error(f"Failed to load static asset {path}: {e}")
+
+    def _files(self) -> List[Path]:
+        if not self.directory.is_dir():
+            return []
+        return [
+            path for path in self.directory.rglob("*")
+            if path.is_file() and not any(part.startswith(".") for part in path.relative_to(self.directory).parts)
+        ]
+
+    def load_all(self):
+        """重新加载整个目录"""
+        self.assets = {}
+        for path in self._files():
+            self._load(path)
+        self.logger.info(f"Loaded {len(self.assets)} static assets from {self.directory}")
+
+    def refresh(self) -> List[str]:
+        """比对修改时间，重新加载变化的文件并移除已删除的文件，返回变化的相对路径"""
+        changed = []
+        seen = set()
+        for path in self._files():
+            relative = self._relative(path)
+            seen.add(relative)
+            asset = self.assets.get(relative)
+            if asset is None or asset.mtime != path.stat().st_mtime:
+                self._load(path)
+                changed.append(relative)
+        for relative in set(self.assets) - seen:
+            del self.assets[relative]
+            changed.append(relative)
+        return changed
+
+    def get(self, relative_path: str) -> Optional[StaticAsset]:
+        # 只按已加载的相对路径查找，不会访问目录以外的文件
+        return self.assets.get(relative_path.strip("/") or "index.html")
+
+    def list(self, suffix: str = "") -> List[str]:
+        return sorted(relative for relative in self.assets if relative.endswith(suffix))
+
+    async def _watch(self):
+        try:
+            from watchfiles import awatch
+        except ImportError:
+            awatch = None
+
+        if awatch is not None and self.directory.is_dir():
+            async for _ in awatch(self.directory, debounce=200):
+                self._log_changes(self.refresh())
+        else:
+            while True:
+                await asyncio.sleep(settings.STATIC_ASSETS_POLL_INTERVAL)
+                self._log_changes(self.refresh())
+
+    def _log_changes(self, changed: List[str]):
+        if changed:
+            self.logger.info(f"Reloaded static assets: {', '.join(changed)}")
+
+    def start(self):
+        """加载目录并启动文件监视"""
+        self.load_all()
+        if self.watch_task is None:
+            self.watch_task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self.watch_task is not None:
+            self.watch_task.cancel()
+            await asyncio.gather(self.watch_task, return_exceptions=True)
+            self.watch_task = None
+
+
+examples_assets = StaticAssetStore(settings.EXAMPLES_DIR)
@@ -0,0 +1,308 @@
+from typing import Dict, Any, List, Optional
+from datetime import timedelta
+import asyncio
+import logging
+import os
+import shutil
+import socket
+import time
+
+from sqlalchemy import select, delete, insert, func, cast, Integer
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.config import settings
+from ..core.database import AsyncSessionLocal
+from ..models.efficiency_metrics import SystemHealth
+from ..utils.timezone import utc_now
+from .health_prober import health_prober, HEALTHY, UNHEALTHY
+
+logger = logging.getLogger(__name__)
+
+DEGRADED = "degraded"
+
+# 趋势接口可选的聚合字段：名称 -> SystemHealth 列或 details 中的 JSON 路径
+TREND_METRICS = {
+    "cpu_usage": SystemHealth.cpu_usage,
+    "memory_usage": SystemHealth.memory_usage,
+    "disk_usage": SystemHealth.disk_usage,
+    "response_time": SystemHealth.response_time,
+    "rss_mb": ("process", "rss_mb"),
+    "event_loop_lag_ms": ("event_loop", "max_lag_ms"),
+    "ingest_pending": ("ingest", "pending_batches"),
+    "write_p95_ms": ("ingest", "write_p95_ms"),
+    "write_p99_ms": ("ingest", "write_p99_ms"),
+    "database_latency_ms": ("dependencies", "database", "latency_ms"),
+    "redis_latency_ms": ("dependencies", "redis", "latency_ms"),
+    "influxdb_latency_ms": ("dependencies", "influxdb", "latency_ms"),
+}
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    """最近秩分位数，values 需已排序"""
+    if not values:
+        return None
+    return round(values[min(len(values) - 1, max(0, int(q * len(values) + 0.5) - 1))], 3)
+
+
+def _read_proc(path: str) -> Optional[str]:
+    try:
+        with open(path) as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _meminfo_total_kb() -> Optional[int]:
+    content = _read_proc("/proc/meminfo")
+    for line in (content or "").splitlines():
+        if line.startswith("MemTotal:"):
+            return int(line.split()[1])
+    return None
+
+
+class ProcessStats:
+    """从 /proc/self 读取本进程的 CPU 时间、常驻内存和线程数（非 Linux 环境下各项为 None）"""
+
+    def __init__(self):
+        self.clock_ticks = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+        self.memory_total_kb = _meminfo_total_kb()
+        self.last_cpu_seconds: Optional[float] = None
+        self.last_wall = time.monotonic()
+
+    def cpu_seconds(self) -> Optional[float]:
+        content = _read_proc("/proc/self/stat")
+        if content is None:
+            return None
+        # 进程名可能含空格，从最后一个右括号之后按空格切分；utime、stime 是第 14、15 个字段
+        fields = content.rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / self.clock_ticks
+
+    def status(self) -> Dict[str, int]:
+        values = {}
+        for line in (_read_proc("/proc/self/status") or "").splitlines():
+            key, _, value = line.partition(":")
+            if key in ("VmRSS", "VmHWM", "Threads"):
+                values[key] = int(value.split()[0])
+        fd_dir = "/proc/self/fd"
+        if os.path.isdir(fd_dir):
+            values["open_fds"] = len(os.listdir(fd_dir))
+        return values
+
+    def sample(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        cpu_seconds = self.cpu_seconds()
+        cpu_percent = None
+        if cpu_seconds is not None and self.last_cpu_seconds is not None and now > self.last_wall:
+            # 相对单个核的百分比，多线程时可能超过 100
+            cpu_percent = round((cpu_seconds - self.last_cpu_seconds) / (now - self.last_wall) * 100, 2)
+        self.last_cpu_seconds = cpu_seconds
+        self.last_wall = now
+
+        status = self.status()
+        rss_kb = status.get("VmRSS")
+        memory_percent = None
+        if rss_kb is not None and self.memory_total_kb:
+            memory_percent = round(rss_kb / self.memory_total_kb * 100, 2)
+        return {
+            "cpu_percent": cpu_percent,
+            "memory_percent": memory_percent,
+            "rss_mb": round(rss_kb / 1024, 2) if rss_kb is not None else None,
+            "peak_rss_mb": round(status["VmHWM"] / 1024, 2) if "VmHWM" in status else None,
+            "threads": status.get("Threads"),
+            "open_fds": status.get("open_fds")
+        }
+
+
+class EventLoopLagMonitor:
+    """按固定间隔 sleep，记录实际唤醒时间比预期晚了多少（即事件循环被阻塞的时长）"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.lags: List[float] = []
+
+    async def run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, (time.perf_counter() - started - self.interval) * 1000))
+
+    def drain(self) -> Dict[str, Any]:
+        lags, self.lags = sorted(self.lags), []
+        return {
+            "samples": len(lags),
+            "avg_lag_ms": round(sum(lags) / len(lags), 3) if lags else None,
+            "p99_lag_ms": _percentile(lags, 0.99),
+            "max_lag_ms": round(lags[-1], 3) if lags else None
+        }
+
+
+class SystemSampler:
+    """
+    服务自身的运行状况采样，定期批量写入 system_health 表
+
+    每 SYSTEM_SAMPLE_INTERVAL 秒采一次（进程资源、事件循环延迟、事件接收积压和写入耗时分位数、
+    依赖探测耗时），攒够 SYSTEM_SAMPLE_BATCH_SIZE 条后一次插入；写入失败时保留在内存中下次重试，
+    缓冲条数有上限，超出时丢弃最早的样本。
+    """
+
+    def __init__(self):
+        self.service_name = settings.SYSTEM_SAMPLE_SERVICE_NAME
+        self.instance = f"{socket.gethostname()}:{os.getpid()}"
+        self.process = ProcessStats()
+        self.lag_monitor = EventLoopLagMonitor(settings.EVENT_LOOP_LAG_PROBE_INTERVAL)
+        self.buffer: List[Dict[str, Any]] = []
+        self.last_cleanup: Optional[float] = None
+        self.stopping: Optional[asyncio.Event] = None
+        self.lag_task: Optional[asyncio.Task] = None
+        self.sample_task: Optional[asyncio.Task] = None
+        self.logger = logging.getLogger(__name__)
+
+    def sample(self) -> Dict[str, Any]:
+        """采集一条样本（system_health 表的一行）"""
+        process = self.process.sample()
+        event_loop = self.lag_monitor.drain()
+
+        latencies = sorted(health_prober.ingest.drain_latencies())
+        ingest = {
+            "pending_batches": health_prober.ingest.pending,
+            "saturated": health_prober.ingest.saturated,
+            "batches": len(latencies),
+            "write_p50_ms": _percentile(latencies, 0.5),
+            "write_p95_ms": _percentile(latencies, 0.95),
+            "write_p99_ms": _percentile(latencies, 0.99),
+            "write_max_ms": round(latencies[-1], 3) if latencies else None
+        }
+        dependencies = {
+            name: {"status": check.status, "latency_ms": check.latency_ms}
+            for name, check in health_prober.checks.items()
+        }
+
+        disk_percent = None
+        try:
+            disk = shutil.disk_usage(settings.SYSTEM_SAMPLE_DISK_PATH)
+            disk_percent = round(disk.used / disk.total * 100, 2)
+        except OSError:
+            pass
+
+        if not health_prober.healthy:
+            status = UNHEALTHY
+        elif ingest["saturated"] or (
+            event_loop["max_lag_ms"] is not None
+            and event_loop["max_lag_ms"] >= settings.EVENT_LOOP_LAG_WARN_MS
+        ):
+            status = DEGRADED
+        else:
+            status = HEALTHY
+
+        now = utc_now().replace(tzinfo=None)
+        return {
+            "service_name": self.service_name,
+            "status": status,
+            "response_time": ingest["write_p95_ms"],
+            "cpu_usage": process["cpu_percent"],
+            "memory_usage": process["memory_percent"],
+            "disk_usage": disk_percent,
+            "message": None,
+            "details": {
+                "instance": self.instance,
+                "process": process,
+                "event_loop": event_loop,
+                "ingest": ingest,
+                "dependencies": dependencies
+            },
+            "checked_at": now,
+            "created_at": now
+        }
+
+    async def flush(self):
+        """把缓冲的样本一次插入，并按保留天数清理旧样本（每小时最多一次）"""
+        if not self.buffer:
+            return
+        rows = list(self.buffer)
+        try:
+            async with AsyncSessionLocal() as session:
+                await session.execute(insert(SystemHealth), rows)
+                if self.last_cleanup is None or time.monotonic() - self.last_cleanup >= 3600:
+                    cutoff = utc_now().replace(tzinfo=None) - timedelta(days=settings.SYSTEM_HEALTH_RETENTION_DAYS)
+                    await session.execute(delete(SystemHealth).where(SystemHealth.checked_at < cutoff))
+                    self.last_cleanup = time.monotonic()
+                await session.commit()
+            self.buffer = self.buffer[len(rows):]
+        except Exception as e:
+            self.logger.error(f"Failed to write {len(rows)} system health samples: {e}")
+            overflow = len(self.buffer) - settings.SYSTEM_SAMPLE_MAX_BUFFER
+            if overflow > 0:
+                del self.buffer[:overflow]
+
+    async def _loop(self):
+        # 用停止事件而不是取消结束循环，避免在批量写入中途被取消
+        while True:
+            try:
+                await asyncio.wait_for(self.stopping.wait(), timeout=settings.SYSTEM_SAMPLE_INTERVAL)
+                break
+            except asyncio.TimeoutError:
+                pass
+            try:
+                self.buffer.append(self.sample())
+            except Exception as e:
+                self.logger.error(f"Failed to sample system health: {e}")
+            if len(self.buffer) >= settings.SYSTEM_SAMPLE_BATCH_SIZE:
+                await self.flush()
+
+    def start(self):
+        if self.sample_task is None:
+            self.process.sample()
+            self.stopping = asyncio.Event()
+            self.lag_task = asyncio.create_task(self.lag_monitor.run())
+            self.sample_task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self.sample_task is None:
+            return
+        self.stopping.set()
+        self.lag_task.cancel()
+        await asyncio.gather(self.lag_task, self.sample_task, return_exceptions=True)
+        self.lag_task = self.sample_task = None
+        # 关闭前写入尚未落库的样本
+        await self.flush()
+
+
+async def get_health_trends(session: AsyncSession, hours: int, bucket_minutes: int,
+                            metrics: List[str], service_name: Optional[str] = None) -> List[Dict[str, Any]]:
+    """按时间桶聚合 system_health 样本，每个字段返回平均值和最大值（多个实例的样本合并计算）"""
+    since = utc_now().replace(tzinfo=None) - timedelta(hours=hours)
+    bucket = func.to_timestamp(
+        func.floor(func.extract("epoch", SystemHealth.checked_at) / (bucket_minutes * 60)) * (bucket_minutes * 60)
+    ).label("bucket")
+
+    columns = [bucket, func.count().label("samples")]
+    for name in metrics:
+        target = TREND_METRICS[name]
+        value = SystemHealth.details[target].as_float() if isinstance(target, tuple) else target
+        columns.append(func.avg(value).label(f"{name}_avg"))
+        columns.append(func.max(value).label(f"{name}_max"))
+    columns.append(func.sum(cast(SystemHealth.status != HEALTHY, Integer)).label("not_healthy"))
+
+    query = select(*columns).where(SystemHealth.checked_at >= since).group_by(bucket).order_by(bucket)
+    if service_name:
+        query = query.where(SystemHealth.service_name == service_name)
+
+    result = await session.execute(query)
+    trends = []
+    for row in result.all():
+        item = {
+            "bucket": row.bucket.replace(tzinfo=None).isoformat(),
+            "samples": row.samples,
+            "not_healthy_samples": int(row.not_healthy or 0)
+        }
+        for name in metrics:
+            avg, peak = getattr(row, f"{name}_avg"), getattr(row, f"{name}_max")
+            item[name] = {
+                "avg": round(float(avg), 3) if avg is not None else None,
+                "max": round(float(peak), 3) if peak is not None else None
+            }
+        trends.append(item)
+    return trends
+
+
+system_sampler = SystemSampler()
@@ -0,0 +1,62 @@
+from datetime import timedelta
+import asyncio
+import logging
+
+from ..celery_app import celery_app
+from ..core.config import settings
+from ..services.aggregate_store import AggregateStore, last_closed_day
+from ..services.influxdb_service import InfluxDBService
+from ..utils.timezone import utc_now
+
+logger = logging.getLogger(__name__)
+
+
+async def _backfill_user(aggregate_store: AggregateStore, influxdb_service: InfluxDBService, user_id: str,
+                         today, max_days: int) -> int:
+    """从覆盖起点的前一天（不晚于已结束的最后一天）开始向前逐天重算，最多max_days天，不早于保留期"""
+    start = await aggregate_store.get_coverage_start(user_id)
+    if start is None:
+        return 0
+    floor = today - timedelta(days=settings.AGGREGATE_RETENTION_DAYS - 1)
+    backfilled = 0
+    day = min(start - timedelta(days=1), last_closed_day())
+    while day >= floor and backfilled < max_days:
+        await aggregate_store.reconcile_user_day(influxdb_service, user_id, day)
+        backfilled += 1
+        day -= timedelta(days=1)
+    return backfilled
+
+
+async def _reconcile_active_users(days: int, backfill_days: int) -> int:
+    aggregate_store = AggregateStore()
+    influxdb_service = InfluxDBService()
+    today = utc_now().date()
+    closed = last_closed_day()
+    reconciled = 0
+    try:
+        users = await aggregate_store.get_active_users(utc_now() - timedelta(days=days))
+        for user_id in users:
+            try:
+                # 从已结束的最后一天往前重算，覆盖起点才能逐天下移
+                for offset in range(days):
+                    await aggregate_store.reconcile_user_day(
+                        influxdb_service, user_id, closed - timedelta(days=offset)
+                    )
+                    reconciled += 1
+                reconciled += await _backfill_user(aggregate_store, influxdb_service, user_id, today, backfill_days)
+            except Exception as e:
+                logger.error(f"Failed to reconcile aggregates for user {user_id}: {e}")
+    finally:
+        await influxdb_service.close()
+        await aggregate_store.close()
+    return reconciled
+
+
+@celery_app.task(name="app.tasks.aggregates.reconcile_aggregates")
+def reconcile_aggregates(days: int = None, backfill_days: int = None) -> int:
+    """用InfluxDB中的原始事件校正最近几天的增量聚合，并为覆盖不完整的用户向前补算"""
+    days = days or settings.AGGREGATE_RECONCILE_DAYS
+    backfill_days = settings.AGGREGATE_BACKFILL_DAYS if backfill_days is None else backfill_days
+    reconciled = asyncio.run(_reconcile_active_users(days, backfill_days))
+    logger.info(f"Reconciled {reconciled} user-day aggregates")
+    return reconciled
@@ -0,0 +1,15 @@
+import asyncio
+import logging
+
+from ..celery_app import celery_app
+from ..services.dashboard_views import refresh_all_dashboard_views
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task(name="app.tasks.dashboards.refresh_dashboard_views")
+def refresh_dashboard_views() -> int:
+    """并发刷新看板物化视图，刷新期间看板接口仍可读取旧数据"""
+    refreshed = asyncio.run(refresh_all_dashboard_views())
+    logger.info(f"Refreshed dashboard views: {', '.join(refreshed)}")
+    return len(refreshed)
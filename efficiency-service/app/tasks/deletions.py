@@ -0,0 +1,47 @@
+from typing import Dict, Any, Optional
+import asyncio
+import logging
+
+from ..celery_app import celery_app
+from ..core.database import AsyncSessionLocal, engine
+from ..services.deletion_jobs import DeletionJobRunner, find_resumable_jobs, PENDING
+
+logger = logging.getLogger(__name__)
+
+
+async def _run(job_id: str) -> Optional[Dict[str, Any]]:
+    try:
+        return await DeletionJobRunner().run(job_id)
+    finally:
+        # 每次 asyncio.run 都是新的事件循环，连接池中的连接不能留给下一次任务
+        await engine.dispose()
+
+
+async def _find_resumable() -> list:
+    try:
+        async with AsyncSessionLocal() as session:
+            return await find_resumable_jobs(session)
+    finally:
+        await engine.dispose()
+
+
+@celery_app.task(name="app.tasks.deletions.run_deletion_job")
+def run_deletion_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """分块执行用户数据删除任务，用完单次时间预算后重新排队继续"""
+    job = asyncio.run(_run(job_id))
+    if job is None:
+        logger.info(f"Deletion job {job_id} is finished or running elsewhere, skipping")
+    elif job["status"] == PENDING:
+        run_deletion_job.delay(job_id)
+    return job
+
+
+@celery_app.task(name="app.tasks.deletions.resume_deletion_jobs")
+def resume_deletion_jobs() -> int:
+    """重新提交等待中、执行进程已退出或可重试的删除任务（重复提交时只有一个能领取执行）"""
+    job_ids = asyncio.run(_find_resumable())
+    for job_id in job_ids:
+        run_deletion_job.delay(job_id)
+    if job_ids:
+        logger.info(f"Resumed deletion jobs: {', '.join(job_ids)}")
+    return len(job_ids)
@@ -0,0 +1,32 @@
+import asyncio
+import logging
+
+from ..celery_app import celery_app
+from ..core.config import settings
+from ..core.database import AsyncSessionLocal
+from ..services.influxdb_service import InfluxDBService
+from ..services.learning_curve import fit_learning_curves as fit_curves, save_curves
+
+logger = logging.getLogger(__name__)
+
+
+async def _fit_all_users(days: int) -> int:
+    influxdb_service = InfluxDBService()
+    try:
+        # 一次查询所有用户的标注时长，统一做分组拟合
+        columns = await influxdb_service.get_annotation_durations(days)
+    finally:
+        await influxdb_service.close()
+
+    curves = fit_curves(columns, settings.LEARNING_CURVE_MIN_SAMPLES)
+    async with AsyncSessionLocal() as session:
+        return await save_curves(session, curves, days)
+
+
+@celery_app.task(name="app.tasks.learning_curves.fit_learning_curves")
+def fit_learning_curves(days: int = None) -> int:
+    """为所有用户与标注类型批量拟合幂律学习曲线并保存"""
+    days = days or settings.LEARNING_CURVE_DAYS
+    fitted = asyncio.run(_fit_all_users(days))
+    logger.info(f"Fitted {fitted} learning curves")
+    return fitted
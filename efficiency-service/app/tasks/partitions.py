@@ -0,0 +1,25 @@
+import asyncio
+import logging
+
+from ..celery_app import celery_app
+from ..services.partitions import ensure_metric_partitions as ensure_partitions, drop_expired_metric_partitions
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task(name="app.tasks.partitions.ensure_metric_partitions")
+def ensure_metric_partitions(months_ahead: int = None) -> int:
+    """提前创建效率指标表的未来月份分区"""
+    created = asyncio.run(ensure_partitions(months_ahead))
+    if created:
+        logger.info(f"Created efficiency metric partitions: {', '.join(created)}")
+    return len(created)
+
+
+@celery_app.task(name="app.tasks.partitions.cleanup_old_metrics")
+def cleanup_old_metrics(retention_days: int = None) -> int:
+    """按保留期卸载并删除过期的效率指标分区（整块删除，不做逐行DELETE）"""
+    dropped = asyncio.run(drop_expired_metric_partitions(retention_days))
+    if dropped:
+        logger.info(f"Dropped efficiency metric partitions: {', '.join(dropped)}")
+    return len(dropped)
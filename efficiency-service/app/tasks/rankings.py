@@ -0,0 +1,28 @@
+import asyncio
+import logging
+
+from ..celery_app import celery_app
+from ..core.config import settings
+from ..services.aggregate_store import AggregateStore
+from ..services.ranking_index import RankingIndex
+
+logger = logging.getLogger(__name__)
+
+
+async def _refresh_rankings(days: int) -> int:
+    aggregate_store = AggregateStore()
+    ranking_index = RankingIndex()
+    try:
+        return await ranking_index.refresh(aggregate_store, days)
+    finally:
+        await ranking_index.close()
+        await aggregate_store.close()
+
+
+@celery_app.task(name="app.tasks.rankings.refresh_rankings")
+def refresh_rankings(days: int = None) -> int:
+    """用增量聚合重建所有项目的排名索引"""
+    days = days or settings.RANKING_DAYS
+    projects = asyncio.run(_refresh_rankings(days))
+    logger.info(f"Refreshed ranking index for {projects} projects")
+    return projects
@@ -0,0 +1,39 @@
+from datetime import timedelta
+import asyncio
+import logging
+
+from ..celery_app import celery_app
+from ..core.config import settings
+from ..services.aggregate_store import AggregateStore
+from ..services.influxdb_service import InfluxDBService
+from ..services.recommendations import RecommendationStore
+from ..services.sequence_store import SequenceStore
+from ..utils.timezone import utc_now
+
+logger = logging.getLogger(__name__)
+
+
+async def _precompute_active_users(days: int) -> int:
+    aggregate_store = AggregateStore()
+    sequence_store = SequenceStore()
+    recommendation_store = RecommendationStore()
+    influxdb_service = InfluxDBService()
+    try:
+        users = await aggregate_store.get_active_users(utc_now() - timedelta(days=days))
+        return await recommendation_store.refresh_users(
+            users, days, influxdb_service, aggregate_store, sequence_store
+        )
+    finally:
+        await influxdb_service.close()
+        await recommendation_store.close()
+        await sequence_store.close()
+        await aggregate_store.close()
+
+
+@celery_app.task(name="app.tasks.recommendations.precompute_recommendations")
+def precompute_recommendations(days: int = None) -> int:
+    """为活跃用户分批预计算改进建议"""
+    days = days or settings.RECOMMENDATION_DAYS
+    refreshed = asyncio.run(_precompute_active_users(days))
+    logger.info(f"Precomputed recommendations for {refreshed} users")
+    return refreshed
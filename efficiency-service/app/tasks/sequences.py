@@ -0,0 +1,42 @@
+from datetime import timedelta
+import asyncio
+import logging
+
+from ..celery_app import celery_app
+from ..core.config import settings
+from ..services.aggregate_store import AggregateStore
+from ..services.influxdb_service import InfluxDBService
+from ..services.sequence_store import SequenceStore
+from ..utils.timezone import utc_now
+
+logger = logging.getLogger(__name__)
+
+
+async def _mine_active_users(days: int) -> int:
+    aggregate_store = AggregateStore()
+    sequence_store = SequenceStore()
+    influxdb_service = InfluxDBService()
+    mined = 0
+    try:
+        users = await aggregate_store.get_active_users(utc_now() - timedelta(days=days))
+        for user_id in users:
+            try:
+                sequences = await influxdb_service.get_operation_sequences(user_id, days)
+                if await sequence_store.save(user_id, days, sequences):
+                    mined += 1
+            except Exception as e:
+                logger.error(f"Failed to mine operation sequences for user {user_id}: {e}")
+    finally:
+        await influxdb_service.close()
+        await sequence_store.close()
+        await aggregate_store.close()
+    return mined
+
+
+@celery_app.task(name="app.tasks.sequences.mine_operation_sequences")
+def mine_operation_sequences(days: int = None) -> int:
+    """为活跃用户预计算操作序列模式与转移矩阵"""
+    days = days or settings.SEQUENCE_MINING_DAYS
+    mined = asyncio.run(_mine_active_users(days))
+    logger.info(f"Mined operation sequences for {mined} users")
+    return mined
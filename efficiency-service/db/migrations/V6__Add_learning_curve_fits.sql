@@ -0,0 +1,23 @@
+-- 学习曲线拟合结果（由后台任务批量写入）
+CREATE TABLE IF NOT EXISTS learning_curve_fits (
+    id SERIAL PRIMARY KEY,
+    user_id VARCHAR(255) NOT NULL,
+    project_id VARCHAR(255) NOT NULL,
+    annotation_type VARCHAR(100) NOT NULL,
+    sample_count INTEGER DEFAULT 0,
+    initial_duration FLOAT NOT NULL,
+    learning_exponent FLOAT NOT NULL,
+    learning_rate FLOAT NOT NULL,
+    r_squared FLOAT,
+    current_duration FLOAT,
+    plateau_detected BOOLEAN DEFAULT FALSE,
+    window_days INTEGER NOT NULL,
+    fitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT uq_learning_curve_fits_dim UNIQUE (user_id, project_id, annotation_type)
+);
+
+CREATE INDEX IF NOT EXISTS idx_learning_curve_fits_user_id ON learning_curve_fits (user_id);
+CREATE INDEX IF NOT EXISTS idx_learning_curve_fits_project_rate ON learning_curve_fits (project_id, annotation_type, learning_rate DESC);
+
+COMMENT ON COLUMN learning_curve_fits.learning_exponent IS '幂律学习曲线指数b：duration = a * n^(-b)';
+COMMENT ON COLUMN learning_curve_fits.learning_rate IS '练习次数翻倍时耗时下降的百分比';
@@ -0,0 +1,72 @@
+-- efficiency_metrics 改为按 timestamp 按月范围分区
+-- 时间索引改为每个分区上的 BRIN 索引；过期数据按整个分区卸载删除
+-- 后续月份的分区由后台任务 app.tasks.partitions.ensure_metric_partitions 提前创建
+BEGIN;
+
+-- 旧表改名，释放表名、主键和索引名称
+ALTER TABLE efficiency_metrics RENAME TO efficiency_metrics_legacy;
+ALTER TABLE efficiency_metrics_legacy RENAME CONSTRAINT efficiency_metrics_pkey TO efficiency_metrics_legacy_pkey;
+DROP INDEX IF EXISTS ix_efficiency_metrics_id;
+DROP INDEX IF EXISTS ix_efficiency_metrics_user_id;
+DROP INDEX IF EXISTS ix_efficiency_metrics_project_id;
+DROP INDEX IF EXISTS ix_efficiency_metrics_task_id;
+DROP INDEX IF EXISTS idx_efficiency_metrics_timestamp;
+DROP INDEX IF EXISTS idx_efficiency_metrics_metric_type;
+
+-- 分区表的主键必须包含分区键；沿用原有序列，id 继续递增
+CREATE TABLE efficiency_metrics (
+    id INTEGER NOT NULL DEFAULT nextval('efficiency_metrics_id_seq'),
+    user_id VARCHAR(255) NOT NULL,
+    project_id VARCHAR(255) NOT NULL,
+    task_id VARCHAR(255),
+    tool VARCHAR(100),
+    metric_type VARCHAR(100) NOT NULL,
+    metric_value FLOAT NOT NULL,
+    timestamp TIMESTAMP NOT NULL,
+    extra_data JSON,
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp);
+
+ALTER SEQUENCE efficiency_metrics_id_seq OWNED BY efficiency_metrics.id;
+
+-- 覆盖已有数据到未来3个月的按月分区，另加兜底分区
+DO $$
+DECLARE
+    month_start TIMESTAMP;
+    last_month TIMESTAMP := date_trunc('month', CURRENT_TIMESTAMP + INTERVAL '3 months');
+BEGIN
+    SELECT date_trunc('month', COALESCE(MIN(timestamp), CURRENT_TIMESTAMP))
+      INTO month_start
+      FROM efficiency_metrics_legacy;
+
+    WHILE month_start <= last_month LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF efficiency_metrics FOR VALUES FROM (%L) TO (%L)',
+            'efficiency_metrics_y' || to_char(month_start, 'YYYY') || 'm' || to_char(month_start, 'MM'),
+            month_start,
+            month_start + INTERVAL '1 month'
+        );
+        month_start := month_start + INTERVAL '1 month';
+    END LOOP;
+END $$;
+
+CREATE TABLE IF NOT EXISTS efficiency_metrics_default PARTITION OF efficiency_metrics DEFAULT;
+
+INSERT INTO efficiency_metrics (id, user_id, project_id, task_id, tool, metric_type, metric_value, timestamp, extra_data)
+SELECT id, user_id, project_id, task_id, tool, metric_type, metric_value, timestamp, extra_data
+  FROM efficiency_metrics_legacy;
+
+DROP TABLE efficiency_metrics_legacy;
+
+-- 在父表上建索引，每个分区（包括之后挂载的分区）自动创建对应的索引
+CREATE INDEX IF NOT EXISTS idx_efficiency_metrics_timestamp_brin ON efficiency_metrics USING brin (timestamp);
+CREATE INDEX IF NOT EXISTS ix_efficiency_metrics_user_id ON efficiency_metrics (user_id);
+CREATE INDEX IF NOT EXISTS ix_efficiency_metrics_project_id ON efficiency_metrics (project_id);
+CREATE INDEX IF NOT EXISTS ix_efficiency_metrics_task_id ON efficiency_metrics (task_id);
+CREATE INDEX IF NOT EXISTS idx_efficiency_metrics_metric_type ON efficiency_metrics (metric_type);
+
+COMMENT ON COLUMN efficiency_metrics.extra_data IS '事件相关的额外数据，存储为JSON格式';
+COMMENT ON COLUMN efficiency_metrics.metric_type IS '指标类型：annotation_time, fps等';
+COMMENT ON COLUMN efficiency_metrics.metric_value IS '指标值';
+
+COMMIT;
@@ -0,0 +1,53 @@
+-- 看板物化视图：按项目/天、按用户/项目/天、按工具/天汇总 efficiency_metrics
+-- 每个视图带唯一索引，供 REFRESH MATERIALIZED VIEW CONCURRENTLY 使用
+-- 由后台任务 app.tasks.dashboards.refresh_dashboard_views 定期刷新（DASHBOARD_REFRESH_INTERVAL）
+BEGIN;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_project_daily_metrics AS
+SELECT project_id,
+       date_trunc('day', timestamp)::date AS day,
+       metric_type,
+       COUNT(*) AS event_count,
+       COUNT(DISTINCT user_id) AS user_count,
+       COUNT(DISTINCT task_id) AS task_count,
+       SUM(metric_value) AS value_sum,
+       MIN(metric_value) AS value_min,
+       MAX(metric_value) AS value_max,
+       MAX(timestamp) AS last_activity
+  FROM efficiency_metrics
+ GROUP BY project_id, date_trunc('day', timestamp)::date, metric_type
+WITH DATA;
+CREATE UNIQUE INDEX IF NOT EXISTS uq_mv_project_daily_metrics ON mv_project_daily_metrics (project_id, day, metric_type);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_user_project_daily_metrics AS
+SELECT user_id,
+       project_id,
+       date_trunc('day', timestamp)::date AS day,
+       metric_type,
+       COUNT(*) AS event_count,
+       COUNT(DISTINCT task_id) AS task_count,
+       SUM(metric_value) AS value_sum,
+       MIN(metric_value) AS value_min,
+       MAX(metric_value) AS value_max,
+       MAX(timestamp) AS last_activity
+  FROM efficiency_metrics
+ GROUP BY user_id, project_id, date_trunc('day', timestamp)::date, metric_type
+WITH DATA;
+CREATE UNIQUE INDEX IF NOT EXISTS uq_mv_user_project_daily_metrics ON mv_user_project_daily_metrics (user_id, project_id, day, metric_type);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_tool_daily_metrics AS
+SELECT project_id,
+       COALESCE(tool, 'unknown') AS tool,
+       date_trunc('day', timestamp)::date AS day,
+       metric_type,
+       COUNT(*) AS event_count,
+       COUNT(DISTINCT user_id) AS user_count,
+       SUM(metric_value) AS value_sum,
+       MIN(metric_value) AS value_min,
+       MAX(metric_value) AS value_max
+  FROM efficiency_metrics
+ GROUP BY project_id, COALESCE(tool, 'unknown'), date_trunc('day', timestamp)::date, metric_type
+WITH DATA;
+CREATE UNIQUE INDEX IF NOT EXISTS uq_mv_tool_daily_metrics ON mv_tool_daily_metrics (project_id, tool, day, metric_type);
+
+COMMIT;
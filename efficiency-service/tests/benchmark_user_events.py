@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+analyze_user_events 性能对比脚本
+功能：
+1. 生成模拟的用户事件记录（交互 / 性能 / 标注，含越界值）
+2. 对比逐条字典分析与列式向量化分析的耗时
+3. 校验两种实现的输出完全一致
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.api.v1.events import analyze_user_events, analyze_user_columns  # noqa: E402
+from app.services.flux_columnar import FluxColumns, Categorical  # noqa: E402
+
+EVENT_TYPES = ['EventType.USER_INTERACTION', 'EventType.PERFORMANCE', 'EventType.ANNOTATION', 'EventType.ERROR']
+ACTIONS = ['click', 'drag', 'zoom', 'pan', 'select', 'draw', 'undo']
+FIELDS = {
+    'EventType.USER_INTERACTION': ['duration', 'count'],
+    'EventType.PERFORMANCE': ['fps', 'memory_usage'],
+    'EventType.ANNOTATION': ['duration', 'success'],
+    'EventType.ERROR': ['count'],
+}
+
+
+def generate_records(n: int, seed: int = 42):
+    """生成 n 条记录，返回 (事件字典列表, FluxColumns)"""
+    rng = random.Random(seed)
+    events = []
+    type_codes, action_codes, field_codes, values = [], [], [], []
+    field_names = sorted({name for names in FIELDS.values() for name in names})
+
+    for _ in range(n):
+        event_type = rng.choice(EVENT_TYPES)
+        field = rng.choice(FIELDS[event_type])
+        action = rng.choice(ACTIONS) if event_type == 'EventType.USER_INTERACTION' else None
+        if field == 'fps':
+            value = rng.uniform(-10, 240)
+        elif field == 'duration':
+            value = rng.uniform(-100, 12000)
+        else:
+            value = float(rng.randint(0, 5))
+
+        events.append({
+            'field': field,
+            'value': value,
+            'event_type': event_type,
+            'action': action if action is not None else 'unknown',
+        })
+        type_codes.append(EVENT_TYPES.index(event_type))
+        action_codes.append(ACTIONS.index(action) if action is not None else -1)
+        field_codes.append(field_names.index(field))
+        values.append(value)
+
+    columns = FluxColumns(
+        np.zeros(n, dtype=np.int64),
+        np.array(values, dtype=np.float64),
+        {
+            'event_type': Categorical(np.array(type_codes, dtype=np.int32), list(EVENT_TYPES)),
+            'action': Categorical(np.array(action_codes, dtype=np.int32), list(ACTIONS)),
+            '_field': Categorical(np.array(field_codes, dtype=np.int32), field_names),
+        }
+    )
+    return events, columns
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='analyze_user_events 性能对比')
+    parser.add_argument('--records', type=int, default=1_000_000, help='记录数量')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子')
+    args = parser.parse_args()
+
+    print(f"🔧 生成 {args.records:,} 条记录...")
+    events, columns = generate_records(args.records, args.seed)
+
+    expected, loop_time = timed(analyze_user_events, events, 'benchmark_user')
+    actual, vector_time = timed(analyze_user_columns, columns, 'benchmark_user')
+
+    expected.pop('last_updated')
+    actual.pop('last_updated')
+    same = expected == actual and list(expected['event_distribution']) == list(actual['event_distribution'])
+
+    print(f"⏱️  逐条分析:   {loop_time * 1000:.1f} ms")
+    print(f"⏱️  向量化分析: {vector_time * 1000:.1f} ms")
+    print(f"🚀 加速比: {loop_time / max(vector_time, 1e-9):.1f}x")
+    print(f"{'✅' if same else '❌'} 输出{'一致' if same else '不一致'}")
+    return 0 if same else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -18,6 +18,12 @@ from typing import Dict, List, Any, Optional
 import argparse
 import numpy as np
 
+from effm_frames import (
+    INSTANCE_TYPE_MAPPING, INSTANCE_2D_TYPES, USER_COLUMNS, IDLE_THRESHOLD_SECONDS,
+    find_column, normalize_instance_types, completion_mask, duration_stats,
+    efficiency_scores, consistency_scores, improvement_trends, idle_gaps, idle_summary, records
+)
+
 try:
     from influxdb_client.client.influxdb_client import InfluxDBClient
     from influxdb_client.client.query_api import QueryApi
@@ -34,37 +40,6 @@ INFLUXDB_CONFIG = {
     'bucket': 'efficiency_events'
 }
 
-# 2D Instance类型映射
-INSTANCE_TYPE_MAPPING = {
-    # 基础类型映射
-    'rect': 'cuboid',
-    'rectangle': 'cuboid', 
-    'bounding_box': 'cuboid',
-    'BOUNDING_BOX': 'cuboid',
-    'RECTANGLE': 'cuboid',
-    
-    # 多边形类型
-    'polygon': 'polygon',
-    'POLYGON': 'polygon',
-    
-    # 折线类型
-    'polyline': 'polyline',
-    'POLYLINE': 'polyline',
-    
-    # ISS相关类型
-    'iss': 'issinstance',
-    'iss-rect': 'issinstance',
-    'iss_unified': 'issinstance',
-    'ISS': 'issinstance',
-    'ISS_UNIFIED': 'issinstance',
-    'ISS_RECT': 'issinstance',
-    
-    # 关键点（虽然不是2D instance，但包含进来）
-    'keypoint': 'keypoint',
-    'key-point': 'keypoint',
-    'KEY_POINT': 'keypoint',
-}
-
 class Effm2DInstanceAnalyzer:
     def __init__(self):
         """初始化 2D Instance 分析器"""
@@ -151,45 +126,22 @@ class Effm2DInstanceAnalyzer:
             print(f"❌ 查询2D Instance数据失败: {e}")
             return None
     
-    def normalize_instance_type(self, tool_type: str) -> str:
-        """标准化实例类型名称"""
-        if not tool_type:
-            return 'unknown'
-        
-        tool_type_clean = str(tool_type).strip().lower()
-        return INSTANCE_TYPE_MAPPING.get(tool_type_clean, tool_type_clean)
-    
     def analyze_2d_instance_statistics(self, df: pd.DataFrame) -> Dict[str, Any]:
         """分析2D Instance类型统计（总体和个人）"""
         if df.empty:
             return {"error": "没有数据可分析"}
         
         # 添加标准化的实例类型字段 - 包含实际数据中的字段
-        df['normalized_instance_type'] = df.apply(
-            lambda row: self.normalize_instance_type(
-                row.get('annotationType') or 
-                row.get('meta_toolType') or 
-                row.get('toolType') or 
-                row.get('tool_type') or 
-                row.get('field', '')
-            ), axis=1
-        )
+        df['normalized_instance_type'] = normalize_instance_types(df)
         
         # 过滤出2D instance相关的数据
-        instance_types = ['cuboid', 'polygon', 'polyline', 'issinstance']
-        instance_df = df[df['normalized_instance_type'].isin(instance_types)]
+        instance_df = df[df['normalized_instance_type'].isin(INSTANCE_2D_TYPES)]
         
         if instance_df.empty:
             return {"error": "没有找到2D Instance相关数据"}
         
         # 过滤完成的标注事件
-        completion_mask = (
-            (instance_df.get('action', pd.Series(dtype='object')).fillna('') == 'complete') |
-            (instance_df.get('event_type', pd.Series(dtype='object')).fillna('').str.contains('completion|completed', case=False, na=False)) |
-            (instance_df.get('field', pd.Series(dtype='object')).fillna('').str.contains('completion|completed', case=False, na=False))
-        )
-        
-        completion_df = instance_df[completion_mask]
+        completion_df = instance_df[completion_mask(instance_df)]
         
         if completion_df.empty:
             completion_df = instance_df  # 如果没有明确的完成标识，使用全部数据
@@ -256,19 +208,10 @@ class Effm2DInstanceAnalyzer:
             return {"error": "没有数据可分析"}
         
         # 标准化实例类型 - 包含实际数据中的字段
-        df['normalized_instance_type'] = df.apply(
-            lambda row: self.normalize_instance_type(
-                row.get('annotationType') or 
-                row.get('meta_toolType') or 
-                row.get('toolType') or 
-                row.get('tool_type') or 
-                row.get('field', '')
-            ), axis=1
-        )
+        df['normalized_instance_type'] = normalize_instance_types(df)
         
         # 过滤2D instance数据
-        instance_types = ['cuboid', 'polygon', 'polyline', 'issinstance']
-        instance_df = df[df['normalized_instance_type'].isin(instance_types)]
+        instance_df = df[df['normalized_instance_type'].isin(INSTANCE_2D_TYPES)]
         
         if instance_df.empty:
             return {"error": "没有找到2D Instance相关数据"}
@@ -306,12 +249,7 @@ class Effm2DInstanceAnalyzer:
         valid_mask = (
             (instance_df[f'{duration_col}_numeric'].notna()) & 
             (instance_df[f'{duration_col}_numeric'] > 0) &
-            (
-                (instance_df.get('type', pd.Series(dtype='object')).fillna('') == 'complete') |
-                (instance_df.get('action', pd.Series(dtype='object')).fillna('') == 'complete') |
-                (instance_df.get('event_type', pd.Series(dtype='object')).fillna('').str.contains('completion|completed', case=False, na=False)) |
-                (instance_df.get('field', pd.Series(dtype='object')).fillna('').str.contains('duration|completion', case=False, na=False))
-            )
+            completion_mask(instance_df, field_pattern='duration|completion', status_columns=('type', 'action'))
         )
         
         valid_df = instance_df[valid_mask]
@@ -349,19 +287,10 @@ class Effm2DInstanceAnalyzer:
             return {"error": "没有数据可分析"}
         
         # 标准化实例类型 - 包含实际数据中的字段
-        df['normalized_instance_type'] = df.apply(
-            lambda row: self.normalize_instance_type(
-                row.get('annotationType') or 
-                row.get('meta_toolType') or 
-                row.get('toolType') or 
-                row.get('tool_type') or 
-                row.get('field', '')
-            ), axis=1
-        )
+        df['normalized_instance_type'] = normalize_instance_types(df)
         
         # 过滤2D instance数据
-        instance_types = ['cuboid', 'polygon', 'polyline', 'issinstance']
-        instance_df = df[df['normalized_instance_type'].isin(instance_types)]
+        instance_df = df[df['normalized_instance_type'].isin(INSTANCE_2D_TYPES)]
         
         if instance_df.empty:
             return {"error": "没有找到2D Instance相关数据"}
@@ -379,20 +308,23 @@ class Effm2DInstanceAnalyzer:
             return {"error": "缺少用户或时间信息"}
         
         # 转换时间格式
-        df_copy = instance_df.copy()
+        df_copy = instance_df[[user_col, 'time', 'normalized_instance_type']].copy()
         df_copy['time'] = pd.to_datetime(df_copy['time'])
         
+        # 整表排序一次得到每个用户相邻事件的间隔，总体与按用户的分析共用
+        gaps = idle_gaps(df_copy, user_col)
+        
         # 总体空闲分析
-        overall_idle = self._analyze_overall_idle_patterns(df_copy, user_col)
+        overall_idle = self._analyze_overall_idle_patterns(gaps)
         
         # 按实例类型的空闲分析
         type_idle = self._analyze_idle_by_instance_type(df_copy, user_col)
         
         # 按用户的空闲分析
-        user_idle = self._analyze_idle_by_user(df_copy, user_col)
+        user_idle = self._analyze_idle_by_user(df_copy, user_col, gaps)
         
         return {
-            "total_users_analyzed": len(df_copy[user_col].dropna().unique()),
+            "total_users_analyzed": int(df_copy[user_col].nunique()),
             "overall_idle_patterns": overall_idle,
             "idle_by_instance_type": type_idle,
             "idle_by_user": user_idle,
@@ -450,217 +382,93 @@ class Effm2DInstanceAnalyzer:
     
     def _analyze_efficiency_by_type(self, df: pd.DataFrame, duration_col: str) -> Dict[str, Any]:
         """按实例类型分析效率"""
-        type_efficiency = {}
-        
-        for instance_type in df['normalized_instance_type'].dropna().unique():
-            type_data = df[df['normalized_instance_type'] == instance_type][duration_col]
-            
-            if len(type_data) > 0:
-                type_efficiency[str(instance_type)] = {
-                    "count": len(type_data),
-                    "avg_time": float(type_data.mean()),
-                    "median_time": float(type_data.median()),
-                    "min_time": float(type_data.min()),
-                    "max_time": float(type_data.max()),
-                    "std_time": float(type_data.std()) if len(type_data) > 1 else 0,
-                    "efficiency_score": self._calculate_efficiency_score(type_data),
-                    "consistency_score": self._calculate_consistency_score(type_data)
-                }
-        
-        return type_efficiency
+        stats = duration_stats(df, ['normalized_instance_type'], duration_col)
+        stats['efficiency_score'] = efficiency_scores(stats)
+        stats['consistency_score'] = consistency_scores(stats)
+        stats = stats.rename(columns={
+            'mean': 'avg_time', 'median': 'median_time', 'min': 'min_time', 'max': 'max_time', 'std': 'std_time'
+        })
+        
+        return records(stats, [
+            'count', 'avg_time', 'median_time', 'min_time', 'max_time', 'std_time',
+            'efficiency_score', 'consistency_score'
+        ])
     
     def _analyze_efficiency_by_user(self, df: pd.DataFrame, duration_col: str) -> Dict[str, Any]:
         """按用户分析效率"""
-        user_fields = ['user_id', 'userId', 'createdBy', 'created_by']
-        user_col = None
-        
-        for field in user_fields:
-            if field in df.columns:
-                user_col = field
-                break
+        user_col = find_column(df, USER_COLUMNS)
         
         if not user_col:
             return {"error": "未找到用户信息"}
         
-        user_efficiency = {}
+        # 用户总体统计与 用户×类型 统计各做一次groupby
+        user_stats = duration_stats(df, [user_col], duration_col)
+        user_stats['efficiency_score'] = efficiency_scores(user_stats)
+        user_stats['consistency_score'] = consistency_scores(user_stats)
+        user_stats['improvement_trend'] = improvement_trends(df, [user_col], duration_col)
         
-        for user_id in df[user_col].dropna().unique():
-            user_data = df[df[user_col] == user_id]
-            user_durations = user_data[duration_col]
-            
-            if len(user_durations) > 0:
-                # 按类型的效率
-                type_breakdown = {}
-                for instance_type in user_data['normalized_instance_type'].dropna().unique():
-                    type_durations = user_data[user_data['normalized_instance_type'] == instance_type][duration_col]
-                    if len(type_durations) > 0:
-                        type_breakdown[str(instance_type)] = {
-                            "count": len(type_durations),
-                            "avg_time": float(type_durations.mean()),
-                            "min_time": float(type_durations.min()),
-                            "max_time": float(type_durations.max())
-                        }
-                
-                user_efficiency[str(user_id)] = {
-                    "total_instances": len(user_durations),
-                    "overall_avg_time": float(user_durations.mean()),
-                    "overall_median_time": float(user_durations.median()),
-                    "efficiency_score": self._calculate_efficiency_score(user_durations),
-                    "consistency_score": self._calculate_consistency_score(user_durations),
-                    "by_instance_type": type_breakdown,
-                    "improvement_trend": self._calculate_improvement_trend(user_data, duration_col)
-                }
+        type_stats = duration_stats(df, [user_col, 'normalized_instance_type'], duration_col)
+        type_stats = type_stats.rename(columns={'mean': 'avg_time', 'min': 'min_time', 'max': 'max_time'})
+        type_breakdown: Dict[str, Dict[str, Any]] = {}
+        for (user_id, instance_type), row in type_stats[['count', 'avg_time', 'min_time', 'max_time']].to_dict(orient='index').items():
+            type_breakdown.setdefault(str(user_id), {})[str(instance_type)] = row
+        
+        user_efficiency = {}
+        for user_id, row in user_stats.to_dict(orient='index').items():
+            user_efficiency[str(user_id)] = {
+                "total_instances": row['count'],
+                "overall_avg_time": row['mean'],
+                "overall_median_time": row['median'],
+                "efficiency_score": row['efficiency_score'],
+                "consistency_score": row['consistency_score'],
+                "by_instance_type": type_breakdown.get(str(user_id), {}),
+                "improvement_trend": row['improvement_trend']
+            }
         
         return user_efficiency
     
-    def _analyze_overall_idle_patterns(self, df: pd.DataFrame, user_col: str) -> Dict[str, Any]:
+    def _analyze_overall_idle_patterns(self, gaps: pd.DataFrame) -> Dict[str, Any]:
         """分析总体空闲模式"""
-        total_idle_time = 0
-        total_idle_periods = 0
-        all_idle_durations = []
-        
-        for user_id in df[user_col].dropna().unique():
-            user_data = df[df[user_col] == user_id].sort_values('time')
-            
-            if len(user_data) < 2:
-                continue
-            
-            time_diffs = user_data['time'].diff().dropna()
-            idle_threshold = pd.Timedelta(minutes=2)
-            idle_times = time_diffs[time_diffs > idle_threshold]
-            
-            if len(idle_times) > 0:
-                total_idle_time += idle_times.sum().total_seconds()
-                total_idle_periods += len(idle_times)
-                all_idle_durations.extend([t.total_seconds() for t in idle_times])
+        idle_durations = gaps.loc[gaps['gap_seconds'] > IDLE_THRESHOLD_SECONDS, 'gap_seconds']
+        total_idle_time = float(idle_durations.sum())
+        total_idle_periods = len(idle_durations)
         
         return {
             "total_idle_time": total_idle_time,
             "total_idle_periods": total_idle_periods,
             "avg_idle_duration": total_idle_time / total_idle_periods if total_idle_periods > 0 else 0,
-            "median_idle_duration": float(np.median(all_idle_durations)) if all_idle_durations else 0,
-            "max_idle_duration": max(all_idle_durations) if all_idle_durations else 0
+            "median_idle_duration": float(idle_durations.median()) if total_idle_periods > 0 else 0,
+            "max_idle_duration": float(idle_durations.max()) if total_idle_periods > 0 else 0
         }
     
     def _analyze_idle_by_instance_type(self, df: pd.DataFrame, user_col: str) -> Dict[str, Any]:
-        """按实例类型分析空闲模式"""
-        type_idle = {}
-        
-        for instance_type in df['normalized_instance_type'].dropna().unique():
-            type_df = df[df['normalized_instance_type'] == instance_type]
-            idle_data = []
-            
-            for user_id in type_df[user_col].dropna().unique():
-                user_data = type_df[type_df[user_col] == user_id].sort_values('time')
-                
-                if len(user_data) < 2:
-                    continue
-                
-                time_diffs = user_data['time'].diff().dropna()
-                idle_threshold = pd.Timedelta(minutes=2)
-                idle_times = time_diffs[time_diffs > idle_threshold]
-                
-                if len(idle_times) > 0:
-                    idle_data.extend([t.total_seconds() for t in idle_times])
-            
-            if idle_data:
-                type_idle[str(instance_type)] = {
-                    "idle_periods_count": len(idle_data),
-                    "avg_idle_duration": float(np.mean(idle_data)),
-                    "median_idle_duration": float(np.median(idle_data)),
-                    "max_idle_duration": max(idle_data)
-                }
-        
-        return type_idle
+        """按实例类型分析空闲模式（间隔按 类型+用户 分组计算）"""
+        gaps = idle_gaps(df, user_col, by=['normalized_instance_type'])
+        idle = gaps[gaps['gap_seconds'] > IDLE_THRESHOLD_SECONDS]
+        if idle.empty:
+            return {}
+        
+        stats = idle.groupby('normalized_instance_type', observed=True, sort=False)['gap_seconds'].agg(
+            idle_periods_count='size',
+            avg_idle_duration='mean',
+            median_idle_duration='median',
+            max_idle_duration='max'
+        )
+        return records(stats)
     
-    def _analyze_idle_by_user(self, df: pd.DataFrame, user_col: str) -> Dict[str, Any]:
+    def _analyze_idle_by_user(self, df: pd.DataFrame, user_col: str, gaps: Optional[pd.DataFrame] = None) -> Dict[str, Any]:
         """按用户分析空闲模式"""
-        user_idle = {}
-        
-        for user_id in df[user_col].dropna().unique():
-            user_data = df[df[user_col] == user_id].sort_values('time')
-            
-            if len(user_data) < 2:
-                continue
-            
-            time_diffs = user_data['time'].diff().dropna()
-            idle_threshold = pd.Timedelta(minutes=2)
-            long_idle_threshold = pd.Timedelta(minutes=10)
-            
-            idle_times = time_diffs[time_diffs > idle_threshold]
-            long_idle_times = time_diffs[time_diffs > long_idle_threshold]
-            
-            total_session_time = (user_data['time'].max() - user_data['time'].min()).total_seconds()
-            total_user_idle = idle_times.sum().total_seconds() if len(idle_times) > 0 else 0
-            
-            user_idle[str(user_id)] = {
-                "total_instances": len(user_data),
-                "session_duration": total_session_time,
-                "total_idle_time": total_user_idle,
-                "idle_periods_count": len(idle_times),
-                "long_idle_periods_count": len(long_idle_times),
-                "idle_ratio": total_user_idle / total_session_time if total_session_time > 0 else 0,
-                "avg_idle_duration": total_user_idle / len(idle_times) if len(idle_times) > 0 else 0,
-                "max_idle_duration": idle_times.max().total_seconds() if len(idle_times) > 0 else 0
-            }
-        
-        return user_idle
-    
-    def _calculate_efficiency_score(self, durations: pd.Series) -> float:
-        """计算效率分数（0-100，分数越高越高效）"""
-        if len(durations) == 0:
-            return 0.0
-        
-        # 基于时间的效率分数：快速完成获得高分
-        median_time = durations.median()
-        avg_time = durations.mean()
-        
-        # 如果平均时间接近中位数，说明稳定性好
-        stability_factor = 1 - abs(avg_time - median_time) / avg_time if avg_time > 0 else 0
-        
-        # 基础效率分数（反比于平均时间）
-        base_score = max(0, 100 - (avg_time / 10))  # 假设10秒为基准
-        
-        # 结合稳定性
-        efficiency_score = base_score * (0.7 + 0.3 * stability_factor)
-        
-        return min(100.0, max(0.0, efficiency_score))
-    
-    def _calculate_consistency_score(self, durations: pd.Series) -> float:
-        """计算一致性分数（0-100，分数越高越一致）"""
-        if len(durations) <= 1:
-            return 100.0
-        
-        # 基于变异系数的一致性分数
-        cv = durations.std() / durations.mean() if durations.mean() > 0 else float('inf')
-        
-        # 变异系数越小，一致性越高
-        consistency_score = max(0, 100 - cv * 50)
-        
-        return min(100.0, max(0.0, consistency_score))
-    
-    def _calculate_improvement_trend(self, user_data: pd.DataFrame, duration_col: str) -> str:
-        """计算用户改进趋势"""
-        if len(user_data) < 5:  # 需要足够的数据点
-            return "insufficient_data"
-        
-        # 按时间排序，计算时间趋势
-        sorted_data = user_data.sort_values('time')
-        durations = sorted_data[duration_col].values
-        
-        # 简单线性趋势：比较前半部分和后半部分的平均值
-        mid_point = len(durations) // 2
-        first_half_avg = np.mean(durations[:mid_point])
-        second_half_avg = np.mean(durations[mid_point:])
-        
-        improvement_ratio = (first_half_avg - second_half_avg) / first_half_avg if first_half_avg > 0 else 0
-        
-        if improvement_ratio > 0.1:
-            return "improving"
-        elif improvement_ratio < -0.1:
-            return "declining"
-        else:
-            return "stable"
+        summary = idle_summary(df, user_col, gaps=gaps)
+        summary = summary.rename(columns={
+            'total_events': 'total_instances',
+            'avg_idle_time': 'avg_idle_duration',
+            'max_idle_time': 'max_idle_duration'
+        })
+        
+        return records(summary, [
+            'total_instances', 'session_duration', 'total_idle_time', 'idle_periods_count',
+            'long_idle_periods_count', 'idle_ratio', 'avg_idle_duration', 'max_idle_duration'
+        ])
     
     def _generate_efficiency_insights(self, type_efficiency: Dict, user_efficiency: Dict) -> Dict[str, Any]:
         """生成效率洞察"""
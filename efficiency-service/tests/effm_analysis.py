@@ -14,6 +14,11 @@ from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional
 import argparse
 
+from effm_frames import (
+    IDLE_THRESHOLD_SECONDS, completion_mask, duration_stats, fast_slow_counts,
+    idle_gaps, idle_summary, activity_levels, records
+)
+
 try:
     from influxdb_client.client.influxdb_client import InfluxDBClient
     from influxdb_client.client.query_api import QueryApi
@@ -120,13 +125,7 @@ class EffmAnalyzer:
                 break
         
         # 过滤完成的标注事件
-        completion_mask = (
-            (df.get('action', pd.Series(dtype='object')).fillna('') == 'complete') |
-            (df.get('event_type', pd.Series(dtype='object')).fillna('').str.contains('completion|completed', case=False, na=False)) |
-            (df.get('field', pd.Series(dtype='object')).fillna('').str.contains('completion|completed', case=False, na=False))
-        )
-        
-        completion_df = df[completion_mask]
+        completion_df = df[completion_mask(df)]
         
         if completion_df.empty:
             completion_df = df  # 如果没有明确的完成标识，使用全部数据
@@ -196,11 +195,7 @@ class EffmAnalyzer:
         valid_mask = (
             (df[duration_col].notna()) & 
             (df[duration_col] > 0) &
-            (
-                (df.get('action', pd.Series(dtype='object')).fillna('') == 'complete') |
-                (df.get('event_type', pd.Series(dtype='object')).fillna('').str.contains('completion|completed', case=False, na=False)) |
-                (df.get('field', pd.Series(dtype='object')).fillna('').str.contains('duration|completion', case=False, na=False))
-            )
+            completion_mask(df, field_pattern='duration|completion')
         )
         
         valid_df = df[valid_mask]
@@ -212,24 +207,17 @@ class EffmAnalyzer:
         if valid_df.empty:
             return {"error": "没有有效的时长数据"}
         
-        # 按类型分组分析时长
-        time_stats_by_type = {}
-        
-        for annotation_type in valid_df[type_col].dropna().unique():
-            type_data = valid_df[valid_df[type_col] == annotation_type][duration_col]
-            
-            if len(type_data) > 0:
-                time_stats_by_type[str(annotation_type)] = {
-                    "count": len(type_data),
-                    "avg_time": float(type_data.mean()),
-                    "median_time": float(type_data.median()),
-                    "min_time": float(type_data.min()),
-                    "max_time": float(type_data.max()),
-                    "std_time": float(type_data.std()) if len(type_data) > 1 else 0,
-                    "total_time": float(type_data.sum()),
-                    "fast_annotations": int((type_data < type_data.median()).sum()),
-                    "slow_annotations": int((type_data > type_data.mean() + type_data.std()).sum())
-                }
+        # 按类型分组分析时长（一次groupby得到所有类型的统计）
+        type_stats = duration_stats(valid_df, [type_col], duration_col)
+        type_stats = type_stats.join(fast_slow_counts(valid_df, [type_col], duration_col))
+        type_stats = type_stats.rename(columns={
+            'mean': 'avg_time', 'median': 'median_time', 'min': 'min_time', 'max': 'max_time',
+            'std': 'std_time', 'sum': 'total_time', 'fast': 'fast_annotations', 'slow': 'slow_annotations'
+        })
+        time_stats_by_type = records(type_stats, [
+            'count', 'avg_time', 'median_time', 'min_time', 'max_time', 'std_time', 'total_time',
+            'fast_annotations', 'slow_annotations'
+        ])
         
         # 总体统计
         all_durations = valid_df[duration_col]
@@ -281,61 +269,31 @@ class EffmAnalyzer:
             return {"error": "缺少用户或时间信息"}
         
         # 转换时间格式
-        df_copy = df.copy()
+        df_copy = df[[user_col, 'time']].copy()
         df_copy['time'] = pd.to_datetime(df_copy['time'])
         
-        # 按用户分组分析空闲时间
-        user_idle_stats = {}
-        total_idle_time = 0
-        idle_periods = []
-        
-        for user_id in df_copy[user_col].dropna().unique():
-            user_data = df_copy[df_copy[user_col] == user_id].sort_values('time')
-            
-            if len(user_data) < 2:
-                continue
-            
-            # 计算相邻事件之间的时间间隔
-            time_diffs = user_data['time'].diff().dropna()  # 删除NaT值
-            
-            # 定义空闲阈值
-            idle_threshold = pd.Timedelta(minutes=2)  # 2分钟无操作算空闲
-            long_idle_threshold = pd.Timedelta(minutes=10)  # 10分钟算长时间空闲
-            
-            # 筛选出空闲时间段
-            idle_times = time_diffs[time_diffs > idle_threshold]
-            long_idle_times = time_diffs[time_diffs > long_idle_threshold]
-            
-            # 计算统计指标
-            total_session_time = (user_data['time'].max() - user_data['time'].min()).total_seconds()
-            total_user_idle = idle_times.sum().total_seconds() if len(idle_times) > 0 else 0
-            
-            user_idle_stats[str(user_id)] = {
-                "total_events": len(user_data),
-                "session_duration": total_session_time,
-                "total_idle_time": total_user_idle,
-                "idle_periods_count": len(idle_times),
-                "long_idle_periods_count": len(long_idle_times),
-                "avg_idle_time": total_user_idle / len(idle_times) if len(idle_times) > 0 else 0,
-                "max_idle_time": idle_times.max().total_seconds() if len(idle_times) > 0 else 0,
-                "idle_ratio": total_user_idle / total_session_time if total_session_time > 0 else 0,
-                "activity_level": "高" if total_user_idle / total_session_time < 0.2 else ("中" if total_user_idle / total_session_time < 0.5 else "低")
+        # 整表排序一次，按用户计算相邻事件之间的时间间隔
+        gaps = idle_gaps(df_copy, user_col)
+        summary = idle_summary(df_copy, user_col, gaps=gaps)
+        summary['activity_level'] = activity_levels(summary['idle_ratio'])
+        
+        user_idle_stats = records(summary, [
+            'total_events', 'session_duration', 'total_idle_time', 'idle_periods_count',
+            'long_idle_periods_count', 'avg_idle_time', 'max_idle_time', 'idle_ratio', 'activity_level'
+        ])
+        total_idle_time = float(summary['total_idle_time'].sum())
+        
+        # 记录具体的空闲时间段（只保留最长的10段）
+        idle = gaps[gaps['gap_seconds'] > IDLE_THRESHOLD_SECONDS].nlargest(10, 'gap_seconds')
+        idle_periods = [
+            {
+                "user_id": str(user_id),
+                "idle_duration": float(gap_seconds),
+                "start_time": str(start_time),
+                "end_time": str(end_time)
             }
-            
-            total_idle_time += total_user_idle
-            
-            # 记录具体的空闲时间段
-            idle_indices = time_diffs[time_diffs > idle_threshold].index
-            for idx in idle_indices:
-                if idx > 0:
-                    idx_pos = user_data.index.get_loc(idx)
-                    if idx_pos > 0:
-                        idle_periods.append({
-                            "user_id": str(user_id),
-                            "idle_duration": time_diffs[idx].total_seconds(),
-                            "start_time": str(user_data.iloc[idx_pos-1]['time']),
-                            "end_time": str(user_data.iloc[idx_pos]['time'])
-                        })
+            for user_id, start_time, end_time, gap_seconds in idle[[user_col, 'start_time', 'end_time', 'gap_seconds']].itertuples(index=False)
+        ]
         
         # 排序找出最空闲和最活跃的用户
         sorted_users = sorted(user_idle_stats.items(), key=lambda x: x[1]['idle_ratio'], reverse=True)
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+EFFM 分析脚本共用的 DataFrame 计算库
+功能：
+1. 实例类型标准化（按 category 编码只对唯一值做映射）
+2. 按用户 / 类型的一次性 groupby 统计（时长、空闲间隔、前后半段趋势）
+3. 效率分数、一致性分数、专业化分数的向量化计算
+
+分组键统一转为 category 类型，所有函数只对整个 DataFrame 做一次排序和分组，
+不再逐个用户或类型重新过滤。
+"""
+
+from typing import Dict, List, Optional, Sequence, Iterable
+
+import numpy as np
+import pandas as pd
+
+# 2D Instance类型映射
+INSTANCE_TYPE_MAPPING = {
+    # 基础类型映射
+    'rect': 'cuboid',
+    'rectangle': 'cuboid',
+    'bounding_box': 'cuboid',
+    'BOUNDING_BOX': 'cuboid',
+    'RECTANGLE': 'cuboid',
+
+    # 多边形类型
+    'polygon': 'polygon',
+    'POLYGON': 'polygon',
+
+    # 折线类型
+    'polyline': 'polyline',
+    'POLYLINE': 'polyline',
+
+    # ISS相关类型
+    'iss': 'issinstance',
+    'iss-rect': 'issinstance',
+    'iss_unified': 'issinstance',
+    'ISS': 'issinstance',
+    'ISS_UNIFIED': 'issinstance',
+    'ISS_RECT': 'issinstance',
+
+    # 关键点（虽然不是2D instance，但包含进来）
+    'keypoint': 'keypoint',
+    'key-point': 'keypoint',
+    'KEY_POINT': 'keypoint',
+}
+
+# 2D Instance 类型
+INSTANCE_2D_TYPES = ['cuboid', 'polygon', 'polyline', 'issinstance']
+
+# 实例类型的取值来源，按优先级排列
+TYPE_SOURCE_COLUMNS = ['annotationType', 'meta_toolType', 'toolType', 'tool_type', 'field']
+
+USER_COLUMNS = ['user_id', 'userId', 'createdBy', 'created_by']
+
+# 基于类型的复杂度（未知类型按2计）
+TYPE_COMPLEXITY = {
+    'cuboid': 1,  # 简单
+    'polygon': 3,  # 复杂
+    'polyline': 2,  # 中等
+    'issinstance': 4,  # 最复杂
+    'keypoint': 1  # 简单
+}
+
+IDLE_THRESHOLD_SECONDS = 120  # 2分钟无操作算空闲
+LONG_IDLE_THRESHOLD_SECONDS = 600  # 10分钟算长时间空闲
+
+
+def find_column(df: pd.DataFrame, candidates: Iterable[str]) -> Optional[str]:
+    """返回候选字段中第一个存在的列名"""
+    for field in candidates:
+        if field in df.columns:
+            return field
+    return None
+
+
+def text_column(df: pd.DataFrame, column: str) -> pd.Series:
+    """取字符串列，缺失的列或值视为空字符串"""
+    if column not in df.columns:
+        return pd.Series('', index=df.index, dtype='object')
+    return df[column].fillna('').astype(str)
+
+
+def normalize_instance_types(df: pd.DataFrame, mapping: Optional[Dict[str, str]] = None,
+                             columns: Sequence[str] = TYPE_SOURCE_COLUMNS) -> pd.Series:
+    """
+    标准化实例类型
+
+    按 columns 顺序取第一个非空值；先转为 category，清洗和映射只对唯一值做一次，再按编码还原到每一行。
+    """
+    mapping = INSTANCE_TYPE_MAPPING if mapping is None else mapping
+    raw = pd.Series(np.nan, index=df.index, dtype='object')
+    for column in columns:
+        if column in df.columns:
+            values = df[column]
+            raw = raw.fillna(values.where(values.notna() & (values.astype(str) != '')))
+
+    raw = raw.astype('category')
+    labels = []
+    for category in raw.cat.categories:
+        clean = str(category).strip().lower()
+        labels.append(mapping.get(clean, clean) or 'unknown')
+    # 编码 -1（缺失）对应最后一个标签
+    labels = np.array(labels + ['unknown'], dtype=object)
+    return pd.Series(labels[raw.cat.codes.to_numpy()], index=df.index)
+
+
+def completion_mask(df: pd.DataFrame, field_pattern: str = 'completion|completed',
+                    status_columns: Sequence[str] = ('action',)) -> pd.Series:
+    """完成事件的判定：状态列等于 complete，或事件类型 / 字段名匹配完成相关的模式"""
+    mask = text_column(df, 'event_type').str.contains('completion|completed', case=False, regex=True)
+    mask |= text_column(df, 'field').str.contains(field_pattern, case=False, regex=True)
+    for column in status_columns:
+        mask |= text_column(df, column) == 'complete'
+    return mask
+
+
+def _group_keys(df: pd.DataFrame, keys: Sequence[str]):
+    """分组键：无键时用常量数组，整个表作为一组"""
+    return list(keys) if keys else np.zeros(len(df), dtype=np.int8)
+
+
+def _as_categories(df: pd.DataFrame, keys: Sequence[str]) -> pd.DataFrame:
+    """把分组键转为 category 类型，去掉键缺失的行"""
+    frame = df.dropna(subset=list(keys)) if keys else df
+    frame = frame.copy()
+    for key in keys:
+        if not isinstance(frame[key].dtype, pd.CategoricalDtype):
+            frame[key] = frame[key].astype('category')
+    return frame
+
+
+def duration_stats(df: pd.DataFrame, keys: Sequence[str], value_col: str,
+                   quantiles: Sequence[float] = ()) -> pd.DataFrame:
+    """
+    按分组一次性计算时长统计
+
+    返回列：count / mean / median / min / max / std / sum，以及 q25、q75 等分位数列；
+    单条记录的分组 std 记为0。
+    """
+    frame = _as_categories(df, keys)
+    grouped = frame.groupby(_group_keys(frame, keys), observed=True, sort=False)[value_col]
+    stats = grouped.agg(['size', 'mean', 'median', 'min', 'max', 'std', 'sum'])
+    stats = stats.rename(columns={'size': 'count'})
+    stats['std'] = stats['std'].fillna(0.0)
+
+    if quantiles:
+        quantile_values = grouped.quantile(list(quantiles)).unstack()
+        for q in quantiles:
+            stats[f'q{int(round(q * 100))}'] = quantile_values[q]
+    return stats
+
+
+def fast_slow_counts(df: pd.DataFrame, keys: Sequence[str], value_col: str) -> pd.DataFrame:
+    """每组中低于组内中位数（fast）与高于均值加一倍标准差（slow）的记录数"""
+    frame = _as_categories(df, keys)
+    group_keys = _group_keys(frame, keys)
+    values = frame[value_col]
+    grouped = frame.groupby(group_keys, observed=True, sort=False)[value_col]
+    median = grouped.transform('median')
+    upper = grouped.transform('mean') + grouped.transform('std')
+    flags = frame.assign(fast=values < median, slow=values > upper)
+    return flags.groupby(group_keys, observed=True, sort=False)[['fast', 'slow']].sum().astype(int)
+
+
+def efficiency_scores(stats: pd.DataFrame) -> pd.Series:
+    """效率分数（0-100，分数越高越高效），输入为 duration_stats 的结果"""
+    mean = stats['mean']
+    # 如果平均时间接近中位数，说明稳定性好
+    stability = np.where(mean > 0, 1 - (mean - stats['median']).abs() / mean.where(mean > 0, 1), 0)
+    # 基础效率分数（反比于平均时间，假设10秒为基准），结合稳定性
+    base = (100 - mean / 10).clip(lower=0)
+    return (base * (0.7 + 0.3 * stability)).clip(0.0, 100.0)
+
+
+def consistency_scores(stats: pd.DataFrame) -> pd.Series:
+    """一致性分数（0-100，变异系数越小越一致），输入为 duration_stats 的结果"""
+    mean = stats['mean']
+    cv = (stats['std'] / mean.where(mean > 0)).fillna(np.inf)
+    scores = (100 - cv * 50).clip(0.0, 100.0)
+    return scores.where(stats['count'] > 1, 100.0)
+
+
+def idle_gaps(df: pd.DataFrame, user_col: str, by: Sequence[str] = (), time_col: str = 'time') -> pd.DataFrame:
+    """
+    相邻事件之间的时间间隔
+
+    整个表按 (by, 用户, 时间) 排序一次，再用 groupby().shift() 求组内上一条事件时间；
+    返回每个间隔的分组键、start_time、end_time 和 gap_seconds（每组第一条事件没有间隔）。
+    """
+    keys = list(by) + [user_col]
+    frame = _as_categories(df[keys + [time_col]], keys)
+    frame = frame.sort_values(keys + [time_col], kind='mergesort')
+    previous = frame.groupby(keys, observed=True, sort=False)[time_col].shift()
+
+    gaps = frame[keys].copy()
+    gaps['start_time'] = previous
+    gaps['end_time'] = frame[time_col]
+    gaps['gap_seconds'] = (frame[time_col] - previous).dt.total_seconds()
+    return gaps[gaps['gap_seconds'].notna()]
+
+
+def idle_summary(df: pd.DataFrame, user_col: str, time_col: str = 'time',
+                 idle_seconds: float = IDLE_THRESHOLD_SECONDS,
+                 long_idle_seconds: float = LONG_IDLE_THRESHOLD_SECONDS,
+                 gaps: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """
+    按用户汇总空闲时间（只包含至少两条事件的用户）
+
+    返回列：total_events / session_duration / total_idle_time / idle_periods_count /
+    long_idle_periods_count / avg_idle_time / max_idle_time / idle_ratio
+    """
+    frame = _as_categories(df[[user_col, time_col]], [user_col])
+    events = frame.groupby(user_col, observed=True, sort=False)[time_col].agg(['size', 'min', 'max'])
+    events = events[events['size'] >= 2]
+
+    if gaps is None:
+        gaps = idle_gaps(frame, user_col, time_col=time_col)
+    idle = gaps.loc[gaps['gap_seconds'] > idle_seconds, [user_col, 'gap_seconds']]
+    idle = idle.assign(long=idle['gap_seconds'] > long_idle_seconds)
+    idle_stats = idle.groupby(user_col, observed=True, sort=False).agg(
+        total_idle_time=('gap_seconds', 'sum'),
+        idle_periods_count=('gap_seconds', 'size'),
+        long_idle_periods_count=('long', 'sum'),
+        max_idle_time=('gap_seconds', 'max')
+    ).reindex(events.index).fillna(0)
+
+    summary = pd.DataFrame({
+        'total_events': events['size'].astype(int),
+        'session_duration': (events['max'] - events['min']).dt.total_seconds(),
+        'total_idle_time': idle_stats['total_idle_time'].astype(float),
+        'idle_periods_count': idle_stats['idle_periods_count'].astype(int),
+        'long_idle_periods_count': idle_stats['long_idle_periods_count'].astype(int),
+        'max_idle_time': idle_stats['max_idle_time'].astype(float)
+    }, index=events.index)
+    summary['avg_idle_time'] = (summary['total_idle_time'] /
+                                summary['idle_periods_count'].where(summary['idle_periods_count'] > 0)).fillna(0.0)
+    summary['idle_ratio'] = (summary['total_idle_time'] /
+                             summary['session_duration'].where(summary['session_duration'] > 0)).fillna(0.0)
+    return summary
+
+
+def activity_levels(idle_ratio: pd.Series) -> pd.Series:
+    """按空闲比例划分活跃度：<0.2 为高，<0.5 为中，其余为低"""
+    return pd.Series(np.select([idle_ratio < 0.2, idle_ratio < 0.5], ['高', '中'], '低'), index=idle_ratio.index)
+
+
+def split_halves(df: pd.DataFrame, keys: Sequence[str], time_col: str = 'time') -> pd.DataFrame:
+    """
+    按时间把每组记录分为前后两半
+
+    返回按 (keys, 时间) 排序的表，增加 _half（0 为前半，1 为后半，前半为 n // 2 条）和 _size 两列。
+    """
+    frame = _as_categories(df, keys).sort_values(list(keys) + [time_col], kind='mergesort')
+    grouped = frame.groupby(list(keys), observed=True, sort=False)
+    position = grouped.cumcount()
+    size = grouped[time_col].transform('size')
+    return frame.assign(_half=(position >= size // 2).astype(np.int8), _size=size)
+
+
+def improvement_trends(df: pd.DataFrame, keys: Sequence[str], value_col: str, time_col: str = 'time',
+                       min_count: int = 5, threshold: float = 0.1) -> pd.Series:
+    """比较每组前后两半的平均时长：improving / declining / stable，记录不足为 insufficient_data"""
+    halves = split_halves(df, keys, time_col)
+    sizes = halves.groupby(list(keys), observed=True, sort=False)['_size'].first()
+    means = halves.groupby(list(keys) + ['_half'], observed=True, sort=False)[value_col].mean().unstack('_half')
+    means = means.reindex(index=sizes.index, columns=[0, 1])
+
+    first, second = means[0], means[1]
+    ratio = ((first - second) / first.where(first > 0)).fillna(0.0)
+    trends = np.select([ratio > threshold, ratio < -threshold], ['improving', 'declining'], 'stable')
+    return pd.Series(np.where(sizes < min_count, 'insufficient_data', trends), index=sizes.index)
+
+
+def speed_trends(df: pd.DataFrame, keys: Sequence[str], time_col: str = 'time',
+                 min_count: int = 5, threshold: float = 0.2) -> pd.Series:
+    """比较每组前后两半的平均标注间隔：accelerating / decelerating / stable，记录不足为 insufficient_data"""
+    halves = split_halves(df, keys, time_col)
+    sizes = halves.groupby(list(keys), observed=True, sort=False)['_size'].first()
+    spans = halves.groupby(list(keys) + ['_half'], observed=True, sort=False)[time_col].agg(['min', 'max', 'size'])
+    intervals = ((spans['max'] - spans['min']).dt.total_seconds() / spans['size']).unstack('_half')
+    counts = spans['size'].unstack('_half')
+    intervals = intervals.reindex(index=sizes.index, columns=[0, 1])
+    counts = counts.reindex(index=sizes.index, columns=[0, 1]).fillna(0)
+
+    first, second = intervals[0], intervals[1]
+    change = ((first - second) / first.where(first > 0)).fillna(0.0)
+    trends = np.select([change > threshold, change < -threshold], ['accelerating', 'decelerating'], 'stable')
+    insufficient = (sizes < min_count) | (counts[0] < 2) | (counts[1] < 2)
+    return pd.Series(np.where(insufficient, 'insufficient_data', trends), index=sizes.index)
+
+
+def type_counts(df: pd.DataFrame, user_col: str, type_col: str = 'normalized_instance_type') -> pd.DataFrame:
+    """用户 × 类型 的记录数矩阵（行按用户，列按类型，未出现的组合为0）"""
+    frame = _as_categories(df[[user_col, type_col]], [user_col, type_col])
+    return frame.groupby([user_col, type_col], observed=True, sort=False).size().unstack(fill_value=0)
+
+
+def specialization_scores(counts: pd.DataFrame) -> pd.Series:
+    """
+    专业化分数（0-100，越高越专业化）：1 - 香农熵 / 最大熵
+
+    counts 为 type_counts 的结果，只使用过一种类型的用户记为100。
+    """
+    totals = counts.sum(axis=1)
+    probabilities = counts.div(totals.where(totals > 0), axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        entropy = -(probabilities * np.log2(probabilities.where(probabilities > 0))).sum(axis=1)
+    diversity = (counts > 0).sum(axis=1)
+    max_entropy = np.log2(diversity.where(diversity > 1))
+    scores = ((1 - entropy / max_entropy) * 100).clip(0.0, 100.0)
+    return scores.where(diversity > 1, 100.0)
+
+
+def average_complexity(df: pd.DataFrame, keys: Sequence[str] = (),
+                       type_col: str = 'normalized_instance_type') -> pd.Series:
+    """按分组计算平均类型复杂度（未知类型按2计）"""
+    complexity = df[type_col].astype(object).map(TYPE_COMPLEXITY).fillna(2).astype(float)
+    frame = _as_categories(df.assign(_complexity=complexity), keys)
+    return frame.groupby(_group_keys(frame, keys), observed=True, sort=False)['_complexity'].mean()
+
+
+def records(frame: pd.DataFrame, columns: Optional[List[str]] = None) -> Dict[str, Dict[str, float]]:
+    """把以分组键为索引的统计表转换为 {str(键): {列: 值}} 字典"""
+    frame = frame if columns is None else frame[columns]
+    return {str(key): row for key, row in frame.to_dict(orient='index').items()}
@@ -12,6 +12,11 @@ from typing import Dict, List, Any, Optional
 import argparse
 import numpy as np
 
+from effm_frames import (
+    INSTANCE_2D_TYPES, USER_COLUMNS, TYPE_COMPLEXITY, find_column, normalize_instance_types,
+    completion_mask, duration_stats, speed_trends, type_counts, specialization_scores, average_complexity
+)
+
 try:
     from influxdb_client.client.influxdb_client import InfluxDBClient
     from influxdb_client.client.query_api import QueryApi
@@ -28,28 +33,6 @@ INFLUXDB_CONFIG = {
     'bucket': 'efficiency_events'
 }
 
-# 2D Instance类型映射
-INSTANCE_TYPE_MAPPING = {
-    'rect': 'cuboid',
-    'rectangle': 'cuboid', 
-    'bounding_box': 'cuboid',
-    'BOUNDING_BOX': 'cuboid',
-    'RECTANGLE': 'cuboid',
-    'polygon': 'polygon',
-    'POLYGON': 'polygon',
-    'polyline': 'polyline',
-    'POLYLINE': 'polyline',
-    'iss': 'issinstance',
-    'iss-rect': 'issinstance',
-    'iss_unified': 'issinstance',
-    'ISS': 'issinstance',
-    'ISS_UNIFIED': 'issinstance',
-    'ISS_RECT': 'issinstance',
-    'keypoint': 'keypoint',
-    'key-point': 'keypoint',
-    'KEY_POINT': 'keypoint',
-}
-
 class Enhanced2DAnalyzer:
     def __init__(self):
         """初始化增强版 2D Instance 分析器"""
@@ -132,33 +115,16 @@ class Enhanced2DAnalyzer:
             print(f"❌ 查询2D Instance数据失败: {e}")
             return None
     
-    def normalize_instance_type(self, tool_type: str) -> str:
-        """标准化实例类型名称"""
-        if not tool_type:
-            return 'unknown'
-        
-        tool_type_clean = str(tool_type).strip().lower()
-        return INSTANCE_TYPE_MAPPING.get(tool_type_clean, tool_type_clean)
-    
     def analyze_annotation_targets_overall(self, df: pd.DataFrame) -> Dict[str, Any]:
         """分析总体标注目标"""
         if df.empty:
             return {"error": "没有数据可分析"}
         
         # 标准化实例类型
-        df['normalized_instance_type'] = df.apply(
-            lambda row: self.normalize_instance_type(
-                row.get('annotationType') or 
-                row.get('meta_toolType') or 
-                row.get('toolType') or 
-                row.get('tool_type') or 
-                row.get('field', '')
-            ), axis=1
-        )
+        df['normalized_instance_type'] = normalize_instance_types(df)
         
         # 过滤2D instance数据
-        instance_types = ['cuboid', 'polygon', 'polyline', 'issinstance']
-        instance_df = df[df['normalized_instance_type'].isin(instance_types)]
+        instance_df = df[df['normalized_instance_type'].isin(INSTANCE_2D_TYPES)]
         
         if instance_df.empty:
             return {"error": "没有找到2D Instance相关数据"}
@@ -187,19 +153,10 @@ class Enhanced2DAnalyzer:
             return {"error": "没有数据可分析"}
         
         # 标准化实例类型
-        df['normalized_instance_type'] = df.apply(
-            lambda row: self.normalize_instance_type(
-                row.get('annotationType') or 
-                row.get('meta_toolType') or 
-                row.get('toolType') or 
-                row.get('tool_type') or 
-                row.get('field', '')
-            ), axis=1
-        )
+        df['normalized_instance_type'] = normalize_instance_types(df)
         
         # 过滤2D instance数据
-        instance_types = ['cuboid', 'polygon', 'polyline', 'issinstance']
-        instance_df = df[df['normalized_instance_type'].isin(instance_types)]
+        instance_df = df[df['normalized_instance_type'].isin(INSTANCE_2D_TYPES)]
         
         if instance_df.empty:
             return {"error": "没有找到2D Instance相关数据"}
@@ -232,14 +189,15 @@ class Enhanced2DAnalyzer:
         }
         
         # 按类型的标注速度
-        speed_by_type = {}
-        for inst_type in completion_df['normalized_instance_type'].unique():
-            type_data = completion_df[completion_df['normalized_instance_type'] == inst_type]
-            speed_by_type[str(inst_type)] = {
-                "count": len(type_data),
-                "annotations_per_hour": len(type_data) / total_hours,
-                "percentage_of_total": len(type_data) / len(completion_df) * 100
+        type_totals = completion_df['normalized_instance_type'].value_counts()
+        speed_by_type = {
+            str(inst_type): {
+                "count": int(count),
+                "annotations_per_hour": count / total_hours,
+                "percentage_of_total": count / len(completion_df) * 100
             }
+            for inst_type, count in type_totals[type_totals > 0].items()
+        }
         
         speed_analysis["speed_by_type"] = speed_by_type
         
@@ -259,49 +217,48 @@ class Enhanced2DAnalyzer:
             return {"error": "没有数据可分析"}
         
         # 标准化实例类型
-        df['normalized_instance_type'] = df.apply(
-            lambda row: self.normalize_instance_type(
-                row.get('annotationType') or 
-                row.get('meta_toolType') or 
-                row.get('toolType') or 
-                row.get('tool_type') or 
-                row.get('field', '')
-            ), axis=1
-        )
+        df['normalized_instance_type'] = normalize_instance_types(df)
         
         # 过滤2D instance数据
-        instance_types = ['cuboid', 'polygon', 'polyline', 'issinstance']
-        instance_df = df[df['normalized_instance_type'].isin(instance_types)]
+        instance_df = df[df['normalized_instance_type'].isin(INSTANCE_2D_TYPES)]
         
         if instance_df.empty:
             return {"error": "没有找到2D Instance相关数据"}
         
         # 寻找用户字段
-        user_col = self._find_user_column(instance_df)
+        user_col = find_column(instance_df, USER_COLUMNS)
         if not user_col:
             return {"error": "未找到用户信息"}
         
         # 过滤完成的标注事件
         completion_df = self._filter_completion_events(instance_df)
         
+        # 用户×类型 计数矩阵与各项分数一次算出
+        counts = type_counts(completion_df, user_col)
+        specialization = specialization_scores(counts)
+        complexity = average_complexity(completion_df, [user_col])
+        preference = pd.Series(np.select(
+            [complexity <= 1.5, complexity <= 2.5],
+            ['simple_preference', 'moderate_preference'],
+            'complex_preference'
+        ), index=complexity.index)
+        
         individual_targets = {}
         
-        for user_id in completion_df[user_col].dropna().unique():
-            user_data = completion_df[completion_df[user_col] == user_id]
+        for user_id, user_counts in counts.iterrows():
+            # 用户的目标类型分析
+            user_targets = user_counts[user_counts > 0].sort_values(ascending=False)
+            total = int(user_targets.sum())
             
-            if len(user_data) > 0:
-                # 用户的目标类型分析
-                user_targets = user_data['normalized_instance_type'].value_counts()
-                
-                individual_targets[str(user_id)] = {
-                    "total_annotations": len(user_data),
-                    "target_distribution": user_targets.to_dict(),
-                    "target_percentages": (user_targets / len(user_data) * 100).to_dict(),
-                    "most_common_target": user_targets.index[0] if len(user_targets) > 0 else None,
-                    "target_diversity": len(user_targets),
-                    "specialization_score": self._calculate_specialization_score(user_targets),
-                    "complexity_preference": self._analyze_user_complexity_preference(user_data)
-                }
+            individual_targets[str(user_id)] = {
+                "total_annotations": total,
+                "target_distribution": user_targets.to_dict(),
+                "target_percentages": (user_targets / total * 100).to_dict(),
+                "most_common_target": user_targets.index[0] if len(user_targets) > 0 else None,
+                "target_diversity": len(user_targets),
+                "specialization_score": float(specialization[user_id]),
+                "complexity_preference": preference[user_id]
+            }
         
         # 用户比较分析
         comparison_analysis = self._compare_user_targets(individual_targets)
@@ -317,19 +274,10 @@ class Enhanced2DAnalyzer:
             return {"error": "没有数据可分析"}
         
         # 标准化实例类型
-        df['normalized_instance_type'] = df.apply(
-            lambda row: self.normalize_instance_type(
-                row.get('annotationType') or 
-                row.get('meta_toolType') or 
-                row.get('toolType') or 
-                row.get('tool_type') or 
-                row.get('field', '')
-            ), axis=1
-        )
+        df['normalized_instance_type'] = normalize_instance_types(df)
         
         # 过滤2D instance数据
-        instance_types = ['cuboid', 'polygon', 'polyline', 'issinstance']
-        instance_df = df[df['normalized_instance_type'].isin(instance_types)]
+        instance_df = df[df['normalized_instance_type'].isin(INSTANCE_2D_TYPES)]
         
         if instance_df.empty:
             return {"error": "没有找到2D Instance相关数据"}
@@ -338,61 +286,68 @@ class Enhanced2DAnalyzer:
         instance_df['time'] = pd.to_datetime(instance_df['time'])
         
         # 寻找用户字段
-        user_col = self._find_user_column(instance_df)
+        user_col = find_column(instance_df, USER_COLUMNS)
         if not user_col:
             return {"error": "未找到用户信息"}
         
         # 过滤完成的标注事件
         completion_df = self._filter_completion_events(instance_df)
+        completion_df = completion_df[completion_df[user_col].notna()]
+        completion_df = completion_df.assign(**{user_col: completion_df[user_col].astype('category')})
+        
+        # 每个用户的时间范围、类型计数、速度趋势与完成时间各做一次groupby
+        spans = completion_df.groupby(user_col, observed=True, sort=False)['time'].agg(['min', 'max', 'size'])
+        counts = type_counts(completion_df, user_col)
+        trends = speed_trends(completion_df, [user_col])
+        completion_times = self._analyze_completion_time_by_type(completion_df, user_col)
         
         individual_speeds = {}
         
-        for user_id in completion_df[user_col].dropna().unique():
-            user_data = completion_df[completion_df[user_col] == user_id].sort_values('time')
+        for user_id, span in spans.iterrows():
+            total = int(span['size'])
+            # 计算用户的时间范围
+            user_seconds = (span['max'] - span['min']).total_seconds()
+            user_hours = user_seconds / 3600 if user_seconds > 0 else 1
             
-            if len(user_data) > 0:
-                # 计算用户的时间范围
-                user_time_range = user_data['time'].max() - user_data['time'].min()
-                user_hours = user_time_range.total_seconds() / 3600 if user_time_range.total_seconds() > 0 else 1
-                
-                # 用户速度分析
-                user_speed = {
-                    "session_info": {
-                        "start_time": user_data['time'].min().isoformat(),
-                        "end_time": user_data['time'].max().isoformat(),
-                        "duration_hours": user_hours,
-                        "total_annotations": len(user_data)
-                    },
-                    "speed_metrics": {
-                        "annotations_per_hour": len(user_data) / user_hours,
-                        "annotations_per_minute": len(user_data) / (user_hours * 60),
-                        "average_interval_seconds": user_time_range.total_seconds() / len(user_data) if len(user_data) > 1 else 0
-                    }
+            # 用户速度分析
+            user_speed = {
+                "session_info": {
+                    "start_time": span['min'].isoformat(),
+                    "end_time": span['max'].isoformat(),
+                    "duration_hours": user_hours,
+                    "total_annotations": total
+                },
+                "speed_metrics": {
+                    "annotations_per_hour": total / user_hours,
+                    "annotations_per_minute": total / (user_hours * 60),
+                    "average_interval_seconds": user_seconds / total if total > 1 else 0
                 }
-                
-                # 按类型的速度
-                speed_by_type = {}
-                for inst_type in user_data['normalized_instance_type'].unique():
-                    type_data = user_data[user_data['normalized_instance_type'] == inst_type]
-                    speed_by_type[str(inst_type)] = {
-                        "count": len(type_data),
-                        "annotations_per_hour": len(type_data) / user_hours,
-                        "percentage_of_user_total": len(type_data) / len(user_data) * 100
-                    }
-                
-                user_speed["speed_by_type"] = speed_by_type
-                
-                # 速度趋势分析
-                user_speed["speed_trend"] = self._analyze_user_speed_trend(user_data)
-                
-                # 效率等级
-                user_speed["efficiency_level"] = self._calculate_efficiency_level(user_speed["speed_metrics"]["annotations_per_hour"])
-                
-                # 用户的完成时间分析
-                user_completion_time = self._analyze_completion_time_by_type(user_data)
-                user_speed["completion_time_by_type"] = user_completion_time
-                
-                individual_speeds[str(user_id)] = user_speed
+            }
+            
+            # 按类型的速度
+            user_counts = counts.loc[user_id]
+            user_speed["speed_by_type"] = {
+                str(inst_type): {
+                    "count": int(count),
+                    "annotations_per_hour": count / user_hours,
+                    "percentage_of_user_total": count / total * 100
+                }
+                for inst_type, count in user_counts[user_counts > 0].items()
+            }
+            
+            # 速度趋势分析
+            user_speed["speed_trend"] = trends[user_id]
+            
+            # 效率等级
+            user_speed["efficiency_level"] = self._calculate_efficiency_level(user_speed["speed_metrics"]["annotations_per_hour"])
+            
+            # 用户的完成时间分析
+            if "error" in completion_times:
+                user_speed["completion_time_by_type"] = completion_times
+            else:
+                user_speed["completion_time_by_type"] = completion_times.get(str(user_id), {"error": "没有有效的时长数据"})
+            
+            individual_speeds[str(user_id)] = user_speed
         
         # 用户速度比较
         speed_comparison = self._compare_user_speeds(individual_speeds)
@@ -404,70 +359,27 @@ class Enhanced2DAnalyzer:
     
     def _filter_completion_events(self, df: pd.DataFrame) -> pd.DataFrame:
         """过滤完成的标注事件"""
-        completion_mask = (
-            (df.get('action', pd.Series([], dtype='object')).fillna('') == 'complete') |
-            (df.get('event_type', pd.Series([], dtype='object')).fillna('').str.contains('completion|completed', case=False, na=False)) |
-            (df.get('field', pd.Series([], dtype='object')).fillna('').str.contains('completion|completed', case=False, na=False))
-        )
-        
-        completion_df = df[completion_mask]
+        completion_df = df[completion_mask(df)]
         
         if completion_df.empty:
             completion_df = df  # 如果没有明确的完成标识，使用全部数据
         
         return completion_df
     
-    def _find_user_column(self, df: pd.DataFrame) -> Optional[str]:
-        """寻找用户字段"""
-        user_fields = ['user_id', 'userId', 'createdBy', 'created_by']
-        for field in user_fields:
-            if field in df.columns:
-                return field
-        return None
-    
     def _analyze_target_complexity(self, df: pd.DataFrame) -> Dict[str, Any]:
-        """分析标注目标复杂度"""
-        complexity_analysis = {
-            "simple_shapes": 0,
-            "complex_shapes": 0,
-            "average_complexity": 0
-        }
+        """分析标注目标复杂度（基于类型判断）"""
+        complexity = df['normalized_instance_type'].astype(object).map(TYPE_COMPLEXITY).fillna(2)
+        simple_shapes = int((complexity <= 2).sum())
         
-        # 基于类型判断复杂度
-        type_complexity = {
-            'cuboid': 1,  # 简单
-            'polygon': 3,  # 复杂
-            'polyline': 2,  # 中等
-            'issinstance': 4,  # 最复杂
-            'keypoint': 1  # 简单
+        return {
+            "simple_shapes": simple_shapes,
+            "complex_shapes": len(complexity) - simple_shapes,
+            "average_complexity": float(complexity.mean()) if len(complexity) > 0 else 0
         }
-        
-        for inst_type in df['normalized_instance_type'].unique():
-            count = len(df[df['normalized_instance_type'] == inst_type])
-            complexity = type_complexity.get(str(inst_type), 2)
-            
-            if complexity <= 2:
-                complexity_analysis["simple_shapes"] += count
-            else:
-                complexity_analysis["complex_shapes"] += count
-        
-        total_annotations = len(df)
-        if total_annotations > 0:
-            weighted_complexity = sum(
-                len(df[df['normalized_instance_type'] == inst_type]) * type_complexity.get(str(inst_type), 2)
-                for inst_type in df['normalized_instance_type'].unique()
-            )
-            complexity_analysis["average_complexity"] = weighted_complexity / total_annotations
-        
-        return complexity_analysis
     
-    def _analyze_completion_time_by_type(self, df: pd.DataFrame) -> Dict[str, Any]:
-        """分析每个物体的平均完成时间（按类型）"""
-        completion_time_analysis = {}
-        
-        # 寻找时长相关字段
+    def _find_duration_column(self, df: pd.DataFrame) -> Optional[str]:
+        """寻找取值范围合理的时长字段"""
         duration_fields = ['meta_averagePointInterval', 'meta_duration', 'duration', 'completion_time', 'time_taken', 'value']
-        duration_col = None
         
         for field in duration_fields:
             if field in df.columns:
@@ -478,15 +390,53 @@ class Enhanced2DAnalyzer:
                         if field == 'meta_averagePointInterval':
                             # meta_averagePointInterval 通常在 100-50000 毫秒范围
                             if numeric_values.min() > 0 and numeric_values.max() < 100000:
-                                duration_col = field
-                                break
+                                return field
                         elif field != 'duration':  # 排除异常大的 duration 字段
                             # 其他字段应该在合理范围内
                             if numeric_values.min() > 0 and numeric_values.max() < 3600000:  # 小于1小时
-                                duration_col = field
-                                break
+                                return field
                 except Exception:
                     continue
+        return None
+    
+    def _completion_time_entries(self, stats: pd.DataFrame, duration_col: str,
+                                 with_percentiles: bool) -> Dict[Any, Dict[str, Any]]:
+        """把时长统计表转换为完成时间结果，毫秒级的 meta_averagePointInterval 按组转换为秒"""
+        scaled = stats.copy()
+        if duration_col == 'meta_averagePointInterval':
+            scale = np.where(stats['mean'] > 1000, 1 / 1000, 1.0)  # 毫秒转秒
+            for column in ['mean', 'median', 'min', 'max', 'std', 'q25', 'q75', 'q90']:
+                if column in scaled.columns:
+                    scaled[column] = scaled[column] * scale
+        
+        entries = {}
+        for key, row in scaled.to_dict(orient='index').items():
+            entry = {
+                "count": int(row['count']),
+                "average_completion_time": float(row['mean']),
+                "median_completion_time": float(row['median']),
+                "min_completion_time": float(row['min']),
+                "max_completion_time": float(row['max']),
+                "std_completion_time": float(row['std']),
+                "unit": "秒",
+                "data_source": duration_col
+            }
+            if with_percentiles:
+                entry["percentiles"] = {
+                    "25th": float(row['q25']),
+                    "75th": float(row['q75']),
+                    "90th": float(row['q90'])
+                }
+            entries[key] = entry
+        return entries
+    
+    def _analyze_completion_time_by_type(self, df: pd.DataFrame, user_col: Optional[str] = None) -> Dict[str, Any]:
+        """
+        分析每个物体的平均完成时间（按类型）
+        
+        指定 user_col 时一次分组算出所有用户，返回 {用户: 按类型的结果}
+        """
+        duration_col = self._find_duration_column(df)
         
         if not duration_col:
             return {
@@ -494,67 +444,29 @@ class Enhanced2DAnalyzer:
                 "available_fields": list(df.columns)
             }
         
-        # 转换为数值型
-        df[f'{duration_col}_numeric'] = pd.to_numeric(df[duration_col], errors='coerce')
-        
         # 过滤有效的时长数据
-        valid_df = df[(df[f'{duration_col}_numeric'].notna()) & (df[f'{duration_col}_numeric'] > 0)]
+        durations = pd.to_numeric(df[duration_col], errors='coerce')
+        valid_df = df.assign(_duration=durations)[durations.notna() & (durations > 0)]
         
         if valid_df.empty:
             return {"error": "没有有效的时长数据"}
         
-        # 按类型分析完成时间
-        for inst_type in valid_df['normalized_instance_type'].unique():
-            type_data = valid_df[valid_df['normalized_instance_type'] == inst_type]
-            durations = type_data[f'{duration_col}_numeric']
-            
-            if len(durations) > 0:
-                # 转换毫秒为秒（如果是毫秒级别的数据）
-                if duration_col == 'meta_averagePointInterval' and durations.mean() > 1000:
-                    durations_seconds = durations / 1000  # 毫秒转秒
-                    unit = "秒"
-                else:
-                    durations_seconds = durations
-                    unit = "秒"
-                
-                completion_time_analysis[str(inst_type)] = {
-                    "count": len(durations),
-                    "average_completion_time": float(durations_seconds.mean()),
-                    "median_completion_time": float(durations_seconds.median()),
-                    "min_completion_time": float(durations_seconds.min()),
-                    "max_completion_time": float(durations_seconds.max()),
-                    "std_completion_time": float(durations_seconds.std()) if len(durations) > 1 else 0,
-                    "unit": unit,
-                    "data_source": duration_col,
-                    "percentiles": {
-                        "25th": float(durations_seconds.quantile(0.25)),
-                        "75th": float(durations_seconds.quantile(0.75)),
-                        "90th": float(durations_seconds.quantile(0.90))
-                    }
-                }
-        
-        # 添加总体统计
-        if completion_time_analysis:
-            all_durations = valid_df[f'{duration_col}_numeric']
-            if duration_col == 'meta_averagePointInterval' and all_durations.mean() > 1000:
-                all_durations_seconds = all_durations / 1000
-                unit = "秒"
-            else:
-                all_durations_seconds = all_durations
-                unit = "秒"
-            
-            completion_time_analysis["overall"] = {
-                "count": len(all_durations),
-                "average_completion_time": float(all_durations_seconds.mean()),
-                "median_completion_time": float(all_durations_seconds.median()),
-                "min_completion_time": float(all_durations_seconds.min()),
-                "max_completion_time": float(all_durations_seconds.max()),
-                "std_completion_time": float(all_durations_seconds.std()) if len(all_durations) > 1 else 0,
-                "unit": unit,
-                "data_source": duration_col
-            }
-        
-        return completion_time_analysis
+        keys = [user_col] if user_col else []
+        type_stats = duration_stats(valid_df, keys + ['normalized_instance_type'], '_duration',
+                                    quantiles=(0.25, 0.75, 0.90))
+        overall_stats = duration_stats(valid_df, keys, '_duration')
+        
+        # 按类型分析完成时间，并添加总体统计
+        results: Dict[Any, Dict[str, Any]] = {}
+        for key, entry in self._completion_time_entries(type_stats, duration_col, True).items():
+            owner, inst_type = key if user_col else (None, key)
+            results.setdefault(owner, {})[str(inst_type)] = entry
+        for key, entry in self._completion_time_entries(overall_stats, duration_col, False).items():
+            results.setdefault(key if user_col else None, {})["overall"] = entry
+        
+        if user_col:
+            return {str(owner): result for owner, result in results.items()}
+        return results.get(None, {})
     
     def _analyze_hourly_speed(self, df: pd.DataFrame) -> Dict[str, Any]:
         """分析每小时的标注速度模式"""
@@ -568,48 +480,6 @@ class Enhanced2DAnalyzer:
             "most_productive_hours": hourly_counts.nlargest(3).to_dict()
         }
     
-    def _calculate_specialization_score(self, target_counts: pd.Series) -> float:
-        """计算用户专业化分数（0-100，越高越专业化）"""
-        if len(target_counts) <= 1:
-            return 100.0
-        
-        # 基于香农熵计算多样性，然后转换为专业化分数
-        total = target_counts.sum()
-        probabilities = target_counts / total
-        entropy = -sum(p * np.log2(p) for p in probabilities if p > 0)
-        
-        # 最大熵（完全均匀分布）
-        max_entropy = np.log2(len(target_counts))
-        
-        # 专业化分数 = 1 - 标准化熵
-        specialization = (1 - entropy / max_entropy) * 100 if max_entropy > 0 else 100
-        
-        return min(100.0, max(0.0, specialization))
-    
-    def _analyze_user_complexity_preference(self, user_data: pd.DataFrame) -> str:
-        """分析用户复杂度偏好"""
-        type_complexity = {
-            'cuboid': 1,
-            'polygon': 3,
-            'polyline': 2,
-            'issinstance': 4,
-            'keypoint': 1
-        }
-        
-        total_complexity = sum(
-            len(user_data[user_data['normalized_instance_type'] == inst_type]) * type_complexity.get(str(inst_type), 2)
-            for inst_type in user_data['normalized_instance_type'].unique()
-        )
-        
-        avg_complexity = total_complexity / len(user_data) if len(user_data) > 0 else 0
-        
-        if avg_complexity <= 1.5:
-            return "simple_preference"
-        elif avg_complexity <= 2.5:
-            return "moderate_preference"
-        else:
-            return "complex_preference"
-    
     def _compare_user_targets(self, individual_targets: Dict) -> Dict[str, Any]:
         """比较用户目标偏好"""
         if not individual_targets:
@@ -639,34 +509,6 @@ class Enhanced2DAnalyzer:
             }
         }
     
-    def _analyze_user_speed_trend(self, user_data: pd.DataFrame) -> str:
-        """分析用户速度趋势"""
-        if len(user_data) < 5:
-            return "insufficient_data"
-        
-        # 将数据分为前后两半，比较标注间隔
-        mid_point = len(user_data) // 2
-        first_half = user_data.iloc[:mid_point]
-        second_half = user_data.iloc[mid_point:]
-        
-        if len(first_half) < 2 or len(second_half) < 2:
-            return "insufficient_data"
-        
-        first_half_interval = (first_half['time'].max() - first_half['time'].min()).total_seconds() / len(first_half)
-        second_half_interval = (second_half['time'].max() - second_half['time'].min()).total_seconds() / len(second_half)
-        
-        if first_half_interval > 0:
-            speed_change = (first_half_interval - second_half_interval) / first_half_interval
-            
-            if speed_change > 0.2:
-                return "accelerating"
-            elif speed_change < -0.2:
-                return "decelerating"
-            else:
-                return "stable"
-        
-        return "stable"
-    
     def _calculate_efficiency_level(self, annotations_per_hour: float) -> str:
         """计算效率等级"""
         if annotations_per_hour >= 20:
@@ -0,0 +1,68 @@
+"""
+FluxQuery 查询构建单元测试（无需运行服务和 InfluxDB）
+
+使用方法：在 efficiency-service 目录下执行 `python -m pytest tests/test_flux_query.py`，
+或直接 `python tests/test_flux_query.py`
+"""
+import asyncio
+import os
+import sys
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.flux_query import FluxQuery
+from app.services.influxdb_service import InfluxDBService
+from app.services.range_executor import GroupedStats, TimeSlice
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+STOP = datetime(2024, 1, 2, tzinfo=timezone.utc)
+
+
+def test_pipe_binds_values():
+    query, params = FluxQuery() \
+        .range(start=START, stop=STOP) \
+        .measurement("events") \
+        .tag("user_id", "u1") \
+        .pipe("aggregateWindow(every: {every}, fn: mean, createEmpty: false)", every="1h") \
+        .build()
+
+    assert "|> filter(fn: (r) => r[\"user_id\"] == p_0)" in query
+    assert "|> aggregateWindow(every: p_1, fn: mean, createEmpty: false)" in query
+    assert params["p_0"] == "u1"
+    assert params["p_1"] == "1h"
+
+
+def test_operation_efficiency_query_renders_record_literals():
+    """reduce 的 identity / fn 中的记录字面量不能被当作参数占位符"""
+    service = InfluxDBService()
+    captured = []
+
+    async def get_client():
+        return None
+
+    async def query_grouped(slices, build_query, key, value_column="_value", count_column=None):
+        captured.extend(build_query(time_slice) for time_slice in slices)
+        return GroupedStats()
+
+    service.get_client = get_client
+    service.query_grouped = query_grouped
+    service.time_slices = lambda days, window=None: [TimeSlice(0, START, STOP)]
+
+    result = asyncio.run(service.get_operation_efficiency_analysis("u1", days=1, tool="vscode"))
+
+    assert result["action_efficiency"] == []
+    query, params = captured[0]
+    assert "|> group(columns: [\"action\"])" in query
+    assert ("|> reduce(identity: {total: 0.0, count: 0.0}, "
+            "fn: (r, accumulator) => ({total: accumulator.total + float(v: r._value), "
+            "count: accumulator.count + 1.0}))") in query
+    assert params["p_0"] == "u1"
+    assert params["p_1"] == "vscode"
+    assert params["p_start"] == START and params["p_stop"] == STOP
+
+
+if __name__ == "__main__":
+    test_pipe_binds_values()
+    test_operation_efficiency_query_renders_record_literals()
+    print("OK")
@@ -0,0 +1,82 @@
+"""
+ISS 标注分析累加器单元测试（无需运行服务和 InfluxDB）
+
+使用方法：在 efficiency-service 目录下执行 `python -m pytest tests/test_iss_analysis.py`，
+或直接 `python tests/test_iss_analysis.py`
+"""
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.event_analysis import FrameAnnotationAccumulator, ISSAnnotationAccumulator
+
+COVERAGE = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def frame_event(action, session_id, time, duration=None, polygon_count=0):
+    return {
+        'time': time,
+        'field': 'duration',
+        'value': duration,
+        'event_type': 'EventType.ANNOTATION',
+        'action': action,
+        'metadata': {
+            'toolType': 'iss',
+            'level': 'frame',
+            'frameSessionId': session_id,
+            'polygonCount': polygon_count
+        }
+    }
+
+
+def frame_record(session_id, start, end, duration, polygon_count):
+    return {
+        'level': 'frame',
+        'status': 'completed',
+        'session_id': session_id,
+        'start_time': int(start.timestamp() * 1000),
+        '_time': end,
+        'duration': duration,
+        'polygon_count': polygon_count
+    }
+
+
+def test_frame_spanning_coverage_start_counted_once():
+    """分界之前开始、之后完成的帧：原始事件部分只有开始事件，会话记录部分计入一次"""
+    accumulator = ISSAnnotationAccumulator()
+    start = COVERAGE - timedelta(minutes=5)
+    # 原始事件部分：[window_start, coverage)
+    accumulator.add(frame_event('start', 'done-before', start - timedelta(minutes=5)))
+    accumulator.add(frame_event('complete', 'done-before', start, duration=300000.0, polygon_count=3))
+    accumulator.add(frame_event('start', 'spanning', start))
+    # 会话记录部分：[coverage, now)
+    accumulator.add_session(frame_record('spanning', start, COVERAGE + timedelta(minutes=1), 360000.0, 4))
+
+    result = accumulator.frame.result()
+    assert result['total_frames_analyzed'] == 2
+    assert result['total_polygons_in_frames'] == 7
+
+
+def test_restarted_frame_not_recounted_after_eviction():
+    frames = FrameAnnotationAccumulator(recent_sessions=1)
+    for event in [
+        frame_event('start', 'a', COVERAGE),
+        frame_event('complete', 'a', COVERAGE, duration=100.0, polygon_count=2),
+        frame_event('start', 'b', COVERAGE),
+        frame_event('complete', 'b', COVERAGE, duration=100.0, polygon_count=2),
+        # a 已被挤出最近会话，重新开始但没有再次完成
+        frame_event('start', 'a', COVERAGE),
+    ]:
+        frames.add(event)
+
+    result = frames.result()
+    assert result['total_frames_analyzed'] == 2
+    assert result['total_polygons_in_frames'] == 4
+
+
+if __name__ == "__main__":
+    test_frame_spanning_coverage_start_counted_once()
+    test_restarted_frame_not_recounted_after_eviction()
+    print("OK")